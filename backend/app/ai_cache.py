@@ -0,0 +1,242 @@
+"""Cache semântico de respostas da IA Nat — reaproveita a resposta de uma pergunta quase igual.
+
+Boa parte do que o lead pergunta é a mesma pergunta com outras palavras ("quanto custa?",
+"qual o valor do curso?"). Cada uma custa um embedding, uma varredura da base e um chat
+completion inteiro. Este cache guarda a resposta indexada pelo EMBEDDING da pergunta e, quando
+chega outra acima de SIMILARIDADE_MINIMA no mesmo contexto, devolve a guardada.
+
+NASCE DESLIGADO (AI_CACHE_ENABLED). É opt-in de propósito: uma resposta reaproveitada é uma
+resposta que ninguém gerou para aquele lead, e ligar isso é decisão de quem cuida do prompt.
+
+------------------------------------------------------------------------------------------
+QUANDO UMA RESPOSTA GUARDADA VALE PARA OUTRO LEAD
+------------------------------------------------------------------------------------------
+Só quando TUDO que entrou no prompt além da pergunta é igual. A chave de um acerto é:
+
+  * mesmo canal — cada canal tem a própria base de conhecimento e a própria config;
+  * mesma VERSÃO DA BASE (ver versao_base) — documento novo ou apagado invalida tudo;
+  * mesma ASSINATURA (ver assinatura) — system prompt, modelo, teto de tokens e o curso de
+    interesse do lead. O curso entra porque vai no prompt (INFORMAÇÕES DO LEAD ATUAL): "qual o
+    valor?" tem uma resposta para Saúde Mental e outra para Psicanálise;
+  * similaridade de cosseno >= SIMILARIDADE_MINIMA entre as perguntas.
+
+O NOME é a única informação do lead que NÃO entra na chave: ele é trocado por um marcador na
+hora de guardar e pelo nome do novo lead na hora de devolver (ver _anonimizar). Se a resposta
+guardada cita o nome e o lead atual não tem nome, não há substituição honesta — vira miss.
+
+------------------------------------------------------------------------------------------
+NUNCA COM ESTADO NA CONVERSA
+------------------------------------------------------------------------------------------
+`elegivel` recusa qualquer conversa em que o lead já tenha dito algo antes da pergunta atual,
+ou em que a atendente já tenha respondido algo que não seja template. A resposta a "e à
+noite?" depende do que veio antes, e o embedding da pergunta sozinha não sabe disso — duas
+perguntas idênticas com históricos diferentes NÃO são a mesma pergunta. O cache só vale para a
+primeira pergunta depois da boas-vindas, que é justamente onde as repetições se concentram.
+
+A mesma regra vale para GUARDAR: uma resposta gerada no meio de uma conversa carrega contexto
+dela e não pode servir de modelo para ninguém.
+
+------------------------------------------------------------------------------------------
+ONDE MORA
+------------------------------------------------------------------------------------------
+Em memória, por processo. Sem tabela e sem migração: perder o cache num restart custa só as
+chamadas que ele economizaria, e a TTL curta já assume que ele é descartável. O tamanho é
+limitado por canal (MAX_ENTRADAS_POR_CANAL) e a busca é um produto de matriz em numpy — com
+algumas centenas de entradas, microssegundos perto de um chat completion.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_ATIVO = os.getenv("AI_CACHE_ENABLED", "false").lower() in ("1", "true", "sim")
+
+# Cosseno mínimo entre as perguntas. Alto de propósito: com text-embedding-3-small, 0.95 pega
+# reformulação ("qual o valor" x "quanto custa") e deixa de fora pergunta vizinha ("qual o
+# valor da matrícula" x "qual o valor da mensalidade"). Errar para baixo é responder a
+# pergunta errada; errar para cima é só pagar uma chamada a mais.
+SIMILARIDADE_MINIMA = float(os.getenv("AI_CACHE_SIMILARIDADE", "0.95"))
+
+# Validade de uma resposta guardada. Preço e turma mudam sem a base mudar (o prompt do canal é
+# editado na tela), e a versão da base não vê isso — a TTL é o teto de quanto tempo uma
+# resposta velha pode sobreviver a uma mudança que a assinatura não capturou.
+TTL_SEGUNDOS = int(os.getenv("AI_CACHE_TTL_SEGUNDOS", "3600"))
+
+MAX_ENTRADAS_POR_CANAL = 500
+
+# Marcador do nome do lead dentro da resposta guardada. Formato que o modelo não produz.
+MARCADOR_NOME = "⟦nome⟧"
+
+# Placeholders que get_conversation_history põe no lugar de template e mídia. Template é a
+# boas-vindas (nossa, não do lead) e não carrega estado da conversa.
+_SEM_ESTADO = {"[mensagem de template enviada]"}
+
+# canal -> lista de entradas {vetor, resposta, versao, assinatura, criado_em}
+_entradas: dict = {}
+
+# Geração por canal, incrementada por `invalidar`. Entra na versão da base: é o que faz o
+# upload/remoção de documento invalidar na hora, sem esperar a contagem do banco mudar.
+_geracao: dict = {}
+
+_metricas = {"consultas": 0, "acertos": 0, "perdas": 0, "inelegiveis": 0,
+             "guardadas": 0, "expiradas": 0, "invalidacoes": 0}
+
+
+def elegivel(history: list[dict], user_message: str) -> bool:
+    """A conversa está sem estado? Só então a resposta pode vir do cache (ou ir para ele).
+
+    Sem estado = nada antes da pergunta atual além de template nosso. `history` é o formato
+    de get_conversation_history; a pergunta atual pode ou não já estar no fim dele — inteira
+    ou cortada pela janela.
+    """
+    from app.ai_engine import e_pergunta_atual
+
+    anteriores = list(history)
+    if anteriores and e_pergunta_atual(anteriores[-1], user_message):
+        anteriores = anteriores[:-1]
+    for m in anteriores:
+        if m.get("role") == "user":
+            return False
+        if (m.get("content") or "") not in _SEM_ESTADO:
+            return False
+    return True
+
+
+def assinatura(system_prompt: str, model: str, max_tokens: int, lead_course: str) -> str:
+    """Tudo do prompt que não é pergunta nem nome, resumido num hash."""
+    bruto = "\x1f".join([system_prompt or "", str(model), str(max_tokens), lead_course or ""])
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+async def versao_base(channel_id: int, db) -> tuple:
+    """Versão da base de conhecimento do canal: (documentos, maior id, geração local).
+
+    A contagem pega remoção, o maior id pega inclusão — juntos mudam a cada upload e a cada
+    delete de documento, inclusive feitos por OUTRO processo. A geração local cobre a janela
+    em que este processo mesmo acabou de mexer na base.
+    """
+    from sqlalchemy import func, select
+    from app.models import KnowledgeDocument
+
+    linha = (await db.execute(
+        select(func.count(KnowledgeDocument.id), func.max(KnowledgeDocument.id))
+        .where(KnowledgeDocument.channel_id == channel_id)
+    )).first()
+    total, maior = (linha[0] or 0, linha[1] or 0) if linha else (0, 0)
+    return (total, maior, _geracao.get(channel_id, 0))
+
+
+def invalidar(channel_id: int) -> None:
+    """Descarta o cache do canal. Chamado quando a base ou a config da IA mudam."""
+    _geracao[channel_id] = _geracao.get(channel_id, 0) + 1
+    if _entradas.pop(channel_id, None):
+        _metricas["invalidacoes"] += 1
+
+
+def _normalizar(vetor) -> np.ndarray:
+    v = np.asarray(vetor, dtype=np.float32)
+    norma = np.linalg.norm(v)
+    return v / norma if norma else v
+
+
+def _variantes_nome(lead_name: str) -> list[str]:
+    """Nome completo e primeiro nome, do mais longo para o mais curto."""
+    nome = (lead_name or "").strip()
+    if not nome:
+        return []
+    primeiro = nome.split()[0]
+    return [nome] if primeiro == nome else [nome, primeiro]
+
+
+def _anonimizar(resposta: str, lead_name: str) -> str:
+    """Troca o nome do lead pelo marcador. Só palavra inteira: "Ana" não mexe em "Análise"."""
+    for variante in _variantes_nome(lead_name):
+        resposta = re.sub(rf"\b{re.escape(variante)}\b", MARCADOR_NOME, resposta)
+    return resposta
+
+
+def _personalizar(resposta: str, lead_name: str) -> str | None:
+    """Põe o nome do lead atual no marcador. None se precisaria de nome e não há."""
+    if MARCADOR_NOME not in resposta:
+        return resposta
+    variantes = _variantes_nome(lead_name)
+    if not variantes:
+        return None
+    return resposta.replace(MARCADOR_NOME, variantes[-1])
+
+
+def buscar(channel_id: int, versao: tuple, chave: str, query_embedding, lead_name: str,
+           *, agora: float | None = None) -> str | None:
+    """Resposta guardada para uma pergunta parecida, já com o nome do lead. None = miss.
+
+    `agora` explícito é o que permite testar a TTL sem mock de relógio.
+    """
+    agora = agora if agora is not None else time.monotonic()
+    _metricas["consultas"] += 1
+
+    entradas = _entradas.get(channel_id) or []
+    vivas = [e for e in entradas
+             if e["versao"] == versao and agora - e["criado_em"] < TTL_SEGUNDOS]
+    if len(vivas) != len(entradas):
+        _metricas["expiradas"] += len(entradas) - len(vivas)
+        _entradas[channel_id] = vivas
+
+    candidatas = [e for e in vivas if e["assinatura"] == chave]
+    if candidatas:
+        matriz = np.stack([e["vetor"] for e in candidatas])
+        scores = matriz @ _normalizar(query_embedding)
+        # Da mais parecida para a menos: a melhor pode citar um nome que este lead não tem.
+        for i in np.argsort(-scores):
+            if scores[i] < SIMILARIDADE_MINIMA:
+                break
+            resposta = _personalizar(candidatas[i]["resposta"], lead_name)
+            if resposta is not None:
+                _metricas["acertos"] += 1
+                logger.info("♻️  Cache IA: acerto no canal %s (similaridade %.3f)",
+                            channel_id, float(scores[i]), extra={"amostra": 20})
+                return resposta
+
+    _metricas["perdas"] += 1
+    return None
+
+
+def guardar(channel_id: int, versao: tuple, chave: str, query_embedding, resposta: str,
+            lead_name: str, *, agora: float | None = None) -> None:
+    """Guarda a resposta gerada, com o nome do lead trocado pelo marcador."""
+    if not resposta:
+        return
+    agora = agora if agora is not None else time.monotonic()
+    entradas = _entradas.setdefault(channel_id, [])
+    entradas.append({
+        "vetor": _normalizar(query_embedding),
+        "resposta": _anonimizar(resposta, lead_name),
+        "versao": versao,
+        "assinatura": chave,
+        "criado_em": agora,
+    })
+    # Descarta as mais antigas: a lista está em ordem de inserção.
+    if len(entradas) > MAX_ENTRADAS_POR_CANAL:
+        del entradas[:len(entradas) - MAX_ENTRADAS_POR_CANAL]
+    _metricas["guardadas"] += 1
+
+
+def registrar_inelegivel() -> None:
+    _metricas["inelegiveis"] += 1
+
+
+def estatisticas() -> dict:
+    """Contadores desde o boot do processo + taxa de acerto sobre as consultas elegíveis."""
+    consultas = _metricas["consultas"]
+    return {
+        "ativo": CACHE_ATIVO,
+        **_metricas,
+        "taxa_acerto": (_metricas["acertos"] / consultas) if consultas else 0.0,
+        "entradas": sum(len(v) for v in _entradas.values()),
+        "similaridade_minima": SIMILARIDADE_MINIMA,
+        "ttl_segundos": TTL_SEGUNDOS,
+    }
@@ -2,17 +2,24 @@
 Motor de IA com RAG para atendimento via WhatsApp.
 Usa OpenAI para embeddings + geração de respostas.
 """
+import logging
 import os
 import json
 from datetime import datetime
+from functools import lru_cache
 import numpy as np
 import tiktoken
 from openai import AsyncOpenAI
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import KnowledgeDocument, AIConfig, Message, AIConversationSummary, ExactLead
+from app import ai_cache
+from app.cpu_executor import executar
+from app.metrics import http_client_openai
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client_openai())
 
 DEFAULT_MODEL = "gpt-5-mini"
 EMBEDDING_MODEL = "text-embedding-3-small"
@@ -26,13 +33,24 @@ Responda de forma natural, como uma conversa no WhatsApp (mensagens curtas, use
 
 # === Tokenização ===
 
+@lru_cache(maxsize=1)
+def _encoding():
+    """Encoder o200k_base, carregado uma vez. None se não der para carregar (sem rede no
+    primeiro uso, cache do tiktoken ausente) — aí a contagem cai na estimativa por caracteres,
+    em vez de tentar baixar o arquivo de novo a cada mensagem do histórico."""
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("⚠️ tiktoken indisponível, contando tokens por estimativa: %s", e)
+        return None
+
+
 def count_tokens(text: str, model: str = "gpt-5") -> int:
     """Conta tokens de um texto."""
-    try:
-        enc = tiktoken.get_encoding("o200k_base")
-        return len(enc.encode(text))
-    except Exception:
+    enc = _encoding()
+    if enc is None:
         return len(text) // 4
+    return len(enc.encode(text))
 
 
 def split_into_chunks(text: str, title: str, max_tokens: int = 400) -> list[dict]:
@@ -92,9 +110,20 @@ def cosine_similarity(a: list[float], b: list[float]) -> float:
 
 # === RAG: Busca por Similaridade ===
 
-async def search_knowledge(query: str, channel_id: int, db: AsyncSession, top_k: int = 3) -> list[dict]:
-    """Busca os chunks mais relevantes para a pergunta do lead."""
-    query_embedding = await generate_embedding(query)
+async def search_knowledge(
+    query: str,
+    channel_id: int,
+    db: AsyncSession,
+    top_k: int = 3,
+    query_embedding: list[float] | None = None,
+) -> list[dict]:
+    """Busca os chunks mais relevantes para a pergunta do lead.
+
+    `query_embedding` evita gerar de novo o embedding quando quem chama já tem (cache de
+    respostas — ver ai_cache).
+    """
+    if query_embedding is None:
+        query_embedding = await generate_embedding(query)
 
     result = await db.execute(
         select(KnowledgeDocument).where(
@@ -107,14 +136,21 @@ async def search_knowledge(query: str, channel_id: int, db: AsyncSession, top_k:
     if not documents:
         return []
 
+    # Parse + cosseno de todos os documentos do canal: CPU, vai para o pool (ver cpu_executor).
+    linhas = [(doc.title, doc.content, doc.embedding) for doc in documents]
+    return await executar(_pontuar_documentos, query_embedding, linhas, top_k)
+
+
+def _pontuar_documentos(query_embedding: list[float], linhas: list[tuple], top_k: int) -> list[dict]:
+    """Roda numa thread do pool de CPU: recebe tuplas, não objetos ORM da sessão."""
     scored = []
-    for doc in documents:
+    for title, content, embedding in linhas:
         try:
-            doc_embedding = json.loads(doc.embedding)
+            doc_embedding = json.loads(embedding)
             score = cosine_similarity(query_embedding, doc_embedding)
             scored.append({
-                "title": doc.title,
-                "content": doc.content,
+                "title": title,
+                "content": content,
                 "score": score,
             })
         except (json.JSONDecodeError, TypeError):
@@ -147,34 +183,195 @@ def build_catalog_info(catalog: list[str]) -> str:
 
 
 # === Histórico de Conversa ===
+#
+# O histórico entra no prompt por ORÇAMENTO DE TOKENS, não por número de mensagens. "As últimas
+# 10" eram 40 tokens numa troca de "oi"/"sim" e 6 mil quando o lead colava o currículo — o
+# tamanho do prompt (e a latência do chat completion) ficava na mão do lead. Agora a janela é
+# montada da mais nova para a mais antiga até o orçamento acabar, e cada mensagem é cortada
+# em HISTORICO_TOKENS_POR_MENSAGEM antes de entrar: um texto colado gigante ocupa uma fatia,
+# não o prompt inteiro.
+#
+# O que sai da janela pode virar RESUMO ROLANTE (ver resumo_rolante), guardado no card do
+# Kanban. Desligado por padrão: cada atualização é um chat completion a mais.
+
+HISTORICO_TOKENS_RESPOSTA = int(os.getenv("AI_HISTORY_TOKENS", "1500"))
+HISTORICO_TOKENS_RESUMO = int(os.getenv("AI_SUMMARY_HISTORY_TOKENS", "6000"))
+HISTORICO_TOKENS_POR_MENSAGEM = int(os.getenv("AI_HISTORY_TOKENS_PER_MESSAGE", "400"))
+
+# Teto de linhas lidas do banco por montagem. Com o orçamento padrão a janela fecha bem antes
+# disso; o teto só existe para uma conversa de milhares de mensagens não virar uma query cheia.
+HISTORICO_MAX_MENSAGENS = 200
+
+# Custo fixo de cada mensagem no formato de chat (papel + delimitadores), além do conteúdo.
+TOKENS_POR_MENSAGEM_CHAT = 4
+
+MARCA_CORTE = " […]"
+
+RESUMO_ROLANTE_ATIVO = os.getenv("AI_ROLLING_SUMMARY", "false").lower() in ("1", "true", "sim")
+# Só reescreve o resumo quando há pelo menos isso de mensagens novas fora da janela — resumir
+# a cada mensagem que escorrega seria um chat completion extra por resposta.
+RESUMO_ROLANTE_MIN_MENSAGENS = 6
+
+
+def truncar_tokens(texto: str, max_tokens: int) -> str:
+    """Corta o texto em max_tokens (contando a marca de corte). Mantém o COMEÇO da mensagem."""
+    if count_tokens(texto) <= max_tokens:
+        return texto
+    disponivel = max(max_tokens - count_tokens(MARCA_CORTE), 0)
+    enc = _encoding()
+    if enc is None:
+        return texto[:disponivel * 4] + MARCA_CORTE
+    cortado = enc.decode(enc.encode(texto)[:disponivel])
+    # O corte pode cair no meio de um caractere multibyte (emoji, acento) — descarta o resto.
+    return cortado.rstrip("\ufffd") + MARCA_CORTE
+
+
+def e_pergunta_atual(item: dict, user_message: str) -> bool:
+    """O item do histórico é a pergunta que está sendo respondida — inteira ou já cortada?
+
+    montar_janela corta a mais nova como qualquer outra: depois do corte o texto não bate mais
+    com user_message, e compará-los por igualdade mandaria a pergunta duas vezes ao modelo.
+    """
+    if item.get("role") != "user":
+        return False
+    conteudo = item.get("content") or ""
+    if conteudo == user_message:
+        return True
+    return conteudo.endswith(MARCA_CORTE) and user_message.startswith(conteudo[:-len(MARCA_CORTE)])
+
+
+def _mensagem_para_historico(msg) -> dict:
+    role = "user" if msg.direction == "inbound" else "assistant"
+    content = msg.content or ""
+
+    # Ignorar mensagens de mídia no contexto
+    if content.startswith("media:"):
+        content = "[mídia enviada]"
+    if msg.message_type == "template" or content.startswith("template:") or content.startswith("[Template]"):
+        content = "[mensagem de template enviada]"
+
+    return {"role": role, "content": content}
+
+
+def montar_janela(itens: list[dict], orcamento: int,
+                  por_mensagem: int = HISTORICO_TOKENS_POR_MENSAGEM) -> tuple[list[dict], int]:
+    """Janela de histórico dentro do orçamento. Função pura — é ela que os testes exercitam.
+
+    `itens` vem da MAIS NOVA para a mais antiga. Devolve (janela em ordem cronológica, quantos
+    itens de `itens` entraram). A janela é sempre contígua: a primeira mensagem que não cabe
+    encerra a montagem, mesmo que uma mais antiga e curta coubesse — pular buracos no meio da
+    conversa faria o modelo ler respostas sem as perguntas.
+
+    A mais nova entra SEMPRE (cortada ao que couber): é, em geral, a pergunta que está sendo
+    respondida.
+    """
+    janela = []
+    restante = orcamento
+    for item in itens:
+        limite = min(por_mensagem, max(restante - TOKENS_POR_MENSAGEM_CHAT, 0))
+        conteudo = item["content"]
+        custo = count_tokens(conteudo)
+        if custo > limite:
+            if janela and limite < por_mensagem:
+                break
+            conteudo = truncar_tokens(conteudo, limite)
+            custo = count_tokens(conteudo)
+        janela.append({"role": item["role"], "content": conteudo})
+        restante -= custo + TOKENS_POR_MENSAGEM_CHAT
+        if restante <= TOKENS_POR_MENSAGEM_CHAT:
+            break
+    janela.reverse()
+    return janela, len(janela)
+
+
+async def get_conversation_window(
+    contact_wa_id: str,
+    db: AsyncSession,
+    token_budget: int = HISTORICO_TOKENS_RESPOSTA,
+    max_mensagens: int = HISTORICO_MAX_MENSAGENS,
+) -> tuple[list[dict], list]:
+    """Histórico dentro do orçamento + as Messages mais antigas que ficaram de fora.
 
-async def get_conversation_history(contact_wa_id: str, db: AsyncSession, limit: int = 10) -> list[dict]:
-    """Busca as últimas mensagens da conversa para contexto."""
+    As que ficaram de fora (em ordem cronológica) são a matéria-prima do resumo rolante.
+    """
     result = await db.execute(
         select(Message)
         .where(Message.contact_wa_id == contact_wa_id)
         .order_by(Message.timestamp.desc())
-        .limit(limit)
+        .limit(max_mensagens)
     )
     messages = result.scalars().all()
-    messages.reverse()
-
-    history = []
-    for msg in messages:
-        role = "user" if msg.direction == "inbound" else "assistant"
-        content = msg.content or ""
 
-        # Ignorar mensagens de mídia no contexto
-        if content.startswith("media:"):
-            content = "[mídia enviada]"
-        if msg.message_type == "template" or content.startswith("template:") or content.startswith("[Template]"):
-            content = "[mensagem de template enviada]"
+    history, usadas = montar_janela(
+        [_mensagem_para_historico(m) for m in messages], token_budget)
+    antigas = list(messages[usadas:])
+    antigas.reverse()
+    return history, antigas
 
-        history.append({"role": role, "content": content})
 
+async def get_conversation_history(
+    contact_wa_id: str,
+    db: AsyncSession,
+    limit: int | None = None,
+    token_budget: int = HISTORICO_TOKENS_RESPOSTA,
+) -> list[dict]:
+    """Busca as mensagens mais recentes da conversa que cabem em `token_budget`.
+
+    `limit` continua aceito como teto de mensagens, para quem quer as N últimas no máximo.
+    """
+    history, _ = await get_conversation_window(
+        contact_wa_id, db, token_budget, limit or HISTORICO_MAX_MENSAGENS)
     return history
 
 
+async def resumo_rolante(card, antigas: list, db: AsyncSession) -> str:
+    """Resumo das mensagens que saíram da janela, atualizado incrementalmente no card.
+
+    Só manda para o modelo o resumo anterior + as mensagens com id acima de
+    history_summary_until, e só quando elas somam RESUMO_ROLANTE_MIN_MENSAGENS. Não faz
+    commit: quem chamou é dono da transação. Se falhar, segue com o resumo que já havia —
+    resumo desatualizado é contexto a menos, nunca motivo para não responder.
+    """
+    if not RESUMO_ROLANTE_ATIVO or card is None:
+        return ""
+
+    ate = card.history_summary_until or 0
+    novas = [m for m in antigas if m.id and m.id > ate]
+    if len(novas) >= RESUMO_ROLANTE_MIN_MENSAGENS:
+        trechos = []
+        for m in novas:
+            item = _mensagem_para_historico(m)
+            quem = "Lead" if item["role"] == "user" else "Atendente"
+            trechos.append(f"{quem}: {truncar_tokens(item['content'], HISTORICO_TOKENS_POR_MENSAGEM)}")
+        anterior = card.history_summary or "(nenhum)"
+        try:
+            response = await client.chat.completions.create(
+                model=DEFAULT_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Você mantém o resumo de uma conversa de atendimento. "
+                                   "Atualize o resumo anterior incorporando as mensagens novas. "
+                                   "Máximo de 5 frases. Preserve dados do lead (curso, formação, "
+                                   "objeções, combinados) e descarte cumprimentos."
+                    },
+                    {"role": "user", "content": f"RESUMO ANTERIOR:\n{anterior}\n\n"
+                                                f"MENSAGENS NOVAS:\n" + "\n".join(trechos)},
+                ],
+                max_completion_tokens=300,
+            )
+            texto = response.choices[0].message.content
+            if texto:
+                card.history_summary = texto
+                card.history_summary_until = max(m.id for m in novas)
+                logger.info("🧾 Resumo rolante atualizado para %s (+%s mensagens)",
+                            card.contact_wa_id, len(novas))
+        except Exception as e:
+            logger.warning("⚠️ Erro ao atualizar resumo rolante: %s", e)
+
+    return card.history_summary or ""
+
+
 # === Geração de Resposta ===
 
 async def generate_ai_response(
@@ -241,8 +438,39 @@ async def generate_ai_response(
     #         calendar_info += "\nIMPORTANTE: Só ofereça horários que estão nesta lista. Se o lead pedir um horário que não está disponível, informe que não há vaga e sugira os horários livres.\n"
     # except Exception as e:
     #     print(f"⚠️ Erro ao buscar calendário: {e}")
-    # 2. Buscar contexto do RAG
-    relevant_docs = await search_knowledge(user_message, channel_id, db)
+    # 2. Buscar histórico da conversa (antes do RAG: é ele que decide se o cache vale)
+    history, antigas = await get_conversation_window(contact_wa_id, db)
+    historico_resumido = ""
+    if antigas:
+        historico_resumido = await resumo_rolante(card, antigas, db)
+    if historico_resumido:
+        historico_resumido = (
+            "\n\nRESUMO DA CONVERSA ANTERIOR (mensagens mais antigas que o histórico abaixo):\n"
+            + historico_resumido + "\n"
+        )
+
+    # 2.1 Cache semântico de respostas (opt-in, só em conversa sem estado — ver ai_cache)
+    query_embedding = None
+    cache_chave = None
+    if ai_cache.CACHE_ATIVO:
+        # Mensagem fora da janela é conversa com estado, mesmo que a janela não mostre.
+        if ai_cache.elegivel(history, user_message) and not antigas:
+            try:
+                query_embedding = await generate_embedding(user_message)
+                cache_versao = await ai_cache.versao_base(channel_id, db)
+                cache_chave = ai_cache.assinatura(system_prompt, model, max_tokens, lead_course)
+                em_cache = ai_cache.buscar(channel_id, cache_versao, cache_chave,
+                                           query_embedding, lead_name)
+                if em_cache:
+                    return em_cache
+            except Exception as e:
+                logger.warning("⚠️ Cache IA indisponível, seguindo sem: %s", e)
+                cache_chave = None
+        else:
+            ai_cache.registrar_inelegivel()
+
+    # 2.2 Buscar contexto do RAG
+    relevant_docs = await search_knowledge(user_message, channel_id, db, query_embedding=query_embedding)
     context = ""
     if relevant_docs:
         context = "\n\n---\nINFORMAÇÕES DA BASE DE CONHECIMENTO:\n"
@@ -253,20 +481,17 @@ async def generate_ai_response(
     # 2.5 Catálogo completo de cursos (Solução A: sempre injetado)
     catalog_info = build_catalog_info(await get_course_catalog(channel_id, db))
 
-    # 3. Buscar histórico da conversa
-    history = await get_conversation_history(contact_wa_id, db, limit=10)
-
-    # 4. Montar mensagens para o GPT
+    # 3. Montar mensagens para o GPT
     messages = [
-        {"role": "system", "content": system_prompt + lead_info + calendar_info + catalog_info + context},
+        {"role": "system", "content": system_prompt + lead_info + calendar_info + catalog_info + context + historico_resumido},
     ]
     messages.extend(history)
 
-    # Se a última mensagem do histórico já é a mensagem atual, não duplicar
-    if not history or history[-1].get("content") != user_message:
+    # Se a última mensagem do histórico já é a mensagem atual (mesmo cortada), não duplicar
+    if not history or not e_pergunta_atual(history[-1], user_message):
         messages.append({"role": "user", "content": user_message})
 
-    # 5. Chamar OpenAI
+    # 4. Chamar OpenAI
     try:
         extra = {"reasoning_effort": "minimal"} if str(model).startswith("gpt-5") else {}
         response = await client.chat.completions.create(
@@ -275,7 +500,7 @@ async def generate_ai_response(
             max_completion_tokens=max_tokens,
             **extra,
         )
-        print(f"🤖 finish_reason={response.choices[0].finish_reason} model={model}")
+        logger.debug("🤖 finish_reason=%s model=%s", response.choices[0].finish_reason, model)
         ai_response = response.choices[0].message.content
         if not ai_response:
             messages.append({"role": "assistant", "content": ""})
@@ -288,6 +513,10 @@ async def generate_ai_response(
                 **retry_extra,
             )
             ai_response = retry.choices[0].message.content or "Desculpe, tive um probleminha agora. Pode repetir, por favor? 🙂"
+        elif cache_chave:
+            # Só a resposta do caminho normal vai para o cache — retry e fallback não.
+            ai_cache.guardar(channel_id, cache_versao, cache_chave, query_embedding,
+                             ai_response, lead_name)
         # === DETECTOR DE AGENDAMENTO: DESATIVADO TEMPORARIAMENTE ===
         # try:
         #     from app.google_calendar import detect_and_create_event
@@ -302,15 +531,18 @@ async def generate_ai_response(
         #     print(f"⚠️ Erro ao criar evento: {e}")
         return ai_response
     except Exception as e:
-        print(f"❌ Erro ao gerar resposta IA: {e}")
+        logger.error("❌ Erro ao gerar resposta IA: %s", e)
         return None
 
 
 # === Resumo da Conversa ===
 
-async def generate_conversation_summary(contact_wa_id: str, db: AsyncSession) -> str | None:
-    """Gera um resumo da conversa para o Kanban."""
-    history = await get_conversation_history(contact_wa_id, db, limit=30)
+async def generate_conversation_summary(contact_wa_id: str, db: AsyncSession, card=None) -> str | None:
+    """Gera um resumo da conversa para o Kanban.
+
+    Com `card`, o resumo rolante das mensagens que não couberam no orçamento entra na frente.
+    """
+    history = await get_conversation_history(contact_wa_id, db, token_budget=HISTORICO_TOKENS_RESUMO)
 
     if not history:
         return None
@@ -319,6 +551,8 @@ async def generate_conversation_summary(contact_wa_id: str, db: AsyncSession) ->
         f"{'Lead' if m['role'] == 'user' else 'Atendente'}: {m['content']}"
         for m in history
     ])
+    if card is not None and card.history_summary:
+        conversation_text = f"[Resumo do início da conversa] {card.history_summary}\n{conversation_text}"
 
     try:
         response = await client.chat.completions.create(
@@ -350,7 +584,7 @@ async def generate_conversation_summary(contact_wa_id: str, db: AsyncSession) ->
             ai_response = retry.choices[0].message.content or "Desculpe, não consegui processar. Um momento que vou transferir para nossa consultora."
         return ai_response
     except Exception as e:
-        print(f"❌ Erro ao gerar resumo: {e}")
+        logger.error("❌ Erro ao gerar resumo: %s", e)
         return None
 
 # === Anotação na Exact Spotter ===
@@ -364,11 +598,11 @@ async def save_annotation_to_exact(contact_wa_id: str, channel_id: int, db: Asyn
     )
     exact_lead = result.scalar_one_or_none()
     if not exact_lead:
-        print(f"⚠️ Lead não encontrado na Exact para wa_id: {contact_wa_id}")
+        logger.warning("⚠️ Lead não encontrado na Exact para wa_id: %s", contact_wa_id)
         return False
     
     # 2. Buscar histórico da conversa
-    history = await get_conversation_history(contact_wa_id, db, limit=30)
+    history = await get_conversation_history(contact_wa_id, db, token_budget=HISTORICO_TOKENS_RESUMO)
     if not history:
         return False
     
@@ -384,6 +618,8 @@ async def save_annotation_to_exact(contact_wa_id: str, channel_id: int, db: Asyn
     
     # 4. Gerar resumo com GPT
     conversation_text = "\n".join([f"{m['role']}: {m['content']}" for m in history])
+    if card and card.history_summary:
+        conversation_text = f"[Resumo do início da conversa] {card.history_summary}\n{conversation_text}"
     
     try:
         response = await client.chat.completions.create(
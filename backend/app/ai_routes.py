@@ -1,6 +1,7 @@
 """
 Rotas da IA: config do agente, upload de documentos RAG, toggle por contato.
 """
+import logging
 import json
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,6 +12,10 @@ from typing import Optional
 from app.database import get_db
 from app.models import AIConfig, KnowledgeDocument, Contact, AIConversationSummary
 from app.ai_engine import generate_embedding, split_into_chunks, count_tokens, DEFAULT_MODEL
+from app import ai_cache
+from app.cpu_executor import executar
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
@@ -82,6 +87,7 @@ async def update_ai_config(channel_id: int, req: AIConfigUpdate, db: AsyncSessio
         config.max_tokens = req.max_tokens
 
     await db.commit()
+    ai_cache.invalidar(channel_id)
     return {"status": "updated"}
 
 
@@ -161,8 +167,8 @@ async def upload_document(
     if not content.strip():
         raise HTTPException(status_code=400, detail="Arquivo vazio")
 
-    # Dividir em chunks
-    chunks = split_into_chunks(content, title)
+    # Dividir em chunks (tiktoken no pool de CPU: um documento grande seguraria o loop)
+    chunks = await executar(split_into_chunks, content, title)
 
     if not chunks:
         raise HTTPException(status_code=400, detail="Não foi possível processar o documento")
@@ -183,10 +189,11 @@ async def upload_document(
             db.add(doc)
             saved += 1
         except Exception as e:
-            print(f"❌ Erro ao processar chunk {chunk['chunk_index']}: {e}")
+            logger.error("❌ Erro ao processar chunk %s: %s", chunk['chunk_index'], e)
             continue
 
     await db.commit()
+    ai_cache.invalidar(channel_id)
 
     return {
         "title": title,
@@ -212,7 +219,18 @@ async def delete_document(channel_id: int, title: str, db: AsyncSession = Depend
         await db.delete(doc)
 
     await db.commit()
+    ai_cache.invalidar(channel_id)
     return {"status": "deleted", "chunks_removed": len(docs)}
+
+
+# === Cache de respostas ===
+
+@router.get("/cache/stats")
+async def ai_cache_stats():
+    """Acertos/perdas do cache semântico de respostas desde o boot deste processo."""
+    return ai_cache.estatisticas()
+
+
 class TestChatRequest(BaseModel):
     message: str
     channel_id: int = 2
@@ -225,9 +243,10 @@ async def test_chat(req: TestChatRequest, db: AsyncSession = Depends(get_db)):
     """Endpoint de teste: simula conversa com a IA sem enviar WhatsApp."""
     from app.ai_engine import search_knowledge, get_course_catalog, build_catalog_info, DEFAULT_SYSTEM_PROMPT
     from openai import AsyncOpenAI
+    from app.metrics import http_client_openai
     import os
 
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client_openai())
 
     # Buscar config do canal
     result = await db.execute(
@@ -289,7 +308,7 @@ async def test_chat(req: TestChatRequest, db: AsyncSession = Depends(get_db)):
             max_completion_tokens=max_tokens,
             **extra,
         )
-        print(f"🤖 finish_reason={response.choices[0].finish_reason} model={model}")
+        logger.debug("🤖 finish_reason=%s model=%s", response.choices[0].finish_reason, model)
         ai_response = response.choices[0].message.content
         if not ai_response:
             messages.append({"role": "assistant", "content": ""})
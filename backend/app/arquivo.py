@@ -0,0 +1,412 @@
+"""Arquivo frio: meses velhos de messages, notifications e nat_button_events em JSONL.zst.
+
+Mensagem de mais de um ano quase nunca é lida, mas continua pesando em tudo que percorre a
+tabela: autovacuum, backup, REINDEX, o tamanho dos índices que o webhook atualiza. Aqui ela
+sai do banco para um arquivo por mês, comprimido, e o histórico da conversa continua
+chegando nela pela mesma rota.
+
+------------------------------------------------------------------------------------------
+FORMATO
+------------------------------------------------------------------------------------------
+    ARQUIVO_DIR/<tabela>/<AAAA>/<MM>.jsonl.zst
+
+Uma linha JSON por registro (orjson, as colunas como estão no banco; datas em ISO, no mesmo
+formato do `.isoformat()` das rotas). O arquivo é uma SEQUÊNCIA de quadros zstd — o
+`zstd -d` comum lê como um arquivo só. Em messages, um quadro por contato, ordenado por
+(timestamp, id): archive_message_blocks guarda offset e tamanho de cada um, e ler o histórico
+de um contato é um seek e um quadro, não o mês inteiro. Nas outras tabelas, quadros de
+LINHAS_POR_QUADRO (ninguém lê pelo app; é auditoria).
+
+JSONL.zst e não Parquet: o que se lê de volta é a conversa inteira de um contato, não colunas
+soltas, e o orjson já está no projeto — pyarrow seria uma dependência pesada para isso.
+
+------------------------------------------------------------------------------------------
+SEM DELETE EM MESSAGES
+------------------------------------------------------------------------------------------
+messages é particionada por mês (app/particoes.py). Arquivar um mês é:
+  1. DETACH da partição (transação curta, lock_timeout): o app para de enxergá-la;
+  2. exportar a tabela solta, sem concorrência nenhuma; conferir o arquivo (linhas + sha256);
+  3. noutra transação (a do passo 2 segura a tabela enquanto o cursor existir), juntos:
+     archive_batches + archive_message_blocks + DROP TABLE da partição.
+Se algo falha entre 1 e 3, a tabela solta continua lá e o próximo ciclo retoma dela. Se o
+COMMIT do passo 3 falha, o banco está intacto e o arquivo é sobrescrito na próxima vez.
+Sem a migração de partições, messages não é arquivada (só avisa).
+
+notifications e nat_button_events são pequenas e sem partição: DELETE ... RETURNING e o
+arquivo na mesma transação — o que sai do banco é exatamente o que foi gravado.
+
+------------------------------------------------------------------------------------------
+LEITURA
+------------------------------------------------------------------------------------------
+`pagina_mensagens` é a paginação por cursor de GET /api/contacts/{wa_id}/messages: lê o quente
+primeiro e, quando a página não enche, continua pelos blocos do arquivo, do mês mais novo para
+o mais velho. O cliente não sabe de onde veio cada mensagem. Bloco cujo arquivo sumiu, ou cujo
+quadro está truncado/corrompido, é logado, contado e pulado — a conversa abre, com o buraco no
+log.
+
+O job só roda com ARQUIVO_ENABLED=true. Manual: `venv/bin/python -m app.arquivo`.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import date, datetime
+
+import orjson
+import zstandard as zstd
+from sqlalchemy import select, text, tuple_
+
+from app import particoes
+from app.cpu_executor import executar
+from app.database import async_session
+from app.metrics import Contador
+from app.models import ArchiveBatch, ArchiveMessageBlock, Message
+from app.serializacao import dumps
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_ATIVO = os.getenv("ARQUIVO_ENABLED", "false").lower() == "true"
+ARQUIVO_DIR = os.getenv("ARQUIVO_DIR", "/home/ubuntu/pos-plataform/arquivo")
+# Meses que ficam no banco além do corrente. 12: o mês de 13 meses atrás é o primeiro a sair.
+ARQUIVO_MESES = int(os.getenv("ARQUIVO_MESES", "12"))
+ZSTD_NIVEL = int(os.getenv("ARQUIVO_ZSTD_NIVEL", "10"))
+INTERVALO_SEGUNDOS = 24 * 3600
+LINHAS_POR_QUADRO = 5000
+PAGINA_PADRAO = 50
+
+# Tabelas sem partição: coluna que define o mês.
+TABELAS_POR_DATA = {"notifications": "created_at", "nat_button_events": "created_at"}
+
+linhas_arquivadas = Contador("archive_rows_total",
+                             "Linhas levadas do banco para o arquivo frio, por tabela.",
+                             ("tabela",))
+leituras_arquivo = Contador("archive_block_reads_total",
+                            "Blocos do arquivo frio lidos pelo histórico de mensagens.",
+                            ("resultado",))
+
+
+def corte(hoje: date | None = None) -> date:
+    """Primeiro dia do mês mais antigo que FICA no banco; tudo antes dele é arquivado."""
+    hoje = hoje or date.today()
+    meses = hoje.year * 12 + hoje.month - 1 - ARQUIVO_MESES
+    return date(meses // 12, meses % 12 + 1, 1)
+
+
+def caminho(tabela: str, mes: date) -> str:
+    """Relativo a ARQUIVO_DIR (é o que vai para archive_batches)."""
+    return os.path.join(tabela, f"{mes:%Y}", f"{mes:%m}.jsonl.zst")
+
+
+def _absoluto(relativo: str) -> str:
+    return os.path.join(ARQUIVO_DIR, relativo)
+
+
+def _proximo_mes(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+# ----------------------------------------------------------------------------------------------
+# Arquivo (rodam no pool de CPU: compressão e disco fora do event loop)
+# ----------------------------------------------------------------------------------------------
+
+def _gravar_quadro(arquivo, linhas: list[dict]) -> int:
+    dados = b"".join(dumps(linha) + b"\n" for linha in linhas)
+    quadro = zstd.ZstdCompressor(level=ZSTD_NIVEL).compress(dados)
+    arquivo.write(quadro)
+    return len(quadro)
+
+
+def _fechar(arquivo):
+    arquivo.flush()
+    os.fsync(arquivo.fileno())
+    arquivo.close()
+
+
+def _conferir(caminho_abs: str, esperadas: int) -> tuple[str, int]:
+    """Relê o arquivo inteiro: todas as linhas descomprimem e são JSON. Devolve (sha256, bytes)."""
+    sha = hashlib.sha256()
+    with open(caminho_abs, "rb") as f:
+        for pedaco in iter(lambda: f.read(1 << 20), b""):
+            sha.update(pedaco)
+    linhas = 0
+    with open(caminho_abs, "rb") as f, \
+            zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True) as leitor:
+        resto = b""
+        for pedaco in iter(lambda: leitor.read(1 << 20), b""):
+            *completas, resto = (resto + pedaco).split(b"\n")
+            for linha in completas:
+                orjson.loads(linha)
+            linhas += len(completas)
+    if resto or linhas != esperadas:
+        raise ValueError(f"{caminho_abs}: {linhas} linhas no arquivo, {esperadas} esperadas")
+    return sha.hexdigest(), os.path.getsize(caminho_abs)
+
+
+def _ler_quadro(caminho_abs: str, offset: int, tamanho: int) -> list[dict]:
+    with open(caminho_abs, "rb") as f:
+        f.seek(offset)
+        quadro = f.read(tamanho)
+    dados = zstd.ZstdDecompressor().decompress(quadro)
+    return [orjson.loads(linha) for linha in dados.splitlines()]
+
+
+class _Gravacao:
+    """Arquivo .parcial que só vira o definitivo depois de conferido."""
+
+    def __init__(self, tabela: str, mes: date):
+        self.relativo = caminho(tabela, mes)
+        self.final = _absoluto(self.relativo)
+        self.parcial = self.final + ".parcial"
+        self.offset = 0
+        self.linhas = 0
+        os.makedirs(os.path.dirname(self.final), exist_ok=True)
+        self.arquivo = open(self.parcial, "wb")
+
+    async def quadro(self, linhas: list[dict]) -> tuple[int, int]:
+        """Grava um quadro; devolve (offset, tamanho) dele."""
+        tamanho = await executar(_gravar_quadro, self.arquivo, linhas)
+        inicio, self.offset = self.offset, self.offset + tamanho
+        self.linhas += len(linhas)
+        return inicio, tamanho
+
+    async def concluir(self) -> tuple[str, int]:
+        await executar(_fechar, self.arquivo)
+        sha, tamanho = await executar(_conferir, self.parcial, self.linhas)
+        os.replace(self.parcial, self.final)
+        return sha, tamanho
+
+    def descartar(self):
+        self.arquivo.close()
+        if os.path.exists(self.parcial):
+            os.remove(self.parcial)
+
+
+# ----------------------------------------------------------------------------------------------
+# Arquivamento
+# ----------------------------------------------------------------------------------------------
+
+async def arquivar_messages(mes: date) -> int | None:
+    """Um mês de messages para o arquivo. None se não há partição (nem solta) desse mês."""
+    nome = particoes.nome_particao(mes.year, mes.month)
+
+    # 1. DETACH curto. Se já está solta (ciclo anterior caiu no meio), segue dela.
+    async with async_session() as db:
+        anexada = (await db.execute(text("""
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = 'messages'::regclass AND inhrelid = to_regclass(:nome)
+        """), {"nome": nome})).scalar()
+        if anexada:
+            await particoes.desanexar(db, mes.year, mes.month)
+            await db.commit()
+
+    # 2. Exportar a tabela solta e conferir. Transação só de leitura, encerrada antes do DROP:
+    #    o portal do stream segura a tabela até o fim da transação, mesmo fechado.
+    async with async_session() as db:
+        if not (await db.execute(text("SELECT to_regclass(:nome) IS NOT NULL"), {"nome": nome})).scalar():
+            return None
+        gravacao = _Gravacao("messages", mes)
+        try:
+            blocos = []
+            contato, grupo = None, []
+
+            async def fechar_grupo():
+                offset, tamanho = await gravacao.quadro(grupo)
+                blocos.append(ArchiveMessageBlock(
+                    contact_wa_id=contato, month=mes, offset=offset, size=tamanho,
+                    row_count=len(grupo), first_at=grupo[0]["timestamp"],
+                    last_at=grupo[-1]["timestamp"]))
+
+            linhas = await db.stream(text(
+                f'SELECT * FROM {nome} ORDER BY contact_wa_id, "timestamp", id'))
+            async for linha in linhas.mappings():
+                if linha["contact_wa_id"] != contato and grupo:
+                    await fechar_grupo()
+                    grupo = []
+                contato = linha["contact_wa_id"]
+                grupo.append(dict(linha))
+            if grupo:
+                await fechar_grupo()
+
+            sha, tamanho = await gravacao.concluir()
+        except BaseException:
+            gravacao.descartar()
+            raise
+
+    # 3. Registrar e dropar — uma transação. Solta, a tabela não muda entre 2 e 3.
+    async with async_session() as db:
+        db.add(ArchiveBatch(table_name="messages", month=mes, file_path=gravacao.relativo,
+                            row_count=gravacao.linhas, size_bytes=tamanho, sha256=sha))
+        db.add_all(blocos)
+        await db.execute(text(f"DROP TABLE {nome}"))
+        await db.commit()
+    linhas_arquivadas.inc(gravacao.linhas, tabela="messages")
+    return gravacao.linhas
+
+
+async def arquivar_tabela(tabela: str, mes: date) -> int:
+    """Um mês de uma tabela de TABELAS_POR_DATA: DELETE ... RETURNING e o arquivo, juntos."""
+    coluna = TABELAS_POR_DATA[tabela]
+    async with async_session() as db:
+        linhas = (await db.execute(text(f"""
+            DELETE FROM {tabela} WHERE {coluna} >= :de AND {coluna} < :ate RETURNING *
+        """), {"de": mes, "ate": _proximo_mes(mes)})).mappings().all()
+        if not linhas:
+            return 0
+        linhas = sorted((dict(r) for r in linhas), key=lambda r: (r[coluna], r["id"]))
+        gravacao = _Gravacao(tabela, mes)
+        try:
+            for i in range(0, len(linhas), LINHAS_POR_QUADRO):
+                await gravacao.quadro(linhas[i:i + LINHAS_POR_QUADRO])
+            sha, tamanho = await gravacao.concluir()
+        except BaseException:
+            gravacao.descartar()
+            raise
+        db.add(ArchiveBatch(table_name=tabela, month=mes, file_path=gravacao.relativo,
+                            row_count=len(linhas), size_bytes=tamanho, sha256=sha))
+        await db.commit()
+    linhas_arquivadas.inc(len(linhas), tabela=tabela)
+    return len(linhas)
+
+
+async def meses_pendentes(hoje: date | None = None) -> list[tuple[str, date]]:
+    """(tabela, mês) a arquivar, do mais velho para o mais novo."""
+    limite = corte(hoje)
+    pendentes = []
+    async with async_session() as db:
+        nomes = (await db.execute(text("""
+            SELECT relname FROM pg_class
+            WHERE relkind = 'r' AND relname ~ '^messages_p[0-9]{4}_[0-9]{2}$'
+        """))).scalars().all()
+        for nome in nomes:
+            mes = date(int(nome[-7:-3]), int(nome[-2:]), 1)
+            if mes < limite:
+                pendentes.append(("messages", mes))
+        for tabela, coluna in TABELAS_POR_DATA.items():
+            meses = (await db.execute(text(f"""
+                SELECT DISTINCT date_trunc('month', {coluna})::date FROM {tabela}
+                WHERE {coluna} < :corte
+                  AND date_trunc('month', {coluna})::date NOT IN (
+                      SELECT month FROM archive_batches WHERE table_name = :tabela)
+            """), {"corte": limite, "tabela": tabela})).scalars().all()
+            pendentes.extend((tabela, m) for m in meses)
+        if not nomes:
+            particionada = (await db.execute(text(
+                "SELECT to_regproc('cenat_criar_particoes_messages') IS NOT NULL"))).scalar()
+            if not particionada:
+                logger.warning("⚠️ Arquivo: messages não é particionada — só notifications e "
+                               "nat_button_events serão arquivadas (rode migrate_messages_particionada.py)")
+    return sorted(pendentes, key=lambda p: (p[1], p[0]))
+
+
+async def arquivar_pendentes(hoje: date | None = None) -> list[tuple[str, date, int]]:
+    feitos = []
+    for tabela, mes in await meses_pendentes(hoje):
+        if tabela == "messages":
+            linhas = await arquivar_messages(mes)
+        else:
+            linhas = await arquivar_tabela(tabela, mes)
+        if linhas is not None:
+            logger.info("🧊 Arquivo: %s %s — %s linhas", tabela, f"{mes:%Y-%m}", linhas)
+            feitos.append((tabela, mes, linhas))
+    return feitos
+
+
+async def arquivo_job():
+    """Loop diário. Registrado no lifespan de main.py quando ARQUIVO_ENABLED=true.
+
+    Um mês que falha (lock, disco cheio) é logado e fica para o dia seguinte; os meses já
+    feitos no ciclo estão commitados.
+    """
+    while True:
+        await asyncio.sleep(INTERVALO_SEGUNDOS)
+        try:
+            await arquivar_pendentes()
+        except Exception as e:
+            logger.error("❌ Arquivo: ciclo falhou (tenta de novo amanhã): %s: %s", type(e).__name__, e)
+
+
+# ----------------------------------------------------------------------------------------------
+# Leitura: histórico de mensagens paginado, quente + arquivo
+# ----------------------------------------------------------------------------------------------
+
+def _ts(valor) -> datetime:
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+
+
+def para_tela(m) -> dict:
+    """Formato de GET /api/contacts/{wa_id}/messages, para linha do banco ou do arquivo."""
+    return {
+        "id": m["id"],
+        "wa_message_id": m["wa_message_id"],
+        "direction": m["direction"],
+        "type": m["message_type"],
+        "content": m["content"],
+        "timestamp": _ts(m["timestamp"]).isoformat(),
+        "status": m["status"],
+        "sent_by_ai": m["sent_by_ai"] or False,
+        "channel_id": m["channel_id"],
+    }
+
+
+def _antes_do_cursor(m, antes: datetime | None, antes_id: int | None) -> bool:
+    if antes is None:
+        return True
+    if antes_id is None:
+        return _ts(m["timestamp"]) < antes
+    return (_ts(m["timestamp"]), m["id"]) < (antes, antes_id)
+
+
+async def pagina_mensagens(db, wa_id: str, antes: datetime | None = None,
+                           antes_id: int | None = None, limite: int = PAGINA_PADRAO) -> list[dict]:
+    """As `limite` mensagens mais novas antes do cursor (timestamp, id), em ordem cronológica.
+
+    O próximo cursor é o timestamp e o id da PRIMEIRA mensagem devolvida.
+    """
+    m = Message.__table__
+    consulta = select(m).where(m.c.contact_wa_id == wa_id)
+    if antes is not None:
+        consulta = consulta.where(m.c.timestamp <= antes)       # poda de partições
+        if antes_id is None:
+            consulta = consulta.where(m.c.timestamp < antes)
+        else:
+            consulta = consulta.where(tuple_(m.c.timestamp, m.c.id) < tuple_(antes, antes_id))
+    quentes = (await db.execute(
+        consulta.order_by(m.c.timestamp.desc(), m.c.id.desc()).limit(limite))).mappings().all()
+    pagina = [para_tela(r) for r in quentes]
+
+    if len(pagina) < limite:
+        blocos = select(ArchiveMessageBlock).where(ArchiveMessageBlock.contact_wa_id == wa_id)
+        if antes is not None:
+            blocos = blocos.where(ArchiveMessageBlock.first_at <= antes)
+        for bloco in (await db.execute(blocos.order_by(ArchiveMessageBlock.month.desc()))).scalars().all():
+            arquivo = _absoluto(caminho("messages", bloco.month))
+            try:
+                linhas = await executar(_ler_quadro, arquivo, bloco.offset, bloco.size)
+            except OSError as e:
+                leituras_arquivo.inc(resultado="ausente")
+                logger.error("❌ Arquivo: bloco de %s em %s ilegível: %s", wa_id, arquivo, e)
+                continue
+            except (zstd.ZstdError, orjson.JSONDecodeError) as e:
+                # Quadro truncado ou corrompido: mesmo destino do bloco sumido — a conversa
+                # abre sem ele, em vez de virar 500 inteira.
+                leituras_arquivo.inc(resultado="corrompido")
+                logger.error("❌ Arquivo: bloco de %s em %s corrompido: %s: %s",
+                             wa_id, arquivo, type(e).__name__, e)
+                continue
+            leituras_arquivo.inc(resultado="ok")
+            for linha in reversed(linhas):
+                if _antes_do_cursor(linha, antes, antes_id):
+                    pagina.append(para_tela(linha))
+                    if len(pagina) == limite:
+                        break
+            if len(pagina) == limite:
+                break
+    pagina.reverse()
+    return pagina
+
+
+if __name__ == "__main__":
+    from app.logs import configurar_logs
+    configurar_logs()
+    for t, mes_feito, n in asyncio.run(arquivar_pendentes()):
+        print(f"OK: {t} {mes_feito:%Y-%m} — {n} linhas")
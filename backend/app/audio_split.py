@@ -0,0 +1,210 @@
+"""Divide MP3 em trechos sobrepostos e costura as transcrições de volta — sem ffmpeg.
+
+Uma ligação de 40 minutos mandada inteira ao Whisper é UMA requisição de minutos, e passa do
+limite de upload (25 MB) a partir de certa duração/bitrate. Cortando em trechos de
+SEGMENTO_SEGUNDOS e transcrevendo em paralelo, o tempo total fica perto do de um trecho só.
+
+------------------------------------------------------------------------------------------
+POR QUE CORTAR NA FRONTEIRA DE QUADRO BASTA
+------------------------------------------------------------------------------------------
+MP3 é uma sequência de quadros independentes, cada um com cabeçalho de 4 bytes que diz o
+próprio tamanho. Uma fatia de bytes que começa num cabeçalho e termina no fim de um quadro é,
+ela mesma, um MP3 válido — é assim que streaming de rádio funciona. Nada de decodificar,
+nada de binário externo: só ler cabeçalhos (`quadros_mp3`).
+
+A ressalva é o reservatório de bits do Layer III: um quadro pode usar bytes sobrando do
+anterior, e o primeiro quadro de um trecho cortado perde essa referência — algumas dezenas de
+ms de áudio degradado no começo do trecho. É uma das razões da SOBREPOSIÇÃO: o que sai
+estragado no começo do trecho B saiu inteiro no fim do trecho A.
+
+------------------------------------------------------------------------------------------
+SOBREPOSIÇÃO E COSTURA
+------------------------------------------------------------------------------------------
+Cada trecho começa SOBREPOSICAO_SEGUNDOS antes do fim do anterior. Sem isso, a palavra que
+cai exatamente no corte sai pela metade nos dois trechos e some da transcrição. Com ela, o
+trecho da emenda aparece duas vezes, e `costurar` remove a duplicata: procura a maior
+sequência de palavras em comum entre o FIM do texto acumulado e o COMEÇO do próximo, corta o
+acumulado onde a sequência começa e continua do próximo a partir dali. As pontas fora da
+sequência comum — palavra cortada pela metade, quadro degradado — são descartadas dos dois
+lados. Se não há sequência comum de pelo menos MIN_PALAVRAS_EMENDA (silêncio na emenda, por
+exemplo), os textos são simplesmente concatenados: duplicar duas palavras é melhor do que
+arriscar apagar uma frase.
+"""
+import re
+from difflib import SequenceMatcher
+
+# Trecho de 5 min: ~5 MB a 128 kbps, folgado sob o limite de 25 MB do Whisper.
+SEGMENTO_SEGUNDOS = 300
+SOBREPOSICAO_SEGUNDOS = 4
+
+MIN_PALAVRAS_EMENDA = 3
+# Quantas palavras de cada lado da emenda entram na comparação. 4 s de fala em português são
+# ~12 palavras; 40 cobre com folga sem deixar a busca casar com uma repetição distante.
+JANELA_PALAVRAS_EMENDA = 40
+
+# ------------------------------------------------------------------------------------------
+# CABEÇALHO MPEG AUDIO
+# ------------------------------------------------------------------------------------------
+
+# kbps por (versão, layer). Versão: 1 = MPEG-1; 2 = MPEG-2 e MPEG-2.5 (mesma tabela).
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Hz por código de versão do cabeçalho (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1).
+_TAXAS = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def cabecalho_mp3(dados: bytes, pos: int) -> tuple[int, float] | None:
+    """(tamanho do quadro em bytes, duração em segundos) do quadro em `pos`, ou None.
+
+    None para qualquer coisa que não seja um cabeçalho válido — inclusive bitrate "free"
+    e códigos reservados, que não dá para medir sem decodificar.
+    """
+    if pos + 4 > len(dados):
+        return None
+    b0, b1, b2 = dados[pos], dados[pos + 1], dados[pos + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    codigo_versao = (b1 >> 3) & 0x03
+    codigo_layer = (b1 >> 1) & 0x03
+    indice_bitrate = (b2 >> 4) & 0x0F
+    indice_taxa = (b2 >> 2) & 0x03
+    if codigo_versao == 1 or codigo_layer == 0 or indice_bitrate in (0, 15) or indice_taxa == 3:
+        return None
+
+    layer = 4 - codigo_layer                       # 3 -> Layer I, 2 -> II, 1 -> III
+    versao = 1 if codigo_versao == 3 else 2
+    bitrate = _BITRATES[(versao, layer)][indice_bitrate] * 1000
+    taxa = _TAXAS[codigo_versao][indice_taxa]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 1:
+        amostras = 384
+        tamanho = (12 * bitrate // taxa + padding) * 4
+    else:
+        amostras = 576 if (layer == 3 and versao == 2) else 1152
+        tamanho = (amostras // 8) * bitrate // taxa + padding
+    return tamanho, amostras / taxa
+
+
+def _pular_id3(dados: bytes) -> int:
+    """Offset do primeiro byte depois da tag ID3v2, se houver (tamanho é syncsafe)."""
+    if len(dados) < 10 or dados[:3] != b"ID3":
+        return 0
+    tamanho = ((dados[6] & 0x7F) << 21 | (dados[7] & 0x7F) << 14
+               | (dados[8] & 0x7F) << 7 | (dados[9] & 0x7F))
+    rodape = 10 if dados[5] & 0x10 else 0
+    return 10 + tamanho + rodape
+
+
+def quadros_mp3(dados: bytes) -> list[tuple[int, int, float]]:
+    """Lista de (offset, tamanho, duração) de cada quadro de áudio, em ordem.
+
+    Enquanto a cadeia de quadros está em sincronia (este cabeçalho começa exatamente onde o
+    quadro anterior terminou), basta o cabeçalho ser válido. Fora dela — no começo e depois
+    de lixo (tag ID3v1 no fim, bytes corrompidos), que é pulado byte a byte — um cabeçalho só
+    é aceito se o quadro seguinte também começa com cabeçalho (ou se é o último). É o que
+    evita tomar por cabeçalho um 0xFF 0xFx que apareceu no meio do áudio.
+    """
+    quadros = []
+    pos = _pular_id3(dados)
+    fim = len(dados)
+    em_sincronia = False
+    while pos + 4 <= fim:
+        info = cabecalho_mp3(dados, pos)
+        if info is not None:
+            tamanho, duracao = info
+            seguinte = pos + tamanho
+            if (em_sincronia or seguinte + 4 > fim
+                    or cabecalho_mp3(dados, seguinte) is not None):
+                if seguinte > fim:
+                    break                      # último quadro truncado
+                quadros.append((pos, tamanho, duracao))
+                pos = seguinte
+                em_sincronia = True
+                continue
+        em_sincronia = False
+        pos += 1
+    return quadros
+
+
+def duracao_mp3(quadros: list[tuple[int, int, float]]) -> float:
+    return sum(q[2] for q in quadros)
+
+
+def dividir_mp3(dados: bytes, quadros: list[tuple[int, int, float]] | None = None,
+                segmento: float = SEGMENTO_SEGUNDOS,
+                sobreposicao: float = SOBREPOSICAO_SEGUNDOS) -> list[bytes]:
+    """Fatias do MP3, cada uma com ~`segmento` s, começando `sobreposicao` s antes do fim da
+    anterior. Sempre cortadas em fronteira de quadro. Áudio curto devolve uma fatia só.
+    """
+    if quadros is None:
+        quadros = quadros_mp3(dados)
+    if not quadros:
+        return [dados]
+
+    # Instante de início de cada quadro.
+    inicios = []
+    t = 0.0
+    for _, _, duracao in quadros:
+        inicios.append(t)
+        t += duracao
+    total = t
+
+    fatias = []
+    i_inicio = 0
+    corte = segmento
+    while True:
+        if corte >= total - sobreposicao:
+            ultimo = quadros[-1]
+            fatias.append(dados[quadros[i_inicio][0]:ultimo[0] + ultimo[1]])
+            return fatias
+        # Último quadro que começa antes do corte.
+        i_fim = i_inicio
+        while i_fim + 1 < len(quadros) and inicios[i_fim + 1] < corte:
+            i_fim += 1
+        fatias.append(dados[quadros[i_inicio][0]:quadros[i_fim][0] + quadros[i_fim][1]])
+        # O próximo começa `sobreposicao` antes do fim deste.
+        recuo = corte - sobreposicao
+        while i_inicio < i_fim and inicios[i_inicio + 1] <= recuo:
+            i_inicio += 1
+        corte += segmento
+
+
+# ------------------------------------------------------------------------------------------
+# COSTURA
+# ------------------------------------------------------------------------------------------
+
+def _normalizar(palavra: str) -> str:
+    return re.sub(r"[^\w]", "", palavra.lower())
+
+
+def costurar(textos: list[str]) -> str:
+    """Junta as transcrições dos trechos, removendo o que foi dito duas vezes na emenda."""
+    palavras: list[str] = []
+    for texto in textos:
+        novas = (texto or "").split()
+        if not novas:
+            continue
+        if not palavras:
+            palavras = novas
+            continue
+
+        cauda = palavras[-JANELA_PALAVRAS_EMENDA:]
+        cabeca = novas[:JANELA_PALAVRAS_EMENDA]
+        casamento = SequenceMatcher(
+            None, [_normalizar(p) for p in cauda], [_normalizar(p) for p in cabeca],
+            autojunk=False,
+        ).find_longest_match(0, len(cauda), 0, len(cabeca))
+
+        if casamento.size >= MIN_PALAVRAS_EMENDA:
+            corte_acumulado = len(palavras) - len(cauda) + casamento.a
+            palavras = palavras[:corte_acumulado] + novas[casamento.b:]
+        else:
+            palavras = palavras + novas
+    return " ".join(palavras)
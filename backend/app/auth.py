@@ -1,3 +1,33 @@
+"""JWT e o usuário autenticado de cada request.
+
+------------------------------------------------------------------------------------------
+CACHE DO USUÁRIO AUTENTICADO
+------------------------------------------------------------------------------------------
+get_current_user roda em TODO request autenticado — inclusive cada polling de cada SDR — e
+era sempre um SELECT em users pelo id. Agora o usuário fica AUTH_CACHE_TTL_S segundos num
+cache do processo (LRU de até AUTH_CACHE_MAX ids): dentro disso, autenticar não toca no banco.
+
+O cache guarda um SNAPSHOT das colunas, e cada request recebe um User novo montado dele (não
+o objeto ORM, que pertence à sessão de quem o carregou). Usuário inexistente ou inativo não
+é guardado: vale o que o banco disser na próxima chamada.
+
+REVOGAÇÃO: o token leva a claim "tv" (users.token_version). Desativar ou trocar o papel sobe
+a versão e invalida o cache — o token antigo deixa de valer no request seguinte, sem esperar
+o TTL e sem SELECT por request. Num deploy com mais de um processo, os OUTROS processos só
+veem a versão nova quando o TTL vence (segundos). Token sem "tv" (emitido antes desta
+versão) vale como 0.
+
+------------------------------------------------------------------------------------------
+TICKET DO STREAM DE EVENTOS
+------------------------------------------------------------------------------------------
+O EventSource do navegador não manda header, e o JWT de 24h na query do stream acabava no
+access log (journald) de toda aba aberta. O stream agora recebe um TICKET: um JWT de
+TICKET_EVENTOS_SEGUNDOS, marcado com uso "eventos", pedido com o token de verdade no header
+(POST /api/eventos/ticket) e aceito UMA vez — o jti usado fica em memória até vencer. O ticket
+não vale como token de API, nem o token como ticket. Num deploy com mais de um processo, o
+"uma vez" é por processo; a janela de 60s é o teto de reuso entre eles.
+"""
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException
@@ -7,9 +37,12 @@ from sqlalchemy import select
 import bcrypt
 import jwt
 import os
+import secrets
+import time
 from dotenv import load_dotenv
 
 from app.database import get_db
+from app.metrics import Contador
 from app.models import User
 
 load_dotenv()
@@ -20,6 +53,24 @@ ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 security = HTTPBearer()
 
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "5"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "500"))
+# Sem password_hash: o hash não precisa morar em memória por request.
+_COLUNAS_USUARIO = ("id", "name", "email", "role", "is_active", "created_at", "token_version")
+
+_usuarios: OrderedDict = OrderedDict()      # id -> (expira_em, snapshot)
+# Sobe a cada invalidação. Uma leitura que começou antes dela não guarda o resultado: ela pode
+# ter lido a linha de antes da mudança.
+_geracao_usuarios = 0
+
+TICKET_EVENTOS_SEGUNDOS = 60
+USO_TICKET_EVENTOS = "eventos"
+_tickets_usados: dict = {}                  # jti -> exp (epoch)
+
+consultas_usuario = Contador("auth_user_cache_total",
+                             "Usuário autenticado: achado no cache (hit) ou lido do banco (miss).",
+                             ("resultado",))
+
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
@@ -36,30 +87,116 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def invalidar_usuario(user_id: Optional[int] = None):
+    """Tira o usuário do cache (ou todos, sem id). Chamar DEPOIS do commit da mudança."""
+    global _geracao_usuarios
+    if user_id is None:
+        _usuarios.clear()
+    else:
+        _usuarios.pop(user_id, None)
+    _geracao_usuarios += 1
+
+
+def _do_cache(user_id: int) -> Optional[User]:
+    item = _usuarios.get(user_id)
+    if item is None:
+        return None
+    expira_em, snapshot = item
+    if time.monotonic() >= expira_em:
+        del _usuarios[user_id]
+        return None
+    _usuarios.move_to_end(user_id)
+    return User(**snapshot)
+
+
+def _guardar(user: User, geracao: int):
+    if geracao != _geracao_usuarios or AUTH_CACHE_TTL_S <= 0:
+        return
+    snapshot = {coluna: getattr(user, coluna) for coluna in _COLUNAS_USUARIO}
+    _usuarios[user.id] = (time.monotonic() + AUTH_CACHE_TTL_S, snapshot)
+    _usuarios.move_to_end(user.id)
+    while len(_usuarios) > AUTH_CACHE_MAX:
+        _usuarios.popitem(last=False)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db),
 ) -> User:
-    token = credentials.credentials
+    return await usuario_do_token(credentials.credentials, db)
+
+
+def _decodificar(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Token inválido")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Token inválido")
+    return payload
+
+
+async def usuario_do_token(token: str, db: AsyncSession) -> User:
+    """Valida o JWT e carrega o usuário."""
+    payload = _decodificar(token)
+    if payload.get("uso") is not None:
+        # Ticket de stream não autentica a API.
+        raise HTTPException(status_code=401, detail="Token inválido")
+    return await usuario_da_sessao(int(payload["sub"]), payload.get("tv", 0), db)
+
 
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
+async def usuario_da_sessao(user_id: int, versao: int, db: AsyncSession) -> User:
+    """Usuário ativo, com a token_version que a sessão carrega. 401 se não for mais.
 
-    if not user or not user.is_active:
-        raise HTTPException(status_code=401, detail="Usuário não encontrado ou inativo")
+    É o que valida o token a cada request e o que o stream de eventos reconfere enquanto
+    está aberto.
+    """
+    user = _do_cache(user_id)
+    if user is not None:
+        consultas_usuario.inc(resultado="hit")
+    else:
+        consultas_usuario.inc(resultado="miss")
+        geracao = _geracao_usuarios
+        result = await db.execute(select(User).where(User.id == user_id))
+        carregado = result.scalar_one_or_none()
+
+        if not carregado or not carregado.is_active:
+            raise HTTPException(status_code=401, detail="Usuário não encontrado ou inativo")
+
+        _guardar(carregado, geracao)
+        user = User(**{coluna: getattr(carregado, coluna) for coluna in _COLUNAS_USUARIO})
+
+    if versao != (user.token_version or 0):
+        raise HTTPException(status_code=401, detail="Sessão revogada, faça login novamente")
 
     return user
 
 
+def criar_ticket_eventos(user: User) -> str:
+    """Ticket de uso único para abrir o stream de eventos (ver TICKET DO STREAM DE EVENTOS)."""
+    return create_access_token(
+        {"sub": str(user.id), "tv": user.token_version or 0, "uso": USO_TICKET_EVENTOS,
+         "jti": secrets.token_urlsafe(16)},
+        timedelta(seconds=TICKET_EVENTOS_SEGUNDOS))
+
+
+async def usuario_do_ticket(ticket: str, db: AsyncSession) -> User:
+    """Valida e CONSOME um ticket do stream de eventos. Devolve o usuário dele."""
+    payload = _decodificar(ticket)
+    jti = payload.get("jti")
+    if payload.get("uso") != USO_TICKET_EVENTOS or not jti:
+        raise HTTPException(status_code=401, detail="Ticket inválido")
+    agora = time.time()
+    for velho in [j for j, exp in _tickets_usados.items() if exp < agora]:
+        del _tickets_usados[velho]
+    if jti in _tickets_usados:
+        raise HTTPException(status_code=401, detail="Ticket já usado")
+    _tickets_usados[jti] = payload["exp"]
+    return await usuario_da_sessao(int(payload["sub"]), payload.get("tv", 0), db)
+
+
 def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
     """Gate de admin: 403 para quem não tem role='admin'."""
     if current_user.role != "admin":
@@ -6,7 +6,9 @@ from typing import Optional
 
 from app.database import get_db
 from app.models import User
-from app.auth import hash_password, verify_password, create_access_token, get_current_user
+from app.auth import hash_password, verify_password, create_access_token, get_current_user, invalidar_usuario
+# bcrypt custa ~200 ms de CPU: roda no pool, não no event loop (ver cpu_executor).
+from app.cpu_executor import executar
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -28,13 +30,13 @@ async def login(req: LoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == req.email))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(req.password, user.password_hash):
+    if not user or not await executar(verify_password, req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
 
     if not user.is_active:
         raise HTTPException(status_code=401, detail="Usuário inativo")
 
-    token = create_access_token({"sub": str(user.id), "role": user.role})
+    token = create_access_token({"sub": str(user.id), "role": user.role, "tv": user.token_version or 0})
 
     return {
         "access_token": token,
@@ -72,7 +74,7 @@ async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db), cur
     user = User(
         name=req.name,
         email=req.email,
-        password_hash=hash_password(req.password),
+        password_hash=await executar(hash_password, req.password),
         role=req.role,
     )
     db.add(user)
@@ -124,14 +126,20 @@ async def update_user(user_id: int, req: UpdateUserRequest, db: AsyncSession = D
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
+    # Desativar ou trocar o papel revoga os tokens já emitidos (claim "tv", ver app/auth.py).
+    revogar = (req.is_active is False and user.is_active) or (req.role is not None and req.role != user.role)
+
     if req.name is not None:
         user.name = req.name
     if req.role is not None:
         user.role = req.role
     if req.is_active is not None:
         user.is_active = req.is_active
+    if revogar:
+        user.token_version = (user.token_version or 0) + 1
 
     await db.commit()
+    invalidar_usuario(user_id)
     return {"id": user.id, "name": user.name, "role": user.role, "is_active": user.is_active}
 
 
@@ -150,4 +158,5 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db), current_
 
     await db.delete(user)
     await db.commit()
+    invalidar_usuario(user_id)
     return {"status": "deleted"}
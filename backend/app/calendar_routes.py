@@ -50,8 +50,9 @@ async def book_appointment(
     cal_id = CALENDARS[consultant_key]["calendar_id"]
     consultant_name = CALENDARS[consultant_key]["name"]
     
-    # Verificar se o horário está livre
-    slots = await get_available_slots(cal_id, date, duration)
+    # Verificar se o horário está livre — direto no Google, nunca do cache: um evento criado
+    # no Google Calendar há segundos ainda não está no cache, e aqui o erro é marcar duas vezes.
+    slots = await get_available_slots(cal_id, date, duration, usar_cache=False)
     if not any(s["start"] == time for s in slots):
         raise HTTPException(status_code=409, detail="Horário não disponível")
     
@@ -62,6 +63,7 @@ async def book_appointment(
     summary = f"📞 Ligação - {lead_name} ({course})"
     description = f"Lead: {lead_name}\nTelefone: {lead_phone}\nCurso: {course}\nAgendado pela IA Nat"
     
+    # create_event invalida o cache: a agenda e o próximo lead já não veem este horário.
     event = await create_event(cal_id, summary, description, start_dt, end_dt)
     
     return {
@@ -0,0 +1,128 @@
+"""Trabalho de CPU fora do event loop, e um vigia que avisa quando o loop trava.
+
+O processo é UM event loop: enquanto uma função síncrona pesada roda nele, nada mais anda —
+nem o webhook da Meta (que reenvia se não recebe 200), nem os outros requests. Três caminhos
+faziam isso a cada uso:
+
+  * bcrypt no login e no cadastro (verify_password/hash_password): ~200 ms de CPU por login,
+    de propósito — é o custo do hash;
+  * tiktoken em split_into_chunks: encode de cada parágrafo a cada upload na base da IA;
+  * numpy em search_knowledge: json.loads + cosseno de TODOS os documentos do canal, a cada
+    mensagem que a IA responde.
+
+Agora eles passam por `executar(fn, ...)`, que roda `fn` num pool de threads PRÓPRIO
+(CPU_THREADS). Threads, e não processos, porque os três soltam o GIL no trecho pesado (o
+bcrypt e o encode do tiktoken são código nativo que libera o GIL; o numpy libera no produto
+escalar) — e thread não exige serializar os argumentos nem subir outro interpretador. Pool
+próprio pelo mesmo motivo do google_executor: o executor padrão do loop é o das leituras de
+arquivo, e um pico de logins não pode atrasar o streaming de uma gravação.
+
+------------------------------------------------------------------------------------------
+VIGIA DO LOOP
+------------------------------------------------------------------------------------------
+`monitorar_loop()` (uma task do lifespan) acorda a cada LOOP_LAG_INTERVALO_S e mede quanto
+acordou atrasado: é o histograma event_loop_lag_seconds. Atraso acima de LOOP_LAG_LIMIAR_MS
+vira log com a duração.
+
+Só a duração não diz QUEM travou. Para isso há uma thread vigia: se a batida do loop fica
+velha demais, ela tira uma foto da pilha da thread do loop NAQUELE instante
+(sys._current_frames) e loga — é a função culpada, pega no ato. Conta em
+event_loop_blocked_total. Custo: uma thread acordando duas vezes por limiar, sem lock.
+"""
+import asyncio
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import Contador, Histograma
+
+logger = logging.getLogger(__name__)
+
+CPU_THREADS = int(os.getenv("CPU_THREADS", str(min(4, os.cpu_count() or 1))))
+LOOP_LAG_INTERVALO_S = float(os.getenv("LOOP_LAG_INTERVALO_S", "0.5"))
+LOOP_LAG_LIMIAR_MS = float(os.getenv("LOOP_LAG_LIMIAR_MS", "100"))
+
+_executor = ThreadPoolExecutor(max_workers=CPU_THREADS, thread_name_prefix="cpu")
+
+duracao_tarefa = Histograma("cpu_task_duration_seconds",
+                            "Tempo de CPU fora do loop, por função (sem a fila do pool).",
+                            ("tarefa",))
+atraso_loop = Histograma("event_loop_lag_seconds",
+                         "Quanto o vigia do event loop acordou atrasado.",
+                         baldes=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+travamentos = Contador("event_loop_blocked_total",
+                       "Vezes em que o event loop ficou parado além de LOOP_LAG_LIMIAR_MS.")
+
+# Instante (monotonic) da última vez que o loop rodou o vigia; a thread vigia só lê.
+_batida: float | None = None
+
+
+async def executar(fn, *args, **kwargs):
+    """Roda `fn(*args, **kwargs)` no pool de CPU e devolve o resultado (ou repassa a exceção)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_medido, fn, *args, **kwargs))
+
+
+def _medido(fn, *args, **kwargs):
+    inicio = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        duracao_tarefa.observar(time.perf_counter() - inicio, tarefa=fn.__name__)
+
+
+def encerrar():
+    """Chamado no shutdown do lifespan: não aceita mais tarefas e não espera as em voo."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ----------------------------------------------------------------------------------------------
+# Vigia do loop
+# ----------------------------------------------------------------------------------------------
+
+def _pilha(ident: int, linhas: int = 8) -> str:
+    quadro = sys._current_frames().get(ident)
+    if quadro is None:
+        return "(pilha indisponível)"
+    return "".join(traceback.format_stack(quadro)[-linhas:]).rstrip()
+
+
+def _vigiar(ident_loop: int, parar: threading.Event):
+    """Thread vigia: loga a pilha do loop quando a batida passa do limiar (uma vez por trava)."""
+    limiar = LOOP_LAG_LIMIAR_MS / 1000
+    avisada = None
+    while not parar.wait(limiar / 2):
+        batida = _batida
+        if batida is None or batida == avisada:
+            continue
+        parado = time.monotonic() - batida - LOOP_LAG_INTERVALO_S
+        if parado > limiar:
+            avisada = batida
+            travamentos.inc()
+            logger.warning("🐢 Event loop parado há %.0f ms — rodando agora:\n%s",
+                           parado * 1000, _pilha(ident_loop))
+
+
+async def monitorar_loop():
+    """Task do lifespan: mede o atraso do loop e mantém a thread vigia viva."""
+    global _batida
+    parar = threading.Event()
+    vigia = threading.Thread(target=_vigiar, args=(threading.get_ident(), parar),
+                             name="loop-vigia", daemon=True)
+    vigia.start()
+    try:
+        while True:
+            _batida = inicio = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVALO_S)
+            atraso = max(time.monotonic() - inicio - LOOP_LAG_INTERVALO_S, 0.0)
+            atraso_loop.observar(atraso)
+            if atraso * 1000 > LOOP_LAG_LIMIAR_MS:
+                logger.warning("🐢 Event loop atrasou %.0f ms", atraso * 1000)
+    finally:
+        _batida = None
+        parar.set()
@@ -1,11 +1,16 @@
 import asyncio
 from app.database import engine, Base
+from app import nat_guard, particoes
 from app.models import Contact, Message, ExactLead
 
 
 async def create_all():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # messages nasce particionada (models.Message): sem partição nenhuma, o INSERT falha.
+        await particoes.preparar(conn)
+        # Sem os triggers, o nat_guard não pode guardar o nat_config em cache (conferir_gatilhos).
+        await nat_guard.instalar_gatilhos(conn)
     print("✅ Tabelas criadas com sucesso!")
 
 
@@ -1,16 +1,183 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+"""Engine e sessões do Postgres, com o pool dimensionado por configuração e medido.
+
+O engine subia só com os padrões: pool de 5 + 10 de overflow, espera de 30s por conexão,
+nenhum statement_timeout, nenhum pre_ping. Um webhook com transação longa ou um disparo em
+massa (a sessão fica aberta os ~30 min do lote) secava o pool em silêncio — e o sintoma
+aparecia em OUTRO lugar, como latência aleatória de quem esperava conexão.
+
+`criar_engine()` monta o engine a partir do ambiente:
+
+  * DB_POOL_SIZE / DB_MAX_OVERFLOW — conexões fixas e extras (padrão 10 + 10).
+  * DB_POOL_TIMEOUT — quanto um request espera por conexão antes de falhar (padrão 10s). Com
+    o pool seco, um erro rápido e contado é melhor que 30s de fila invisível.
+  * DB_POOL_RECYCLE / DB_POOL_PRE_PING — conexão velha é trocada; conexão morta (restart do
+    Postgres) é detectada no checkout, não no meio do request.
+  * DB_STATEMENT_TIMEOUT_MS — teto de cada statement, aplicado pelo servidor (padrão 30s).
+    Rotas que precisam de teto menor usam `get_db_com_timeout(ms)` (ver abaixo).
+  * DB_PREPARED_CACHE — cache de prepared statements do asyncpg por conexão (padrão 100).
+  * SQL_ECHO — desligado por padrão (ver app/logs.py).
+
+------------------------------------------------------------------------------------------
+POOL VISÍVEL
+------------------------------------------------------------------------------------------
+`PoolMedido` cronometra cada checkout: db_pool_checkout_wait_seconds mostra quanto se esperou
+por conexão, e db_pool_timeouts_total quantas vezes se desistiu. Os gauges db_pool_in_use,
+db_pool_idle e db_pool_overflow são lidos do pool a cada scrape. O mesmo retrato, legível,
+fica em GET /api/debug/pool (admin).
+
+------------------------------------------------------------------------------------------
+STATEMENT TIMEOUT POR ROTA
+------------------------------------------------------------------------------------------
+O teto global vai no `server_settings` da conexão. Uma rota que precisa responder rápido
+(o webhook da Meta reenvia se não recebe 200) declara `Depends(get_db_com_timeout(5000))`:
+a sessão faz `SET LOCAL statement_timeout` no início de CADA transação dela — LOCAL, para
+que o valor morra no commit/rollback e a conexão volte ao pool com o teto global.
+
+------------------------------------------------------------------------------------------
+RÉPLICA DE LEITURA
+------------------------------------------------------------------------------------------
+Dashboard, inbox, kanban e as listagens da Exact são leitura pura e pesada, e disputavam o
+primário com as escritas do webhook. Com DATABASE_READ_URL definido, essas rotas declaram
+`Depends(get_read_db)` e leem de um segundo engine (pool próprio, DB_READ_POOL_SIZE), com
+`default_transaction_read_only` ligado — uma escrita esquecida numa rota de leitura falha
+alta em vez de ir parar na réplica. Sem DATABASE_READ_URL, get_read_db É o get_db.
+
+Para testar local, basta apontar DATABASE_READ_URL para outro Postgres ou para o MESMO,
+com outro DSN: o roteamento e o read-only valem igual, só não há atraso de replicação.
+
+A sessão de leitura volta para o PRIMÁRIO quando:
+
+  * "pedido"       — o cliente mandou o header X-Read-Primary: 1 (a tela que acabou de
+                     salvar e precisa ver o que salvou, sem esperar a réplica);
+  * "apos_escrita" — o mesmo cliente (mesmo Authorization) fez um POST/PUT/PATCH/DELETE
+                     com sucesso há menos de DB_READ_APOS_ESCRITA_S (padrão 5s). É o
+                     read-your-writes automático: cobre o atraso normal da réplica sem a
+                     tela precisar saber que ela existe. Quem marca é o
+                     LeituraAposEscritaMiddleware, em memória — o deploy é processo único;
+  * "replica_fora" — a réplica não entregou conexão. A leitura cai no primário na hora e
+                     a réplica fica de fora por DB_READ_PAUSA_S (padrão 30s), para que cada
+                     request não pague de novo o timeout de conexão.
+
+db_read_sessions_total{destino, motivo} conta para onde cada sessão de leitura foi.
+"""
+import asyncio
+import logging
 import os
+import time
+
 from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import Contador, Histograma, Medidor, instrumentar_engine
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://localhost:5432/cenat_whatsapp")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "sim")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_PREPARED_CACHE = int(os.getenv("DB_PREPARED_CACHE", "100"))
+
+# Desligado por padrão: o echo escreve cada statement direto no stdout, síncrono. Para ver o
+# SQL, prefira LOG_LEVELS="sqlalchemy.engine=INFO", que passa pela fila de app/logs.py.
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "sim")
+
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+DB_READ_APOS_ESCRITA_S = float(os.getenv("DB_READ_APOS_ESCRITA_S", "5"))
+DB_READ_PAUSA_S = float(os.getenv("DB_READ_PAUSA_S", "30"))
+
+espera_pool = Histograma(
+    "db_pool_checkout_wait_seconds", "Espera por uma conexão do pool, por checkout.",
+    baldes=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+timeouts_pool = Contador(
+    "db_pool_timeouts_total", "Checkouts que desistiram por DB_POOL_TIMEOUT.")
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """O pool assíncrono padrão, cronometrando a espera de cada checkout."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            timeouts_pool.inc()
+            raise
+        finally:
+            espera_pool.observar(time.perf_counter() - inicio)
+
+
+def estado_pool(pool) -> dict:
+    """Retrato do pool: o que /api/debug/pool mostra e os gauges leem."""
+    return {
+        "size": pool.size(),
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout_s": pool.timeout(),
+        "checkouts": espera_pool.contagem(),
+        "espera_total_s": round(espera_pool.soma(), 3),
+        "timeouts": timeouts_pool.valor(),
+    }
+
+
+def criar_engine(url: str = DATABASE_URL, *, somente_leitura: bool = False, **sobrepor):
+    """Engine assíncrono configurado pelo ambiente. `sobrepor` troca qualquer argumento."""
+    server_settings = {
+        "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS),
+        "application_name": "cenat-backend-leitura" if somente_leitura else "cenat-backend",
+    }
+    if somente_leitura:
+        server_settings["default_transaction_read_only"] = "on"
+    opcoes = dict(
+        echo=SQL_ECHO,
+        poolclass=PoolMedido,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": DB_PREPARED_CACHE,
+            "server_settings": server_settings,
+        },
+    )
+    opcoes.update(sobrepor)
+    novo = create_async_engine(url, **opcoes)
+    instrumentar_engine(novo)
+    return novo
+
+
+engine = criar_engine()
+
+for _nome, _ajuda, _campo in (
+        ("db_pool_in_use", "Conexões emprestadas agora.", "in_use"),
+        ("db_pool_idle", "Conexões paradas no pool.", "idle"),
+        ("db_pool_overflow", "Conexões além do pool_size abertas agora.", "overflow")):
+    Medidor(_nome, _ajuda, coletar=lambda campo=_campo: {(): estado_pool(engine.pool)[campo]})
 
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+engine_leitura = (criar_engine(DATABASE_READ_URL, somente_leitura=True,
+                               pool_size=DB_READ_POOL_SIZE)
+                  if DATABASE_READ_URL else None)
+async_session_leitura = (sessionmaker(engine_leitura, class_=AsyncSession,
+                                      expire_on_commit=False)
+                         if engine_leitura is not None else None)
+
 
 class Base(DeclarativeBase):
     pass
@@ -18,4 +185,103 @@ class Base(DeclarativeBase):
 
 async def get_db():
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def _timeout_local(ms: int):
+    def aplicar(session, transaction, connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(ms)}")
+    return aplicar
+
+
+def get_db_com_timeout(ms: int):
+    """Dependência como get_db, mas com statement_timeout de `ms` em cada transação."""
+    async def dependencia():
+        async with async_session() as session:
+            event.listen(session.sync_session, "after_begin", _timeout_local(ms))
+            yield session
+    return dependencia
+
+
+# ------------------------------------------------------------------------------------------
+# Réplica de leitura (ver RÉPLICA DE LEITURA na docstring do módulo)
+# ------------------------------------------------------------------------------------------
+HEADER_LER_PRIMARIO = "x-read-primary"
+METODOS_DE_ESCRITA = ("POST", "PUT", "PATCH", "DELETE")
+
+sessoes_leitura = Contador(
+    "db_read_sessions_total", "Sessões de get_read_db, por destino e motivo.",
+    ("destino", "motivo"))
+
+_escritas: dict = {}          # Authorization -> time.monotonic() da última escrita com sucesso
+_replica_fora_ate = 0.0
+
+
+def marcar_escrita(chave: str, agora: float | None = None) -> None:
+    agora = time.monotonic() if agora is None else agora
+    _escritas[chave] = agora
+    if len(_escritas) > 1000:
+        for antiga in [k for k, t in _escritas.items() if agora - t > DB_READ_APOS_ESCRITA_S]:
+            del _escritas[antiga]
+
+
+def _motivo_primario(headers) -> str | None:
+    """Por que esta leitura NÃO vai para a réplica — ou None, se vai."""
+    if async_session_leitura is None:
+        return "sem_replica"
+    if headers.get(HEADER_LER_PRIMARIO, "").lower() in ("1", "true", "sim"):
+        return "pedido"
+    escrita = _escritas.get(headers.get("authorization", ""))
+    agora = time.monotonic()
+    if escrita is not None and agora - escrita < DB_READ_APOS_ESCRITA_S:
+        return "apos_escrita"
+    if agora < _replica_fora_ate:
+        return "replica_fora"
+    return None
+
+
+def _pausar_replica(erro: Exception) -> None:
+    global _replica_fora_ate
+    _replica_fora_ate = time.monotonic() + DB_READ_PAUSA_S
+    logger.warning("⚠️ Réplica de leitura indisponível (%s: %s); lendo do primário por %ss",
+                   type(erro).__name__, erro, DB_READ_PAUSA_S)
+
+
+async def get_read_db(request: Request):
+    """Dependência das rotas só de leitura: sessão na réplica, ou no primário quando precisa."""
+    motivo = _motivo_primario(request.headers)
+    if motivo is None:
+        async with async_session_leitura() as session:
+            try:
+                await session.connection()
+            except (OSError, DBAPIError, PoolTimeout, asyncio.TimeoutError) as e:
+                _pausar_replica(e)
+                motivo = "replica_fora"
+            else:
+                sessoes_leitura.inc(destino="replica", motivo="leitura")
+                yield session
+                return
+    sessoes_leitura.inc(destino="primario", motivo=motivo)
+    async with async_session() as session:
+        yield session
+
+
+class LeituraAposEscritaMiddleware:
+    """Marca o cliente que acabou de escrever, para get_read_db mandá-lo ao primário."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METODOS_DE_ESCRITA:
+            await self.app(scope, receive, send)
+            return
+        chave = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+
+        async def enviar(mensagem):
+            if (chave and mensagem["type"] == "http.response.start"
+                    and mensagem["status"] < 400):
+                marcar_escrita(chave)
+            await send(mensagem)
+
+        await self.app(scope, receive, enviar)
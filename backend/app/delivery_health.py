@@ -4,11 +4,28 @@ O sistema passou 4 dias mandando template que a Meta recusava (`131042`) sem que
 soubesse. As Fases 1 a 3 fizeram o banco contar a verdade; esta faz alguém ser AVISADO da
 verdade, sem precisar abrir o painel nem rodar consulta.
 
-Duas notificações, uma por transição:
+Duas notificações, uma por transição, POR FLUXO — um fluxo é o par (canal, template):
 
-  QUEBROU  na última hora, ≥ 5 templates saíram e ≥ 50% falharam
+  QUEBROU  na última hora, ≥ 5 desfechos do fluxo e ≥ 50% deles falharam
   VOLTOU   estava em alerta e a taxa caiu para < 10% (com volume suficiente para afirmar isso)
 
+------------------------------------------------------------------------------------------
+CONTADORES POR MINUTO, E NÃO VARREDURA DE messages
+------------------------------------------------------------------------------------------
+`messages.template_name` é gravado por todo caminho que envia template (envio manual, disparo
+em massa, boas-vindas, NAT). O webhook de status, quando uma dessas mensagens chega a um
+DESFECHO — entregue (delivered/read) ou falhou — soma 1 no balde do minuto em
+`template_delivery_minuto` (canal, template, minuto). `avaliar` só soma os ~60 baldes de cada
+fluxo: o custo é o mesmo com 10 ou 10.000 templates por hora, e por isso o ciclo roda a cada
+minuto em vez de a cada 15.
+
+A taxa passou a ser sobre DESFECHOS, não sobre envios: uma mensagem que ainda não voltou nem
+delivered nem failed não diz nada sobre entrega e não entra no denominador. O balde é o minuto
+em que o desfecho chegou.
+
+Mensagens anteriores à coluna (template_name NULL) não são contadas — o alerta vale a partir
+do deploy, sem backfill.
+
 ------------------------------------------------------------------------------------------
 POR QUE JOB PRÓPRIO E NÃO UM HANDLER DO nat_scheduler
 ------------------------------------------------------------------------------------------
@@ -94,15 +111,15 @@ Durante os 4 dias do incidente NÃO houve uma única hora com ≥5 templates e z
 seja, a regra corrigida não teria dado nenhum alarme falso de volta, e o alerta teria ficado
 de pé exatamente enquanto o problema existiu.
 
-LIMITAÇÃO CONHECIDA, do outro lado: a mesma diluição pode ESCONDER uma quebra. Se a campanha
-das 16h tivesse rodado às 08h, a taxa global de 23/07 08h teria sido baixa e o alerta não
-dispararia naquele momento. Neste incidente ele disparou, mas isso foi sorte de ordenação, não
-projeto. A correção de verdade é `messages.template_name`, para medir a saúde POR TEMPLATE em
-vez de no agregado — migração, portanto fora do escopo desta sprint, e registrada como frente
-própria no doc.
+A mesma diluição podia ESCONDER uma quebra: se a campanha das 16h tivesse rodado às 08h, a
+taxa global de 23/07 08h teria sido baixa e o alerta não dispararia. A correção era medir POR
+TEMPLATE — é o que os contadores por fluxo fazem agora. Cada fluxo tem o próprio estado (em
+`notifications.ref`), e a campanha das 16h e a boas-vindas morta não se enxergam mais. O teto
+de zero falhas continua valendo dentro de cada fluxo: barato, e erra para o lado do barulho.
 """
+import logging
 import asyncio
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -114,8 +131,11 @@ from app.models import Notification, User
 # NAT estar desligada não afeta este módulo.
 from app.nat_guard import GESTOR_USER_ID, _agora_sp
 
-# De quanto em quanto tempo a varredura roda.
-INTERVALO_SEGUNDOS = 900  # 15 min
+logger = logging.getLogger(__name__)
+
+# De quanto em quanto tempo a avaliação roda. Com contadores, um ciclo custa a soma dos baldes
+# da última hora por fluxo — barato o bastante para rodar a cada minuto.
+INTERVALO_SEGUNDOS = 60
 
 # Janela de observação. Uma hora é curta o bastante para o alerta chegar enquanto o incidente
 # ainda importa, e longa o bastante para o denominador não virar ruído estatístico.
@@ -133,12 +153,19 @@ LIMIAR_QUEBROU = 0.50
 LIMIAR_VOLTOU = 0.10
 
 # Teto ABSOLUTO de falhas para anunciar recuperação — ver a seção sobre diluição na docstring.
-# Zero é a única resposta defensável hoje: com a taxa medida no agregado de todos os templates,
-# qualquer número > 0 permite que uma campanha grande e saudável declare "normalizou" com um
-# fluxo inteiro ainda morto por baixo. Foi o que aconteceria em 23/07 e 24/07.
-# Para voltar ao comportamento literal do enunciado, basta subir este número.
+# Nasceu para a taxa agregada, em que qualquer número > 0 deixava uma campanha saudável
+# declarar "normalizou" por cima de um fluxo morto. Por fluxo a diluição acabou, mas o zero
+# fica: "voltou" só com uma hora limpa. Para o comportamento literal do enunciado, suba-o.
 MAX_FALHAS_PARA_VOLTAR = 0
 
+# Baldes mais velhos que isto são apagados pelo job. A avaliação só olha a última hora; a
+# sobra é para quem quiser consultar o histórico recente de um fluxo direto no banco.
+RETENCAO_DIAS = 7
+
+# Status da Meta que encerram a entrega de uma mensagem, e em qual contador caem.
+DESFECHO_ENTREGUE = ("delivered", "read")
+DESFECHO_FALHOU = "failed"
+
 # `notifications.type` é VARCHAR(30) — os dois cabem com folga.
 TIPO_QUEBROU = "delivery_health_down"
 TIPO_VOLTOU = "delivery_health_up"
@@ -147,79 +174,139 @@ ESTADO_ALERTA = "alerta"
 ESTADO_NORMAL = "normal"
 
 
-async def medir(db: AsyncSession, *, agora=None) -> dict:
-    """Total, falhas, taxa e erro mais frequente dos templates da última hora.
+def _minuto(quando: datetime) -> datetime:
+    return quando.replace(second=0, microsecond=0)
+
+
+async def contar_desfecho(db: AsyncSession, mensagem, status_anterior: str | None,
+                          novo_status: str, *, agora=None) -> bool:
+    """Soma o desfecho de um template no balde do minuto. True se contou.
+
+    Chamado pelo webhook de status, dentro de savepoint. Conta TRANSIÇÃO, não evento: a Meta
+    manda delivered e depois read para a mesma mensagem, e reentrega status — só a primeira
+    passagem para "entregue" e a primeira para "falhou" contam.
+
+    NÃO dá commit: vai junto com o status da própria mensagem. `status_anterior` só vale se
+    foi lido com a linha TRAVADA (SELECT ... FOR UPDATE, como o webhook faz): dois webhooks
+    concorrentes lendo 'sent' contariam a mesma entrega duas vezes.
+    """
+    template = getattr(mensagem, "template_name", None)
+    if not template or getattr(mensagem, "direction", None) != "outbound":
+        return False
+    if novo_status == DESFECHO_FALHOU and status_anterior != DESFECHO_FALHOU:
+        entregues, falhas = 0, 1
+    elif (novo_status in DESFECHO_ENTREGUE
+          and status_anterior not in (*DESFECHO_ENTREGUE, DESFECHO_FALHOU)):
+        entregues, falhas = 1, 0
+    else:
+        return False
+
+    agora = agora if agora is not None else _agora_sp()
+    await db.execute(text("""
+        INSERT INTO template_delivery_minuto (channel_id, template_name, minuto, entregues, falhas)
+        VALUES (:canal, :template, :minuto, :entregues, :falhas)
+        ON CONFLICT (channel_id, template_name, minuto) DO UPDATE
+           SET entregues = template_delivery_minuto.entregues + EXCLUDED.entregues,
+               falhas = template_delivery_minuto.falhas + EXCLUDED.falhas
+    """), {"canal": mensagem.channel_id or 0, "template": template, "minuto": _minuto(agora),
+           "entregues": entregues, "falhas": falhas})
+    return True
+
+
+async def podar(db: AsyncSession, *, agora=None) -> int:
+    """Apaga os baldes além de RETENCAO_DIAS. Devolve quantos. Não commita."""
+    agora = agora if agora is not None else _agora_sp()
+    res = await db.execute(text("DELETE FROM template_delivery_minuto WHERE minuto < :corte"),
+                           {"corte": agora - timedelta(days=RETENCAO_DIAS)})
+    return res.rowcount or 0
+
+
+def _ref(canal: int, template: str) -> str:
+    """Chave do fluxo em notifications.ref — é o que separa o estado de um fluxo do outro."""
+    return f"template:{canal}:{template}"
 
-    SÓ `direction='outbound'` e `message_type='template'`. Mensagem recebida não tem entrega
-    para medir, e texto de atendente vive dentro da janela de 24h (regra diferente, falha por
-    motivo diferente) — misturar os dois diluiria a taxa justamente quando ela precisa gritar.
+
+async def medir(db: AsyncSession, *, agora=None) -> list[dict]:
+    """Total de desfechos, falhas e taxa de cada fluxo (canal, template) na última hora.
+
+    Só os fluxos com algum desfecho na janela. Soma baldes por minuto — no máximo
+    JANELA_MINUTOS linhas por fluxo, não importa o volume enviado.
     """
     agora = agora if agora is not None else _agora_sp()
     inicio = agora - timedelta(minutes=JANELA_MINUTOS)
 
-    linha = (await db.execute(text("""
-        SELECT count(*) AS total,
-               count(*) FILTER (WHERE status = 'failed') AS falhas
+    linhas = (await db.execute(text("""
+        SELECT channel_id, template_name,
+               sum(entregues + falhas) AS total, sum(falhas) AS falhas
+        FROM template_delivery_minuto
+        WHERE minuto >= :inicio AND minuto <= :agora
+        GROUP BY channel_id, template_name
+        ORDER BY channel_id, template_name
+    """), {"inicio": _minuto(inicio), "agora": agora})).all()
+
+    fluxos = []
+    for linha in linhas:
+        total, falhas = int(linha.total or 0), int(linha.falhas or 0)
+        fluxos.append({
+            "canal": linha.channel_id,
+            "template": linha.template_name,
+            "total": total,
+            "falhas": falhas,
+            "taxa": (falhas / total) if total else 0.0,
+            "erro_top": None,
+            "inicio": inicio,
+            "agora": agora,
+        })
+    return fluxos
+
+
+async def _erro_top(db: AsyncSession, m: dict) -> dict | None:
+    """Erro mais frequente do fluxo na janela. Só consultado quando vai virar notificação.
+
+    NULL vira '(sem código)' porque falha sem código é o caso comum de tudo que precede a
+    persistência de statuses[].errors[] — e continuar mostrando "None" esconderia que existem
+    falhas ali.
+    """
+    r = (await db.execute(text("""
+        SELECT coalesce(error_code::text, '(sem código)') AS codigo, count(*) AS n
         FROM messages
         WHERE direction = 'outbound'
-          AND message_type = 'template'
+          AND template_name = :template
+          AND coalesce(channel_id, 0) = :canal
+          AND status = 'failed'
           AND timestamp >= :inicio
           AND timestamp <= :agora
-    """), {"inicio": inicio, "agora": agora})).first()
-
-    total, falhas = (linha.total or 0), (linha.falhas or 0)
-
-    # Erro mais frequente. NULL vira '(sem código)' porque falha sem código é o caso comum de
-    # tudo que precede a persistência de statuses[].errors[] — e continuar mostrando "None"
-    # esconderia que existem falhas ali.
-    erro_top = None
-    if falhas:
-        r = (await db.execute(text("""
-            SELECT coalesce(error_code::text, '(sem código)') AS codigo, count(*) AS n
-            FROM messages
-            WHERE direction = 'outbound'
-              AND message_type = 'template'
-              AND status = 'failed'
-              AND timestamp >= :inicio
-              AND timestamp <= :agora
-            GROUP BY 1 ORDER BY n DESC, codigo LIMIT 1
-        """), {"inicio": inicio, "agora": agora})).first()
-        if r is not None:
-            erro_top = {"codigo": r.codigo, "ocorrencias": r.n}
-
-    return {
-        "total": total,
-        "falhas": falhas,
-        "taxa": (falhas / total) if total else 0.0,
-        "erro_top": erro_top,
-        "inicio": inicio,
-        "agora": agora,
-    }
+        GROUP BY 1 ORDER BY n DESC, codigo LIMIT 1
+    """), {"template": m["template"], "canal": m["canal"], "inicio": m["inicio"],
+           "agora": m["agora"]})).first()
+    return {"codigo": r.codigo, "ocorrencias": r.n} if r is not None else None
 
 
-async def estado_atual(db: AsyncSession) -> str:
-    """`alerta` ou `normal`, lido da última notificação de saúde de entrega.
+async def estados_atuais(db: AsyncSession) -> dict:
+    """{ref do fluxo: `alerta` ou `normal`}, lido da última notificação de cada fluxo.
 
     ORDER BY id, não created_at: o id é BIGSERIAL e a ordem dele é exata. `created_at` vem de
     `server_default=func.now()`, que é o relógio do banco (UTC) enquanto o resto do projeto
     grava horário de SP — ordenar por ele funcionaria, mas seria depender de um relógio que
     não é o nosso para responder uma pergunta de ordem.
 
-    Sem nenhuma das duas → `normal`. É a resposta certa no primeiro boot e depois de uma
-    limpeza de notificações (ver docstring do módulo: erra para o lado do barulho).
+    Fluxo sem notificação nenhuma → ausente do dict → `normal`. É a resposta certa no primeiro
+    boot e depois de uma limpeza de notificações (ver docstring do módulo: erra para o lado
+    do barulho). As notificações do alerta agregado antigo têm ref NULL e ficam de fora.
     """
-    r = (await db.execute(text("""
-        SELECT type FROM notifications
-        WHERE user_id = :uid AND type IN (:down, :up)
-        ORDER BY id DESC LIMIT 1
-    """), {"uid": GESTOR_USER_ID, "down": TIPO_QUEBROU, "up": TIPO_VOLTOU})).first()
-
-    return ESTADO_ALERTA if (r is not None and r.type == TIPO_QUEBROU) else ESTADO_NORMAL
+    linhas = (await db.execute(text("""
+        SELECT DISTINCT ON (ref) ref, type FROM notifications
+        WHERE user_id = :uid AND type IN (:down, :up) AND ref IS NOT NULL
+        ORDER BY ref, id DESC
+    """), {"uid": GESTOR_USER_ID, "down": TIPO_QUEBROU, "up": TIPO_VOLTOU})).all()
+    return {r.ref: (ESTADO_ALERTA if r.type == TIPO_QUEBROU else ESTADO_NORMAL)
+            for r in linhas}
 
 
 def _corpo(m: dict) -> str:
     pct = f"{m['taxa'] * 100:.0f}%"
-    partes = [f"{m['falhas']} de {m['total']} templates falharam na última hora ({pct})."]
+    partes = [f"Template {m['template']} (canal {m['canal']}): {m['falhas']} de "
+              f"{m['total']} falharam na última hora ({pct})."]
     if m["erro_top"]:
         partes.append(f"Erro mais frequente: {m['erro_top']['codigo']} "
                       f"({m['erro_top']['ocorrencias']}x).")
@@ -227,7 +314,7 @@ def _corpo(m: dict) -> str:
     return " ".join(partes)
 
 
-async def _notificar(db: AsyncSession, tipo: str, titulo: str, corpo: str) -> bool:
+async def _notificar(db: AsyncSession, tipo: str, ref: str, titulo: str, corpo: str) -> bool:
     """Cria a notificação para a gestão. False se o usuário não existir.
 
     A conferência não é zelo excessivo: `notifications.user_id` tem FK para `users`, e apontar
@@ -235,17 +322,17 @@ async def _notificar(db: AsyncSession, tipo: str, titulo: str, corpo: str) -> bo
     um rollback que derruba o ciclo inteiro — e, pior, sem registrar o alerta em lugar nenhum.
     """
     if (await db.execute(select(User.id).where(User.id == GESTOR_USER_ID))).first() is None:
-        print(f"⚠️  Saúde de entrega: usuário da gestão (id={GESTOR_USER_ID}) não existe — "
-              f"alerta {tipo} NÃO registrado. Corpo: {corpo}")
+        logger.warning("⚠️  Saúde de entrega: usuário da gestão (id=%s) não existe — alerta %s "
+                       "NÃO registrado. Corpo: %s", GESTOR_USER_ID, tipo, corpo)
         return False
 
     db.add(Notification(user_id=GESTOR_USER_ID, contact_wa_id=None, type=tipo,
-                        ref=None, title=titulo, body=corpo))
+                        ref=ref, title=titulo[:255], body=corpo))
     return True
 
 
 async def avaliar(db: AsyncSession, *, agora=None) -> dict:
-    """Um ciclo: mede, compara com o estado guardado e notifica SÓ na transição.
+    """Um ciclo: mede cada fluxo, compara com o estado dele e notifica SÓ na transição.
 
     NÃO dá commit — quem chama decide a fronteira da transação. É o que deixa o teste rodar
     isto contra uma sessão e desfazer tudo no fim.
@@ -253,56 +340,83 @@ async def avaliar(db: AsyncSession, *, agora=None) -> dict:
     `agora` explícito permite testar sem mock de relógio, mesmo padrão de
     `nat_scheduler.processar_pendentes` e de `dentro_horario_comercial(quando=...)`.
 
-    Devolve as métricas + `estado_anterior`, `estado`, `transicao` (None quando nada mudou).
+    Devolve {"fluxos": [...], "total", "falhas", "em_alerta"}; cada fluxo traz as métricas +
+    `estado_anterior`, `estado`, `transicao` (None quando nada mudou). Um fluxo em alerta que
+    ficou sem tráfego não aparece em "fluxos" — e continua em alerta, como antes.
     """
-    m = await medir(db, agora=agora)
-    anterior = await estado_atual(db)
+    fluxos = await medir(db, agora=agora)
+    estados = await estados_atuais(db)
 
-    volume_suficiente = m["total"] >= MINIMO_ENVIOS
-    quebrou = volume_suficiente and m["taxa"] >= LIMIAR_QUEBROU
-    voltou = (volume_suficiente and m["taxa"] < LIMIAR_VOLTOU
-              and m["falhas"] <= MAX_FALHAS_PARA_VOLTAR)
+    for m in fluxos:
+        ref = _ref(m["canal"], m["template"])
+        anterior = estados.get(ref, ESTADO_NORMAL)
 
-    transicao, estado = None, anterior
+        volume_suficiente = m["total"] >= MINIMO_ENVIOS
+        quebrou = volume_suficiente and m["taxa"] >= LIMIAR_QUEBROU
+        voltou = (volume_suficiente and m["taxa"] < LIMIAR_VOLTOU
+                  and m["falhas"] <= MAX_FALHAS_PARA_VOLTAR)
 
-    if anterior == ESTADO_NORMAL and quebrou:
-        if await _notificar(db, TIPO_QUEBROU, "Entrega de mensagens quebrou", _corpo(m)):
-            transicao, estado = TIPO_QUEBROU, ESTADO_ALERTA
-            print(f"🚨 Saúde de entrega: QUEBROU — {_corpo(m)}")
+        transicao, estado = None, anterior
 
-    elif anterior == ESTADO_ALERTA and voltou:
-        if await _notificar(db, TIPO_VOLTOU, "Entrega de mensagens normalizada", _corpo(m)):
-            transicao, estado = TIPO_VOLTOU, ESTADO_NORMAL
-            print(f"✅ Saúde de entrega: NORMALIZOU — {_corpo(m)}")
+        if anterior == ESTADO_NORMAL and quebrou:
+            m["erro_top"] = await _erro_top(db, m)
+            if await _notificar(db, TIPO_QUEBROU, ref,
+                                f"Entrega do template {m['template']} quebrou", _corpo(m)):
+                transicao, estado = TIPO_QUEBROU, ESTADO_ALERTA
+                logger.error("🚨 Saúde de entrega: QUEBROU — %s", _corpo(m))
 
-    return {**m, "estado_anterior": anterior, "estado": estado, "transicao": transicao}
+        elif anterior == ESTADO_ALERTA and voltou:
+            if await _notificar(db, TIPO_VOLTOU, ref,
+                                f"Entrega do template {m['template']} normalizada", _corpo(m)):
+                transicao, estado = TIPO_VOLTOU, ESTADO_NORMAL
+                logger.info("✅ Saúde de entrega: NORMALIZOU — %s", _corpo(m))
+
+        estados[ref] = estado
+        m.update(estado_anterior=anterior, estado=estado, transicao=transicao)
+
+    return {
+        "fluxos": fluxos,
+        "total": sum(m["total"] for m in fluxos),
+        "falhas": sum(m["falhas"] for m in fluxos),
+        "em_alerta": sorted(ref for ref, e in estados.items() if e == ESTADO_ALERTA),
+    }
 
 
 async def delivery_health_job():
-    """Loop de 15 min. Registrado no lifespan de main.py, junto dos outros jobs.
+    """Loop de 1 min. Registrado no lifespan de main.py, junto dos outros jobs.
 
     Dorme ANTES de trabalhar, como todos os outros jobs do main.py.
 
     O try/except abraça o ciclo inteiro porque este loop não pode morrer: se morrer, o sistema
     volta a não saber que está falhando — que é o estado de onde esta sprint veio.
 
-    BATIMENTO POR CICLO. O `print` de resumo sai SEMPRE, inclusive na janela vazia — e isso é
-    a tese desta sprint aplicada ao próprio vigia. Um job que só loga em transição é
-    indistinguível de um job morto: "nada no log" significaria tanto "rodou e está tudo bem"
-    quanto "o loop caiu há três dias". Um alerta que pode morrer em silêncio é exatamente o
-    tipo de falha invisível que o incidente 131042 expôs, e não faria sentido corrigir isso no
-    envio e reproduzi-lo aqui. Mesmo padrão do resumo do nat_scheduler.
+    BATIMENTO POR CICLO. A linha de log "⏱️  Saúde de entrega: ..." (logger.info) sai SEMPRE,
+    inclusive na janela vazia — e isso é a tese desta sprint aplicada ao próprio vigia. Um job
+    que só loga em transição é indistinguível de um job morto: "nada no log" significaria tanto
+    "rodou e está tudo bem" quanto "o loop caiu há três dias". Um alerta que pode morrer em
+    silêncio é exatamente o tipo de falha invisível que o incidente 131042 expôs, e não faria
+    sentido corrigir isso no envio e reproduzi-lo aqui. Mesmo padrão do resumo do nat_scheduler.
+
+    SEM `extra={"amostra": N}`, mesmo rodando a cada minuto: são 1.440 linhas por dia, nada
+    perto do volume que a amostragem de app/logs.py existe para cortar, e cada linha carrega
+    números diferentes. Amostrada, ela voltaria a ter buracos de N minutos em que "não logou"
+    não distingue "rodou" de "morreu" — o contrário do que o batimento quer provar.
     """
     while True:
         await asyncio.sleep(INTERVALO_SEGUNDOS)
         try:
             async with async_session() as db:
                 r = await avaliar(db)
+                await podar(db)
                 await db.commit()
-            print(f"⏱️  Saúde de entrega: {r['total']} template(s) na janela, "
-                  f"{r['falhas']} falha(s), taxa {r['taxa'] * 100:.0f}%, estado={r['estado']}")
-            if r["transicao"]:
-                print(f"🔔 Saúde de entrega: notificação {r['transicao']} enviada para a "
-                      f"gestão (id={GESTOR_USER_ID})")
+            logger.info("⏱️  Saúde de entrega: %s fluxo(s) na janela, %s desfecho(s), %s "
+                        "falha(s), em alerta=%s",
+                        len(r['fluxos']), r['total'], r['falhas'],
+                        r['em_alerta'] or 'nenhum')
+            for m in r["fluxos"]:
+                if m["transicao"]:
+                    logger.info("🔔 Saúde de entrega: notificação %s de %s enviada para a gestão "
+                                "(id=%s)",
+                                m['transicao'], m['template'], GESTOR_USER_ID)
         except Exception as e:
-            print(f"❌ Erro no delivery_health_job: {type(e).__name__}: {e}")
+            logger.error("❌ Erro no delivery_health_job: %s: %s", type(e).__name__, e)
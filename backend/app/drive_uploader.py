@@ -0,0 +1,138 @@
+"""Fila de upload de gravações ao Google Drive.
+
+Antes, o upload era uma chamada avulsa: MediaInMemoryUpload com o MP3 inteiro na RAM, um
+files().create e um permissions().create síncronos, e nenhum registro. Se o Drive falhasse
+no meio, o upload estava perdido — ninguém tentava de novo.
+
+Agora o webhook de gravação, depois de salvar o MP3 no disco, marca
+`call_logs.drive_upload_status='pending'` e ACORDA este worker. O worker sobe a gravação
+direto do arquivo local, em pedaços (google_drive.enviar_gravacao), e persiste a sessão de
+upload resumível a cada pedaço confirmado.
+
+Só liga com DRIVE_UPLOAD_ENABLED=true. Hoje nenhuma gravação vai ao Drive (a função de
+upload não era chamada de lugar nenhum), e ligar isto passa a publicar as gravações com link
+"qualquer pessoa com o link" — é decisão de produto, não efeito colateral de deploy.
+
+------------------------------------------------------------------------------------------
+MESMO DESENHO DA FILA DE TRANSCRIÇÃO
+------------------------------------------------------------------------------------------
+Estados, reivindicação por SKIP LOCKED em transação curta, 'processing' travada há mais de
+TRAVADA_APOS_MINUTOS volta à fila, retentativa com run_at empurrado, MAX_TENTATIVAS e
+gravação sumida do disco indo direto para 'error' — é o esqueleto de fila_worker.py, o mesmo
+da transcrição, que explica o porquê de cada escolha. Aqui fica só o upload.
+
+A diferença é a RETOMADA: `drive_upload_uri` guarda a sessão aberta no Drive. A retentativa
+(ou o processo que reiniciou no meio) continua do último pedaço confirmado, em vez de subir
+a gravação de novo do byte zero. Se o Drive já esqueceu a sessão (404/410 — ela expira em
+~1 semana), o uri é limpo e a próxima tentativa começa do zero.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app import fila_worker
+from app.database import async_session
+from app.fila_worker import CONCLUIDA as CONCLUIDO, ERRO, PENDENTE, PROCESSANDO
+from app.models import CallLog
+from app.nat_guard import _agora_sp
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ATIVO = os.getenv("DRIVE_UPLOAD_ENABLED", "false").lower() == "true"
+INTERVALO_SEGUNDOS = 60
+# Cada upload ocupa uma thread do pool do Google por pedaço; acima de GOOGLE_THREADS (4) só
+# enfileiraria lá dentro, e o calendário da agenda ficaria esperando atrás.
+CONCORRENCIA = int(os.getenv("DRIVE_UPLOAD_CONCORRENCIA", "2"))
+MAX_TENTATIVAS = 5
+ATRASO_RETENTATIVA_SEGUNDOS = 600
+TRAVADA_APOS_MINUTOS = 30
+MAX_POR_CICLO = 20
+
+FILA = fila_worker.Fila("drive_upload", "Drive", MAX_TENTATIVAS,
+                        ATRASO_RETENTATIVA_SEGUNDOS, TRAVADA_APOS_MINUTOS)
+
+_acordar = asyncio.Event()
+
+
+def acordar():
+    _acordar.set()
+
+
+def _snapshot(call_log) -> dict:
+    return {
+        "local_recording_path": call_log.local_recording_path,
+        "from_number": call_log.from_number,
+        "to_number": call_log.to_number,
+        "duration": call_log.duration or 0,
+        "user_name": call_log.user_name,
+        "created_at": call_log.created_at,
+        "uri": call_log.drive_upload_uri,
+    }
+
+
+async def _reivindicar(db, corte: datetime) -> dict | None:
+    """Trava a próxima gravação da fila e a marca como 'processing'. Não commita."""
+    return await fila_worker.reivindicar(FILA, db, corte, _snapshot)
+
+
+async def _gravar(call_id: int, **valores):
+    """Progresso ou desfecho de um upload, numa sessão própria e curta."""
+    async with async_session() as db:
+        await db.execute(update(CallLog).where(CallLog.id == call_id).values(**valores))
+        await db.commit()
+
+
+def _sessao_expirada(e: Exception) -> bool:
+    """HttpError 404/410 na sessão resumível: o Drive não conhece mais aquele uri."""
+    status = getattr(getattr(e, "resp", None), "status", None)
+    return status in (404, 410)
+
+
+async def _processar(trabalho: dict, agora: datetime) -> str:
+    """Sobe uma gravação já reivindicada. Grava o desfecho e devolve o status."""
+    from app import google_drive as gd
+
+    call_id, caminho = trabalho["id"], trabalho["local_recording_path"]
+
+    async def ao_avancar(uri, enviados):
+        await _gravar(call_id, drive_upload_uri=uri, drive_upload_progress=enviados)
+
+    try:
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"gravação não está no disco: {caminho}")
+        link = await gd.enviar_gravacao(
+            caminho,
+            gd.nome_do_arquivo(trabalho["from_number"], trabalho["to_number"],
+                               trabalho["duration"], trabalho["created_at"]),
+            gd.subpasta_da_consultora(trabalho["user_name"]),
+            uri=trabalho["uri"],
+            ao_avancar=ao_avancar,
+        )
+    except Exception as e:
+        limpar_sessao = {"drive_upload_uri": None, "drive_upload_progress": None} \
+            if _sessao_expirada(e) else {}
+        return await fila_worker.registrar_falha(FILA, _gravar, trabalho, agora, e,
+                                                 sempre=limpar_sessao)
+
+    await _gravar(call_id, drive_file_url=link, drive_upload_status=CONCLUIDO,
+                  drive_upload_error=None, drive_upload_run_at=None,
+                  drive_upload_uri=None)
+    logger.info("☁️ Gravação da ligação %s enviada ao Drive: %s", call_id, link)
+    return CONCLUIDO
+
+
+async def processar_fila(*, agora: datetime | None = None,
+                         concorrencia: int = CONCORRENCIA,
+                         limite: int = MAX_POR_CICLO) -> dict:
+    """Drena a fila com `concorrencia` trabalhadores. Devolve {status: quantidade}."""
+    return await fila_worker.drenar(FILA, async_session, _reivindicar, _processar,
+                                    corte=agora if agora is not None else _agora_sp(),
+                                    concorrencia=concorrencia, limite=limite)
+
+
+async def drive_upload_job():
+    """Loop do worker. Registrado no lifespan de main.py, junto dos outros jobs."""
+    await fila_worker.laco(FILA, _acordar, INTERVALO_SEGUNDOS, processar_fila, "☁️")
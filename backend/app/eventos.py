@@ -0,0 +1,273 @@
+"""Barramento de eventos em tempo real: o que mudou no banco, empurrado para cada tela aberta.
+
+A tela de conversas descobria mensagem nova perguntando: /api/contacts a cada 5s (a query
+LATERAL da inbox, inteira, por SDR), /api/contacts/{wa_id}/messages a cada 3s e o sino a
+cada 15s. Com 10 SDRs logados são ~5 inboxes por segundo, com ou sem mensagem nova — a carga
+do banco crescia com SDRs × frequência, e não com o que acontece.
+
+Agora o banco AVISA:
+
+    INSERT/UPDATE ──► trigger ──► pg_notify('cenat_eventos', json) ──► LISTEN (conexão do
+    (webhook, envios,                 (entregue no COMMIT)               nat_scheduler)
+     NAT, disparo)                                                            │
+                                                                              ▼
+        tela ◄── SSE /api/eventos/stream ◄── fila da conexão ◄── distribuir(evento)
+
+------------------------------------------------------------------------------------------
+POR TRIGGER, NÃO NO CÓDIGO
+------------------------------------------------------------------------------------------
+Mensagem entra e muda de status por meia dúzia de caminhos (webhook, /send/*, NAT, disparo em
+massa, agendadas, welcome) e notificação nasce em cinco lugares. Um trigger por tabela
+(migrate_eventos_tempo_real.py) cobre todos, inclusive os que ainda vão existir, e herda a
+semântica do NOTIFY: só sai no COMMIT. A tela nunca é avisada de uma linha que sofreu
+rollback, e quando o aviso chega a linha já é visível para quem for buscá-la.
+
+Eventos (campo `tipo` do payload):
+  * mensagem    — INSERT em messages: wa_id, id, direction, status, preview (140 chars)
+  * status      — messages.status mudou: wa_id, id, status
+  * notificacao — INSERT em notifications: id, usuario, type, title, wa_id
+  * atribuicao  — contacts.assigned_to mudou: wa_id, atribuido, anterior
+Mensagem, status e atribuição levam `canal` e `atribuido` do contato, que é o que decide
+quem recebe (ver `visivel`). O payload é um DELTA, pequeno de propósito (o NOTIFY tem teto
+de 8000 bytes): a tela usa para saber O QUE recarregar, e recarrega só aquilo.
+
+------------------------------------------------------------------------------------------
+A MESMA CONEXÃO DE LISTEN
+------------------------------------------------------------------------------------------
+Não existe uma terceira conexão dedicada: o canal é escutado pela conexão de
+`nat_scheduler.escutar_agendamentos`, como o nat_config do nat_guard. Num deploy com mais de
+um processo, cada um tem a sua escuta e distribui às telas conectadas NELE — o NOTIFY é o
+fan-out entre processos.
+
+Sem LISTEN (conexão caída, reconectando), evento nenhum chega. Em vez de fingir, o stream
+manda `estado {"tempo_real": false}` e a tela volta ao polling até o `true`; ao voltar, todas
+as telas recebem `resync` e recarregam uma vez, cobrindo o que passou no buraco.
+
+------------------------------------------------------------------------------------------
+FILA POR CONEXÃO, LIMITADA
+------------------------------------------------------------------------------------------
+Cada tela tem uma fila de EVENTOS_FILA eventos. Uma aba em segundo plano, ou uma rede lenta,
+não segura o distribuir nem faz a memória crescer: fila cheia é esvaziada e troca-se tudo por
+um único `resync` — "recarregue o que está na tela", que é o que a tela faria de qualquer jeito
+com 200 deltas atrasados.
+
+------------------------------------------------------------------------------------------
+VERSÕES POR RECURSO (GET condicional, app/respostas.py)
+------------------------------------------------------------------------------------------
+Os mesmos avisos mantêm um contador em memória por recurso listado: a inbox (contatos), as
+mensagens de cada wa_id, os cards do kanban e os leads da Exact. Quem lista devolve a versão
+como ETag; a próxima chamada com If-None-Match igual responde 304 sem tocar no banco.
+
+É correto porque o NOTIFY chega na ORDEM DOS COMMITS e só depois deles: a versão é lida ANTES
+da query principal, então qualquer mudança que a query não viu ainda vai avançar a versão.
+Um max(updated_at) não teria essa garantia — duas transações podem commitar fora da ordem
+dos seus relógios. A versão avança ANTES de o evento ir para as telas: a tela que recarrega
+por causa do evento já pede com a versão nova.
+
+Só vale com a escuta de pé E os triggers instalados (conferidos a cada conexão de LISTEN,
+ver GATILHOS_VERSOES). Sem isso, `versao()` devolve None e as rotas respondem 200 sempre. A
+`geracao` muda quando a escuta cai ou volta: o que passou no buraco invalida todas as ETags.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from app.metrics import Contador, Medidor
+
+logger = logging.getLogger(__name__)
+
+CANAL = "cenat_eventos"
+EVENTOS_FILA = int(os.getenv("EVENTOS_FILA", "200"))
+# Comentário SSE periódico: mantém a conexão viva atrás do nginx e detecta aba fechada.
+PING_SEGUNDOS = float(os.getenv("EVENTOS_PING_SEGUNDOS", "15"))
+
+TIPO_ESTADO = "estado"
+TIPO_RESYNC = "resync"
+
+# Avisos por tabela, sem delta: migrate_versoes_listas.py.
+CANAL_VERSOES = "cenat_versoes"
+RECURSO_CONTATOS = "contatos"
+RECURSO_MENSAGENS = "mensagens"
+RECURSO_KANBAN = "kanban"
+RECURSO_EXACT = "exact"
+RECURSO_DA_TABELA = {
+    "contacts": RECURSO_CONTATOS,
+    "contact_tags": RECURSO_CONTATOS,
+    "tags": RECURSO_CONTATOS,
+    "ai_conversation_summaries": RECURSO_KANBAN,
+    "exact_leads": RECURSO_EXACT,
+}
+# Sem QUALQUER um destes, alguma mudança não avisaria e uma ETag ficaria velha para sempre.
+GATILHOS_VERSOES = (
+    "cenat_eventos_mensagem", "cenat_eventos_status", "cenat_eventos_atribuicao",
+    "cenat_versoes_contacts", "cenat_versoes_contact_tags", "cenat_versoes_tags",
+    "cenat_versoes_ai_conversation_summaries", "cenat_versoes_exact_leads",
+)
+# Um contador por wa_id: passou disto, zera tudo e muda a geração (as ETags antigas morrem).
+MAX_VERSOES = 50_000
+
+
+@dataclass(eq=False)
+class Assinatura:
+    usuario_id: int
+    admin: bool
+    fila: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=EVENTOS_FILA))
+
+
+_assinaturas: set = set()
+_escuta_ativa = False
+_versoes: dict = {}           # (recurso, chave) -> contador
+_geracao = 0
+_gatilhos_ok = False
+
+recebidos = Contador("eventos_recebidos_total", "Eventos vindos do NOTIFY, por tipo.", ("tipo",))
+transbordos = Contador("eventos_resync_total",
+                       "Filas de conexão que encheram e viraram um resync.")
+Medidor("eventos_conexoes", "Telas conectadas ao stream agora.",
+        coletar=lambda: {(): len(_assinaturas)})
+
+
+def visivel(evento: dict, assinatura: Assinatura) -> bool:
+    """A mesma regra da inbox (list_contacts): admin vê tudo, SDR só o que é dele."""
+    tipo = evento.get("tipo")
+    if tipo in (TIPO_ESTADO, TIPO_RESYNC):
+        return True
+    if tipo == "notificacao":
+        return evento.get("usuario") == assinatura.usuario_id
+    if assinatura.admin:
+        return True
+    if tipo == "atribuicao":
+        return assinatura.usuario_id in (evento.get("atribuido"), evento.get("anterior"))
+    return evento.get("atribuido") == assinatura.usuario_id
+
+
+def _entregar(assinatura: Assinatura, evento: dict):
+    try:
+        assinatura.fila.put_nowait(evento)
+    except asyncio.QueueFull:
+        while not assinatura.fila.empty():
+            assinatura.fila.get_nowait()
+        assinatura.fila.put_nowait({"tipo": TIPO_RESYNC})
+        transbordos.inc()
+
+
+def distribuir(evento: dict):
+    for assinatura in list(_assinaturas):
+        if visivel(evento, assinatura):
+            _entregar(assinatura, evento)
+
+
+def assinar(usuario_id: int, admin: bool) -> Assinatura:
+    assinatura = Assinatura(usuario_id=usuario_id, admin=admin)
+    _assinaturas.add(assinatura)
+    _entregar(assinatura, {"tipo": TIPO_ESTADO, "tempo_real": _escuta_ativa})
+    return assinatura
+
+
+def cancelar(assinatura: Assinatura):
+    _assinaturas.discard(assinatura)
+
+
+def versao(recurso: str, chave=None) -> tuple | None:
+    """(geração, contador) do recurso, ou None quando não dá para confiar (ver VERSÕES)."""
+    if not (_escuta_ativa and _gatilhos_ok):
+        return None
+    return _geracao, _versoes.get((recurso, chave), 0)
+
+
+def _avancar(recurso: str, chave=None):
+    global _geracao
+    _versoes[(recurso, chave)] = _versoes.get((recurso, chave), 0) + 1
+    if len(_versoes) > MAX_VERSOES:
+        _versoes.clear()
+        _geracao += 1
+
+
+def ao_notificar(conexao, pid, canal, payload):
+    """Callback do LISTEN em CANAL (roda no event loop)."""
+    try:
+        evento = json.loads(payload)
+        tipo = evento["tipo"]
+    except (TypeError, ValueError, KeyError):
+        logger.warning("⚠️ Eventos: NOTIFY com payload ilegível: %r", payload)
+        return
+    recebidos.inc(tipo=tipo)
+    if tipo in ("mensagem", "status", "atribuicao"):
+        _avancar(RECURSO_CONTATOS)
+    if tipo in ("mensagem", "status"):
+        _avancar(RECURSO_MENSAGENS, evento.get("wa_id"))
+    distribuir(evento)
+
+
+def ao_notificar_tabela(conexao, pid, canal, payload):
+    """Callback do LISTEN em CANAL_VERSOES: payload é o nome da tabela que mudou."""
+    recurso = RECURSO_DA_TABELA.get(payload)
+    if recurso is None:
+        logger.warning("⚠️ Eventos: NOTIFY de versão de tabela desconhecida: %r", payload)
+        return
+    _avancar(recurso)
+
+
+async def conferir_gatilhos(conexao) -> bool:
+    """Liga as versões só se TODOS os triggers de GATILHOS_VERSOES estiverem instalados."""
+    global _gatilhos_ok
+    instalados = await conexao.fetchval(
+        "SELECT count(DISTINCT tgname) FROM pg_trigger WHERE tgname = ANY($1::text[])",
+        list(GATILHOS_VERSOES))
+    _gatilhos_ok = instalados == len(GATILHOS_VERSOES)
+    if not _gatilhos_ok:
+        logger.warning("⚠️ Eventos: %s de %s triggers de versão instalados — GET condicional "
+                       "desligado (rode migrate_eventos_tempo_real.py e "
+                       "migrate_versoes_listas.py)", instalados, len(GATILHOS_VERSOES))
+    return _gatilhos_ok
+
+
+def escuta(ativa: bool):
+    """Ligado/desligado pela conexão de LISTEN do nat_scheduler. Avisa as telas da mudança."""
+    global _escuta_ativa, _geracao
+    if ativa == _escuta_ativa:
+        return
+    _escuta_ativa = ativa
+    _geracao += 1
+    distribuir({"tipo": TIPO_ESTADO, "tempo_real": ativa})
+    if ativa:
+        distribuir({"tipo": TIPO_RESYNC})
+
+
+def formatar_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+async def fluxo(usuario_id: int, admin: bool, conferir=None):
+    """Corpo do stream SSE de uma tela. Termina quando o cliente desconecta (cancelamento).
+
+    A assinatura nasce aqui dentro, e não no endpoint, para que só exista enquanto houver
+    alguém lendo — e o `finally` a remova em qualquer saída.
+
+    `conferir()` (async, devolve bool) roda no máximo a cada PING_SEGUNDOS, com ou sem evento
+    no meio: o stream é autenticado uma vez, na abertura, e vive o quanto a aba viver. Sem a
+    reconferência, um usuário desativado (ou com a sessão revogada) seguiria recebendo os
+    eventos. False encerra o stream.
+    """
+    assinatura = assinar(usuario_id, admin)
+    try:
+        yield "retry: 5000\n\n"
+        conferido = time.monotonic()
+        while True:
+            try:
+                evento = await asyncio.wait_for(assinatura.fila.get(), PING_SEGUNDOS)
+                saida = formatar_sse(evento)
+            except asyncio.TimeoutError:
+                saida = ": ping\n\n"
+            if conferir is not None and time.monotonic() - conferido >= PING_SEGUNDOS:
+                if not await conferir():
+                    logger.info("🔒 Eventos: sessão do usuário %s não vale mais, stream encerrado",
+                                usuario_id)
+                    return
+                conferido = time.monotonic()
+            yield saida
+    finally:
+        cancelar(assinatura)
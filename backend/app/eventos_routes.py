@@ -0,0 +1,52 @@
+"""Stream de eventos em tempo real para as telas (ver app/eventos.py).
+
+    POST /api/eventos/ticket                 {"ticket", "expira_em"}   (Bearer no header)
+    GET  /api/eventos/stream?ticket=<ticket>  text/event-stream
+
+O EventSource do navegador não manda header Authorization, então alguma credencial vai na
+query — e a query vai parar no access log. Por isso ela é um ticket de 60s e uso único (ver
+TICKET DO STREAM DE EVENTOS em app/auth.py), nunca o JWT da sessão. Cada reconexão pede um
+ticket novo.
+
+O usuário é carregado numa sessão própria, fechada ANTES de o stream começar: um Depends(get_db)
+seguraria uma conexão do pool pela vida inteira da aba — dez SDRs logados secariam o pool. A
+reconferência periódica (usuário ainda ativo, sessão não revogada) abre e fecha a sua, e na
+maior parte das vezes nem chega ao banco: sai do cache de usuários do auth.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app import eventos
+from app.auth import (TICKET_EVENTOS_SEGUNDOS, criar_ticket_eventos, get_current_user,
+                      usuario_da_sessao, usuario_do_ticket)
+from app.database import async_session
+from app.models import User
+
+router = APIRouter(prefix="/api/eventos", tags=["eventos"])
+
+
+@router.post("/ticket")
+async def ticket_eventos(current_user: User = Depends(get_current_user)):
+    return {"ticket": criar_ticket_eventos(current_user), "expira_em": TICKET_EVENTOS_SEGUNDOS}
+
+
+@router.get("/stream")
+async def stream_eventos(ticket: str = Query(...)):
+    async with async_session() as db:
+        usuario = await usuario_do_ticket(ticket, db)
+    usuario_id, versao = usuario.id, usuario.token_version or 0
+
+    async def conferir() -> bool:
+        try:
+            async with async_session() as db:
+                await usuario_da_sessao(usuario_id, versao, db)
+        except HTTPException:
+            return False
+        return True
+
+    return StreamingResponse(
+        eventos.fluxo(usuario_id, usuario.role == "admin", conferir),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: o nginx não segura os eventos esperando encher o buffer.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,28 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.eventos import RECURSO_EXACT
+from app.metrics import cliente_http
 from app.models import ExactLead, CourseAlias
-from app.exact_spotter import sync_exact_leads, get_auto_welcome_config
+from app.exact_spotter import sync_exact_leads, get_auto_welcome_config, BASE_URL as EXACT_URL
 # Movida para modulo neutro (quebra o import circular com exact_spotter).
 # Re-export: quem ja importava daqui continua funcionando, comportamento identico.
 from app.course_names import resolve_course_name
 # Trava unica do template de boas-vindas — a MESMA usada em /send/template e /scheduled-messages.
 from app.welcome_guard import bloquear_se_boas_vindas
+from app.respostas import etag_lista, nao_modificado, com_etag
 
 router = APIRouter(prefix="/api/exact-leads", tags=["exact-leads"])
 
 
 @router.get("")
 async def list_exact_leads(
+    request: Request,
     stage: str = None,
     sub_source: str = None,
     funnel_id: int = None,
     search: str = None,
     limit: int = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
+    etag = etag_lista(db, RECURSO_EXACT, None, stage, sub_source, funnel_id, search, limit)
+    nao_mudou = nao_modificado(request, etag, "exact_leads")
+    if nao_mudou:
+        return nao_mudou
+
     query = select(ExactLead).order_by(ExactLead.register_date.desc())
 
     if stage:
@@ -41,7 +50,7 @@ async def list_exact_leads(
     result = await db.execute(query)
     leads = result.scalars().all()
 
-    return [
+    return com_etag([
         {
             "id": l.id,
             "exact_id": l.exact_id,
@@ -58,7 +67,7 @@ async def list_exact_leads(
             "synced_at": l.synced_at.isoformat() if l.synced_at else None,
         }
         for l in leads
-    ]
+    ], etag)
 
 
 @router.post("/sync")
@@ -68,7 +77,7 @@ async def trigger_sync(db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/stats")
-async def exact_leads_stats(db: AsyncSession = Depends(get_db)):
+async def exact_leads_stats(db: AsyncSession = Depends(get_read_db)):
     total = await db.execute(select(func.count(ExactLead.id)))
     total = total.scalar()
 
@@ -98,15 +107,14 @@ async def exact_leads_stats(db: AsyncSession = Depends(get_db)):
 @router.get("/funnels")
 async def list_funnels():
     """Proxy read-only do Exact /Funnels. Retorna [{id, name}] pro front montar o filtro."""
-    import httpx
     import os
 
     headers = {
         "Content-Type": "application/json",
         "token_exact": os.getenv("EXACT_SPOTTER_TOKEN"),
     }
-    async with httpx.AsyncClient(timeout=30) as client:
-        res = await client.get("https://api.exactspotter.com/v3/Funnels", headers=headers)
+    async with cliente_http("exact", timeout=30) as client:
+        res = await client.get(f"{EXACT_URL}/Funnels", headers=headers)
         data = res.json()
 
     return [
@@ -117,16 +125,15 @@ async def list_funnels():
 
 @router.get("/{exact_id}/details")
 async def get_lead_details(exact_id: int):
-    import httpx
     import os
 
     headers = {
         "Content-Type": "application/json",
         "token_exact": os.getenv("EXACT_SPOTTER_TOKEN")
     }
-    base = "https://api.exactspotter.com/v3"
+    base = EXACT_URL
 
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with cliente_http("exact", timeout=30) as client:
         # Lead
         lead_res = await client.get(f"{base}/Leads", headers=headers, params={"$filter": f"id eq {exact_id}"})
         lead_data = lead_res.json().get("value", [])
@@ -391,6 +398,7 @@ async def bulk_send_template(
                     content=content_text,
                     timestamp=datetime.now(SP_TZ).replace(tzinfo=None),
                     status="sent",
+                    template_name=template_name,
                 )
                 db.add(msg)
                 sent += 1
@@ -1,5 +1,5 @@
+import logging
 import os
-import httpx
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -7,8 +7,11 @@ from app.models import ExactLead, Contact, Channel, Message, AIConversationSumma
 from app.whatsapp import send_template_message
 from app.course_names import resolve_course_name
 from app.date_parse import parse_datetime
+from app.metrics import cliente_http
 
-BASE_URL = "https://api.exactspotter.com/v3"
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("EXACT_BASE_URL", "https://api.exactspotter.com/v3")
 
 # Canal, template e idioma da boas-vindas vêm de auto_welcome_config (tela), NÃO de constante.
 # As antigas AI_CHANNEL_ID=2 / AUTO_TEMPLATE_NAME="mensagens_de_boas_vindas" foram removidas:
@@ -57,7 +60,7 @@ async def add_timeline_comment(lead_id: int, text: str, *, timeout: float = 15):
     de mensagens de todos os leads por 15s.
     """
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
+        async with cliente_http("exact", timeout=timeout) as client:
             response = await client.post(
                 f"{BASE_URL}/timelineAdd",
                 headers=get_headers(),
@@ -68,13 +71,13 @@ async def add_timeline_comment(lead_id: int, text: str, *, timeout: float = 15):
                 },
             )
             if response.status_code in (200, 201):
-                print(f"✅ Timeline atualizada para lead {lead_id}")
+                logger.info("✅ Timeline atualizada para lead %s", lead_id)
                 return True
             else:
-                print(f"❌ Erro timeline: {response.status_code} - {response.text}")
+                logger.error("❌ Erro timeline: %s - %s", response.status_code, response.text)
                 return False
     except Exception as e:
-        print(f"❌ Erro ao inserir timeline: {e}")
+        logger.error("❌ Erro ao inserir timeline: %s", e)
         return False
 
 
@@ -87,7 +90,7 @@ def get_headers():
 
 async def fetch_leads_from_exact(skip: int = 0, top: int = 500):
     """Busca leads do Exact Spotter com paginação."""
-    async with httpx.AsyncClient(timeout=30) as client:
+    async with cliente_http("exact", timeout=30) as client:
         response = await client.get(
             f"{BASE_URL}/Leads",
             headers=get_headers(),
@@ -278,6 +281,7 @@ async def send_welcome_to_new_lead(lead_data: dict, db: AsyncSession, config, *,
                      or f"[Template] {name}, {course}"),
             timestamp=datetime.now(SP_TZ).replace(tzinfo=None),
             status="sent",
+            template_name=template_name,
         ))
 
         # Card no Kanban — checar duplicata antes (protege o reenvio manual com force=True).
@@ -323,15 +327,16 @@ async def send_welcome_to_new_lead(lead_data: dict, db: AsyncSession, config, *,
                 from app.nat_flow import iniciar_fluxo_nat
                 await iniciar_fluxo_nat(lead_row if lead_row is not None else lead_data, db)
         except Exception as e:
-            print(f"⚠️  NAT: fluxo não iniciado para {phone}: {type(e).__name__}: {e}")
+            logger.warning("⚠️  NAT: fluxo não iniciado para %s: %s: %s",
+                           phone, type(e).__name__, e)
 
-        print(f"🤖 Boas-vindas enviada para {name} ({phone}) - Curso: {course}")
+        logger.info("🤖 Boas-vindas enviada para %s (%s) - Curso: %s", name, phone, course)
         return result("sent", "ok")
 
     except Exception as e:
         detail = str(e)
         stamp("failed", detail[:1000])
-        print(f"❌ Erro ao enviar welcome para {name}: {detail}")
+        logger.error("❌ Erro ao enviar welcome para %s: %s", name, detail)
         return result("failed", "exception", detail)
 
 
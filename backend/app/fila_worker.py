@@ -0,0 +1,197 @@
+"""Esqueleto das filas de trabalho longo em call_logs: transcrição e upload ao Drive.
+
+transcription_worker.py e drive_uploader.py são a mesma fila com trabalho diferente. Cada uma
+tem o seu grupo de colunas em call_logs com o mesmo sufixo — `<prefixo>_status`, `_run_at`,
+`_started_at`, `_attempts`, `_error` — e tudo que não é o trabalho em si mora aqui: reivindicar,
+retentar, desistir, drenar com concorrência limitada e o laço que dorme até ser acordado.
+
+------------------------------------------------------------------------------------------
+ESTADOS (<prefixo>_status)
+------------------------------------------------------------------------------------------
+  pending     na fila. run_at NULL = já; preenchido = retentativa adiada
+  processing  reivindicada por um trabalhador, que está no trabalho agora
+  done        concluída
+  error       `max_tentativas` esgotadas. Sai da fila; só um humano re-enfileira.
+
+------------------------------------------------------------------------------------------
+REIVINDICAÇÃO
+------------------------------------------------------------------------------------------
+`SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1` + UPDATE para 'processing' + COMMIT, numa
+transação CURTA — o mesmo SKIP LOCKED do nat_scheduler, mas com uma diferença importante: lá
+a ação roda DENTRO da transação que travou a linha, porque dura milissegundos. Aqui o
+trabalho dura minutos e fala com a OpenAI ou com o Drive; segurar uma transação (e uma conexão
+do pool) aberta por minutos seria trocar um worker do uvicorn preso por uma conexão presa.
+Então a posse da linha é o próprio status 'processing', gravado e commitado antes de começar.
+
+O preço disso é o processo poder morrer com a linha em 'processing'. Por isso uma linha em
+'processing' há mais de `travada_apos_minutos` também é reivindicável — conta como tentativa,
+porque o motivo da morte pode ter sido a própria gravação.
+
+------------------------------------------------------------------------------------------
+CONCORRÊNCIA
+------------------------------------------------------------------------------------------
+`concorrencia` trabalhadores, cada um reivindicando UMA ligação por vez até a fila esvaziar
+(ou as vagas do ciclo acabarem). Não é "pega um lote e espera o lote todo": uma ligação de 40
+minutos não segura as outras atrás dela.
+
+------------------------------------------------------------------------------------------
+RETENTATIVA
+------------------------------------------------------------------------------------------
+Falhou → attempts já foi incrementado na reivindicação; se ainda há tentativas, volta para
+'pending' com run_at = agora + `atraso_retentativa_segundos` (mesmo mecanismo do
+nat_scheduler: empurrar o run_at é o que impede a retentativa de queimar na mesma passada).
+Na última vira 'error' com o motivo em <prefixo>_error. Gravação sumida do disco não adianta
+retentar: vai direto para 'error'.
+
+As funções recebem a sessão, o `_reivindicar` e o `_gravar` de quem chama, em vez de
+importá-los: cada worker continua dono do seu módulo (e os testes trocam as peças de um sem
+mexer no outro).
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from app.models import CallLog
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = "pending"
+PROCESSANDO = "processing"
+CONCLUIDA = "done"
+ERRO = "error"
+
+
+@dataclass(frozen=True)
+class Fila:
+    prefixo: str                    # "transcription" -> transcription_status, ...
+    rotulo: str                     # como a fila aparece nos logs
+    max_tentativas: int
+    atraso_retentativa_segundos: int
+    travada_apos_minutos: int
+
+    def coluna(self, nome: str):
+        return getattr(CallLog, f"{self.prefixo}_{nome}")
+
+    def valores(self, **valores) -> dict:
+        return {f"{self.prefixo}_{nome}": valor for nome, valor in valores.items()}
+
+
+async def reivindicar(fila: Fila, db, corte: datetime, snapshot) -> dict | None:
+    """Trava a próxima ligação da fila e a marca como 'processing'. Não commita.
+
+    `snapshot(call_log)` copia para um dict o que o trabalho precisa: ele roda DEPOIS do
+    commit, com a sessão fechada, e um objeto ORM ali recarregaria de forma lazy. O dict
+    devolvido ganha "id" e "attempts" (já contando esta).
+    """
+    travada = corte - timedelta(minutes=fila.travada_apos_minutos)
+    res = await db.execute(
+        select(CallLog)
+        .where(CallLog.local_recording_path.isnot(None),
+               or_(and_(fila.coluna("status") == PENDENTE,
+                        or_(fila.coluna("run_at").is_(None),
+                            fila.coluna("run_at") <= corte)),
+                   and_(fila.coluna("status") == PROCESSANDO,
+                        fila.coluna("started_at") < travada)))
+        .order_by(CallLog.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    call_log = res.scalar_one_or_none()
+    if call_log is None:
+        return None
+
+    trabalho = snapshot(call_log)
+    trabalho["id"] = call_log.id
+    trabalho["attempts"] = (getattr(call_log, f"{fila.prefixo}_attempts") or 0) + 1
+    await db.execute(
+        update(CallLog).where(CallLog.id == trabalho["id"]).values(
+            **fila.valores(status=PROCESSANDO, started_at=corte,
+                           attempts=trabalho["attempts"], error=None))
+    )
+    return trabalho
+
+
+async def registrar_falha(fila: Fila, gravar, trabalho: dict, agora: datetime, erro: Exception,
+                          *, sempre: dict | None = None, ao_desistir: dict | None = None) -> str:
+    """Desfecho de uma tentativa que falhou: 'pending' adiado ou, na última, 'error'.
+
+    `sempre` entra nos dois desfechos; `ao_desistir`, só no 'error'. Devolve o status gravado.
+    """
+    motivo = f"{type(erro).__name__}: {erro}"
+    definitivo = isinstance(erro, FileNotFoundError) or trabalho["attempts"] >= fila.max_tentativas
+    if definitivo:
+        await gravar(trabalho["id"], **fila.valores(status=ERRO, error=motivo),
+                     **(sempre or {}), **(ao_desistir or {}))
+        logger.warning("⛔ %s: ligação %s falhou na tentativa %s/%s — desistindo. %s",
+                       fila.rotulo, trabalho["id"], trabalho["attempts"], fila.max_tentativas,
+                       motivo)
+        return ERRO
+    proxima = agora + timedelta(seconds=fila.atraso_retentativa_segundos)
+    await gravar(trabalho["id"], **fila.valores(status=PENDENTE, error=motivo, run_at=proxima),
+                 **(sempre or {}))
+    logger.warning("⚠️  %s: ligação %s falhou na tentativa %s/%s, nova tentativa às %s. %s",
+                   fila.rotulo, trabalho["id"], trabalho["attempts"], fila.max_tentativas,
+                   proxima.strftime("%H:%M:%S"), motivo)
+    return PENDENTE
+
+
+async def _trabalhador(fila: Fila, sessao, reivindicar_um, processar, corte: datetime,
+                       resumo: dict, vagas: list):
+    """Reivindica e processa uma ligação por vez até a fila (ou as vagas do ciclo) acabar."""
+    while vagas[0] > 0:
+        vagas[0] -= 1
+        try:
+            async with sessao() as db:
+                trabalho = await reivindicar_um(db, corte)
+                await db.commit()
+        except Exception as e:
+            logger.error("❌ %s: erro ao reivindicar: %s: %s", fila.rotulo, type(e).__name__, e)
+            resumo["erro"] = resumo.get("erro", 0) + 1
+            return
+        if trabalho is None:
+            return
+        try:
+            status = await processar(trabalho, corte)
+        except Exception as e:
+            # Falha ao GRAVAR o desfecho. A linha fica em 'processing' e volta à fila como
+            # travada depois de travada_apos_minutos — nada se perde.
+            logger.error("❌ %s: erro ao gravar ligação %s: %s: %s",
+                         fila.rotulo, trabalho["id"], type(e).__name__, e)
+            status = "erro"
+        resumo[status] = resumo.get(status, 0) + 1
+
+
+async def drenar(fila: Fila, sessao, reivindicar_um, processar, *, corte: datetime,
+                 concorrencia: int, limite: int) -> dict:
+    """Drena a fila com `concorrencia` trabalhadores, no máximo `limite` ligações no ciclo.
+
+    `reivindicar_um(db, corte)` e `processar(trabalho, corte)` são os do worker. Devolve
+    {status: quantidade}.
+    """
+    resumo: dict = {}
+    vagas = [limite]
+    await asyncio.gather(*(_trabalhador(fila, sessao, reivindicar_um, processar, corte,
+                                        resumo, vagas)
+                           for _ in range(max(concorrencia, 1))))
+    return resumo
+
+
+async def laco(fila: Fila, acordar: asyncio.Event, intervalo_segundos: int, processar_fila,
+               emoji: str):
+    """Loop de um worker: dorme até `intervalo_segundos` OU até alguém acordar — o que vier
+    primeiro — e drena a fila."""
+    while True:
+        try:
+            await asyncio.wait_for(acordar.wait(), timeout=intervalo_segundos)
+        except asyncio.TimeoutError:
+            pass
+        acordar.clear()
+        try:
+            resumo = await processar_fila()
+            if resumo:
+                logger.info("%s %s: %s", emoji, fila.rotulo, resumo)
+        except Exception as e:
+            logger.error("❌ %s: erro no ciclo da fila: %s: %s", fila.rotulo, type(e).__name__, e)
@@ -1,10 +1,13 @@
-import os
-from datetime import datetime, timedelta
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import asyncio
+import logging
+import time as _time
+from datetime import date, datetime, time, timedelta, timezone
+
+from app.google_executor import executar, servico
+
+logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
-CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), "..", "google-credentials.json")
 
 # Calendários das consultoras
 CALENDARS = {
@@ -16,63 +19,160 @@ CALENDARS = {
 
 
 def get_service():
-    """Cria serviço autenticado do Google Calendar."""
-    credentials = service_account.Credentials.from_service_account_file(
-        CREDENTIALS_PATH, scopes=SCOPES
-    )
-    return build("calendar", "v3", credentials=credentials)
-
-
-async def get_busy_slots(calendar_id: str, date_str: str):
-    """Retorna horários ocupados de um dia específico."""
-    service = get_service()
-    date = datetime.strptime(date_str, "%Y-%m-%d")
-    time_min = date.replace(hour=8, minute=0).isoformat() + "-03:00"
-    time_max = date.replace(hour=18, minute=0).isoformat() + "-03:00"
-
-    body = {
-        "timeMin": time_min,
-        "timeMax": time_max,
-        "timeZone": "America/Sao_Paulo",
-        "items": [{"id": calendar_id}],
-    }
-    result = service.freebusy().query(body=body).execute()
-    busy = result["calendars"][calendar_id]["busy"]
-    return busy
+    """Cliente do Google Calendar desta thread (ver google_executor). Só dentro de `executar`."""
+    return servico("calendar", "v3", SCOPES)
 
 
-async def get_available_slots(calendar_id: str, date_str: str, duration_min: int = 30):
-    """Retorna horários livres de um dia (slots de 30 min, das 8h às 18h)."""
-    busy = await get_busy_slots(calendar_id, date_str)
-    date = datetime.strptime(date_str, "%Y-%m-%d")
+def _consultar_freebusy(body: dict) -> dict:
+    return get_service().freebusy().query(body=body).execute()
 
-    # Gerar todos os slots possíveis (8h-18h)
-    slots = []
-    current = date.replace(hour=8, minute=0, second=0)
-    end_of_day = date.replace(hour=18, minute=0, second=0)
-
-    while current + timedelta(minutes=duration_min) <= end_of_day:
-        slot_end = current + timedelta(minutes=duration_min)
-        is_free = True
-        for b in busy:
-            busy_start = datetime.fromisoformat(b["start"].replace("Z", "+00:00")).replace(tzinfo=None) + timedelta(hours=-3)
-            busy_end = datetime.fromisoformat(b["end"].replace("Z", "+00:00")).replace(tzinfo=None) + timedelta(hours=-3)
-            if current < busy_end and slot_end > busy_start:
-                is_free = False
-                break
-        if is_free:
-            slots.append({
-                "start": current.strftime("%H:%M"),
-                "end": slot_end.strftime("%H:%M"),
-            })
-        current += timedelta(minutes=duration_min)
 
+def _inserir_evento(calendar_id: str, event: dict) -> dict:
+    return get_service().events().insert(calendarId=calendar_id, body=event).execute()
+
+
+# ------------------------------------------------------------------------------------------
+# DISPONIBILIDADE
+# ------------------------------------------------------------------------------------------
+# Antes: get_available_dates chamava get_available_slots dia a dia — até 12 freebusy em
+# sequência, cada um reconstruindo o serviço — e cada slot varria a lista inteira de
+# ocupados, reparseando as datas. A página de agenda levava segundos.
+#
+# Agora:
+#   * UM freebusy cobre a janela inteira (todos os dias) para TODAS as consultoras de
+#     CALENDARS de uma vez;
+#   * os ocupados de cada agenda são convertidos para horário de SP, ordenados e mesclados
+#     UMA vez (`_mesclar`), e os slots saem de uma varredura linear (`_varrer`);
+#   * o resultado fica em cache por CACHE_TTL_SEGUNDOS. create_event invalida — inclusive o
+#     do /book — e o /book confere o horário com usar_cache=False antes de gravar, para não
+#     marcar em cima de um evento criado direto no Google nos últimos segundos.
+
+HORA_INICIO = 8
+HORA_FIM = 18
+CACHE_TTL_SEGUNDOS = 60
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]
+SP_TZ = timezone(timedelta(hours=-3))
+
+# {"inicio": date, "fim": date, "agendas": frozenset, "expira": monotonic, "ocupados": {...}}
+_cache: dict = {}
+# Invalidação durante uma consulta em voo: a consulta que começou ANTES do create_event não
+# pode gravar no cache o resultado velho que trouxe.
+_geracao = 0
+_trava = asyncio.Lock()
+
+
+def invalidar_disponibilidade():
+    global _geracao
+    _geracao += 1
+    _cache.clear()
+
+
+def _para_sp(valor: str) -> datetime:
+    """ISO do Google (Z ou com offset) -> datetime naive em horário de SP."""
+    return datetime.fromisoformat(valor.replace("Z", "+00:00")).astimezone(SP_TZ).replace(tzinfo=None)
+
+
+def _mesclar(intervalos: list[tuple[datetime, datetime]]) -> list[tuple[datetime, datetime]]:
+    """Ordena e funde sobrepostos/encostados: [(9,10), (9:30,11), (11,12)] -> [(9,12)]."""
+    mesclados: list[list[datetime]] = []
+    for inicio, fim in sorted(intervalos):
+        if mesclados and inicio <= mesclados[-1][1]:
+            if fim > mesclados[-1][1]:
+                mesclados[-1][1] = fim
+        else:
+            mesclados.append([inicio, fim])
+    return [(a, b) for a, b in mesclados]
+
+
+def _varrer(ocupados: list[tuple[datetime, datetime]], dia: date,
+            duration_min: int = 30) -> list[dict]:
+    """Slots livres de `dia` (grade de duration_min a partir de HORA_INICIO).
+
+    `ocupados` vem mesclado e ordenado, então um ponteiro só anda para a frente: cada
+    intervalo é olhado uma vez no dia inteiro, em vez de uma vez por slot.
+    """
+    passo = timedelta(minutes=duration_min)
+    atual = datetime.combine(dia, time(HORA_INICIO))
+    fim_do_dia = datetime.combine(dia, time(HORA_FIM))
+    j = 0
+    slots = []
+    while atual + passo <= fim_do_dia:
+        slot_fim = atual + passo
+        while j < len(ocupados) and ocupados[j][1] <= atual:
+            j += 1
+        if j == len(ocupados) or ocupados[j][0] >= slot_fim:
+            slots.append({"start": atual.strftime("%H:%M"), "end": slot_fim.strftime("%H:%M")})
+        atual = slot_fim
     return slots
 
 
+async def _ocupados(inicio: date, fim: date, extra: str | None = None,
+                    usar_cache: bool = True) -> dict[str, list[tuple[datetime, datetime]]]:
+    """{calendar_id: ocupados mesclados} de TODAS as agendas, de `inicio` a `fim` (inclusive).
+
+    Uma consulta freebusy só. `extra` é uma agenda fora de CALENDARS que alguém pediu.
+    """
+    agendas = frozenset([c["calendar_id"] for c in CALENDARS.values()] + ([extra] if extra else []))
+    async with _trava:
+        c = _cache
+        if (usar_cache and c and c["inicio"] <= inicio and fim <= c["fim"]
+                and agendas <= c["agendas"] and _time.monotonic() < c["expira"]):
+            return c["ocupados"]
+
+        geracao = _geracao
+        body = {
+            "timeMin": datetime.combine(inicio, time(HORA_INICIO)).isoformat() + "-03:00",
+            "timeMax": datetime.combine(fim, time(HORA_FIM)).isoformat() + "-03:00",
+            "timeZone": "America/Sao_Paulo",
+            "items": [{"id": a} for a in sorted(agendas)],
+        }
+        result = await executar(_consultar_freebusy, body)
+        ocupados = {
+            a: _mesclar([(_para_sp(b["start"]), _para_sp(b["end"]))
+                         for b in result.get("calendars", {}).get(a, {}).get("busy", [])])
+            for a in agendas
+        }
+        if geracao == _geracao:
+            _cache.clear()
+            _cache.update(inicio=inicio, fim=fim, agendas=agendas, ocupados=ocupados,
+                          expira=_time.monotonic() + CACHE_TTL_SEGUNDOS)
+        return ocupados
+
+
+def _dias_uteis(hoje: date, days_ahead: int) -> list[date]:
+    """Os dias úteis candidatos que get_available_dates sempre olhou: amanhã até +days_ahead+7."""
+    dias = (hoje + timedelta(days=i) for i in range(1, days_ahead + 8))
+    return [d for d in dias if d.weekday() < 5]
+
+
+async def get_busy_slots(calendar_id: str, date_str: str, usar_cache: bool = True):
+    """Retorna horários ocupados de um dia específico (mesclados, em horário de SP)."""
+    dia = datetime.strptime(date_str, "%Y-%m-%d").date()
+    ocupados = (await _ocupados(dia, dia, calendar_id, usar_cache))[calendar_id]
+    return [{"start": a.isoformat() + "-03:00", "end": b.isoformat() + "-03:00"}
+            for a, b in ocupados if a.date() <= dia <= b.date()]
+
+
+async def get_available_slots(calendar_id: str, date_str: str, duration_min: int = 30,
+                              usar_cache: bool = True):
+    """Retorna horários livres de um dia (slots de 30 min, das 8h às 18h).
+
+    Com o cache quente (a página de agenda acabou de pedir as datas), não vai ao Google.
+    """
+    dia = datetime.strptime(date_str, "%Y-%m-%d").date()
+    if usar_cache and _cache:
+        # Cache da janela inteira cobre o dia: aproveita em vez de uma consulta de um dia só.
+        inicio, fim = min(dia, _cache["inicio"]), max(dia, _cache["fim"])
+        if (fim - inicio).days > 31:
+            inicio = fim = dia
+    else:
+        inicio = fim = dia
+    ocupados = (await _ocupados(inicio, fim, calendar_id, usar_cache))[calendar_id]
+    return _varrer(ocupados, dia, duration_min)
+
+
 async def create_event(calendar_id: str, summary: str, description: str, start_dt: datetime, end_dt: datetime):
-    """Cria evento no Google Calendar."""
-    service = get_service()
+    """Cria evento no Google Calendar (e invalida o cache de disponibilidade)."""
     event = {
         "summary": summary,
         "description": description,
@@ -85,25 +185,26 @@ async def create_event(calendar_id: str, summary: str, description: str, start_d
             "timeZone": "America/Sao_Paulo",
         },
     }
-    result = service.events().insert(calendarId=calendar_id, body=event).execute()
-    print(f"✅ Evento criado: {result.get('htmlLink')}")
+    result = await executar(_inserir_evento, calendar_id, event)
+    invalidar_disponibilidade()
+    logger.info("✅ Evento criado: %s", result.get('htmlLink'))
     return result
 
 
-async def get_available_dates(calendar_id: str, days_ahead: int = 5):
-    """Retorna os próximos dias com horários disponíveis."""
+async def get_available_dates(calendar_id: str, days_ahead: int = 5, agora: datetime | None = None):
+    """Retorna os próximos dias com horários disponíveis. Uma consulta ao Google, no máximo."""
+    dias = _dias_uteis((agora or datetime.now()).date(), days_ahead)
+    if not dias:
+        return []
+    ocupados = (await _ocupados(dias[0], dias[-1], calendar_id))[calendar_id]
+
     available = []
-    today = datetime.now()
-    for i in range(1, days_ahead + 8):
-        date = today + timedelta(days=i)
-        if date.weekday() >= 5:  # Pula sábado e domingo
-            continue
-        date_str = date.strftime("%Y-%m-%d")
-        slots = await get_available_slots(calendar_id, date_str)
+    for dia in dias:
+        slots = _varrer(ocupados, dia)
         if slots:
             available.append({
-                "date": date_str,
-                "weekday": ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"][date.weekday()],
+                "date": dia.strftime("%Y-%m-%d"),
+                "weekday": DIAS_SEMANA[dia.weekday()],
                 "slots_count": len(slots),
                 "first_slot": slots[0]["start"],
                 "last_slot": slots[-1]["start"],
@@ -116,9 +217,10 @@ async def get_available_dates(calendar_id: str, days_ahead: int = 5):
 async def detect_and_create_event(ai_response: str, conversation_history: list, lead_name: str, lead_phone: str, lead_course: str, dry_run: bool = False):
     """Detecta se houve agendamento na resposta e cria evento no Google Calendar."""
     from openai import AsyncOpenAI
+    from app.metrics import http_client_openai
     import json
     
-    client = AsyncOpenAI()
+    client = AsyncOpenAI(http_client=http_client_openai())
     
     # Pedir ao GPT para extrair data/hora se houver agendamento
     try:
@@ -146,7 +248,8 @@ O ano atual é 2026. Responda APENAS com JSON, sem markdown."""},
         
         if result.get("agendado") and result.get("data") and result.get("hora"):
             if dry_run:
-                print(f"🧪 [dry_run] Agendamento detectado, evento NÃO criado: {result['data']} {result['hora']}")
+                logger.info("🧪 [dry_run] Agendamento detectado, evento NÃO criado: %s %s",
+                            result['data'], result['hora'])
                 return {"agendamento_detectado": True, "data": result["data"], "hora": result["hora"]}
             from datetime import datetime, timedelta
             
@@ -158,10 +261,10 @@ O ano atual é 2026. Responda APENAS com JSON, sem markdown."""},
             description = f"Lead: {lead_name}\nTelefone: {lead_phone}\nCurso: {lead_course}\nAgendado pela IA Nat"
             
             event = await create_event(cal_id, summary, description, start_dt, end_dt)
-            print(f"Evento criado automaticamente: {result['data']} {result['hora']}")
+            logger.info("Evento criado automaticamente: %s %s", result['data'], result['hora'])
             return event
     except Exception as e:
-        print(f"⚠️ Erro ao detectar/criar evento: {e}")
+        logger.warning("⚠️ Erro ao detectar/criar evento: %s", e)
 
     if dry_run:
         return {"agendamento_detectado": False}
@@ -1,32 +1,51 @@
+import logging
 import os
-import httpx
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaInMemoryUpload
+import threading
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
 from datetime import datetime
 
-CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), "..", "google-credentials.json")
+from app.google_executor import executar, http_autorizado, servico
+
+logger = logging.getLogger(__name__)
+
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 DRIVE_FOLDER_NAME = "Gravações CENAT"
 
-_drive_service = None  # reset cache
+# Upload resumível: o arquivo sai do disco em pedaços de PEDACO_UPLOAD (a API exige múltiplo
+# de 256 KB), cada pedaço numa chamada própria ao executor, com timeout próprio. Nenhum
+# momento tem a gravação inteira na memória, e uma falha no meio perde só o pedaço em voo.
+PEDACO_UPLOAD = 4 * 1024 * 1024
+TIMEOUT_PEDACO = 120
+# A limpeza diária percorre todas as subpastas.
+TIMEOUT_LIMPEZA = 1800
+
 _folder_id = "1-xXfqt_pgwqSZwXCQO3LpTeAtXd_hmMl"
 
+# (nome, pai) -> id. Pasta de consultora não muda de id; sem o cache, cada upload fazia um
+# files().list — e uma rajada de ligações terminando junto, N listas iguais ao Drive. A trava
+# serializa a PRIMEIRA busca de cada pasta: duas threads criando "Geral" ao mesmo tempo
+# criariam duas pastas "Geral".
+_pastas: dict = {}
+_trava_pastas = threading.Lock()
 
-def get_drive_service():
-    global _drive_service
-    if _drive_service:
-        return _drive_service
 
-    credentials = service_account.Credentials.from_service_account_file(
-        CREDENTIALS_PATH, scopes=SCOPES
-    )
-    _drive_service = build("drive", "v3", credentials=credentials)
-    return _drive_service
+def get_drive_service():
+    """Cliente do Drive desta thread (ver google_executor). Só dentro de `executar`."""
+    return servico("drive", "v3", SCOPES)
 
 
 def get_or_create_folder(folder_name: str, parent_id: str = None) -> str:
-    """Busca ou cria uma pasta no Google Drive."""
+    """Busca ou cria uma pasta no Google Drive. Memorizado por (nome, pai) no processo."""
+    chave = (folder_name, parent_id)
+    with _trava_pastas:
+        if chave in _pastas:
+            return _pastas[chave]
+        _pastas[chave] = _buscar_ou_criar_pasta(folder_name, parent_id)
+        return _pastas[chave]
+
+
+def _buscar_ou_criar_pasta(folder_name: str, parent_id: str = None) -> str:
     service = get_drive_service()
 
     query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
@@ -59,68 +78,130 @@ def get_root_folder_id() -> str:
     return _folder_id
 
 
-async def upload_recording_to_drive(
-    recording_url: str,
-    call_sid: str,
-    from_number: str,
-    to_number: str,
-    user_name: str = "Desconhecido",
-    duration: int = 0,
-) -> str:
-    """Baixa gravação da Twilio e faz upload ao Google Drive. Retorna o link."""
-    # Baixar o áudio da Twilio
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            recording_url,
-            auth=(account_sid, auth_token),
-            follow_redirects=True,
-        )
-        if response.status_code != 200:
-            print(f"❌ Erro ao baixar gravação: {response.status_code}")
-            return ""
+def nome_do_arquivo(from_number: str, to_number: str, duration: int,
+                    quando: datetime | None = None) -> str:
+    now = (quando or datetime.now()).strftime("%Y-%m-%d_%H%M")
+    duration_min = f"{duration // 60}m{duration % 60:02d}s"
+    return f"{now}_{from_number}_para_{to_number}_{duration_min}.mp3"
 
-        audio_data = response.content
 
-    # Organizar em subpasta por consultora
-    root_folder_id = get_root_folder_id()
-    subfolder_name = user_name if user_name != "Desconhecido" else "Geral"
-    subfolder_id = get_or_create_folder(subfolder_name, root_folder_id)
+def subpasta_da_consultora(user_name: str | None) -> str:
+    return user_name if user_name and user_name != "Desconhecido" else "Geral"
 
-    # Nome do arquivo
-    now = datetime.now().strftime("%Y-%m-%d_%H%M")
-    duration_min = f"{duration // 60}m{duration % 60:02d}s"
-    file_name = f"{now}_{from_number}_para_{to_number}_{duration_min}.mp3"
 
-    # Upload ao Drive
-    service = get_drive_service()
-    file_metadata = {
-        "name": file_name,
-        "parents": [subfolder_id],
-    }
-    media = MediaInMemoryUpload(audio_data, mimetype="audio/mpeg")
+# ------------------------------------------------------------------------------------------
+# UPLOAD RESUMÍVEL — as partes síncronas rodam no pool do Google
+# ------------------------------------------------------------------------------------------
 
-    uploaded = service.files().create(
-        body=file_metadata,
+def _iniciar_upload(local_path: str, file_name: str, subfolder_name: str):
+    """Monta o pedido resumível (a sessão só é aberta no primeiro next_chunk)."""
+    subfolder_id = get_or_create_folder(subfolder_name, get_root_folder_id())
+    media = MediaFileUpload(local_path, mimetype="audio/mpeg",
+                            chunksize=PEDACO_UPLOAD, resumable=True)
+    return get_drive_service().files().create(
+        body={"name": file_name, "parents": [subfolder_id]},
         media_body=media,
         fields="id, webViewLink",
-    ).execute()
+    )
+
 
-    # Tornar acessível via link
-    service.permissions().create(
-        fileId=uploaded["id"],
+def _retomar(pedido, uri: str):
+    """Posiciona o pedido na sessão de upload `uri`, já aberta no Drive. Devolve o arquivo se
+    o upload já tinha terminado; senão None.
+
+    É a consulta de estado do protocolo resumível (PUT vazio com "bytes */total"): o Drive
+    responde 308 com o Range que já recebeu, ou 200/201 se já tem tudo. O pedido é posicionado
+    pelos atributos públicos resumable_uri/resumable_progress, e o próximo next_chunk manda
+    dali — sem depender de estado interno do googleapiclient. 404/410 sobem como HttpError:
+    a sessão expirou (o drive_uploader limpa o uri e recomeça).
+    """
+    resp, conteudo = http_autorizado(SCOPES).request(
+        uri, "PUT", headers={"Content-Range": f"bytes */{pedido.resumable.size()}",
+                             "Content-Length": "0"})
+    if resp.status in (200, 201):
+        return pedido.postproc(resp, conteudo)
+    if resp.status != 308:
+        raise HttpError(resp, conteudo, uri=uri)
+    pedido.resumable_uri = uri
+    faixa = resp.get("range")
+    pedido.resumable_progress = int(faixa.split("-")[1]) + 1 if faixa else 0
+    return None
+
+
+def _enviar_pedaco(pedido):
+    # http da thread ATUAL: o pedido foi montado em outra thread do pool, e httplib2 não é
+    # thread-safe.
+    return pedido.next_chunk(http=http_autorizado(SCOPES), num_retries=2)
+
+
+def _tornar_publico(file_id: str):
+    get_drive_service().permissions().create(
+        fileId=file_id,
         body={"type": "anyone", "role": "reader"},
     ).execute()
 
-    drive_link = uploaded.get("webViewLink", "")
-    print(f"☁️ Gravação enviada ao Drive: {drive_link}")
+
+async def enviar_gravacao(local_path: str, file_name: str, subfolder_name: str, *,
+                          uri: str | None = None, ao_avancar=None) -> str:
+    """Upload resumível do MP3 em disco para a subpasta da consultora. Retorna o link.
+
+    `ao_avancar(uri, bytes_enviados)` (async) é chamado depois de cada pedaço confirmado pelo
+    Drive — é onde o drive_uploader persiste a sessão para retomar depois de uma falha ou de
+    um restart. Passar o `uri` salvo continua o upload de onde parou.
+    """
+    pedido = await executar(_iniciar_upload, local_path, file_name, subfolder_name)
+    resposta = None
+    if uri:
+        resposta = await executar(_retomar, pedido, uri, timeout=TIMEOUT_PEDACO)
+    while resposta is None:
+        _, resposta = await executar(_enviar_pedaco, pedido, timeout=TIMEOUT_PEDACO)
+        if resposta is None and ao_avancar is not None:
+            await ao_avancar(pedido.resumable_uri, pedido.resumable_progress)
+    await executar(_tornar_publico, resposta["id"])
+    return resposta.get("webViewLink", "")
+
+
+async def upload_recording_to_drive(
+    recording_url: str,
+    call_sid: str,
+    from_number: str,
+    to_number: str,
+    user_name: str = "Desconhecido",
+    duration: int = 0,
+    local_path: str | None = None,
+) -> str:
+    """Faz upload da gravação ao Google Drive. Retorna o link.
+
+    Usa o MP3 que o webhook de gravação já salvou em disco (`local_path`, ou o caminho padrão
+    do call_sid). Só baixa da Twilio — em streaming, para o mesmo caminho — se ainda não
+    houver arquivo local. O fluxo normal é a fila (drive_uploader), que chama
+    `enviar_gravacao` direto e sobrevive a falhas; isto é o upload avulso, numa tacada só.
+    """
+    from app.recordings import baixar_gravacao, caminho_local
+
+    local_path = local_path or caminho_local(call_sid)
+    if not os.path.exists(local_path):
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        try:
+            await baixar_gravacao(recording_url, local_path, auth=(account_sid, auth_token))
+        except Exception as e:
+            logger.error("❌ Erro ao baixar gravação: %s: %s", type(e).__name__, e)
+            return ""
+
+    drive_link = await enviar_gravacao(
+        local_path, nome_do_arquivo(from_number, to_number, duration),
+        subpasta_da_consultora(user_name),
+    )
+    logger.info("☁️ Gravação enviada ao Drive: %s", drive_link)
     return drive_link
 
 
 def delete_old_recordings(days: int = 90):
-    """Exclui gravações com mais de X dias do Google Drive."""
+    """Exclui gravações com mais de X dias do Google Drive.
+
+    Síncrona: o job diário roda via `executar(delete_old_recordings, ...)`.
+    """
     from datetime import timedelta
 
     service = get_drive_service()
@@ -149,9 +230,9 @@ def delete_old_recordings(days: int = 90):
             try:
                 service.files().delete(fileId=f["id"]).execute()
                 deleted_count += 1
-                print(f"🗑️ Deletado: {f['name']}")
+                logger.info("🗑️ Deletado: %s", f['name'])
             except Exception as e:
-                print(f"❌ Erro ao deletar {f['name']}: {e}")
+                logger.error("❌ Erro ao deletar %s: %s", f['name'], e)
 
-    print(f"🗑️ Total deletado: {deleted_count} gravações com +{days} dias")
+    logger.info("🗑️ Total deletado: %s gravações com +%s dias", deleted_count, days)
     return deleted_count
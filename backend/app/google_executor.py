@@ -0,0 +1,127 @@
+"""Chamadas ao Google (Drive, Calendar) fora do event loop.
+
+O `googleapiclient` é SÍNCRONO: cada `.execute()` é um request HTTP bloqueante. Chamado de
+dentro de uma função async — como google_drive e google_calendar faziam — ele congela o
+event loop inteiro enquanto o Google responde: um upload de gravação ao Drive parava TODOS
+os requests e webhooks do processo (inclusive os da Meta, que reenviam se não recebem 200).
+E `google_calendar.get_service()` relia o JSON da conta de serviço e reconstruía o cliente a
+cada chamada.
+
+Agora toda chamada ao Google passa por `executar(fn, ...)`, que roda `fn` num pool de
+threads PRÓPRIO e limitado (GOOGLE_THREADS), com timeout por chamada.
+
+------------------------------------------------------------------------------------------
+POR QUE UM POOL PRÓPRIO, E NÃO asyncio.to_thread
+------------------------------------------------------------------------------------------
+`to_thread` usa o executor padrão do loop, o mesmo das leituras de arquivo (recordings,
+transcription). Um Drive lento ocuparia essas threads e travaria o que não tem nada a ver
+com o Google. Com pool próprio, o pior caso de um Google fora do ar é GOOGLE_THREADS
+threads presas — e as chamadas seguintes esperando na fila DESTE pool, com timeout.
+
+------------------------------------------------------------------------------------------
+TIMEOUT EM DUAS CAMADAS
+------------------------------------------------------------------------------------------
+  * `executar(timeout=...)`: quem chamou desiste e recebe TimeoutError. Mas uma thread não
+    pode ser morta de fora — o request continua rodando nela.
+  * TIMEOUT_SOCKET no httplib2: é o que de fato libera a thread quando o Google não responde.
+    Sem ele, o httplib2 espera para sempre e o pool vai secando.
+
+------------------------------------------------------------------------------------------
+SERVIÇO EM CACHE, UM POR THREAD
+------------------------------------------------------------------------------------------
+As credenciais são lidas do disco uma vez e compartilhadas. O objeto de serviço NÃO pode
+ser compartilhado entre threads: ele carrega um httplib2.Http, que não é thread-safe (a
+própria documentação do googleapiclient manda criar um por thread). Então cada thread do
+pool constrói o seu na primeira chamada e reusa dali em diante — no máximo GOOGLE_THREADS
+construções por API durante a vida do processo, em vez de uma por chamada.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import medir_externo
+
+CREDENTIALS_PATH = os.path.join(os.path.dirname(__file__), "..", "google-credentials.json")
+
+GOOGLE_THREADS = int(os.getenv("GOOGLE_THREADS", "4"))
+TIMEOUT_PADRAO = 30
+TIMEOUT_SOCKET = 60
+
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_THREADS, thread_name_prefix="google")
+_local = threading.local()
+_credenciais: dict = {}
+_trava_credenciais = threading.Lock()
+
+
+def _credenciais_para(escopos: tuple):
+    from google.oauth2 import service_account
+
+    with _trava_credenciais:
+        if escopos not in _credenciais:
+            _credenciais[escopos] = service_account.Credentials.from_service_account_file(
+                CREDENTIALS_PATH, scopes=list(escopos)
+            )
+        return _credenciais[escopos]
+
+
+def http_autorizado(escopos: list[str]):
+    """httplib2 autenticado DESTA thread, construído uma vez e reusado.
+
+    Também é o que se passa a `HttpRequest.next_chunk(http=...)` num upload resumível: o
+    pedido guarda o http da thread que o montou, e cada pedaço pode rodar em outra thread.
+    """
+    import google_auth_httplib2
+    import httplib2
+
+    cache = getattr(_local, "http", None)
+    if cache is None:
+        cache = _local.http = {}
+    chave = tuple(escopos)
+    if chave not in cache:
+        cache[chave] = google_auth_httplib2.AuthorizedHttp(
+            _credenciais_para(chave), http=httplib2.Http(timeout=TIMEOUT_SOCKET)
+        )
+    return cache[chave]
+
+
+def servico(nome: str, versao: str, escopos: list[str]):
+    """Cliente do googleapiclient para ESTA thread, construído uma vez e reusado.
+
+    Só deve ser chamado de dentro de uma função passada a `executar` (ou seja, numa thread do
+    pool) — chamado direto no event loop, o cliente devolvido bloquearia o loop do mesmo jeito.
+    """
+    from googleapiclient.discovery import build
+
+    cache = getattr(_local, "servicos", None)
+    if cache is None:
+        cache = _local.servicos = {}
+    chave = (nome, versao, tuple(escopos))
+    if chave not in cache:
+        cache[chave] = build(nome, versao, http=http_autorizado(escopos), cache_discovery=False)
+    return cache[chave]
+
+
+async def executar(fn, *args, timeout: float = TIMEOUT_PADRAO, **kwargs):
+    """Roda `fn(*args, **kwargs)` no pool do Google e espera no máximo `timeout` segundos.
+
+    Levanta asyncio.TimeoutError se estourar (a thread segue até o TIMEOUT_SOCKET) e repassa
+    qualquer exceção de `fn` (HttpError do Google, por exemplo) sem embrulhar.
+
+    O tempo em external_request_duration_seconds{service="google"} é o de `fn` na thread, sem
+    a fila do pool — e inclui a chamada que o chamador já abandonou por timeout.
+    """
+    loop = asyncio.get_running_loop()
+    futuro = loop.run_in_executor(_executor, functools.partial(_medido, fn, *args, **kwargs))
+    return await asyncio.wait_for(futuro, timeout=timeout)
+
+
+def _medido(fn, *args, **kwargs):
+    with medir_externo("google"):
+        return fn(*args, **kwargs)
+
+
+def encerrar():
+    """Chamado no shutdown do lifespan: não aceita mais chamadas e não espera as em voo."""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,16 +1,18 @@
 """
 Rotas do Kanban: listar cards, mover entre colunas, atualizar notas.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.eventos import RECURSO_KANBAN
 from app.models import AIConversationSummary, Contact
 from app.ai_engine import generate_conversation_summary
+from app.respostas import etag_lista, nao_modificado, com_etag
 
 router = APIRouter(prefix="/api/kanban", tags=["kanban"])
 
@@ -31,10 +33,16 @@ class UpdateSummaryRequest(BaseModel):
 
 @router.get("/cards")
 async def list_kanban_cards(
+    request: Request,
     channel_id: Optional[int] = None,
     status: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
 ):
+    etag = etag_lista(db, RECURSO_KANBAN, None, channel_id, status)
+    nao_mudou = nao_modificado(request, etag, "kanban_cards")
+    if nao_mudou:
+        return nao_mudou
+
     query = select(AIConversationSummary).order_by(AIConversationSummary.updated_at.desc())
 
     if channel_id:
@@ -45,7 +53,7 @@ async def list_kanban_cards(
     result = await db.execute(query)
     cards = result.scalars().all()
 
-    return [
+    return com_etag([
         {
             "id": c.id,
             "contact_wa_id": c.contact_wa_id,
@@ -61,13 +69,13 @@ async def list_kanban_cards(
             "updated_at": c.updated_at.isoformat() if c.updated_at else None,
         }
         for c in cards
-    ]
+    ], etag)
 
 
 # === Estatísticas do Kanban ===
 
 @router.get("/stats")
-async def kanban_stats(channel_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+async def kanban_stats(channel_id: Optional[int] = None, db: AsyncSession = Depends(get_read_db)):
     base_filter = []
     if channel_id:
         base_filter.append(AIConversationSummary.channel_id == channel_id)
@@ -171,7 +179,7 @@ async def generate_summary(card_id: int, db: AsyncSession = Depends(get_db)):
     if not card:
         raise HTTPException(status_code=404, detail="Card não encontrado")
 
-    summary = await generate_conversation_summary(card.contact_wa_id, db)
+    summary = await generate_conversation_summary(card.contact_wa_id, db, card=card)
 
     if summary:
         card.summary = summary
@@ -0,0 +1,199 @@
+"""Logs estruturados em JSON, escritos por uma thread própria e nunca pelo event loop.
+
+Até aqui todo diagnóstico era `print()`: síncrono, para o stdout, de dentro dos caminhos
+quentes — cada mensagem do webhook, cada decisão do guard, cada envio. Com o journald
+lento (disco cheio, rotação), o `write` do stdout trava e, com ele, o loop inteiro. E o
+engine subia com echo=True: TODO statement SQL ia para o stdout em produção.
+
+Agora cada módulo tem o seu `logger = logging.getLogger(__name__)`, e `configurar_logs()`
+(chamado uma vez, no import de main.py) monta:
+
+    logger.info(...) ──► QueueHandler ──► fila em memória ──► QueueListener (thread) ──► stdout
+                         (filtro de amostragem)                (formato JSON)
+
+O lado do loop só formata a mensagem e faz `put_nowait` numa fila: custo de microssegundos,
+e nenhum I/O. A escrita de verdade é da thread do QueueListener.
+
+------------------------------------------------------------------------------------------
+CONFIGURAÇÃO (env)
+------------------------------------------------------------------------------------------
+  * LOG_LEVEL   — nível da raiz, padrão INFO.
+  * LOG_LEVELS  — níveis por módulo: "app.nat_flow=DEBUG,app.ai_engine=WARNING". É também
+                  como se liga o SQL quando precisa: "sqlalchemy.engine=INFO" manda os
+                  statements por ESTE pipeline (JSON, fora do loop). O echo do engine
+                  (SQL_ECHO em database.py) escreve direto no stdout e fica desligado.
+  * LOG_FORMATO — "json" (padrão) ou "texto", para ler no terminal durante o dev.
+  * LOG_FILA    — tamanho máximo da fila, padrão 10000.
+
+------------------------------------------------------------------------------------------
+FILA CHEIA DESCARTA, NÃO ESPERA
+------------------------------------------------------------------------------------------
+Se o stdout parar de escoar, a fila enche e as linhas novas são DESCARTADAS e contadas
+(log_records_dropped_total no /metrics). Esperar espaço na fila seria devolver ao loop
+exatamente o bloqueio que a fila existe para tirar.
+
+------------------------------------------------------------------------------------------
+AMOSTRAGEM
+------------------------------------------------------------------------------------------
+Linha de alto volume e conteúdo repetido (acerto de cache, relay fora do ar a cada webhook)
+passa `extra={"amostra": N}`: sai a 1ª e depois 1 a cada N, contadas por (logger, molde da
+mensagem) — por isso essas linhas usam o estilo `%s` e não f-string. A linha que sai leva
+`"amostra": N` no JSON, para quem soma saber que cada uma vale N. O descarte acontece antes
+da fila, então a linha amostrada fora custa um incremento de dict.
+
+Os emojis continuam no texto das mensagens: os `journalctl ... | grep "❌"` do
+COMANDOS_UTEIS.md seguem funcionando sobre o JSON.
+
+------------------------------------------------------------------------------------------
+CREDENCIAL NA URL
+------------------------------------------------------------------------------------------
+O access log do uvicorn escreve a URL inteira, query incluída. O stream de eventos recebe
+credencial na query (hoje um ticket de 60s; antes, o JWT da sessão — aba aberta há dias
+ainda manda). No caminho até o journald, `token=` e `ticket=` das linhas do uvicorn.access
+viram `***`.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+LOG_FILA = int(os.getenv("LOG_FILA", "10000"))
+
+# Loggers que o uvicorn configura com handler próprio (síncrono, no stdout) e propagate=False.
+LOGGERS_UVICORN = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_CREDENCIAL_NA_URL = re.compile(r"\b(token|ticket)=[^&\s\"]*")
+
+# Atributos que todo LogRecord tem; o que sobrar veio de `extra=` e vai para o JSON.
+_CAMPOS_DO_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+_handler: logging.Handler | None = None
+_descartados = None
+
+
+class FormatoJson(logging.Formatter):
+    """Uma linha JSON por registro: ts (UTC), level, logger, msg, os `extra=` e exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        corpo = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc)
+                          .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _CAMPOS_DO_RECORD and not chave.startswith("_"):
+                corpo[chave] = valor
+        if record.exc_text:
+            corpo["exc"] = record.exc_text
+        return json.dumps(corpo, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar a 1ª e depois 1 a cada `amostra` linhas do mesmo (logger, molde)."""
+
+    def __init__(self):
+        super().__init__()
+        self._vistas: dict = {}
+        self._trava = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        n = getattr(record, "amostra", None)
+        if not n or n <= 1:
+            return True
+        chave = (record.name, record.msg)
+        with self._trava:
+            vistas = self._vistas.get(chave, 0)
+            self._vistas[chave] = vistas + 1
+        return vistas % n == 0
+
+
+class FilaHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) quando a fila enche, em vez de levantar."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formata a mensagem AQUI, enquanto os args ainda são os objetos vivos, e guarda o
+        # traceback à parte — o QueueHandler padrão funde os dois num texto só.
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.name == "uvicorn.access":
+            record.msg = _CREDENCIAL_NA_URL.sub(r"\1=***", record.msg)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if _descartados is not None:
+                _descartados.inc()
+
+
+def _niveis_por_modulo(texto: str) -> dict:
+    niveis = {}
+    for par in texto.split(","):
+        nome, _, nivel = par.partition("=")
+        if nome.strip() and nivel.strip():
+            niveis[nome.strip()] = nivel.strip().upper()
+    return niveis
+
+
+def configurar_logs(*, stream=None) -> None:
+    """Monta o pipeline (fila + thread + JSON) na raiz. Idempotente."""
+    global _listener, _handler, _descartados
+    if _listener is not None:
+        return
+    from app.metrics import Contador
+
+    if _descartados is None:
+        _descartados = Contador("log_records_dropped_total",
+                                "Linhas de log descartadas com a fila cheia.")
+
+    saida = logging.StreamHandler(stream or sys.stdout)
+    saida.setFormatter(FormatoJson() if LOG_FORMATO == "json" else
+                       logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    fila = queue.Queue(maxsize=LOG_FILA)
+    _handler = FilaHandler(fila)
+    _handler.addFilter(FiltroAmostragem())
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=False)
+
+    raiz = logging.getLogger()
+    for antigo in list(raiz.handlers):
+        raiz.removeHandler(antigo)
+    raiz.addHandler(_handler)
+    raiz.setLevel(LOG_LEVEL)
+    for nome in LOGGERS_UVICORN:
+        logger = logging.getLogger(nome)
+        logger.handlers = []
+        logger.propagate = True
+    for nome, nivel in _niveis_por_modulo(LOG_LEVELS).items():
+        logging.getLogger(nome).setLevel(nivel)
+
+    _listener.start()
+    atexit.register(encerrar_logs)
+
+
+def encerrar_logs() -> None:
+    """Escoa o que está na fila e para a thread. Chamado no shutdown do lifespan e no atexit."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _listener = _handler = None
@@ -10,11 +10,17 @@ from app.twilio_routes import router as twilio_router
 from datetime import datetime, timezone, timedelta
 from app.kanban_routes import router as kanban_router
 from app.calendar_routes import router as calendar_router
+from app.logs import configurar_logs, encerrar_logs
+from app.metrics import MetricasMiddleware, cliente_http
+from app.respostas import CompressaoMiddleware
+from app.serializacao import RespostaJSON, ler_json
 from contextlib import asynccontextmanager
+import logging
 import os
-import httpx
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 SP_TZ = timezone(timedelta(hours=-3))
 
 
@@ -91,8 +97,8 @@ async def _realimentar_welcome_status(wa_message_id: str, novo_status: str, erro
                   erro.get("error_details") or erro.get("error_title")]
         lead.welcome_status = "failed"
         lead.welcome_error = " — ".join(p for p in partes if p) or "recusada pela Meta sem detalhe"
-        print(f"📉 Boas-vindas de {lead.name} (exact_id={lead.exact_id}) recusada: "
-              f"{lead.welcome_error}")
+        logger.info("📉 Boas-vindas de %s (exact_id=%s) recusada: %s",
+                    lead.name, lead.exact_id, lead.welcome_error)
         return
 
     # delivered / read → chegou. 'read' também vira 'delivered': o que esta coluna responde é
@@ -107,17 +113,21 @@ async def _realimentar_welcome_status(wa_message_id: str, novo_status: str, erro
     lead.welcome_error = None
 
 
-from app.database import get_db, async_session
+from app.database import get_db_com_timeout, async_session, LeituraAposEscritaMiddleware
 from app.models import Channel, Contact, ExactLead, Message, NatButtonEvent
 from app.nat_buttons import extrair_evento_botao, conteudo_legivel
+from app.delivery_health import contar_desfecho
+from app.auth import get_current_admin
 from app.routes import router
 from app.auth_routes import router as auth_router
 from app.exact_routes import router as exact_router
 from app.auto_welcome_routes import router as auto_welcome_router
 from app.nat_routes import router as nat_router
+from app.eventos_routes import router as eventos_router
 from app.exact_spotter import sync_exact_leads
 
 load_dotenv()
+configurar_logs()
 
 
 async def sync_job():
@@ -127,20 +137,21 @@ async def sync_job():
         try:
             async with async_session() as db:
                 result = await sync_exact_leads(db)
-                print(f"🔄 Sync Exact Spotter: {result}")
+                logger.info("🔄 Sync Exact Spotter: %s", result)
         except Exception as e:
-            print(f"❌ Erro no sync Exact Spotter: {e}")
+            logger.error("❌ Erro no sync Exact Spotter: %s", e)
 
 async def cleanup_recordings_job():
     """Job que exclui gravações com +90 dias a cada 24 horas."""
     while True:
         await asyncio.sleep(86400)  # 24 horas
         try:
-            from app.google_drive import delete_old_recordings
-            delete_old_recordings(days=90)
-            print("🗑️ Limpeza de gravações antigas concluída")
+            from app.google_drive import TIMEOUT_LIMPEZA, delete_old_recordings
+            from app.google_executor import executar
+            await executar(delete_old_recordings, days=90, timeout=TIMEOUT_LIMPEZA)
+            logger.info("🗑️ Limpeza de gravações antigas concluída")
         except Exception as e:
-            print(f"❌ Erro na limpeza de gravações: {e}")
+            logger.error("❌ Erro na limpeza de gravações: %s", e)
 
 
 async def window_alerts_job():
@@ -187,9 +198,9 @@ async def window_alerts_job():
                                 created += 1
                 await db.commit()
                 if created:
-                    print(f"🔔 Alertas de janela criados: {created}")
+                    logger.info("🔔 Alertas de janela criados: %s", created)
         except Exception as e:
-            print(f"❌ Erro no window_alerts_job: {e}")
+            logger.error("❌ Erro no window_alerts_job: %s", e)
 
 
 async def scheduled_messages_job():
@@ -230,15 +241,16 @@ async def scheduled_messages_job():
                         # com o motivo registrado, e o job NAO quebra: segue para o proximo.
                         sm.status = "error"
                         sm.result = json.dumps({"error": str(e.detail), "blocked": True})
-                        print(f"⛔ Agendamento bloqueado (boas-vindas nao vai em massa): {e.detail}")
+                        logger.warning("⛔ Agendamento bloqueado (boas-vindas nao vai em massa): %s",
+                                       e.detail)
                     except Exception as e:
                         sm.status = "error"
                         sm.result = json.dumps({"error": str(e)})
                     await db.commit()
                 if due:
-                    print(f"📨 Agendamentos processados: {len(due)}")
+                    logger.info("📨 Agendamentos processados: %s", len(due))
         except Exception as e:
-            print(f"❌ Erro no scheduled_messages_job: {e}")
+            logger.error("❌ Erro no scheduled_messages_job: %s", e)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -249,19 +261,50 @@ async def lifespan(app: FastAPI):
     scheduled_task = asyncio.create_task(scheduled_messages_job())
     # Agendador da NAT (Bloco 7). Sobe SEMPRE, inclusive com a NAT desligada: ele não envia
     # nada nem decide nada — só executa o que já foi agendado, e com a NAT desligada ninguém
-    # agenda. Fila vazia custa um SELECT por minuto.
-    from app.nat_scheduler import nat_scheduler_job, INTERVALO_SEGUNDOS as NAT_SCHED_S
+    # agenda. Fila vazia custa um SELECT por minuto. O listener acorda o job na hora em que
+    # uma ação curta é agendada (LISTEN/NOTIFY); sem ele, o tique de 60s cobre.
+    from app.nat_scheduler import (nat_scheduler_job, escutar_agendamentos,
+                                   CONCORRENCIA as NAT_SCHED_N)
     nat_scheduler_task = asyncio.create_task(nat_scheduler_job())
+    nat_listen_task = asyncio.create_task(escutar_agendamentos())
     # Vigia da saúde de entrega (Fase 4). Sobe SEMPRE e independe da NAT e da boas-vindas
     # estarem desligadas: ele observa TODO template que sai, e a pergunta "a Meta está
     # aceitando o que mandamos?" continua valendo com as automações no chão.
     from app.delivery_health import delivery_health_job, INTERVALO_SEGUNDOS as SAUDE_S
     delivery_health_task = asyncio.create_task(delivery_health_job())
-    print("✅ Sync Exact Spotter agendado (a cada 10 min)")
-    print("✅ Alertas de janela 24h agendados (a cada 5 min)")
-    print("✅ Agendamento de templates ativo (checa a cada 60s)")
-    print(f"✅ Agendador NAT ativo (checa a cada {NAT_SCHED_S}s)")
-    print(f"✅ Alerta de saúde de entrega ativo (checa a cada {SAUDE_S // 60} min)")
+    # Fila de transcrição de ligações. Consome o 'pending' que o webhook de gravação marca e
+    # o que o botão do front re-enfileira; fila vazia custa um SELECT a cada 30s.
+    from app.transcription_worker import transcription_worker_job, CONCORRENCIA as TRANSCR_N
+    transcription_task = asyncio.create_task(transcription_worker_job())
+    # Fila de upload ao Drive. Só sobe com DRIVE_UPLOAD_ENABLED=true (ver drive_uploader.py):
+    # desligada, o webhook nem enfileira.
+    from app import drive_uploader
+    drive_task = asyncio.create_task(drive_uploader.drive_upload_job()) \
+        if drive_uploader.UPLOAD_ATIVO else None
+    # Vigia do event loop: mede o atraso e loga a pilha de quem trava (ver cpu_executor.py).
+    from app import cpu_executor
+    loop_task = asyncio.create_task(cpu_executor.monitorar_loop())
+    # Partições mensais de messages: mantém PARTICOES_FUTURAS meses criados à frente.
+    from app import particoes
+    particoes_task = asyncio.create_task(particoes.manter_particoes_job())
+    # Arquivo frio dos meses velhos. Só sobe com ARQUIVO_ENABLED=true (ver arquivo.py).
+    from app import arquivo
+    arquivo_task = asyncio.create_task(arquivo.arquivo_job()) if arquivo.ARQUIVO_ATIVO else None
+    logger.info("✅ Sync Exact Spotter agendado (a cada 10 min)")
+    logger.info("✅ Alertas de janela 24h agendados (a cada 5 min)")
+    logger.info("✅ Agendamento de templates ativo (checa a cada 60s)")
+    logger.info("✅ Agendador NAT ativo (%s em paralelo, acorda por LISTEN/NOTIFY)", NAT_SCHED_N)
+    logger.info("✅ Alerta de saúde de entrega ativo (checa a cada %s min)", SAUDE_S // 60)
+    logger.info("✅ Fila de transcrição ativa (%s em paralelo)", TRANSCR_N)
+    if drive_task:
+        logger.info("✅ Fila de upload ao Drive ativa (%s em paralelo)",
+                    drive_uploader.CONCORRENCIA)
+    logger.info("✅ Vigia do event loop ativo (avisa acima de %.0f ms)", cpu_executor.LOOP_LAG_LIMIAR_MS)
+    logger.info("✅ Partições de messages mantidas (%s meses à frente, a cada %s h)",
+                particoes.PARTICOES_FUTURAS, particoes.INTERVALO_SEGUNDOS // 3600)
+    if arquivo_task:
+        logger.info("✅ Arquivo frio ativo (mantém %s meses no banco, em %s)",
+                    arquivo.ARQUIVO_MESES, arquivo.ARQUIVO_DIR)
     yield
     # Shutdown: cancela o job
     task.cancel()
@@ -269,10 +312,23 @@ async def lifespan(app: FastAPI):
     window_task.cancel()
     scheduled_task.cancel()
     nat_scheduler_task.cancel()
+    nat_listen_task.cancel()
     delivery_health_task.cancel()
-
-
-app = FastAPI(title="Cenat WhatsApp API", lifespan=lifespan)
+    transcription_task.cancel()
+    if drive_task:
+        drive_task.cancel()
+    particoes_task.cancel()
+    if arquivo_task:
+        arquivo_task.cancel()
+    from app.google_executor import encerrar as encerrar_google
+    encerrar_google()
+    loop_task.cancel()
+    cpu_executor.encerrar()
+    encerrar_logs()
+
+
+# orjson no dumps de toda rota (ver app/serializacao.py).
+app = FastAPI(title="Cenat WhatsApp API", lifespan=lifespan, default_response_class=RespostaJSON)
 
 app.add_middleware(
     CORSMiddleware,
@@ -281,6 +337,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Quem acabou de escrever lê do primário por alguns segundos (ver RÉPLICA DE LEITURA em database.py).
+app.add_middleware(LeituraAposEscritaMiddleware)
+# gzip só de JSON/texto acima de 1 KB; mídia, Range e SSE passam direto (ver app/respostas.py).
+app.add_middleware(CompressaoMiddleware)
+# Por último = mais externo: mede o request inteiro, inclusive o preflight do CORS.
+app.add_middleware(MetricasMiddleware)
 
 app.include_router(router)
 app.include_router(auth_router)
@@ -290,7 +352,12 @@ app.include_router(ai_router)
 app.include_router(kanban_router)
 app.include_router(calendar_router)
 app.include_router(nat_router)
+app.include_router(eventos_router)
 VERIFY_TOKEN = os.getenv("WEBHOOK_VERIFY_TOKEN")
+CS_RELAY_URL = os.getenv("CS_RELAY_URL", "https://pedagogico.cenatdata.online/api/webhook/whatsapp")
+# A Meta reenvia o webhook que não responde em poucos segundos: statement nenhum daqui pode
+# segurar a conexão pelos 30s do teto global (ver STATEMENT TIMEOUT POR ROTA em database.py).
+WEBHOOK_STATEMENT_TIMEOUT_MS = int(os.getenv("WEBHOOK_STATEMENT_TIMEOUT_MS", "5000"))
 app.include_router(twilio_router)
 
 
@@ -301,21 +368,25 @@ async def verify_webhook(
     hub_challenge: str = Query(None, alias="hub.challenge"),
 ):
     if hub_mode == "subscribe" and hub_token == VERIFY_TOKEN:
-        print("✅ Webhook verificado com sucesso!")
+        logger.info("✅ Webhook verificado com sucesso!")
         return int(hub_challenge)
     raise HTTPException(status_code=403, detail="Token inválido")
 
 
 @app.post("/webhook")
-async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
-    body = await request.json()
+async def receive_webhook(request: Request,
+                          db: AsyncSession = Depends(get_db_com_timeout(WEBHOOK_STATEMENT_TIMEOUT_MS))):
+    body = await ler_json(request)
 
-    # Relay para CS Platform
+    # Relay para CS Platform: os bytes como chegaram, sem serializar de novo.
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            await client.post("https://pedagogico.cenatdata.online/api/webhook/whatsapp", json=body)
+        async with cliente_http("cs_relay", timeout=5) as client:
+            await client.post(CS_RELAY_URL,
+                              content=await request.body(),
+                              headers={"Content-Type": "application/json"})
     except Exception as e:
-        print(f"❌ Relay CS falhou: {e}")
+        # Com o pedagógico fora do ar, é uma linha por webhook: amostrada.
+        logger.error("❌ Relay CS falhou: %s", e, extra={"amostra": 20})
 
     if body.get("object") != "whatsapp_business_account":
         return {"status": "ignored"}
@@ -417,13 +488,15 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                     try:
                         async with db.begin_nested():
                             db.add(NatButtonEvent(**evento_botao))
-                        print(f"🔘 Clique capturado: {evento_botao['source']} "
-                              f"payload={evento_botao['button_payload']!r} "
-                              f"texto={evento_botao['button_text']!r} "
-                              f"context={evento_botao['context_message_id']!r}")
+                        logger.info("🔘 Clique capturado: %s payload=%r texto=%r context=%r",
+                                    evento_botao['source'],
+                                    evento_botao['button_payload'],
+                                    evento_botao['button_text'],
+                                    evento_botao['context_message_id'])
                     except Exception as e:
-                        print(f"⚠️  Falha ao registrar clique em nat_button_events "
-                              f"({wa_message_id}): {type(e).__name__}: {e}")
+                        logger.warning("⚠️  Falha ao registrar clique em nat_button_events (%s): "
+                                       "%s: %s",
+                                       wa_message_id, type(e).__name__, e)
 
                 # Roteamento do fluxo NAT. Vem DEPOIS da persistência do evento (o registro
                 # do clique não pode depender do fluxo dar certo) e, como ela, dentro de
@@ -437,8 +510,8 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                         elif msg_type == "text":
                             await processar_texto(msg["from"], content, wa_message_id, db)
                 except Exception as e:
-                    print(f"⚠️  Falha no fluxo NAT ({wa_message_id}): "
-                          f"{type(e).__name__}: {e}")
+                    logger.warning("⚠️  Falha no fluxo NAT (%s): %s: %s",
+                                   wa_message_id, type(e).__name__, e)
 
                 # Notificação de nova mensagem para o SDR dono (se houver)
                 owner_result = await db.execute(select(Contact.assigned_to, Contact.name).where(Contact.wa_id == msg["from"]))
@@ -460,8 +533,16 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                 wa_message_id = status_update["id"]
                 new_status = status_update["status"]
 
-                result = await db.execute(select(Message).where(Message.wa_message_id == wa_message_id))
+                # FOR UPDATE: a Meta manda delivered e read da mesma mensagem em POSTs a
+                # milissegundos um do outro. Sem a trava, os dois leem 'sent' antes de qualquer
+                # commit e os dois contam a entrega em contar_desfecho. Com ela, o segundo espera
+                # o commit do primeiro e lê o status já gravado — o UPDATE do status travaria a
+                # linha até o commit de qualquer jeito; a trava só chega antes da leitura.
+                result = await db.execute(select(Message)
+                                          .where(Message.wa_message_id == wa_message_id)
+                                          .with_for_update())
                 existing = result.scalar_one_or_none()
+                status_anterior = existing.status if existing else None
                 if existing:
                     existing.status = new_status
 
@@ -477,10 +558,11 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                         existing.error_details = erro["error_details"]
                     # Loga mesmo quando a mensagem não está no nosso banco: o motivo da
                     # recusa é informação, ainda que não haja linha para carimbar.
-                    print(f"❌ Meta recusou {wa_message_id}: status={new_status} "
-                          f"code={erro['error_code']} title={erro['error_title']!r} "
-                          f"details={erro['error_details']!r}"
-                          f"{'' if existing else ' [mensagem não encontrada no banco]'}")
+                    logger.error("❌ Meta recusou %s: status=%s code=%s title=%r details=%r%s",
+                                 wa_message_id, new_status,
+                                 erro['error_code'], erro['error_title'],
+                                 erro['error_details'],
+                                 '' if existing else ' [mensagem não encontrada no banco]')
 
                 # REALIMENTAÇÃO DO CARIMBO DO LEAD (Fase 2).
                 #
@@ -493,8 +575,18 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                         await _realimentar_welcome_status(
                             wa_message_id, new_status, erro, db)
                 except Exception as e:
-                    print(f"⚠️  welcome_status não realimentado ({wa_message_id}): "
-                          f"{type(e).__name__}: {e}")
+                    logger.warning("⚠️  welcome_status não realimentado (%s): %s: %s",
+                                   wa_message_id, type(e).__name__, e)
+
+                # CONTADOR DE SAÚDE POR TEMPLATE (delivery_health). Mesmo savepoint defensivo:
+                # o balde do minuto é observabilidade e não pode custar o status do lote.
+                if existing is not None and existing.template_name:
+                    try:
+                        async with db.begin_nested():
+                            await contar_desfecho(db, existing, status_anterior, new_status)
+                    except Exception as e:
+                        logger.warning("⚠️  desfecho de template não contado (%s): %s: %s",
+                                       wa_message_id, type(e).__name__, e)
 
             # === AGENTE IA: DESATIVADO TEMPORARIAMENTE ===
             # for msg in value.get("messages", []):
@@ -580,11 +672,32 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
             #         print(f"🤖 IA respondeu para {sender_wa_id}")
 
             await db.commit()
-            print(f"💾 Dados salvos no banco!")
+            logger.debug("💾 Dados salvos no banco!")
 
     return {"status": "ok"}
 
 
 @app.get("/health")
 async def health():
-    return {"status": "online"}
\ No newline at end of file
+    return {"status": "online"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Métricas no formato texto do Prometheus (ver app/metrics.py)."""
+    from fastapi.responses import PlainTextResponse
+    from app import metrics as m
+
+    if m.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {m.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token inválido")
+    return PlainTextResponse(m.exposicao(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/debug/pool", include_in_schema=False)
+async def debug_pool(_admin=Depends(get_current_admin)):
+    """Estado do pool de conexões agora: em uso, ociosas, overflow, espera e timeouts."""
+    from app.database import engine, engine_leitura, estado_pool
+
+    estado = estado_pool(engine.pool)
+    estado["leitura"] = estado_pool(engine_leitura.pool) if engine_leitura is not None else None
+    return estado
@@ -0,0 +1,365 @@
+"""Métricas no formato texto do Prometheus, expostas em GET /metrics.
+
+Até aqui a única telemetria eram os `print()` com emoji: nenhum percentil de latência do
+/webhook, nenhuma ideia de quantos SQL um GET /api/contacts dispara, nenhum tempo de
+resposta da Meta, da Exact, da OpenAI, da Twilio ou do Google. Este módulo mede três coisas:
+
+  * ROTA: `MetricasMiddleware` (ASGI puro) mede cada request por método, ROTA e status.
+    A rota é o MOLDE (`/api/contacts/{wa_id}`), nunca o path cru — com o path cru cada
+    contato viraria uma série nova e o /metrics cresceria sem fim.
+  * BANCO: `instrumentar_engine(engine)` pendura before/after_cursor_execute no engine. Todo
+    statement entra em db_statement_duration_seconds; os que rodam DENTRO de um request também
+    somam no contador daquele request, que vira http_request_db_statements e
+    http_request_db_seconds por rota. É o número que denuncia um N+1.
+  * APIs EXTERNAS: `cliente_http(servico, ...)` é o httpx.AsyncClient de sempre com um
+    transporte que cronometra cada chamada; `medir_externo(servico)` cobre o que não é httpx
+    (googleapiclient no pool do google_executor, SDK síncrono da Twilio).
+
+------------------------------------------------------------------------------------------
+POR QUE UM REGISTRO PRÓPRIO, E NÃO prometheus_client
+------------------------------------------------------------------------------------------
+O backend roda em UM processo (uvicorn sem --workers — ver RECON_NAT_FASE0), então não há
+agregação entre workers para resolver, que é o que justificaria a biblioteca. O que sobra é
+contador e histograma com rótulos, e o formato texto 0.0.4 — umas poucas dezenas de linhas,
+sem dependência nova no requirements. Os nomes seguem a convenção do Prometheus
+(`_seconds`, `_total`), então trocar por prometheus_client depois não muda nenhum painel.
+
+As séries vivem em memória e zeram no restart, como em qualquer exporter: o Prometheus
+entende o reset de contador.
+
+------------------------------------------------------------------------------------------
+O QUE O TEMPO MEDE
+------------------------------------------------------------------------------------------
+  * Rota: do primeiro byte do request até o fim do corpo da resposta, incluindo
+    BackgroundTasks (que o Starlette roda antes de devolver o controle ao middleware).
+  * Externa: até os CABEÇALHOS da resposta. Num download em streaming (gravações da
+    Twilio), o corpo vem depois e não entra — o que se quer aqui é a latência do parceiro,
+    não a velocidade do link.
+  * Banco: o execute do driver, sem o tempo de espera por conexão no pool.
+
+`METRICS_TOKEN`, se definido, passa a ser exigido como Bearer no /metrics. Sem ele o
+endpoint fica aberto como o /health: só há moldes de rota e contagens, nenhum dado de lead.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+from sqlalchemy import event
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BALDES_STATEMENTS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+ROTA_DESCONHECIDA = "(sem rota)"
+
+_registro: list = []
+
+
+# ------------------------------------------------------------------------------------------
+# Contador e histograma
+# ------------------------------------------------------------------------------------------
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+class Contador:
+    """Contador monotônico com rótulos. `inc` é seguro entre threads (pool do Google)."""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores: dict = {}
+        self._trava = threading.Lock()
+        _registro.append(self)
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = tuple(str(rotulos[n]) for n in self.rotulos)
+        with self._trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        return self._valores.get(tuple(str(rotulos[n]) for n in self.rotulos), 0)
+
+    def _linhas(self):
+        with self._trava:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma com baldes fixos e rótulos, no formato cumulativo do Prometheus."""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (),
+                 baldes: tuple = BALDES_SEGUNDOS):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.baldes = tuple(sorted(baldes))
+        self._series: dict = {}          # rótulos -> [contagem por balde..., soma, total]
+        self._trava = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor: float, **rotulos):
+        chave = tuple(str(rotulos[n]) for n in self.rotulos)
+        with self._trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.baldes) + 2)
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def contagem(self, **rotulos) -> int:
+        serie = self._series.get(tuple(str(rotulos[n]) for n in self.rotulos))
+        return serie[-1] if serie else 0
+
+    def soma(self, **rotulos) -> float:
+        serie = self._series.get(tuple(str(rotulos[n]) for n in self.rotulos))
+        return serie[-2] if serie else 0.0
+
+    def _linhas(self):
+        with self._trava:
+            itens = sorted((k, list(v)) for k, v in self._series.items())
+        for chave, serie in itens:
+            acumulado = 0
+            for limite, n in zip(self.baldes, serie):
+                acumulado += n
+                le = f'le="{_numero(limite)}"'
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}"
+            infinito = 'le="+Inf"'
+            yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, infinito)} {serie[-1]}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(serie[-2])}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie[-1]}"
+
+
+class Medidor:
+    """Gauge lido na hora da coleta: `coletar()` devolve {valores dos rótulos: número}.
+
+    Para estado que já vive em outro lugar (o pool do SQLAlchemy sabe quantas conexões estão
+    em uso): em vez de espelhar cada mudança num contador, pergunta-se a ele a cada scrape.
+    """
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), *, coletar):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.coletar = coletar
+        _registro.append(self)
+
+    def _linhas(self):
+        for chave, valor in sorted(self.coletar().items()):
+            chave = chave if isinstance(chave, tuple) else (chave,)
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+def exposicao() -> str:
+    """Todas as métricas registradas, no formato texto 0.0.4 do Prometheus."""
+    linhas = []
+    for metrica in _registro:
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica._linhas())
+    return "\n".join(linhas) + "\n"
+
+
+# ------------------------------------------------------------------------------------------
+# As métricas
+# ------------------------------------------------------------------------------------------
+
+http_duracao = Histograma(
+    "http_request_duration_seconds", "Duração dos requests HTTP por rota.",
+    ("method", "route", "status"))
+http_statements = Histograma(
+    "http_request_db_statements", "Statements SQL executados por request.",
+    ("route",), BALDES_STATEMENTS)
+http_sql_segundos = Histograma(
+    "http_request_db_seconds", "Tempo somado de SQL por request.", ("route",))
+sql_duracao = Histograma(
+    "db_statement_duration_seconds",
+    "Duração de cada statement SQL; origem=request ou background (jobs e filas).",
+    ("origem",))
+sql_erros = Contador(
+    "db_statement_errors_total", "Statements SQL que terminaram em erro.", ("origem",))
+externo_duracao = Histograma(
+    "external_request_duration_seconds",
+    "Duração das chamadas a APIs externas; status é o HTTP ou o nome da exceção.",
+    ("service", "status"))
+
+
+# ------------------------------------------------------------------------------------------
+# Rota
+# ------------------------------------------------------------------------------------------
+
+# Acumulador do request corrente. É um objeto MUTÁVEL de propósito: o SQLAlchemy async roda o
+# execute num greenlet que herda o contexto da task, e é mutando o mesmo objeto (e não dando
+# .set() no contextvar) que o que o hook soma volta para o middleware.
+_request_atual: contextvars.ContextVar = contextvars.ContextVar("metricas_request", default=None)
+
+
+def _rota(scope) -> str:
+    rota = scope.get("route")
+    return getattr(rota, "path", None) or ROTA_DESCONHECIDA
+
+
+class MetricasMiddleware:
+    """ASGI puro (e não BaseHTTPMiddleware): não bufferiza o corpo e não quebra streaming."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medida = SimpleNamespace(statements=0, sql=0.0, status=500)
+        token = _request_atual.set(medida)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                medida.status = mensagem["status"]
+            await send(mensagem)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _request_atual.reset(token)
+            rota = _rota(scope)
+            http_duracao.observar(time.perf_counter() - inicio, method=scope["method"],
+                                  route=rota, status=medida.status)
+            http_statements.observar(medida.statements, route=rota)
+            http_sql_segundos.observar(medida.sql, route=rota)
+
+
+# ------------------------------------------------------------------------------------------
+# Banco
+# ------------------------------------------------------------------------------------------
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metricas_inicio = time.perf_counter()
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_metricas_inicio", None)
+    if inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    medida = _request_atual.get()
+    sql_duracao.observar(duracao, origem="request" if medida is not None else "background")
+    if medida is not None:
+        medida.statements += 1
+        medida.sql += duracao
+
+
+def _erro_sql(contexto_excecao):
+    medida = _request_atual.get()
+    sql_erros.inc(origem="request" if medida is not None else "background")
+
+
+def instrumentar_engine(engine) -> None:
+    """Pendura os hooks de tempo no engine (async ou síncrono). Chamado uma vez, em database.py."""
+    alvo = getattr(engine, "sync_engine", engine)
+    event.listen(alvo, "before_cursor_execute", _antes_sql)
+    event.listen(alvo, "after_cursor_execute", _depois_sql)
+    event.listen(alvo, "handle_error", _erro_sql)
+
+
+# ------------------------------------------------------------------------------------------
+# APIs externas
+# ------------------------------------------------------------------------------------------
+
+def _status_do_erro(erro: BaseException) -> str:
+    # HttpError do googleapiclient carrega o status HTTP em .resp.status.
+    status = getattr(getattr(erro, "resp", None), "status", None)
+    return str(status) if status else type(erro).__name__
+
+
+@contextmanager
+def medir_externo(servico: str):
+    """Cronometra uma chamada externa. Quem usa pode gravar `.status` no objeto devolvido;
+    sem isso fica 'ok', e uma exceção vira o status HTTP dela ou o nome da classe."""
+    medida = SimpleNamespace(status="ok")
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    except BaseException as erro:
+        medida.status = _status_do_erro(erro)
+        raise
+    finally:
+        externo_duracao.observar(time.perf_counter() - inicio, service=servico,
+                                 status=medida.status)
+
+
+class TransporteMedido(httpx.AsyncBaseTransport):
+    """Transporte httpx que cronometra cada request e delega ao transporte de verdade."""
+
+    def __init__(self, servico: str, transporte: httpx.AsyncBaseTransport | None = None,
+                 **kwargs_transporte):
+        self.servico = servico
+        self._transporte = transporte or httpx.AsyncHTTPTransport(**kwargs_transporte)
+
+    async def handle_async_request(self, request):
+        with medir_externo(self.servico) as medida:
+            resposta = await self._transporte.handle_async_request(request)
+            medida.status = resposta.status_code
+        return resposta
+
+    async def aclose(self):
+        await self._transporte.aclose()
+
+
+def cliente_http(servico: str, **kwargs) -> httpx.AsyncClient:
+    """`httpx.AsyncClient(**kwargs)` com as chamadas medidas sob `servico`.
+
+    `servico` é um nome curto e FIXO ("graph", "exact", "twilio"...), nunca uma URL: vira
+    rótulo, e cada valor distinto é uma série nova.
+    """
+    kwargs["transport"] = TransporteMedido(servico, kwargs.get("transport"))
+    return httpx.AsyncClient(**kwargs)
+
+
+def http_client_openai():
+    """http_client para o AsyncOpenAI: o padrão do SDK (limites e timeouts), medido."""
+    from openai import DEFAULT_CONNECTION_LIMITS, DefaultAsyncHttpxClient
+
+    return DefaultAsyncHttpxClient(
+        transport=TransporteMedido("openai", limits=DEFAULT_CONNECTION_LIMITS))
+
+
+_TwilioMedido = None
+
+
+def http_client_twilio():
+    """http_client para o twilio.rest.Client (síncrono), com cada request medido."""
+    global _TwilioMedido
+    if _TwilioMedido is None:
+        from twilio.http.http_client import TwilioHttpClient
+
+        class _TwilioMedido(TwilioHttpClient):
+            def request(self, *args, **kwargs):
+                with medir_externo("twilio") as medida:
+                    resposta = super().request(*args, **kwargs)
+                    medida.status = resposta.status_code
+                return resposta
+    return _TwilioMedido()
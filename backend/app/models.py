@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, BigInteger, Integer, Boolean, ForeignKey, func, Table, CheckConstraint
+from sqlalchemy import Column, String, Text, Date, DateTime, BigInteger, Integer, Boolean, ForeignKey, func, Table, CheckConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -48,15 +48,23 @@ class Contact(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    # Particionada por mês em `timestamp` (ver migrate_messages_particionada.py e
+    # app/particoes.py). O Postgres exige a chave de partição em toda constraint única: a PK
+    # é (id, timestamp) e a unicidade do wamid é (wa_message_id, timestamp) — o webhook
+    # repetido da Meta traz o mesmo timestamp, então a duplicata continua barrada.
+    __table_args__ = (
+        UniqueConstraint("wa_message_id", "timestamp", name="messages_wamid_ts_key"),
+        {"postgresql_partition_by": 'RANGE ("timestamp")'},
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    wa_message_id = Column(String(255), unique=True, nullable=False, index=True)
+    wa_message_id = Column(String(255), nullable=False, index=True)
     contact_wa_id = Column(String(20), ForeignKey("contacts.wa_id"), nullable=False, index=True)
     channel_id = Column(Integer, ForeignKey("channels.id"))
     direction = Column(String(10), nullable=False)
     message_type = Column(String(20), nullable=False)
     content = Column(Text, nullable=True)
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, primary_key=True, nullable=False)
     status = Column(String(20), default="received")
     sent_by_ai = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now())
@@ -69,6 +77,11 @@ class Message(Base):
     # É a coluna que substitui o COLUNA_MARCADOR_ENVIO_NAT = None de nat_guard.
     nat_etapa = Column(Text, nullable=True)
 
+    # Nome do template Meta, em todo envio de template (ver migrate_template_health.py). É a
+    # chave da saúde de entrega POR FLUXO em delivery_health; NULL em texto, mídia, recebidas
+    # e nos templates enviados antes da coluna existir.
+    template_name = Column(Text, nullable=True)
+
     # Motivo da falha, vindo de statuses[].errors[] no webhook (ver migrate_message_error.py).
     # Só é preenchido quando a Meta reporta erro; NULL é o caso normal.
     # error_details é onde a Meta explica em linguagem natural — vale mais que o title.
@@ -101,6 +114,8 @@ class User(Base):
     role = Column(String(20), nullable=False, default="atendente")
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
+    # Vai no JWT (claim "tv"); subir o número revoga todos os tokens já emitidos.
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 
 class ExactLead(Base):
@@ -203,6 +218,15 @@ class AIConversationSummary(Base):
     lead_course = Column(String(255), nullable=True)
     ai_messages_count = Column(Integer, default=0)
     human_took_over = Column(Boolean, default=False)
+
+    # Resumo ROLANTE das mensagens que já saíram da janela de histórico da IA (ver
+    # ai_engine.resumo_rolante e migrate_history_summary.py). NÃO é o `summary` acima: aquele
+    # é o resumo do card no Kanban, escrito por humano ou pelo botão "gerar resumo"; este é
+    # contexto interno do prompt, reescrito incrementalmente. history_summary_until é o id da
+    # última Message já incorporada — o que permite resumir só o que é novo a cada vez.
+    history_summary = Column(Text, nullable=True)
+    history_summary_until = Column(BigInteger, nullable=True)
+
     started_at = Column(DateTime, server_default=func.now())
     finished_at = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -228,6 +252,28 @@ class CallLog(Base):
     transcription = Column(Text, nullable=True)
     transcription_insights = Column(Text, nullable=True)
     transcription_status = Column(String(30), nullable=True)  # pending, processing, done, error
+
+    # Fila de transcrição (ver transcription_worker.py e migrate_transcription_worker.py).
+    # run_at é naive em SP, igual a nat_scheduled_actions.run_at: NULL = assim que possível,
+    # preenchido = retentativa que só volta à fila depois dessa hora. timings é JSON em TEXT
+    # (padrão da casa) com o tempo de cada etapa, em ms.
+    transcription_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    transcription_run_at = Column(DateTime, nullable=True)
+    transcription_started_at = Column(DateTime, nullable=True)
+    transcription_finished_at = Column(DateTime, nullable=True)
+    transcription_error = Column(Text, nullable=True)
+    transcription_timings = Column(Text, nullable=True)
+
+    # Fila de upload ao Drive (ver drive_uploader.py e migrate_drive_upload.py). Mesmos
+    # estados e mesma semântica de run_at da fila de transcrição. upload_uri é a sessão de
+    # upload resumível aberta no Drive (vale ~1 semana); progress, os bytes já confirmados.
+    drive_upload_status = Column(String(20), nullable=True)  # pending, processing, done, error
+    drive_upload_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    drive_upload_run_at = Column(DateTime, nullable=True)
+    drive_upload_started_at = Column(DateTime, nullable=True)
+    drive_upload_error = Column(Text, nullable=True)
+    drive_upload_uri = Column(Text, nullable=True)
+    drive_upload_progress = Column(BigInteger, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user_name = Column(String(255), nullable=True)
     contact_wa_id = Column(String(20), nullable=True)
@@ -320,6 +366,9 @@ class NatConfig(Base):
     nat_enabled = Column(Boolean, nullable=False, default=False)
     nat_start_at = Column(DateTime, nullable=True)
     max_envios_hora = Column(Integer, nullable=False, default=20)
+    # Incrementada por trigger a cada UPDATE, que também avisa por NOTIFY. É o que invalida
+    # o cache do nat_guard (ver migrate_nat_guard_cache.py).
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
@@ -449,3 +498,38 @@ class NatScheduledAction(Base):
     attempts = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, server_default=func.now())
     processed_at = Column(DateTime, nullable=True)
+
+
+class ArchiveBatch(Base):
+    """Um mês de uma tabela que saiu para o arquivo frio (ver app/arquivo.py).
+
+    Registro de auditoria: quantas linhas, o arquivo (relativo a ARQUIVO_DIR) e o sha256 que
+    a conferência calculou antes de os dados saírem do banco.
+    """
+    __tablename__ = "archive_batches"
+
+    table_name = Column(String(40), primary_key=True)
+    month = Column(Date, primary_key=True)
+    file_path = Column(Text, nullable=False)
+    row_count = Column(BigInteger, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+
+class ArchiveMessageBlock(Base):
+    """Onde estão as mensagens arquivadas de UM contato num mês: um quadro zstd do arquivo.
+
+    É o que deixa o histórico paginar para dentro do arquivo sem abrir o mês inteiro — um
+    seek em `offset` e `size` bytes descomprimidos sozinhos. first_at/last_at são os
+    timestamps (naive SP, como messages.timestamp) do bloco, para pular mês que não serve.
+    """
+    __tablename__ = "archive_message_blocks"
+
+    contact_wa_id = Column(String(20), primary_key=True)
+    month = Column(Date, primary_key=True)
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
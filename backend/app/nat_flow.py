@@ -27,6 +27,7 @@ Duas regras que valem para tudo neste módulo:
     aguardando_ligacao é ruído (lead rolou a conversa e clicou no botão antigo) — reprocessar
     mandaria o fluxo para trás e o lead receberia de novo uma mensagem que já recebeu.
 """
+import logging
 from datetime import timedelta
 
 from sqlalchemy import select
@@ -41,6 +42,8 @@ from app.nat_guard import (GESTOR_USER_ID, _agora_sp, dentro_horario_comercial,
                            nat_pode_atuar)
 from app.nat_sender import send_nat_message
 
+logger = logging.getLogger(__name__)
+
 # ------------------------------------------------------------------------------------------
 # TRANSFERÊNCIA PARA O SDR (Bloco 5)
 # ------------------------------------------------------------------------------------------
@@ -188,9 +191,9 @@ async def _destinatario_da_transferencia(state: NatFlowState, db: AsyncSession):
         return state.sdr_user_id, False
 
     if await usuario_existe(GESTOR_USER_ID, db):
-        print(f"⚠️  NAT: {state.contact_wa_id} chegou na transferência sem SDR válido "
-              f"(sdr_user_id={state.sdr_user_id}) — notificando a gestão "
-              f"(id={GESTOR_USER_ID})")
+        logger.warning("⚠️  NAT: %s chegou na transferência sem SDR válido (sdr_user_id=%s) — "
+                       "notificando a gestão (id=%s)",
+                       state.contact_wa_id, state.sdr_user_id, GESTOR_USER_ID)
         return GESTOR_USER_ID, True
 
     return None, False
@@ -224,9 +227,9 @@ async def transferir_para_sdr(state: NatFlowState, resposta_do_lead: str,
     # ---- PASSO 1: notificação (+ carimbo) — se falhar, aborta o resto ----
     destinatario, eh_fallback = await _destinatario_da_transferencia(state, db)
     if destinatario is None:
-        print(f"❌ NAT: transferência de {wa_id} sem destinatário possível "
-              f"(sdr_user_id={state.sdr_user_id}, gestor id={GESTOR_USER_ID} não existe) — "
-              "nada notificado, timeline e SLA não tentados")
+        logger.error("❌ NAT: transferência de %s sem destinatário possível (sdr_user_id=%s, "
+                     "gestor id=%s não existe) — nada notificado, timeline e SLA não tentados",
+                     wa_id, state.sdr_user_id, GESTOR_USER_ID)
         return False
 
     title, body = montar_notificacao_transferencia(
@@ -245,16 +248,17 @@ async def transferir_para_sdr(state: NatFlowState, resposta_do_lead: str,
                 body=body,
             ))
             state.transferido_em = _agora_sp()
-        print(f"🔔 NAT: transferência de {wa_id} notificada para user {destinatario}"
-              f"{' (FALLBACK gestão)' if eh_fallback else ''}: {title}")
+        logger.info("🔔 NAT: transferência de %s notificada para user %s%s: %s",
+                    wa_id, destinatario, ' (FALLBACK gestão)' if eh_fallback else '',
+                    title)
     except Exception as e:
-        print(f"❌ NAT: notificação de transferência FALHOU para {wa_id} "
-              f"({type(e).__name__}: {e}) — timeline e SLA não serão tentados")
+        logger.error("❌ NAT: notificação de transferência FALHOU para %s (%s: %s) — timeline e "
+                     "SLA não serão tentados", wa_id, type(e).__name__, e)
         return False
 
     # ---- PASSO 2: anotação na timeline do Exact ----
     if state.exact_lead_id is None:
-        print(f"↩️  NAT: {wa_id} sem exact_lead_id — timeline não anotada")
+        logger.info("↩️  NAT: %s sem exact_lead_id — timeline não anotada", wa_id)
     else:
         try:
             async with db.begin_nested():
@@ -272,8 +276,8 @@ async def transferir_para_sdr(state: NatFlowState, resposta_do_lead: str,
             # add_timeline_comment já engole a própria exceção e devolve False; isto aqui é a
             # rede para o que ela não prevê. Falha na Exact não pode custar a transferência,
             # que já está notificada e carimbada.
-            print(f"⚠️  NAT: timeline do Exact não anotada para {wa_id} "
-                  f"({type(e).__name__}: {e}) — transferência segue válida")
+            logger.warning("⚠️  NAT: timeline do Exact não anotada para %s (%s: %s) — "
+                           "transferência segue válida", wa_id, type(e).__name__, e)
 
     # ---- PASSO 3: SLA. O mais descartável, sozinho no savepoint. ----
     try:
@@ -286,8 +290,9 @@ async def transferir_para_sdr(state: NatFlowState, resposta_do_lead: str,
                 db,
             )
     except Exception as e:
-        print(f"⚠️  NAT: sla_check NÃO agendado para {wa_id} ({type(e).__name__}: {e}) — "
-              "a notificação ao SDR permanece, mas NÃO haverá escalonamento automático")
+        logger.warning("⚠️  NAT: sla_check NÃO agendado para %s (%s: %s) — a notificação ao SDR "
+                       "permanece, mas NÃO haverá escalonamento automático",
+                       wa_id, type(e).__name__, e)
 
     return True
 
@@ -305,7 +310,7 @@ async def iniciar_fluxo_nat(lead, db: AsyncSession) -> str | None:
     try:
         pode, motivo = await nat_pode_atuar(lead, db)
         if not pode:
-            print(f"🔒 NAT não iniciou fluxo: {motivo}")
+            logger.info("🔒 NAT não iniciou fluxo: %s", motivo)
             return None
 
         if isinstance(lead, ExactLead):
@@ -318,13 +323,14 @@ async def iniciar_fluxo_nat(lead, db: AsyncSession) -> str | None:
             sub_source = lead.get("sub_source")
 
         if not wa_id:
-            print("🔒 NAT não iniciou fluxo: lead sem telefone resolvível")
+            logger.info("🔒 NAT não iniciou fluxo: lead sem telefone resolvível")
             return None
 
         # Já está no fluxo: não reiniciar. Um lead re-ingerido não volta para o começo.
         existente = await _estado_do_contato(wa_id, db)
         if existente is not None:
-            print(f"↩️  NAT: {wa_id} já está no fluxo (etapa {existente.etapa}) — nada a fazer")
+            logger.info("↩️  NAT: %s já está no fluxo (etapa %s) — nada a fazer",
+                        wa_id, existente.etapa)
             return existente.etapa
 
         res = await db.execute(select(Contact.assigned_to).where(Contact.wa_id == wa_id))
@@ -337,8 +343,8 @@ async def iniciar_fluxo_nat(lead, db: AsyncSession) -> str | None:
                 contact_wa_id=wa_id, exact_lead_id=exact_lead_id, sdr_user_id=sdr_user_id,
                 etapa=ETAPA_AGUARDANDO_HORARIO,
             ))
-            print(f"🌙 NAT: {wa_id} chegou fora de 09h-19h → {ETAPA_AGUARDANDO_HORARIO} "
-                  "(nada enviado)")
+            logger.info("🌙 NAT: %s chegou fora de 09h-19h → %s (nada enviado)",
+                        wa_id, ETAPA_AGUARDANDO_HORARIO)
             return ETAPA_AGUARDANDO_HORARIO
 
         from app.exact_spotter import resolve_course_name
@@ -349,18 +355,18 @@ async def iniciar_fluxo_nat(lead, db: AsyncSession) -> str | None:
         if not enviou:
             # Sem estado: nada pode afirmar que o lead está esperando uma resposta que ele
             # nunca recebeu. O motivo já foi logado pelo sender.
-            print(f"🔒 NAT: boas-vindas não saiu para {wa_id} — fluxo não iniciado")
+            logger.info("🔒 NAT: boas-vindas não saiu para %s — fluxo não iniciado", wa_id)
             return None
 
         db.add(NatFlowState(
             contact_wa_id=wa_id, exact_lead_id=exact_lead_id, sdr_user_id=sdr_user_id,
             etapa=ETAPA_AGUARDANDO_RESPOSTA,
         ))
-        print(f"✅ NAT: fluxo iniciado para {wa_id} → {ETAPA_AGUARDANDO_RESPOSTA}")
+        logger.info("✅ NAT: fluxo iniciado para %s → %s", wa_id, ETAPA_AGUARDANDO_RESPOSTA)
         return ETAPA_AGUARDANDO_RESPOSTA
 
     except Exception as e:
-        print(f"⚠️  NAT: erro ao iniciar fluxo: {type(e).__name__}: {e}")
+        logger.warning("⚠️  NAT: erro ao iniciar fluxo: %s: %s", type(e).__name__, e)
         return None
 
 
@@ -387,11 +393,12 @@ def _payload_do_evento(evento: dict, state: NatFlowState) -> str | None:
     aprovados = nat_copy.BOTOES_APROVADOS.get(nat_copy.NAT_BOASVINDAS, [])
     livres = [b["titulo"] for b in nat_copy.BOTOES_LIVRES.get(nat_copy.NAT_BOASVINDAS, [])]
     if texto in {t.lower() for t in (aprovados[:1] + livres[:1])}:
-        print(f"↪️  NAT: clique sem payload conhecido, resolvido por texto → {nat_copy.NAT_SIM}")
+        logger.info("↪️  NAT: clique sem payload conhecido, resolvido por texto → %s",
+                    nat_copy.NAT_SIM)
         return nat_copy.NAT_SIM
     if texto in {t.lower() for t in (aprovados[1:2] + livres[1:2])}:
-        print("↪️  NAT: clique sem payload conhecido, resolvido por texto → "
-              f"{nat_copy.NAT_OUTRO_HORARIO}")
+        logger.info("↪️  NAT: clique sem payload conhecido, resolvido por texto → %s",
+                    nat_copy.NAT_OUTRO_HORARIO)
         return nat_copy.NAT_OUTRO_HORARIO
 
     return payload or None
@@ -410,18 +417,18 @@ async def processar_clique(evento: dict, db: AsyncSession) -> str | None:
 
         state = await _estado_do_contato(wa_id, db)
         if state is None:
-            print(f"↩️  NAT: clique de {wa_id} sem fluxo ativo — ignorado")
+            logger.info("↩️  NAT: clique de %s sem fluxo ativo — ignorado", wa_id)
             return None
 
         if _ja_processado(state, wa_message_id):
-            print(f"↩️  NAT: clique {wa_message_id} já processado — nada refeito")
+            logger.info("↩️  NAT: clique %s já processado — nada refeito", wa_message_id)
             return state.etapa
 
         payload = _payload_do_evento(evento, state)
 
         if state.etapa != ETAPA_AGUARDANDO_RESPOSTA:
-            print(f"↩️  NAT: clique '{payload}' fora da etapa esperada "
-                  f"(lead está em {state.etapa}) — ignorado")
+            logger.info("↩️  NAT: clique '%s' fora da etapa esperada (lead está em %s) — ignorado",
+                        payload, state.etapa)
             return None
 
         if payload == nat_copy.NAT_SIM:
@@ -429,21 +436,21 @@ async def processar_clique(evento: dict, db: AsyncSession) -> str | None:
         elif payload == nat_copy.NAT_OUTRO_HORARIO:
             destino, mensagem = ETAPA_REAGENDADO, nat_copy.NAT_MSG_OUTRO_HORARIO
         else:
-            print(f"↩️  NAT: payload '{payload}' desconhecido — ignorado")
+            logger.info("↩️  NAT: payload '%s' desconhecido — ignorado", payload)
             return None
 
         dados = await _dados_do_lead(state, db)
         if not await send_nat_message(wa_id, mensagem, db, **dados):
-            print(f"🔒 NAT: '{mensagem}' não saiu — estado permanece em {state.etapa}")
+            logger.info("🔒 NAT: '%s' não saiu — estado permanece em %s", mensagem, state.etapa)
             return None
 
         state.etapa = destino
         state.ultimo_wa_message_id = wa_message_id
-        print(f"➡️  NAT: {wa_id} {ETAPA_AGUARDANDO_RESPOSTA} → {destino}")
+        logger.info("➡️  NAT: %s %s → %s", wa_id, ETAPA_AGUARDANDO_RESPOSTA, destino)
         return destino
 
     except Exception as e:
-        print(f"⚠️  NAT: erro ao processar clique: {type(e).__name__}: {e}")
+        logger.warning("⚠️  NAT: erro ao processar clique: %s: %s", type(e).__name__, e)
         return None
 
 
@@ -460,7 +467,7 @@ async def processar_texto(contact_wa_id: str, texto: str, wa_message_id: str,
             return None
 
         if _ja_processado(state, wa_message_id):
-            print(f"↩️  NAT: texto {wa_message_id} já processado — nada refeito")
+            logger.info("↩️  NAT: texto %s já processado — nada refeito", wa_message_id)
             return state.etapa
 
         # Em reagendado, o período só chega por texto — o clique sozinho não traz período.
@@ -468,18 +475,19 @@ async def processar_texto(contact_wa_id: str, texto: str, wa_message_id: str,
             if state.horario_preferencial is None and (texto or "").strip():
                 state.horario_preferencial = texto.strip()
                 state.ultimo_wa_message_id = wa_message_id
-                print(f"🗓️  NAT: horário preferencial de {contact_wa_id} registrado: "
-                      f"{state.horario_preferencial!r}")
+                logger.info("🗓️  NAT: horário preferencial de %s registrado: %r",
+                            contact_wa_id, state.horario_preferencial)
             return state.etapa
 
         if state.etapa != ETAPA_AGUARDANDO_MOTIVACAO:
-            print(f"↩️  NAT: texto de {contact_wa_id} em {state.etapa} — nenhuma transição")
+            logger.info("↩️  NAT: texto de %s em %s — nenhuma transição",
+                        contact_wa_id, state.etapa)
             return None
 
         dados = await _dados_do_lead(state, db)
         if not await send_nat_message(
                 contact_wa_id, nat_copy.NAT_CONFIRMA_TRANSFERENCIA, db, **dados):
-            print(f"🔒 NAT: confirmação não saiu — {contact_wa_id} segue em {state.etapa}")
+            logger.info("🔒 NAT: confirmação não saiu — %s segue em %s", contact_wa_id, state.etapa)
             return None
 
         # A máquina de estados avança AQUI, e sempre: a mensagem já saiu para o lead, e não
@@ -487,16 +495,17 @@ async def processar_texto(contact_wa_id: str, texto: str, wa_message_id: str,
         # efeito colateral (avisar, registrar, armar o SLA), nunca a transição.
         state.etapa = ETAPA_AGUARDANDO_LIGACAO
         state.ultimo_wa_message_id = wa_message_id
-        print(f"➡️  NAT: {contact_wa_id} {ETAPA_AGUARDANDO_MOTIVACAO} → "
-              f"{ETAPA_AGUARDANDO_LIGACAO}")
+        logger.info("➡️  NAT: %s %s → %s",
+                    contact_wa_id, ETAPA_AGUARDANDO_MOTIVACAO, ETAPA_AGUARDANDO_LIGACAO)
 
         # transferido_em é carimbado lá dentro, junto da notificação (ver transferir_para_sdr).
         if not await transferir_para_sdr(state, texto, wa_message_id, db):
-            print(f"🚨 NAT: {contact_wa_id} está em {ETAPA_AGUARDANDO_LIGACAO} e NINGUÉM foi "
-                  "avisado. O lead pediu para ser ligado e não há notificação nem SLA.")
+            logger.error("🚨 NAT: %s está em %s e NINGUÉM foi avisado. O lead pediu para ser "
+                         "ligado e não há notificação nem SLA.",
+                         contact_wa_id, ETAPA_AGUARDANDO_LIGACAO)
 
         return ETAPA_AGUARDANDO_LIGACAO
 
     except Exception as e:
-        print(f"⚠️  NAT: erro ao processar texto: {type(e).__name__}: {e}")
+        logger.warning("⚠️  NAT: erro ao processar texto: %s: %s", type(e).__name__, e)
         return None
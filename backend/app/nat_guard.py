@@ -12,14 +12,22 @@ As 5 verificações, nesta ordem:
   3. Funil do lead é 18535?
   4. assigned_to do contato está em (4, 5)?
   5. Teto de max_envios_hora não estourado na última hora?
+
+As verificações 1 e 5 rodam antes de CADA envio da NAT, no caminho crítico do webhook. As duas
+deixaram de custar query por envio — ver CACHE DO nat_config e CONTADOR POR MINUTO abaixo.
 """
+import logging
+import time
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import NatConfig, ExactLead, Contact, Message
 
+logger = logging.getLogger(__name__)
+
 # Mesmo offset fixo usado no resto do projeto (main.py:18). Sem DST, de propósito:
 # é o que os timestamps gravados já usam.
 SP_TZ = timezone(timedelta(hours=-3))
@@ -147,10 +155,188 @@ async def contar_envios_nat_ultima_hora(db: AsyncSession) -> int:
     return int(res.scalar() or 0)
 
 
+# ---------------------------------------------------------------------------------------
+# CONTADOR POR MINUTO — verificação 5 sem COUNT por envio
+#
+# Janela deslizante em memória: {minuto: envios da NAT naquele minuto}. send_nat_message
+# soma 1 no minuto corrente (registrar_envio_nat) e o guard soma os baldes da última hora —
+# no máximo 61 inteiros, sem ir ao banco.
+#
+# Reconciliado contra messages a cada RECONCILIAR_SEGUNDOS, com o mesmo predicado de
+# contar_envios_nat_ultima_hora agrupado por minuto. A reconciliação fica com o MAIOR dos
+# dois valores de cada balde, nunca troca um pelo outro:
+#   * o banco ganha quando outro processo (ou um shell) mandou pela NAT;
+#   * a memória ganha quando o envio ainda não commitou (ou foi revertido depois de a Meta
+#     já ter aceitado — a mensagem saiu, então conta).
+# Os dois erros possíveis são para MAIS, que é a direção da falha fechada. O mesmo vale para
+# a borda: o balde do minuto de corte conta inteiro, até 59s além da hora exata.
+#
+# Sem reconciliação bem-sucedida há mais de RECONCILIAR_SEGUNDOS, o guard reconcilia antes de
+# responder; se a query falhar, a exceção sobe e o guard bloqueia.
+# ---------------------------------------------------------------------------------------
+RECONCILIAR_SEGUNDOS = 60
+
+_envios_por_minuto: dict[datetime, int] = {}
+_reconciliado_em: float | None = None
+
+
+def _minuto(quando: datetime) -> datetime:
+    return quando.replace(second=0, microsecond=0)
+
+
+def registrar_envio_nat(quando: datetime | None = None):
+    """Soma um envio da NAT no balde do minuto. Chamado por send_nat_message."""
+    minuto = _minuto(quando if quando is not None else _agora_sp())
+    _envios_por_minuto[minuto] = _envios_por_minuto.get(minuto, 0) + 1
+    corte = minuto - timedelta(hours=1, minutes=1)
+    for velho in [m for m in _envios_por_minuto if m < corte]:
+        del _envios_por_minuto[velho]
+
+
+async def _reconciliar_envios(db: AsyncSession, agora: datetime):
+    global _reconciliado_em
+    inicio = _minuto(agora - timedelta(hours=1))
+    marcador = getattr(Message, COLUNA_MARCADOR_ENVIO_NAT)
+    minuto = func.date_trunc("minute", Message.timestamp)
+    res = await db.execute(
+        select(minuto, func.count()).where(
+            Message.direction == "outbound",
+            Message.timestamp >= inicio,
+            marcador.isnot(None),
+        ).group_by(minuto)
+    )
+    for balde, n in res.all():
+        _envios_por_minuto[balde] = max(_envios_por_minuto.get(balde, 0), int(n))
+    _reconciliado_em = time.monotonic()
+
+
+async def envios_nat_ultima_hora(db: AsyncSession, *, agora: datetime | None = None) -> int:
+    """Envios da NAT na última hora, pela janela em memória. Contador padrão do guard."""
+    agora = agora if agora is not None else _agora_sp()
+    if _reconciliado_em is None or time.monotonic() - _reconciliado_em > RECONCILIAR_SEGUNDOS:
+        await _reconciliar_envios(db, agora)
+    inicio = _minuto(agora - timedelta(hours=1))
+    return sum(n for m, n in _envios_por_minuto.items() if m >= inicio)
+
+
+# ---------------------------------------------------------------------------------------
+# CACHE DO nat_config — verificação 1 sem SELECT por envio
+#
+# nat_config.versao é incrementada por trigger a cada UPDATE da linha, e o mesmo trigger faz
+# pg_notify(CANAL_CONFIG, versao) — ver instalar_gatilhos. O trigger pega também o UPDATE
+# feito à mão no psql, que é como o kill switch é operado hoje. O DELETE da linha (ausência =
+# desligado) avisa com versão 0, que nenhuma linha tem.
+#
+# O cache só vale enquanto o aviso tem por onde chegar: a conexão de LISTEN (a mesma do
+# agendador, nat_scheduler.escutar_agendamentos) liga o cache quando está de pé E os
+# triggers estão instalados (conferir_gatilhos — um banco criado só pelo create_all tem a
+# coluna versao e nenhum trigger), e o desliga quando cai. Sem isso, o guard volta a ler a
+# linha em toda chamada, como antes — um kill switch que não chega por NOTIFY não pode ficar
+# preso num cache. Aviso com versão diferente da guardada derruba o cache; a próxima chamada
+# relê.
+# ---------------------------------------------------------------------------------------
+CANAL_CONFIG = "nat_config"
+# Sem QUALQUER um destes, alguma mudança do nat_config não avisaria ninguém.
+GATILHOS_CONFIG = ("nat_config_versionar", "nat_config_apagada")
+
+_config_cache: SimpleNamespace | None = None
+_escuta_config_ativa = False
+# Sobe a cada invalidação. Uma leitura que começou antes de um NOTIFY não guarda o resultado:
+# ela pode ter lido a versão velha.
+_geracao_config = 0
+
+
+def invalidar_config():
+    global _config_cache, _geracao_config
+    _config_cache = None
+    _geracao_config += 1
+
+
+def escuta_config(ativa: bool):
+    """Liga/desliga o cache conforme a conexão de LISTEN. Sempre começa do zero."""
+    global _escuta_config_ativa
+    _escuta_config_ativa = ativa
+    invalidar_config()
+
+
+async def instalar_gatilhos(conn):
+    """Triggers de GATILHOS_CONFIG. Para a migração e o create_tables, numa conexão já em
+    transação. Idempotente.
+
+    O NOTIFY só é entregue no COMMIT: um UPDATE revertido não invalida nada, e o que foi
+    commitado invalida antes de qualquer leitura nova poder ver a linha nova.
+    """
+    await conn.execute(text("""
+        CREATE OR REPLACE FUNCTION nat_config_versionar() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('nat_config', '0');
+                RETURN OLD;
+            END IF;
+            NEW.versao := OLD.versao + 1;
+            NEW.updated_at := NOW();
+            PERFORM pg_notify('nat_config', NEW.versao::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    await conn.execute(text("DROP TRIGGER IF EXISTS nat_config_versionar ON nat_config"))
+    await conn.execute(text("""
+        CREATE TRIGGER nat_config_versionar
+            BEFORE UPDATE ON nat_config
+            FOR EACH ROW EXECUTE FUNCTION nat_config_versionar()
+    """))
+    await conn.execute(text("DROP TRIGGER IF EXISTS nat_config_apagada ON nat_config"))
+    await conn.execute(text("""
+        CREATE TRIGGER nat_config_apagada
+            AFTER DELETE ON nat_config
+            FOR EACH ROW EXECUTE FUNCTION nat_config_versionar()
+    """))
+
+
+async def conferir_gatilhos(conexao) -> bool:
+    """Os triggers de GATILHOS_CONFIG estão todos instalados? Na conexão asyncpg do LISTEN."""
+    instalados = await conexao.fetchval(
+        "SELECT count(DISTINCT tgname) FROM pg_trigger WHERE tgname = ANY($1::text[])",
+        list(GATILHOS_CONFIG))
+    if instalados != len(GATILHOS_CONFIG):
+        logger.warning("⚠️ NAT guard: %s de %s triggers do nat_config instalados — cache da "
+                       "config desligado, leitura a cada envio (rode "
+                       "migrate_nat_guard_cache.py)", instalados, len(GATILHOS_CONFIG))
+        return False
+    return True
+
+
+def ao_notificar_config(conexao, pid, canal, payload):
+    """Callback do LISTEN em CANAL_CONFIG: payload é a nova versão da linha."""
+    if _config_cache is None or str(_config_cache.versao) != payload:
+        invalidar_config()
+
+
 async def _carregar_config(db: AsyncSession):
-    """Singleton id=1 de nat_config. Ausência = desligado."""
+    """Singleton id=1 de nat_config. Ausência = desligado.
+
+    Devolve um snapshot (não o objeto ORM, que pertence à sessão de quem chamou e não pode
+    ser reusado pela seguinte). Ausência não é guardada: a linha criada depois tem que valer
+    na próxima chamada.
+    """
+    global _config_cache
+    if _escuta_config_ativa and _config_cache is not None:
+        return _config_cache
+    geracao = _geracao_config
     res = await db.execute(select(NatConfig).where(NatConfig.id == 1))
-    return res.scalar_one_or_none()
+    config = res.scalar_one_or_none()
+    if config is None:
+        return None
+    snapshot = SimpleNamespace(
+        nat_enabled=config.nat_enabled,
+        nat_start_at=config.nat_start_at,
+        max_envios_hora=config.max_envios_hora,
+        versao=config.versao,
+    )
+    if _escuta_config_ativa and geracao == _geracao_config:
+        _config_cache = snapshot
+    return snapshot
 
 
 async def _resolver_lead_e_wa_id(lead_ou_contato, db: AsyncSession):
@@ -188,10 +374,11 @@ async def nat_pode_atuar(lead_ou_contato, db: AsyncSession, *,
     """Retorna (pode, motivo). Falha fechada: qualquer erro → (False, motivo).
 
     `contar_envios` é ponto de injeção para teste — em produção fica None e usa
-    contar_envios_nat_ultima_hora.
+    envios_nat_ultima_hora (a janela em memória; contar_envios_nat_ultima_hora é o COUNT
+    equivalente, direto no banco).
     """
     def bloqueia(motivo: str) -> tuple[bool, str]:
-        print(f"🔒 NAT bloqueada: {motivo}")
+        logger.info("🔒 NAT bloqueada: %s", motivo)
         return False, motivo
 
     try:
@@ -230,7 +417,7 @@ async def nat_pode_atuar(lead_ou_contato, db: AsyncSession, *,
                 f"assigned_to={assigned_to} fora dos SDRs permitidos {sorted(SDR_IDS_PERMITIDOS)}")
 
         # 5) TETO POR HORA — só envios atribuíveis à NAT (ver COLUNA_MARCADOR_ENVIO_NAT).
-        contador = contar_envios or contar_envios_nat_ultima_hora
+        contador = contar_envios or envios_nat_ultima_hora
         enviados = await contador(db)
         teto = config.max_envios_hora
         if teto is None:
@@ -238,8 +425,8 @@ async def nat_pode_atuar(lead_ou_contato, db: AsyncSession, *,
         if enviados >= teto:
             return bloqueia(f"teto de envios/hora estourado ({enviados}/{teto})")
 
-        print(f"✅ NAT liberada para {wa_id} (funil {funnel_id}, SDR {assigned_to}, "
-              f"{enviados}/{teto} na última hora)")
+        logger.info("✅ NAT liberada para %s (funil %s, SDR %s, %s/%s na última hora)",
+                    wa_id, funnel_id, assigned_to, enviados, teto)
         return True, "ok"
 
     except Exception as e:
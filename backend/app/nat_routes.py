@@ -8,6 +8,7 @@ Duas rotas, as duas autenticadas:
 `assumido_por` é O QUE PARA O RELÓGIO do SLA. É um clique explícito, e não a leitura da
 notificação: o sino pode ser limpo sem intenção, e "vi o alerta" não é "vou ligar".
 """
+import logging
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,6 +18,8 @@ from app.database import get_db
 from app.models import ETAPA_AGUARDANDO_LIGACAO, KIND_SLA_CHECK, NatFlowState, User
 from app.nat_guard import _agora_sp
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/nat", tags=["nat"])
 
 
@@ -117,13 +120,13 @@ async def assumir_ligacao(wa_id: str, db: AsyncSession = Depends(get_db),
             from app.nat_scheduler import cancelar
             cancelados = await cancelar(KIND_SLA_CHECK, wa_id, db)
     except Exception as e:
-        print(f"⚠️  NAT: {wa_id} assumido por {current_user.id}, mas o cancelamento do "
-              f"sla_check falhou ({type(e).__name__}: {e}). O SLA não escalona: o handler "
-              "relê o estado e vê assumido_por preenchido.")
+        logger.warning("⚠️  NAT: %s assumido por %s, mas o cancelamento do sla_check falhou (%s: "
+                       "%s). O SLA não escalona: o handler relê o estado e vê assumido_por "
+                       "preenchido.", wa_id, current_user.id, type(e).__name__, e)
 
     await db.commit()
-    print(f"✋ NAT: {wa_id} assumido por {current_user.name} (id={current_user.id}) — "
-          f"{cancelados} sla_check cancelado(s)")
+    logger.info("✋ NAT: %s assumido por %s (id=%s) — %s sla_check cancelado(s)",
+                wa_id, current_user.name, current_user.id, cancelados)
 
     await db.refresh(state)
     return {"ja_assumido": False, "cancelados": cancelados, **await _payload(state, db)}
@@ -9,18 +9,23 @@ COMO A EXECUÇÃO ÚNICA É GARANTIDA
 ------------------------------------------------------------------------------------------
 Três camadas, e as três importam:
 
-1. `SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1` — a linha fica travada pela transação que a
-   pegou. Outro processo que rode o mesmo SELECT no mesmo instante SALTA a linha travada em
-   vez de esperar por ela. Hoje há 1 worker, então isto é seguro contra o futuro (2º worker,
-   restart com sobreposição, alguém rodando o job à mão num shell) e não contra o presente.
+1. `SELECT ... FOR UPDATE SKIP LOCKED LIMIT n` — as linhas ficam travadas pela transação que
+   as pegou. Outro SELECT igual no mesmo instante SALTA as travadas em vez de esperar por
+   elas. Isto já vale no presente, não só contra o futuro: os CONCORRENCIA trabalhadores de
+   cada passada reivindicam lotes ao mesmo tempo, e é o SKIP LOCKED que faz cada ação cair
+   em exatamente um deles. Também cobre o 2º processo, restart com sobreposição e alguém
+   rodando o job à mão num shell.
 
 2. A ação é executada e marcada `executado` na MESMA TRANSAÇÃO. Não existe janela entre
    "executei" e "registrei que executei": ou as duas coisas entram no commit, ou nenhuma. Se
    o processo morrer no meio, o commit não acontece, a linha volta a `pendente` e a ação roda
    de novo do zero — nunca meio-executada e marcada como pronta.
 
-3. UMA transação por ação, não uma por lote. Um handler lento segura o lock só da própria
-   linha, e uma ação que falhe não contamina a sessão das outras.
+3. UMA transação por LOTE, e um SAVEPOINT por ação dentro dele. A ação que falhe é revertida
+   sozinha (o savepoint dela) e não contamina as vizinhas de lote. O que o lote compartilha é
+   o commit: se ELE falhar, o lote inteiro volta a `pendente`, junto com os efeitos — de novo
+   nada meio-executado. O preço é que um handler lento segura as travas das outras linhas do
+   lote até o fim dele; por isso o LOTE é pequeno.
 
 O reverso disso é o que NÃO é garantido, e é bom dizer: a ação pode rodar mais de uma vez se
 ela mesma tiver efeito colateral externo e o commit falhar depois. Para o sla_check isso é
@@ -49,6 +54,29 @@ processo pode morrer entre tentativas sem que a ação volte a ser tentada em ra
 `kind` sem handler NÃO consome tentativa: vira `falhou` na hora, com o motivo. Retentar não
 faz um kind desconhecido virar conhecido, e ficar 3 ciclos tentando só atrasaria o alarme.
 
+------------------------------------------------------------------------------------------
+LOTE, CONCORRÊNCIA E DESPERTAR
+------------------------------------------------------------------------------------------
+Antes: uma ação por transação e por sessão, handlers em série, varredura a cada 60s. O SLA de
+2 min disparava entre 2:00 e 3:00, e uma fila de 600 ações vencidas drenava 50 por minuto.
+
+Agora cada passada sobe CONCORRENCIA trabalhadores. Cada um abre a PRÓPRIA sessão (uma
+AsyncSession não aceita dois handlers ao mesmo tempo), reivindica até LOTE ações com SKIP
+LOCKED, roda uma a uma no savepoint de cada, e commita. Repete até a fila vencida ou o teto
+da passada (MAX_ACOES_POR_CICLO) acabar.
+
+A precisão vem de acordar na hora certa, não de varrer mais rápido:
+  * no fim de cada passada o job lê o menor run_at pendente e arma um despertador para ele,
+    se vier antes do próximo tique. O SLA de 2 min dispara no segundo em que vence. Sobrou
+    fila vencida (o teto da passada cortou)? O despertador já está no passado e a próxima
+    passada começa na hora — 600 vencidas drenam numa rajada, não em 12 minutos;
+  * `agendar` de uma ação que vence antes do próximo tique possível faz `pg_notify`. O
+    NOTIFY só é entregue no COMMIT de quem agendou (e some junto num rollback ou savepoint
+    revertido), então o job nunca acorda para uma ação que não existe. A conexão dedicada de
+    `escutar_agendamentos` recebe o aviso e arma o mesmo despertador.
+O tique de INTERVALO_SEGUNDOS continua como rede de segurança: um NOTIFY perdido (conexão de
+LISTEN caída, banco reiniciado) custa no máximo um tique, como antes.
+
 ------------------------------------------------------------------------------------------
 FUSO
 ------------------------------------------------------------------------------------------
@@ -59,27 +87,46 @@ nat_guard, não reimplementado aqui, para não existirem duas definições de "a
 """
 import asyncio
 import json
+import logging
+import os
 from datetime import datetime, timedelta
 
-from sqlalchemy import select, update
+from sqlalchemy import func, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session
+from app.database import DATABASE_URL, async_session
 from app.models import (ACAO_CANCELADO, ACAO_EXECUTADO, ACAO_FALHOU, ACAO_PENDENTE,
                         MAX_TENTATIVAS_ACAO, NatScheduledAction)
+from app import eventos, nat_guard
 from app.nat_guard import _agora_sp
 
-# De quanto em quanto tempo o job varre a fila. 60s é o mesmo passo do
-# scheduled_messages_job. Para o SLA de 2 min significa disparar entre 2:00 e 3:00 depois da
-# transferência — aceitável, e a alternativa (varrer a cada 5s) seria 12x mais consulta para
-# ganhar segundos num relógio que já é humano.
+logger = logging.getLogger(__name__)
+
+# Tique de segurança do job, o mesmo passo do scheduled_messages_job. NÃO é mais o que define
+# a precisão do SLA — quem define é o despertador (ver LOTE, CONCORRÊNCIA E DESPERTAR). Só
+# garante que nada espere mais que isto se um NOTIFY se perder.
 INTERVALO_SEGUNDOS = 60
 
-# Teto de ações por ciclo. Protege contra a fila crescer sem limite e o job passar um ciclo
-# inteiro drenando (ex.: banco fora do ar por uma hora, 600 ações vencidas de uma vez). O que
-# sobrar é pego no ciclo seguinte, em ordem de run_at — nada é perdido, só adiado.
+# Teto de ações por passada. Uma passada não segura o job indefinidamente (ex.: banco fora do
+# ar por uma hora, 600 ações vencidas de uma vez); o que sobrar fica vencido, o despertador
+# cai no passado e a passada seguinte começa na hora, em ordem de run_at.
 MAX_ACOES_POR_CICLO = 50
 
+# Trabalhadores por passada, cada um com a própria sessão — ou seja, uma conexão do pool cada.
+CONCORRENCIA = int(os.getenv("NAT_SCHEDULER_CONCORRENCIA", "4"))
+
+# Ações reivindicadas por transação. Pequeno de propósito: um handler lento segura as travas
+# do lote inteiro até o commit, e um commit que falhe devolve o lote inteiro à fila.
+LOTE = 10
+
+# Canal do LISTEN/NOTIFY. O payload é o run_at (ISO, naive SP) da ação agendada.
+CANAL_NOTIFY = "nat_scheduler"
+
+# O despertador dispara um pouco DEPOIS do run_at: o relógio do call_later (monotônico) e o
+# de _agora_sp() (parede) não andam cravados, e acordar 10ms antes do vencimento seria uma
+# passada vazia seguida de um tique inteiro de atraso.
+FOLGA_DESPERTAR_SEGUNDOS = 0.5
+
 # Espaçamento entre tentativas de uma ação que falhou. Aplicado empurrando o run_at, o que
 # tira a ação da passada atual e a devolve à fila só depois desse intervalo. Igual ao passo do
 # job para não inventar um segundo relógio: na prática, uma tentativa por ciclo.
@@ -139,7 +186,7 @@ def payload_de(acao: dict) -> dict:
         dados = json.loads(bruto)
         return dados if isinstance(dados, dict) else {}
     except (ValueError, TypeError):
-        print(f"⚠️  NAT scheduler: payload ilegível na ação {acao.get('id')}: {bruto!r}")
+        logger.warning("⚠️  NAT scheduler: payload ilegível na ação %s: %r", acao.get('id'), bruto)
         return {}
 
 
@@ -177,8 +224,13 @@ async def agendar(kind: str, contact_wa_id: str, run_at: datetime, payload: dict
     )
     db.add(acao)
     await db.flush()  # materializa o id do BIGSERIAL sem commitar
-    print(f"⏰ NAT scheduler: {kind} agendado para {contact_wa_id} às "
-          f"{run_at:%Y-%m-%d %H:%M:%S} (id={acao.id})")
+    # Vence antes do próximo tique possível: avisa o job. O NOTIFY só sai no commit de quem
+    # chamou — um agendar revertido não acorda ninguém.
+    if run_at < _agora_sp() + timedelta(seconds=INTERVALO_SEGUNDOS):
+        await db.execute(text("SELECT pg_notify(:canal, :run_at)"),
+                         {"canal": CANAL_NOTIFY, "run_at": run_at.isoformat()})
+    logger.info("⏰ NAT scheduler: %s agendado para %s às %s (id=%s)",
+                kind, contact_wa_id, run_at.strftime('%Y-%m-%d %H:%M:%S'), acao.id)
     return acao.id
 
 
@@ -198,7 +250,8 @@ async def cancelar(kind: str, contact_wa_id: str, db: AsyncSession) -> int:
     )
     quantos = res.rowcount or 0
     if quantos:
-        print(f"🚫 NAT scheduler: {quantos} ação(ões) {kind} cancelada(s) para {contact_wa_id}")
+        logger.info("🚫 NAT scheduler: %s ação(ões) %s cancelada(s) para %s",
+                    quantos, kind, contact_wa_id)
     return quantos
 
 
@@ -206,21 +259,22 @@ async def cancelar(kind: str, contact_wa_id: str, db: AsyncSession) -> int:
 # EXECUÇÃO
 # ------------------------------------------------------------------------------------------
 
-async def _proxima_acao(db: AsyncSession, corte: datetime):
-    """A ação vencida mais antiga, TRAVADA para esta transação. None se não há nenhuma.
+async def _proximas_acoes(db: AsyncSession, corte: datetime, quantas: int) -> list:
+    """Até `quantas` ações vencidas, TRAVADAS para esta transação. Lista vazia se não há.
 
     ORDER BY run_at: quem venceu primeiro roda primeiro. Importa no escalonamento, onde a
-    ordem das ações é a ordem dos níveis.
+    ordem das ações é a ordem dos níveis — e os níveis de um mesmo contato nunca estão no
+    mesmo lote, porque só existe um pendente por (kind, contato).
     """
     res = await db.execute(
         select(NatScheduledAction)
         .where(NatScheduledAction.status == ACAO_PENDENTE,
                NatScheduledAction.run_at <= corte)
         .order_by(NatScheduledAction.run_at)
-        .limit(1)
+        .limit(quantas)
         .with_for_update(skip_locked=True)
     )
-    return res.scalar_one_or_none()
+    return list(res.scalars().all())
 
 
 def _snapshot(acao: NatScheduledAction, agora: datetime) -> dict:
@@ -282,8 +336,8 @@ async def _executar_acao(acao: NatScheduledAction, db: AsyncSession, agora: date
     handler = _resolver_handler(kind)
     if handler is None:
         await _finalizar(db, acao_id, ACAO_FALHOU, agora)
-        print(f"⛔ NAT scheduler: kind {kind!r} sem handler (ação {acao_id}) → falhou. "
-              f"Registre o módulo em MODULOS_DE_HANDLERS.")
+        logger.warning("⛔ NAT scheduler: kind %r sem handler (ação %s) → falhou. Registre o "
+                       "módulo em MODULOS_DE_HANDLERS.", kind, acao_id)
         return ACAO_FALHOU
 
     try:
@@ -297,71 +351,202 @@ async def _executar_acao(acao: NatScheduledAction, db: AsyncSession, agora: date
         tentativas = dados["attempts"] + 1
         if tentativas >= MAX_TENTATIVAS_ACAO:
             await _finalizar(db, acao_id, ACAO_FALHOU, agora, attempts=tentativas)
-            print(f"⛔ NAT scheduler: {kind} (ação {acao_id}, {dados['contact_wa_id']}) "
-                  f"falhou na tentativa {tentativas}/{MAX_TENTATIVAS_ACAO} — desistindo. "
-                  f"{type(e).__name__}: {e}")
+            logger.warning("⛔ NAT scheduler: %s (ação %s, %s) falhou na tentativa %s/%s — "
+                           "desistindo. %s: %s",
+                           kind, acao_id, dados['contact_wa_id'], tentativas,
+                           MAX_TENTATIVAS_ACAO, type(e).__name__, e)
             return ACAO_FALHOU
         # run_at empurrado: é o que tira a ação desta passada e dá espaçamento de verdade
         # entre tentativas (ver RETENTATIVA na docstring do módulo).
         proxima = agora + timedelta(seconds=ATRASO_RETENTATIVA_SEGUNDOS)
         await _finalizar(db, acao_id, ACAO_PENDENTE, agora, attempts=tentativas,
                          run_at=proxima)
-        print(f"⚠️  NAT scheduler: {kind} (ação {acao_id}, {dados['contact_wa_id']}) falhou "
-              f"na tentativa {tentativas}/{MAX_TENTATIVAS_ACAO}, nova tentativa às "
-              f"{proxima:%H:%M:%S}. {type(e).__name__}: {e}")
+        logger.warning("⚠️  NAT scheduler: %s (ação %s, %s) falhou na tentativa %s/%s, nova "
+                       "tentativa às %s. %s: %s",
+                       kind, acao_id, dados['contact_wa_id'], tentativas,
+                       MAX_TENTATIVAS_ACAO, proxima.strftime('%H:%M:%S'),
+                       type(e).__name__, e)
         return ACAO_PENDENTE
 
     await _finalizar(db, acao_id, ACAO_EXECUTADO, agora)
     return ACAO_EXECUTADO
 
 
+async def _trabalhador(corte: datetime, resumo: dict, vagas: list):
+    """Reivindica e executa lotes até a fila vencida (ou as vagas da passada) acabar.
+
+    Um lote = uma sessão, uma transação, um commit. Dentro dele, cada ação no próprio
+    savepoint (_executar_acao).
+    """
+    while vagas[0] > 0:
+        quantas = min(LOTE, vagas[0])
+        vagas[0] -= quantas
+        contagem: dict = {}
+        try:
+            async with async_session() as db:
+                acoes = await _proximas_acoes(db, corte, quantas)
+                if not acoes:
+                    return
+                for acao in acoes:
+                    status = await _executar_acao(acao, db, corte)
+                    contagem[status] = contagem.get(status, 0) + 1
+                await db.commit()
+        except Exception as e:
+            # Falha na infraestrutura (commit, lock, conexão), não no handler — este já tem
+            # o próprio savepoint. O lote inteiro continua pendente; este trabalhador para e
+            # a próxima passada tenta de novo, em vez de repescar o mesmo lote em rajada.
+            logger.error("❌ NAT scheduler: erro ao processar lote: %s: %s", type(e).__name__, e)
+            resumo["erro"] = resumo.get("erro", 0) + 1
+            return
+        for status, n in contagem.items():
+            resumo[status] = resumo.get(status, 0) + n
+
+
 async def processar_pendentes(*, agora: datetime | None = None,
-                              limite: int = MAX_ACOES_POR_CICLO) -> dict:
+                              limite: int = MAX_ACOES_POR_CICLO,
+                              concorrencia: int = CONCORRENCIA) -> dict:
     """Drena a fila vencida. Devolve {status: quantidade}.
 
     `agora` explícito é o que permite testar o vencimento sem mock de relógio — mesmo padrão
     de dentro_horario_comercial(quando=...).
 
-    Uma transação (e uma sessão) por ação. O `break` sai no primeiro ciclo sem ação vencida,
-    então o custo em fila vazia é UM select por minuto.
+    `concorrencia` trabalhadores disputam a fila pelo SKIP LOCKED; cada um sai no primeiro
+    lote vazio, então o custo em fila vazia é um SELECT por trabalhador por passada.
     """
     corte = agora if agora is not None else _agora_sp()
     resumo: dict = {}
+    vagas = [limite]
+    await asyncio.gather(*(_trabalhador(corte, resumo, vagas)
+                           for _ in range(max(concorrencia, 1))))
+    return resumo
+
+
+# ------------------------------------------------------------------------------------------
+# DESPERTADOR
+#
+# Um único timer do loop, sempre para o vencimento MAIS PRÓXIMO conhecido. Quem o arma: o
+# próprio job no fim da passada (menor run_at pendente) e o listener do NOTIFY (run_at recém
+# agendado). Quando dispara, só seta o evento que o job espera — quem trabalha é sempre o job.
+# ------------------------------------------------------------------------------------------
 
-    for _ in range(limite):
+_acordar = asyncio.Event()
+_despertador: asyncio.TimerHandle | None = None
+
+
+def acordar():
+    """Acorda o job agora."""
+    _acordar.set()
+
+
+def despertar_em(run_at: datetime, *, agora: datetime | None = None):
+    """Garante que o job acorde até `run_at` (naive SP). Só adianta, nunca atrasa.
+
+    Chamado de dentro do event loop (o callback do asyncpg roda nele).
+    """
+    global _despertador
+    agora = agora if agora is not None else _agora_sp()
+    segundos = max((run_at - agora).total_seconds(), 0) + FOLGA_DESPERTAR_SEGUNDOS
+    loop = asyncio.get_running_loop()
+    quando = loop.time() + segundos
+    if _despertador is not None and not _despertador.cancelled() \
+            and loop.time() <= _despertador.when() <= quando:
+        return
+    if _despertador is not None:
+        _despertador.cancel()
+    _despertador = loop.call_at(quando, _acordar.set)
+
+
+async def _proximo_vencimento() -> datetime | None:
+    """Menor run_at pendente, vencido ou não. None com a fila vazia."""
+    async with async_session() as db:
+        res = await db.execute(
+            select(func.min(NatScheduledAction.run_at))
+            .where(NatScheduledAction.status == ACAO_PENDENTE))
+        return res.scalar()
+
+
+def _ao_notificar(conexao, pid, canal, payload):
+    """Callback do LISTEN: payload é o run_at da ação que acabou de ser commitada."""
+    try:
+        run_at = datetime.fromisoformat(payload)
+    except (TypeError, ValueError):
+        logger.warning("⚠️  NAT scheduler: NOTIFY com payload ilegível: %r", payload)
+        acordar()
+        return
+    despertar_em(run_at)
+
+
+def _dsn_asyncpg() -> str:
+    """DATABASE_URL sem o `+asyncpg` do SQLAlchemy, que o asyncpg.connect não entende."""
+    return DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def escutar_agendamentos():
+    """Mantém uma conexão DEDICADA em LISTEN e arma o despertador a cada NOTIFY.
+
+    Dedicada, e fora do pool do SQLAlchemy: o LISTEN vale pela vida da conexão, e uma conexão
+    do pool presa para sempre seria uma a menos para os requests. Caiu, reconecta depois de
+    INTERVALO_SEGUNDOS — enquanto isso o tique cobre, só sem a precisão de segundos, o
+    nat_guard relê o nat_config a cada chamada e as telas voltam ao polling (app/eventos.py).
+    """
+    import asyncpg
+
+    while True:
+        conexao = None
         try:
-            async with async_session() as db:
-                acao = await _proxima_acao(db, corte)
-                if acao is None:
-                    break
-                status = await _executar_acao(acao, db, corte)
-                await db.commit()
+            conexao = await asyncpg.connect(_dsn_asyncpg())
+            caiu = asyncio.Event()
+            conexao.add_termination_listener(lambda c: caiu.set())
+            await conexao.add_listener(CANAL_NOTIFY, _ao_notificar)
+            # A mesma conexão escuta o nat_config: é o que autoriza o cache do nat_guard —
+            # desde que os triggers que avisam estejam instalados neste banco.
+            await conexao.add_listener(nat_guard.CANAL_CONFIG, nat_guard.ao_notificar_config)
+            nat_guard.escuta_config(await nat_guard.conferir_gatilhos(conexao))
+            # E os eventos das telas (app/eventos.py): o stream SSE depende desta escuta.
+            await conexao.add_listener(eventos.CANAL, eventos.ao_notificar)
+            await conexao.add_listener(eventos.CANAL_VERSOES, eventos.ao_notificar_tabela)
+            await eventos.conferir_gatilhos(conexao)
+            eventos.escuta(True)
+            # Agendamentos feitos enquanto não havia LISTEN não avisaram ninguém.
+            acordar()
+            await caiu.wait()
+            logger.warning("⚠️  NAT scheduler: conexão de LISTEN caiu, reconectando")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            # Falha na infraestrutura (commit, lock, conexão), não no handler — este já tem
-            # o próprio savepoint. Sem `break`: a ação continua pendente e o ciclo seguinte
-            # tenta de novo. Sem `continue` cego também — contabiliza e segue.
-            print(f"❌ NAT scheduler: erro ao processar ação: {type(e).__name__}: {e}")
-            resumo["erro"] = resumo.get("erro", 0) + 1
-            continue
-        resumo[status] = resumo.get(status, 0) + 1
-
-    return resumo
+            logger.error("❌ NAT scheduler: LISTEN indisponível: %s: %s", type(e).__name__, e)
+        finally:
+            nat_guard.escuta_config(False)
+            eventos.escuta(False)
+            if conexao is not None and not conexao.is_closed():
+                await conexao.close()
+        await asyncio.sleep(INTERVALO_SEGUNDOS)
 
 
 async def nat_scheduler_job():
-    """Loop de 60s. Registrado no lifespan de main.py, junto dos outros jobs.
+    """Loop do agendador. Registrado no lifespan de main.py, junto dos outros jobs.
 
-    Dorme ANTES de trabalhar, como todos os outros jobs do main.py: no boot o processo tem
-    coisa melhor a fazer, e uma ação vencida esperar 60s a mais é irrelevante.
+    Dorme ANTES de trabalhar, como todos os outros jobs do main.py — mas o sono termina no
+    que vier primeiro: o tique de INTERVALO_SEGUNDOS ou o despertador.
 
     O try/except abraça o ciclo inteiro porque este loop não pode morrer: se ele morrer, o
     SLA para de existir sem nada quebrar visivelmente — o pior tipo de falha.
     """
     while True:
-        await asyncio.sleep(INTERVALO_SEGUNDOS)
+        try:
+            await asyncio.wait_for(_acordar.wait(), timeout=INTERVALO_SEGUNDOS)
+        except asyncio.TimeoutError:
+            pass
+        _acordar.clear()
         try:
             resumo = await processar_pendentes()
             if resumo:
-                print(f"⏱️  NAT scheduler: {resumo}")
+                logger.info("⏱️  NAT scheduler: %s", resumo)
+            # Com erro de infraestrutura, NÃO rearma: um lote que falha no commit seguiria
+            # vencido, e o despertador no passado viraria um laço quente. Fica para o tique.
+            if "erro" not in resumo:
+                vencimento = await _proximo_vencimento()
+                if vencimento is not None:
+                    despertar_em(vencimento)
         except Exception as e:
-            print(f"❌ Erro no nat_scheduler_job: {type(e).__name__}: {e}")
+            logger.error("❌ Erro no nat_scheduler_job: %s: %s", type(e).__name__, e)
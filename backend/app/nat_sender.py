@@ -11,6 +11,7 @@ em nat_sim, que falta em ~49% dos leads) não tem como ser montado com honestida
 
 NADA sai daqui sem passar por nat_pode_atuar. Com a NAT desligada, toda chamada é no-op.
 """
+import logging
 from datetime import timedelta
 
 from sqlalchemy import select
@@ -18,10 +19,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import nat_copy
 from app.models import AutoWelcomeConfig, Channel, Contact, Message
-from app.nat_guard import _agora_sp, nat_pode_atuar
+from app.nat_guard import _agora_sp, nat_pode_atuar, registrar_envio_nat
 from app.whatsapp import (send_interactive_buttons, send_template_message,
                           send_text_message)
 
+logger = logging.getLogger(__name__)
+
 # A Meta fecha a janela de atendimento 24h depois da ÚLTIMA mensagem do lead.
 JANELA_ATENDIMENTO = timedelta(hours=24)
 
@@ -81,7 +84,7 @@ async def send_nat_message(contact_wa_id: str, etapa: str, db: AsyncSession, **v
     Nunca envia sem nat_pode_atuar liberar. Falha fechada: qualquer erro devolve False.
     """
     def recusa(motivo: str) -> bool:
-        print(f"🔒 NAT não enviou ({etapa} → {contact_wa_id}): {motivo}")
+        logger.info("🔒 NAT não enviou (%s → %s): %s", etapa, contact_wa_id, motivo)
         return False
 
     try:
@@ -157,10 +160,13 @@ async def send_nat_message(contact_wa_id: str, etapa: str, db: AsyncSession, **v
             timestamp=_agora_sp(),
             status="sent",
             nat_etapa=etapa,
+            template_name=etapa if tipo_msg == "template" else None,
         ))
-        print(f"📤 NAT enviou '{etapa}' para {contact_wa_id} "
-              f"({'texto livre' if aberta else 'template'}, janela "
-              f"{'aberta' if aberta else 'fechada'})")
+        # A Meta já aceitou: conta na janela do teto agora, sem esperar o commit.
+        registrar_envio_nat()
+        logger.info("📤 NAT enviou '%s' para %s (%s, janela %s)",
+                    etapa, contact_wa_id, 'texto livre' if aberta else 'template',
+                    'aberta' if aberta else 'fechada')
         return True
 
     except Exception as e:
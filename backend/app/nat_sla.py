@@ -58,6 +58,7 @@ curso, e logo depois `_finalizar` a sobrescreve para `executado`. O resultado fi
 (ação atual `executado`, nova `pendente`), mas o cancelamento dentro do `agendar()` não é
 conveniência aqui: é o que torna o reagendamento possível.
 """
+import logging
 from datetime import timedelta
 
 from sqlalchemy import select
@@ -70,6 +71,8 @@ from app.nat_flow import (SLA_LIGACAO_MINUTOS, telefone_legivel, usuario_existe,
 from app.nat_guard import GESTOR_USER_ID, SDR_IDS_PERMITIDOS
 from app.nat_scheduler import agendar, registrar_handler
 
+logger = logging.getLogger(__name__)
+
 # Tipos distintos por degrau, como window_alerts_job faz com 1h/3h/5h/20h: o tipo é o que
 # permite consultar "quantos leads chegaram à gestão" sem parsear o título.
 TIPO_NOTIF_SLA_SDR = "nat_sla_sdr"
@@ -150,8 +153,8 @@ async def _notificar(db: AsyncSession, *, user_id: int, wa_id: str, tipo: str, a
     avisar alguém que não existe.
     """
     if not await usuario_existe(user_id, db):
-        print(f"⚠️  NAT SLA: destinatário id={user_id} não existe — {wa_id} não escalonado "
-              f"para ele (o nível sobe igual, para não travar o ciclo)")
+        logger.warning("⚠️  NAT SLA: destinatário id=%s não existe — %s não escalonado para ele "
+                       "(o nível sobe igual, para não travar o ciclo)", user_id, wa_id)
         return False
     db.add(Notification(
         user_id=user_id,
@@ -184,23 +187,23 @@ async def sla_check(acao: dict, db: AsyncSession) -> None:
 
     # --- as três saídas de "nada a fazer" ---
     if state is None:
-        print(f"↩️  NAT SLA: {wa_id} sem estado de fluxo — nada a fazer")
+        logger.info("↩️  NAT SLA: %s sem estado de fluxo — nada a fazer", wa_id)
         return
 
     if state.etapa != ETAPA_AGUARDANDO_LIGACAO:
-        print(f"↩️  NAT SLA: {wa_id} já saiu de {ETAPA_AGUARDANDO_LIGACAO} "
-              f"(está em {state.etapa}) — nada a fazer")
+        logger.info("↩️  NAT SLA: %s já saiu de %s (está em %s) — nada a fazer",
+                    wa_id, ETAPA_AGUARDANDO_LIGACAO, state.etapa)
         return
 
     if state.assumido_por is not None:
-        print(f"✅ NAT SLA: {wa_id} já assumido por user {state.assumido_por} em "
-              f"{state.assumido_em:%H:%M:%S} — relógio parado, nada a fazer")
+        logger.info("✅ NAT SLA: %s já assumido por user %s em %s — relógio parado, nada a fazer",
+                    wa_id, state.assumido_por, state.assumido_em.strftime('%H:%M:%S'))
         return
 
     nivel = state.escalonamento_nivel or 0
     if nivel >= NIVEL_GESTAO:
-        print(f"↩️  NAT SLA: {wa_id} já está no nível {nivel} (gestão avisada) — "
-              "fim da escada, nada a fazer")
+        logger.info("↩️  NAT SLA: %s já está no nível %s (gestão avisada) — fim da escada, nada "
+                    "a fazer", wa_id, nivel)
         return
 
     dados = await _dados_do_lead(state, db)
@@ -221,8 +224,8 @@ async def sla_check(acao: dict, db: AsyncSession) -> None:
             # gestão) porque a gestão JÁ foi avisada na transferência, pelo fallback do Bloco
             # 5: um terceiro aviso para ela não acrescenta informação, e quem faltava saber
             # eram os SDRs.
-            print(f"↪️  NAT SLA: {wa_id} sem SDR dono (sdr_user_id={state.sdr_user_id}) — "
-                  f"avisando AMBOS os SDRs {sorted(SDR_IDS_PERMITIDOS)}")
+            logger.info("↪️  NAT SLA: %s sem SDR dono (sdr_user_id=%s) — avisando AMBOS os SDRs "
+                        "%s", wa_id, state.sdr_user_id, sorted(SDR_IDS_PERMITIDOS))
             title, body = montar_notificacao_escalonamento(
                 NIVEL_OUTRO_SDR, dados["nome"], wa_id, dados["curso"], dono,
                 state.transferido_em, sem_dono=True)
@@ -233,9 +236,9 @@ async def sla_check(acao: dict, db: AsyncSession) -> None:
                                     title=title, body=body):
                     avisados.append(sdr)
             state.escalonamento_nivel = NIVEL_GESTAO
-            print(f"🔺 NAT SLA: {wa_id} nível 0 → {NIVEL_GESTAO} — SDRs avisados: "
-                  f"{avisados or 'nenhum'}. Fim da escada, NÃO reagenda "
-                  "(a gestão já foi avisada na transferência)")
+            logger.info("🔺 NAT SLA: %s nível 0 → %s — SDRs avisados: %s. Fim da escada, NÃO "
+                        "reagenda (a gestão já foi avisada na transferência)",
+                        wa_id, NIVEL_GESTAO, avisados or 'nenhum')
             return
 
         title, body = montar_notificacao_escalonamento(
@@ -251,8 +254,8 @@ async def sla_check(acao: dict, db: AsyncSession) -> None:
         await agendar(KIND_SLA_CHECK, wa_id,
                       agora + timedelta(minutes=SLA_LIGACAO_MINUTOS),
                       {"nivel_anterior": NIVEL_SDR_DONO, "notificado": alvo}, db)
-        print(f"🔺 NAT SLA: {wa_id} nível 0 → {NIVEL_OUTRO_SDR} (SDR {alvo}) — "
-              f"reagendado +{SLA_LIGACAO_MINUTOS}min")
+        logger.info("🔺 NAT SLA: %s nível 0 → %s (SDR %s) — reagendado +%smin",
+                    wa_id, NIVEL_OUTRO_SDR, alvo, SLA_LIGACAO_MINUTOS)
         return
 
     # --- nível 1 -> avisa a GESTÃO e ENCERRA ---
@@ -261,5 +264,5 @@ async def sla_check(acao: dict, db: AsyncSession) -> None:
     await _notificar(db, user_id=GESTOR_USER_ID, wa_id=wa_id, tipo=TIPO_NOTIF_SLA_GESTAO,
                      acao_id=acao_id, title=title, body=body)
     state.escalonamento_nivel = NIVEL_GESTAO
-    print(f"🔺 NAT SLA: {wa_id} nível {NIVEL_OUTRO_SDR} → {NIVEL_GESTAO} (gestão id="
-          f"{GESTOR_USER_ID}) — fim da escada, NÃO reagenda")
+    logger.info("🔺 NAT SLA: %s nível %s → %s (gestão id=%s) — fim da escada, NÃO reagenda",
+                wa_id, NIVEL_OUTRO_SDR, NIVEL_GESTAO, GESTOR_USER_ID)
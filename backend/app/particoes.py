@@ -0,0 +1,174 @@
+"""Partições mensais de `messages`: criar as próximas antes de precisar, e soltar as velhas.
+
+messages é a tabela mais quente do sistema — inbox, histórico, saúde de entrega, teto do
+guard, alertas de janela — e cresce sem fim. Desde migrate_messages_particionada.py ela é
+particionada por RANGE em `timestamp`, uma partição por mês (messages_pAAAA_MM), mais uma
+DEFAULT (messages_pdefault) para que um INSERT fora de qualquer mês criado nunca falhe.
+
+------------------------------------------------------------------------------------------
+PODA
+------------------------------------------------------------------------------------------
+As consultas por janela de tempo — dashboard (hoje/semana), teto por hora do nat_guard,
+saúde de entrega, alerta de janela de 24h — têm `timestamp >= X` e o planner só abre as
+partições do intervalo (com parâmetro ligado, a poda acontece na execução: "Subplans
+Removed" no EXPLAIN ANALYZE). A conferência está na própria migração.
+
+A chave primária passou a ser (id, timestamp) — o Postgres exige a chave de partição em
+toda constraint única. O ORM a conhece (models.Message), então o UPDATE de status do
+webhook sai com `WHERE id = ... AND timestamp = ...` e cai direto na partição certa. A
+unicidade de wa_message_id virou (wa_message_id, timestamp): o webhook repetido da Meta
+traz o MESMO timestamp da mensagem, então a duplicata continua barrada pelo banco.
+
+------------------------------------------------------------------------------------------
+JOB
+------------------------------------------------------------------------------------------
+`manter_particoes_job` roda a cada INTERVALO_SEGUNDOS e garante PARTICOES_FUTURAS meses à
+frente, pela função SQL cenat_criar_particoes_messages (a mesma que a migração usa). O
+CREATE TABLE ... PARTITION OF pede lock no pai: lock_timeout curto, e se o webhook estiver
+no meio, desiste e tenta no próximo ciclo — há meses de folga.
+
+Se a DEFAULT tiver linhas de um mês que ainda não tinha partição (job parado por meses, relógio
+errado na Meta), a função cria o mês como tabela solta, MOVE essas linhas da DEFAULT para ela e
+só então faz o ATTACH — criar direto com PARTITION OF falharia com elas lá.
+
+Sem a migração (a função não existe), o job só avisa uma vez e segue dormindo. Banco novo:
+app/create_tables.py cria a tabela já particionada e chama `preparar`.
+
+Consulta SEM filtro de tempo (histórico do contato por contact_wa_id, status por
+wa_message_id) continua certa e usa o índice de cada partição: um probe por mês, barato.
+
+------------------------------------------------------------------------------------------
+DESANEXAR EM VEZ DE DELETE
+------------------------------------------------------------------------------------------
+`desanexar(db, ano, mes)` tira um mês inteiro da tabela (DETACH PARTITION): operação de
+catálogo, sem DELETE linha a linha, sem bloat, sem VACUUM depois. A partição vira uma tabela
+comum com o mesmo nome, pronta para ser arquivada e dropada. Mês corrente e futuros são
+recusados. DETACH ... CONCURRENTLY não é usado: o Postgres o proíbe com partição DEFAULT.
+"""
+import asyncio
+import logging
+import os
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session
+
+logger = logging.getLogger(__name__)
+
+PARTICOES_FUTURAS = int(os.getenv("MESSAGES_PARTICOES_FUTURAS", "3"))
+INTERVALO_SEGUNDOS = 6 * 3600
+LOCK_TIMEOUT = "3s"
+PREFIXO = "messages_p"
+PARTICAO_DEFAULT = "messages_pdefault"
+
+
+# Cria os meses de `de` até `ate` (inclusive) que ainda não existem; devolve os nomes criados.
+FUNCAO_SQL = """
+CREATE OR REPLACE FUNCTION cenat_criar_particoes_messages(de date, ate date)
+RETURNS SETOF text AS $$
+DECLARE
+    inicio date := date_trunc('month', de)::date;
+    fim date;
+    nome text;
+BEGIN
+    WHILE inicio <= ate LOOP
+        fim := (inicio + interval '1 month')::date;
+        nome := format('messages_p%s', to_char(inicio, 'YYYY_MM'));
+        IF to_regclass(nome) IS NULL THEN
+            IF to_regclass('messages_pdefault') IS NOT NULL AND EXISTS (
+                SELECT 1 FROM messages_pdefault WHERE "timestamp" >= inicio AND "timestamp" < fim
+            ) THEN
+                EXECUTE format('CREATE TABLE %I (LIKE messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nome);
+                EXECUTE format('WITH movidas AS (DELETE FROM messages_pdefault
+                                 WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *)
+                                INSERT INTO %I SELECT * FROM movidas', inicio, fim, nome);
+                EXECUTE format('ALTER TABLE messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                               nome, inicio, fim);
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                               nome, inicio, fim);
+            END IF;
+            RETURN NEXT nome;
+        END IF;
+        inicio := fim;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def nome_particao(ano: int, mes: int) -> str:
+    return f"{PREFIXO}{ano:04d}_{mes:02d}"
+
+
+async def preparar(conn, de: date | None = None, meses_a_frente: int = PARTICOES_FUTURAS) -> list[str]:
+    """Função SQL, partição DEFAULT e os meses de `de` (padrão: hoje) até `meses_a_frente`.
+
+    Para a migração e o create_tables, numa conexão/sessão já em transação. Idempotente.
+    """
+    await conn.execute(text(FUNCAO_SQL))
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS messages_pdefault PARTITION OF messages DEFAULT"))
+    criadas = (await conn.execute(
+        text("SELECT cenat_criar_particoes_messages("
+             ":de, (CURRENT_DATE + make_interval(months => :meses))::date)"),
+        {"de": de or date.today(), "meses": meses_a_frente})).scalars().all()
+    return list(criadas)
+
+
+async def garantir_particoes(db: AsyncSession, meses_a_frente: int = PARTICOES_FUTURAS) -> list[str] | None:
+    """Cria as partições do mês corrente até `meses_a_frente`. Devolve as criadas; None se a
+    tabela ainda não é particionada (migração não rodou)."""
+    existe = (await db.execute(text(
+        "SELECT to_regproc('cenat_criar_particoes_messages') IS NOT NULL"))).scalar()
+    if not existe:
+        return None
+    await db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    criadas = (await db.execute(
+        text("SELECT cenat_criar_particoes_messages(CURRENT_DATE, "
+             "(CURRENT_DATE + make_interval(months => :meses))::date)"),
+        {"meses": meses_a_frente})).scalars().all()
+    return list(criadas)
+
+
+async def desanexar(db: AsyncSession, ano: int, mes: int, hoje: date | None = None) -> str:
+    """Solta o mês da tabela messages. Quem chama faz o commit (e depois arquiva/dropa)."""
+    hoje = hoje or date.today()
+    if (ano, mes) >= (hoje.year, hoje.month):
+        raise ValueError(f"{nome_particao(ano, mes)}: só meses passados podem ser desanexados")
+    nome = nome_particao(ano, mes)
+    anexada = (await db.execute(text("""
+        SELECT 1 FROM pg_inherits
+        WHERE inhparent = 'messages'::regclass AND inhrelid = to_regclass(:nome)
+    """), {"nome": nome})).scalar()
+    if not anexada:
+        raise ValueError(f"{nome}: não é partição de messages")
+    await db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    await db.execute(text(f"ALTER TABLE messages DETACH PARTITION {nome}"))
+    return nome
+
+
+async def manter_particoes_job():
+    """Loop de INTERVALO_SEGUNDOS. Registrado no lifespan de main.py, junto dos outros jobs.
+
+    Dorme ANTES de trabalhar, como os outros: a migração já deixa PARTICOES_FUTURAS meses
+    criados, então o primeiro ciclo não tem pressa.
+    """
+    sem_migracao_avisado = False
+    while True:
+        await asyncio.sleep(INTERVALO_SEGUNDOS)
+        try:
+            async with async_session() as db:
+                criadas = await garantir_particoes(db)
+                await db.commit()
+            if criadas is None:
+                if not sem_migracao_avisado:
+                    logger.warning("⚠️ Partições: messages não é particionada "
+                                   "(rode migrate_messages_particionada.py)")
+                    sem_migracao_avisado = True
+            elif criadas:
+                logger.info("🗂️ Partições de messages criadas: %s", ", ".join(criadas))
+        except Exception as e:
+            logger.error("❌ Partições de messages: ciclo falhou (tenta de novo em %s h): %s",
+                         INTERVALO_SEGUNDOS // 3600, e)
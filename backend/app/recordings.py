@@ -0,0 +1,87 @@
+"""Gravações de ligação no disco: download em streaming da Twilio.
+
+Antes o webhook de gravação fazia `resp.content` (o MP3 INTEIRO na memória — uma ligação de
+40 min são dezenas de MB por request) e gravava com `open().write()` bloqueante, DENTRO do
+event loop: enquanto o disco escrevia, nenhum outro request andava. E o upload ao Drive
+baixava o mesmo arquivo da Twilio uma segunda vez.
+
+Agora:
+  * o corpo vem em pedaços de PEDACO_BYTES (`client.stream` + `aiter_bytes`), e cada escrita
+    vai para uma thread (`asyncio.to_thread`) — memória constante, loop livre;
+  * grava em `<destino>.part` e só renomeia para o nome final (os.replace, atômico) depois de
+    conferir o tamanho contra o Content-Length. Download cortado no meio nunca vira um
+    `<call_sid>.mp3` truncado que o Whisper e o player tomariam por gravação boa;
+  * o Drive lê do disco (google_drive.upload_recording_to_drive com local_path).
+"""
+import asyncio
+import os
+
+import httpx
+
+from app.metrics import cliente_http
+
+RECORDINGS_DIR = "/home/ubuntu/pos-plataform/recordings"
+PEDACO_BYTES = 256 * 1024
+TIMEOUT_DOWNLOAD = httpx.Timeout(60.0, connect=10.0)
+
+
+class DownloadIncompleto(Exception):
+    """O corpo recebido não bate com o Content-Length (ou veio vazio)."""
+
+
+def caminho_local(call_sid: str) -> str:
+    return os.path.join(RECORDINGS_DIR, f"{call_sid}.mp3")
+
+
+def _remover(caminho: str):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+async def baixar_gravacao(url: str, destino: str, *, auth=None,
+                          client: httpx.AsyncClient | None = None) -> int:
+    """Baixa `url` para `destino` em streaming. Devolve o número de bytes gravados.
+
+    Levanta httpx.HTTPStatusError para status != 2xx e DownloadIncompleto se o tamanho não
+    confere. Em qualquer falha, o `.part` é apagado e `destino` fica como estava.
+    `client` existe para os testes injetarem um transporte falso.
+    """
+    parcial = f"{destino}.part"
+    await asyncio.to_thread(os.makedirs, os.path.dirname(destino) or ".", exist_ok=True)
+
+    proprio = client is None
+    client = client or cliente_http("twilio", timeout=TIMEOUT_DOWNLOAD)
+    arquivo = None
+    try:
+        async with client.stream("GET", url, auth=auth, follow_redirects=True) as resp:
+            resp.raise_for_status()
+            esperado = resp.headers.get("content-length")
+            arquivo = await asyncio.to_thread(open, parcial, "wb")
+            gravados = 0
+            async for pedaco in resp.aiter_bytes(PEDACO_BYTES):
+                await asyncio.to_thread(arquivo.write, pedaco)
+                gravados += len(pedaco)
+        await asyncio.to_thread(arquivo.close)
+        arquivo = None
+
+        # Com Content-Encoding (gzip), o Content-Length é do corpo comprimido; aí só dá para
+        # exigir que não venha vazio. A Twilio serve MP3 sem compressão.
+        comprimido = resp.headers.get("content-encoding", "identity") != "identity"
+        if gravados == 0 or (esperado is not None and not comprimido
+                             and int(esperado) != gravados):
+            raise DownloadIncompleto(
+                f"recebidos {gravados} bytes, esperados {esperado or '> 0'}")
+        await asyncio.to_thread(os.replace, parcial, destino)
+        return gravados
+    except BaseException:
+        # Síncrono de propósito: também roda no CancelledError, onde um novo await poderia
+        # ser cancelado antes de limpar. close/remove de um arquivo são microssegundos.
+        if arquivo is not None:
+            arquivo.close()
+        _remover(parcial)
+        raise
+    finally:
+        if proprio:
+            await client.aclose()
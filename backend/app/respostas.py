@@ -0,0 +1,123 @@
+"""GET condicional (ETag -> 304) e compressão das listagens grandes.
+
+As telas relêem as mesmas listas o tempo todo — a inbox a cada reconexão/resync e a cada
+evento, as mensagens da conversa aberta, o kanban, os leads da Exact — e na maior parte das
+vezes nada mudou. Cada releitura era a query inteira (a LATERAL da inbox, por SDR) e o JSON
+inteiro de volta pela rede.
+
+------------------------------------------------------------------------------------------
+ETAG SEM CONSULTA
+------------------------------------------------------------------------------------------
+A ETag vem da versão em memória do recurso (`eventos.versao`, ver VERSÕES POR RECURSO em
+app/eventos.py), somada ao escopo da chamada (usuário, papel, filtros). Conferir If-None-Match
+não custa NENHUMA query: o 304 sai antes da sessão executar qualquer coisa.
+
+Quando não dá para confiar na versão — escuta caída, triggers faltando, ou leitura vinda da
+RÉPLICA (que pode estar atrasada em relação a um aviso que já chegou) — `etag_lista` devolve
+None e a rota responde 200 como sempre, sem ETag. Errar para o lado do 200 custa uma query;
+errar para o lado do 304 deixaria a tela velha até a próxima mudança.
+
+Last-Modified não é emitido: com deletes e commits fora de ordem, a data da última linha não
+diz se a lista mudou. A ETag é fraca (W/): o JSON é equivalente, não byte a byte garantido.
+`Cache-Control: private, no-cache` — o navegador guarda, mas sempre revalida; proxy nenhum
+guarda a lista de um SDR. O navegador manda If-None-Match sozinho: o front não muda.
+
+------------------------------------------------------------------------------------------
+COMPRESSÃO SÓ DO QUE COMPRIME
+------------------------------------------------------------------------------------------
+CompressaoMiddleware é o GZip do Starlette limitado a JSON e texto, acima de GZIP_MINIMO
+bytes. Ficam de fora: áudio/mídia (já comprimidos, e o proxy de gravações responde 206 por
+Range — comprimir quebraria os offsets), o stream SSE (cada evento tem que sair na hora) e o
+que já vem com Content-Encoding.
+"""
+import hashlib
+import json
+import os
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+
+from app import database, eventos
+from app.metrics import Contador
+from app.serializacao import RespostaJSON
+
+GZIP_MINIMO = int(os.getenv("GZIP_MINIMO_BYTES", "1000"))
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "6"))
+TIPOS_COMPRIMIVEIS = ("application/json", "text/html", "text/plain", "text/csv", "text/css",
+                      "application/javascript")
+CACHE_CONTROL = "private, no-cache"
+
+# Uma ETag de antes de um restart nunca bate com a de depois: as versões recomeçam do zero.
+_PROCESSO = os.urandom(8).hex()
+
+nao_modificadas = Contador("http_not_modified_total",
+                           "Listagens respondidas com 304 (sem query), por recurso.",
+                           ("recurso",))
+
+
+def etag_lista(db, recurso: str, chave=None, *escopo) -> str | None:
+    """ETag da listagem, ou None se a versão do recurso não for confiável agora."""
+    if database.engine_leitura is not None and db.bind is database.engine_leitura:
+        return None
+    versao = eventos.versao(recurso, chave)
+    if versao is None:
+        return None
+    bruto = json.dumps([_PROCESSO, recurso, chave, *versao, *escopo], default=str)
+    return 'W/"%s"' % hashlib.sha1(bruto.encode()).hexdigest()[:24]
+
+
+def nao_modificado(request: Request, etag: str | None, recurso: str) -> Response | None:
+    """304 se o cliente já tem esta versão; None para seguir com a query."""
+    if etag is None:
+        return None
+    pedidas = request.headers.get("if-none-match", "")
+    if etag not in (p.strip() for p in pedidas.split(",")):
+        return None
+    nao_modificadas.inc(recurso=recurso)
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def com_etag(conteudo, etag: str | None) -> RespostaJSON:
+    """Resposta já serializada (orjson, sem jsonable_encoder — ver app/serializacao.py)."""
+    if etag is None:
+        return RespostaJSON(conteudo)
+    return RespostaJSON(conteudo, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+# ----------------------------------------------------------------------------------------------
+# Compressão
+# ----------------------------------------------------------------------------------------------
+
+class _SoComprimiveis:
+    """Marca como excluído (passa direto) tudo que não é JSON/texto, e respostas parciais."""
+
+    async def send_with_compression(self, message):
+        await super().send_with_compression(message)
+        if message["type"] == "http.response.start":
+            tipo = Headers(raw=message["headers"]).get("content-type", "")
+            if message["status"] == 206 or not tipo.startswith(TIPOS_COMPRIMIVEIS):
+                self.content_type_is_excluded = True
+
+
+class _GZipSeletivo(_SoComprimiveis, GZipResponder):
+    pass
+
+
+class _SemCompressao(_SoComprimiveis, IdentityResponder):
+    pass
+
+
+class CompressaoMiddleware(GZipMiddleware):
+    def __init__(self, app, minimum_size: int = GZIP_MINIMO, compresslevel: int = GZIP_NIVEL):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _GZipSeletivo(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = _SemCompressao(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from pydantic import BaseModel
@@ -11,8 +11,12 @@ from app.models import Channel, Contact, Message, Tag, contact_tags, CourseAlias
 
 SP_TZ = timezone(timedelta(hours=-3))
 
-from app.database import get_db
-from app.whatsapp import send_text_message, send_template_message, upload_media, send_media_message, create_template, GRAPH_VERSION
+from app import arquivo
+from app.database import get_db, get_read_db
+from app.metrics import cliente_http
+from app.eventos import RECURSO_CONTATOS, RECURSO_MENSAGENS
+from app.respostas import etag_lista, nao_modificado, com_etag
+from app.whatsapp import send_text_message, send_template_message, upload_media, send_media_message, create_template, BASE_URL as GRAPH_URL
 # Trava unica do template de boas-vindas (a MESMA usada em bulk-send-template).
 from app.welcome_guard import bloquear_se_boas_vindas
 
@@ -111,7 +115,7 @@ async def create_channel(req: ChannelRequest, db: AsyncSession = Depends(get_db)
 # === Dashboard ===
 
 @router.get("/dashboard/stats")
-async def dashboard_stats(channel_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+async def dashboard_stats(channel_id: Optional[int] = None, db: AsyncSession = Depends(get_read_db)):
     now = datetime.now()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     week_start = today_start - timedelta(days=today_start.weekday())
@@ -270,6 +274,7 @@ async def send_template(req: SendTemplateRequest, db: AsyncSession = Depends(get
             content=content_text,
             timestamp=datetime.now(SP_TZ).replace(tzinfo=None),
             status="sent",
+            template_name=req.template_name,
         )
         db.add(message)
         await db.commit()
@@ -338,9 +343,16 @@ async def send_media(
 # === Contatos ===
 
 @router.get("/contacts")
-async def list_contacts(channel_id: Optional[int] = None, assigned_to: Optional[int] = None, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def list_contacts(request: Request, channel_id: Optional[int] = None, assigned_to: Optional[int] = None, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     from sqlalchemy import text
 
+    # 304 sem query quando nada mudou desde a última chamada (ver app/respostas.py).
+    etag = etag_lista(db, RECURSO_CONTATOS, None,
+                      current_user.id, current_user.role, channel_id, assigned_to)
+    nao_mudou = nao_modificado(request, etag, "contacts")
+    if nao_mudou:
+        return nao_mudou
+
     filters = []
     params = {}
 
@@ -403,7 +415,7 @@ async def list_contacts(channel_id: Optional[int] = None, assigned_to: Optional[
             tags_map[tr.contact_wa_id] = []
         tags_map[tr.contact_wa_id].append({"id": tr.id, "name": tr.name, "color": tr.color})
 
-    return [
+    return com_etag([
         {
             "wa_id": r.wa_id,
             "name": r.name or r.wa_id,
@@ -420,7 +432,7 @@ async def list_contacts(channel_id: Optional[int] = None, assigned_to: Optional[
             "assigned_to": r.assigned_to,
         }
         for r in rows
-    ]
+    ], etag)
 
 
 @router.get("/contacts/{wa_id}")
@@ -521,26 +533,32 @@ async def mark_as_read(wa_id: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/contacts/{wa_id}/messages")
-async def get_messages(wa_id: str, db: AsyncSession = Depends(get_db)):
+async def get_messages(wa_id: str, request: Request,
+                       before: Optional[datetime] = None, before_id: Optional[int] = None,
+                       limit: Optional[int] = Query(None, ge=1, le=500),
+                       db: AsyncSession = Depends(get_db)):
+    """Sem cursor: a conversa inteira que está no banco, como sempre foi.
+
+    Com `limit` e/ou `before` (+ `before_id`, o id da mensagem do cursor): página das mais
+    novas antes do cursor, que continua pelo arquivo frio quando passa do que está no banco
+    (ver app/arquivo.py). Próxima página: timestamp e id da primeira mensagem devolvida.
+    """
+    paginada = before is not None or limit is not None
+    etag = etag_lista(db, RECURSO_MENSAGENS, wa_id, before, before_id, limit)
+    nao_mudou = nao_modificado(request, etag, "messages")
+    if nao_mudou:
+        return nao_mudou
+
+    if paginada:
+        pagina = await arquivo.pagina_mensagens(db, wa_id, before, before_id,
+                                                limit or arquivo.PAGINA_PADRAO)
+        return com_etag(pagina, etag)
+
+    m = Message.__table__
     result = await db.execute(
-        select(Message).where(Message.contact_wa_id == wa_id).order_by(Message.timestamp.asc())
+        select(m).where(m.c.contact_wa_id == wa_id).order_by(m.c.timestamp.asc())
     )
-    messages = result.scalars().all()
-
-    return [
-        {
-            "id": m.id,
-            "wa_message_id": m.wa_message_id,
-            "direction": m.direction,
-            "type": m.message_type,
-            "content": m.content,
-            "timestamp": m.timestamp.isoformat(),
-            "status": m.status,
-            "sent_by_ai": m.sent_by_ai or False,
-            "channel_id": m.channel_id,
-        }
-        for m in messages
-    ]
+    return com_etag([arquivo.para_tela(r) for r in result.mappings().all()], etag)
 
 
 # === Tags ===
@@ -579,7 +597,6 @@ async def list_templates(channel_id: int, status: Optional[str] = "APPROVED", db
     Default status=APPROVED (não quebra conversas/automações, que enviam só aprovados).
     Passar status=all (ou vazio) lista todos os status e inclui category/rejected_reason.
     """
-    import httpx
     channel = await get_channel(channel_id, db)
     params = {
         "limit": 50,
@@ -588,9 +605,9 @@ async def list_templates(channel_id: int, status: Optional[str] = "APPROVED", db
     # Filtra por status só quando não for "all"/vazio.
     if status and status.lower() != "all":
         params["status"] = status
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         response = await client.get(
-            f"https://graph.facebook.com/{GRAPH_VERSION}/{channel.waba_id}/message_templates",
+            f"{GRAPH_URL}/{channel.waba_id}/message_templates",
             headers={"Authorization": f"Bearer {channel.whatsapp_token}"},
             params=params,
         )
@@ -715,13 +732,12 @@ async def create_channel_template(
 
 @router.get("/media/{media_id}")
 async def get_media(media_id: str, channel_id: int = 1, db: AsyncSession = Depends(get_db)):
-    import httpx
     channel = await get_channel(channel_id, db)
 
     # Passo 1: pegar URL da mídia
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         url_response = await client.get(
-            f"https://graph.facebook.com/v22.0/{media_id}",
+            f"{GRAPH_URL}/{media_id}",
             headers={"Authorization": f"Bearer {channel.whatsapp_token}"},
         )
         url_data = url_response.json()
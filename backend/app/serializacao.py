@@ -0,0 +1,53 @@
+"""JSON rápido (orjson) na saída das rotas e na entrada do webhook.
+
+Uma listagem grande passava por DOIS passes em Python puro: o `jsonable_encoder` do FastAPI
+(percorre a lista inteira convertendo cada valor) e o `json.dumps` do Starlette. Com milhares
+de contatos/mensagens, a serialização custava mais que a query — e rodava no event loop.
+
+  * RespostaJSON: default_response_class do app. Rotas que devolvem dict/list continuam
+    passando pelo jsonable_encoder (o FastAPI sempre chama), mas o dumps é o do orjson.
+  * As listagens quentes (com_etag em app/respostas.py) devolvem RespostaJSON DIRETO: pulam o
+    jsonable_encoder também — o orjson já serializa datetime, date, UUID e Enum sozinho.
+  * ler_json(request): o corpo do webhook com orjson.loads, no lugar de request.json().
+
+DATAS: o orjson escreve datetime no mesmo formato do `.isoformat()` que as rotas já usam
+("2025-01-31T14:05:09", com microssegundos só quando existem e "+00:00" quando tem fuso) —
+a rota que devolve o datetime cru e a que devolve o isoformat produzem o mesmo texto.
+
+O que o orjson não conhece nativamente cai em `_padrao`: Decimal como o jsonable_encoder
+(int se inteiro, senão float), set como lista, modelo pydantic pelo model_dump, e o resto pelo
+próprio jsonable_encoder.
+"""
+from decimal import Decimal
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.requests import Request
+
+OPCOES = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _padrao(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    return jsonable_encoder(obj)
+
+
+def dumps(conteudo) -> bytes:
+    return orjson.dumps(conteudo, default=_padrao, option=OPCOES)
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+async def ler_json(request: Request):
+    """Corpo JSON do request com orjson. JSON inválido levanta ValueError, como request.json()."""
+    return orjson.loads(await request.body())
@@ -1,20 +1,71 @@
+import asyncio
+import logging
 import os
 import httpx
 from openai import AsyncOpenAI
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from app.audio_split import (SEGMENTO_SEGUNDOS, SOBREPOSICAO_SEGUNDOS, costurar,
+                             dividir_mp3, duracao_mp3, quadros_mp3)
+from app.metrics import http_client_openai
 
-async def transcribe_audio(local_path: str) -> str:
-    """Transcreve o áudio usando Whisper API."""
-    with open(local_path, "rb") as audio_file:
-        response = await client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            language="pt",
-        )
+logger = logging.getLogger(__name__)
+
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client_openai())
+
+# Trechos transcritos ao mesmo tempo, POR LIGAÇÃO. Com o worker rodando 2 ligações, são até
+# 16 requisições simultâneas ao Whisper — folgado para o limite por minuto da conta.
+TRECHOS_EM_PARALELO = int(os.getenv("TRANSCRICAO_TRECHOS_PARALELOS", "8"))
+
+
+async def _whisper(dados: bytes, nome: str) -> str:
+    """Uma requisição ao Whisper com o MP3 em memória."""
+    response = await client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(nome, dados),
+        language="pt",
+    )
     return response.text
 
 
+def _ler(local_path: str) -> bytes:
+    with open(local_path, "rb") as f:
+        return f.read()
+
+
+async def transcribe_audio(local_path: str, *, transcrever=None) -> str:
+    """Transcreve o áudio usando Whisper API.
+
+    Gravação longa é cortada em trechos sobrepostos (app/audio_split.py), transcrita em
+    paralelo e costurada — o tempo total fica perto do de um trecho. Gravação curta, ou que
+    não parece MP3, vai inteira numa requisição só, como sempre foi.
+
+    `transcrever(dados, nome) -> str` substitui o Whisper — é o que permite testar e medir
+    sem rede.
+    """
+    transcrever = transcrever or _whisper
+    nome = os.path.basename(local_path)
+
+    # Leitura e varredura de quadros fora do event loop: 40 min de MP3 são ~40 MB e dezenas
+    # de milhares de cabeçalhos.
+    dados = await asyncio.to_thread(_ler, local_path)
+    quadros = await asyncio.to_thread(quadros_mp3, dados)
+
+    # Até um trecho (5 min) cabe folgado nos 25 MB do Whisper em qualquer bitrate de MP3.
+    if not quadros or duracao_mp3(quadros) <= SEGMENTO_SEGUNDOS + SOBREPOSICAO_SEGUNDOS:
+        return await transcrever(dados, nome)
+
+    trechos = await asyncio.to_thread(dividir_mp3, dados, quadros)
+    vagas = asyncio.Semaphore(TRECHOS_EM_PARALELO)
+
+    async def _trecho(i: int, fatia: bytes) -> str:
+        async with vagas:
+            return await transcrever(fatia, f"{i:03d}_{nome}")
+
+    textos = await asyncio.gather(*(_trecho(i, f) for i, f in enumerate(trechos)))
+    logger.info("🎙️  %s: %s trechos transcritos em paralelo", nome, len(trechos))
+    return costurar(list(textos))
+
+
 async def generate_insights(transcription: str, duration: int, user_name: str) -> str:
     """Gera insights da ligação usando GPT-4o."""
     prompt = f"""Você é um analista de qualidade de vendas da CENAT, empresa de pós-graduação.
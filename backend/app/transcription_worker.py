@@ -0,0 +1,143 @@
+"""Fila de transcrição de ligações — tira o Whisper e os insights de dentro do request.
+
+Antes, POST /api/twilio/transcribe/{id} subia o MP3 para o Whisper e esperava o GPT dos
+insights DENTRO do request: minutos com um worker do uvicorn preso e o front num timeout de
+120s. E o webhook de gravação já marcava `transcription_status='pending'`, mas ninguém lia
+esse estado — só virava transcrição quando alguém clicava no botão.
+
+Agora:
+  * o webhook de gravação marca 'pending' (como já fazia) e ACORDA este worker;
+  * o endpoint só re-enfileira e devolve na hora;
+  * este worker consome a fila com concorrência limitada, retentativa e tempos registrados.
+
+------------------------------------------------------------------------------------------
+ESTADOS (call_logs.transcription_status)
+------------------------------------------------------------------------------------------
+  pending     na fila. transcription_run_at NULL = já; preenchido = retentativa adiada
+  processing  reivindicada por um trabalhador, que está no Whisper/GPT agora
+  done        transcrição e insights gravados
+  error       MAX_TENTATIVAS esgotadas. Sai da fila; o botão do front re-enfileira.
+
+------------------------------------------------------------------------------------------
+A FILA
+------------------------------------------------------------------------------------------
+Reivindicação por SKIP LOCKED em transação curta, 'processing' travada voltando à fila,
+retentativa com run_at empurrado e o laço acordável são os de fila_worker.py, que explica o
+porquê de cada escolha e é o mesmo esqueleto do drive_uploader. Aqui fica só o trabalho: o
+Whisper, os insights e os tempos de cada etapa. O teto de CONCORRENCIA protege o limite de
+requisições da OpenAI e o disco (cada Whisper lê o MP3 inteiro).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app import fila_worker
+from app.database import async_session
+from app.fila_worker import CONCLUIDA, ERRO, PENDENTE, PROCESSANDO
+from app.models import CallLog
+from app.nat_guard import _agora_sp
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_SEGUNDOS = 30
+CONCORRENCIA = int(os.getenv("TRANSCRICAO_CONCORRENCIA", "2"))
+MAX_TENTATIVAS = 3
+ATRASO_RETENTATIVA_SEGUNDOS = 300
+TRAVADA_APOS_MINUTOS = 30
+
+# Teto de ligações por ciclo, somando todos os trabalhadores. O que sobrar fica para o ciclo
+# seguinte, em ordem de id.
+MAX_POR_CICLO = 20
+
+FILA = fila_worker.Fila("transcription", "Transcrição", MAX_TENTATIVAS,
+                        ATRASO_RETENTATIVA_SEGUNDOS, TRAVADA_APOS_MINUTOS)
+
+# Acorda o job antes dos INTERVALO_SEGUNDOS: o webhook de gravação e o endpoint chamam
+# acordar() depois de commitar o 'pending'. Sem isto, um clique no botão esperaria até 30s
+# para começar, e a API não tem como saber se o worker já pegou.
+_acordar = asyncio.Event()
+
+
+def acordar():
+    _acordar.set()
+
+
+def _snapshot(call_log) -> dict:
+    return {
+        "call_sid": call_log.call_sid,
+        "local_recording_path": call_log.local_recording_path,
+        "duration": call_log.duration or 0,
+        "user_name": call_log.user_name or "N/A",
+    }
+
+
+async def _reivindicar(db, corte: datetime) -> dict | None:
+    """Trava a próxima ligação da fila e a marca como 'processing'. Não commita."""
+    return await fila_worker.reivindicar(FILA, db, corte, _snapshot)
+
+
+async def _gravar(call_id: int, **valores):
+    """Desfecho de uma ligação, numa sessão própria e curta."""
+    async with async_session() as db:
+        await db.execute(update(CallLog).where(CallLog.id == call_id).values(**valores))
+        await db.commit()
+
+
+async def _processar(trabalho: dict, agora: datetime) -> str:
+    """Whisper + insights de uma ligação já reivindicada. Grava o desfecho e devolve o status."""
+    from app.transcription import transcribe_audio, generate_insights
+
+    call_id, caminho = trabalho["id"], trabalho["local_recording_path"]
+    tempos = {}
+    try:
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"gravação não está no disco: {caminho}")
+
+        inicio = time.monotonic()
+        transcricao = await transcribe_audio(caminho)
+        tempos["whisper_ms"] = int((time.monotonic() - inicio) * 1000)
+
+        inicio = time.monotonic()
+        insights = await generate_insights(
+            transcription=transcricao,
+            duration=trabalho["duration"],
+            user_name=trabalho["user_name"],
+        )
+        tempos["insights_ms"] = int((time.monotonic() - inicio) * 1000)
+    except Exception as e:
+        return await fila_worker.registrar_falha(
+            FILA, _gravar, trabalho, agora, e,
+            ao_desistir={"transcription_finished_at": _agora_sp(),
+                         "transcription_timings": json.dumps(tempos) if tempos else None})
+
+    tempos["total_ms"] = tempos["whisper_ms"] + tempos["insights_ms"]
+    await _gravar(call_id, transcription=transcricao, transcription_insights=insights,
+                  transcription_status=CONCLUIDA, transcription_error=None,
+                  transcription_run_at=None, transcription_finished_at=_agora_sp(),
+                  transcription_timings=json.dumps(tempos))
+    logger.info("📝 Transcrição: ligação %s concluída em %.1fs (whisper %sms, insights %sms)",
+                call_id, tempos['total_ms'] / 1000, tempos['whisper_ms'],
+                tempos['insights_ms'])
+    return CONCLUIDA
+
+
+async def processar_fila(*, agora: datetime | None = None,
+                         concorrencia: int = CONCORRENCIA,
+                         limite: int = MAX_POR_CICLO) -> dict:
+    """Drena a fila com `concorrencia` trabalhadores. Devolve {status: quantidade}.
+
+    `agora` explícito é o corte do ciclo (mesmo padrão de nat_scheduler.processar_pendentes).
+    """
+    return await fila_worker.drenar(FILA, async_session, _reivindicar, _processar,
+                                    corte=agora if agora is not None else _agora_sp(),
+                                    concorrencia=concorrencia, limite=limite)
+
+
+async def transcription_worker_job():
+    """Loop do worker. Registrado no lifespan de main.py, junto dos outros jobs."""
+    await fila_worker.laco(FILA, _acordar, INTERVALO_SEGUNDOS, processar_fila, "🎙️ ")
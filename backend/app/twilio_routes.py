@@ -4,8 +4,13 @@ from pydantic import BaseModel
 from twilio.jwt.access_token import AccessToken
 from twilio.jwt.access_token.grants import VoiceGrant
 from app.auth import get_current_user
+from app.database import get_read_db
+from app.metrics import cliente_http, http_client_twilio
+import logging
 import os
-import httpx
+import json
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/twilio", tags=["twilio"])
 
@@ -50,6 +55,7 @@ async def get_voice_token(current_user=Depends(get_current_user)):
 
 
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER", "")
+TWILIO_BASE_URL = os.getenv("TWILIO_BASE_URL", "https://api.twilio.com")
 
 
 class CallRequest(BaseModel):
@@ -64,7 +70,9 @@ async def make_call(data: CallRequest, current_user=Depends(get_current_user)):
     if not TWILIO_PHONE_NUMBER:
         raise HTTPException(status_code=500, detail="Número Twilio não configurado")
 
-    client = Client(TWILIO_ACCOUNT_SID, os.getenv("TWILIO_AUTH_TOKEN"))
+    client = Client(TWILIO_ACCOUNT_SID, os.getenv("TWILIO_AUTH_TOKEN"),
+                    http_client=http_client_twilio())
+    client.api.base_url = TWILIO_BASE_URL
 
     # Formatar número
     to_number = data.to.strip()
@@ -179,9 +187,9 @@ async def call_status_webhook(request: Request):
             try:
                 await post_call_to_exact_spotter(call_log)
             except Exception as e:
-                print(f"❌ Erro ao postar no Exact: {e}")
+                logger.error("❌ Erro ao postar no Exact: %s", e)
 
-    print(f"📞 Call {call_sid}: {status} ({duration}s)")
+    logger.info("📞 Call %s: %s (%ss)", call_sid, status, duration)
     return Response(content="", media_type="application/xml")
 
 @router.post("/recording-status")
@@ -190,10 +198,11 @@ async def recording_status_webhook(request: Request):
     from app.database import async_session
     from app.models import CallLog
     from sqlalchemy import select
-    import httpx, os
+    import os
 
     form = await request.form()
-    print(f"📥 Recording webhook: CallSid={form.get('CallSid')} RecordingSid={form.get('RecordingSid')} Status={form.get('RecordingStatus')}")
+    logger.info("📥 Recording webhook: CallSid=%s RecordingSid=%s Status=%s",
+                form.get('CallSid'), form.get('RecordingSid'), form.get('RecordingStatus'))
     call_sid = form.get("CallSid", "")
     recording_sid = form.get("RecordingSid", "")
     recording_url = form.get("RecordingUrl", "")
@@ -202,29 +211,17 @@ async def recording_status_webhook(request: Request):
     if recording_status == "completed" and recording_url:
         mp3_url = f"{recording_url}.mp3"
 
-        recordings_dir = "/home/ubuntu/pos-plataform/recordings"
-        os.makedirs(recordings_dir, exist_ok=True)
-        local_path = f"{recordings_dir}/{call_sid}.mp3"
+        from app import drive_uploader
+        from app.recordings import baixar_gravacao, caminho_local
+        local_path = caminho_local(call_sid)
 
         try:
             account_sid = os.getenv("TWILIO_ACCOUNT_SID")
             auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    mp3_url,
-                    auth=(account_sid, auth_token),
-                    follow_redirects=True,
-                    timeout=60,
-                )
-                if resp.status_code == 200:
-                    with open(local_path, "wb") as f:
-                        f.write(resp.content)
-                    print(f"✅ Gravação salva em {local_path}")
-                else:
-                    print(f"❌ Erro ao baixar gravação: {resp.status_code}")
-                    local_path = None
+            tamanho = await baixar_gravacao(mp3_url, local_path, auth=(account_sid, auth_token))
+            logger.info("✅ Gravação salva em %s (%s KB)", local_path, tamanho // 1024)
         except Exception as e:
-            print(f"❌ Erro ao salvar gravação: {e}")
+            logger.error("❌ Erro ao salvar gravação: %s: %s", type(e).__name__, e)
             local_path = None
 
         async with async_session() as db:
@@ -234,13 +231,12 @@ async def recording_status_webhook(request: Request):
             # Fallback: match por tempo
             if not call_log:
                 try:
-                    import httpx as _httpx
                     from datetime import datetime as _dt
                     account_sid = os.getenv("TWILIO_ACCOUNT_SID")
                     auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-                    async with _httpx.AsyncClient() as _client:
+                    async with cliente_http("twilio") as _client:
                         call_resp = await _client.get(
-                            f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json",
+                            f"{TWILIO_BASE_URL}/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json",
                             auth=(account_sid, auth_token),
                         )
                         call_data = call_resp.json()
@@ -256,9 +252,9 @@ async def recording_status_webhook(request: Request):
                         )
                         call_log = result2.scalar_one_or_none()
                         if call_log:
-                            print(f"🔁 Match por tempo: {call_sid} -> {call_log.call_sid}")
+                            logger.info("🔁 Match por tempo: %s -> %s", call_sid, call_log.call_sid)
                 except Exception as e:
-                    print(f"❌ Erro no fallback: {e}")
+                    logger.error("❌ Erro no fallback: %s", e)
 
             if call_log:
                 call_log.recording_sid = recording_sid
@@ -266,10 +262,17 @@ async def recording_status_webhook(request: Request):
                 if local_path:
                     call_log.local_recording_path = local_path
                     call_log.transcription_status = "pending"
+                    if drive_uploader.UPLOAD_ATIVO:
+                        call_log.drive_upload_status = drive_uploader.PENDENTE
                 await db.commit()
-                print(f"✅ CallLog atualizado: {call_log.call_sid}")
+                logger.info("✅ CallLog atualizado: %s", call_log.call_sid)
+                if local_path:
+                    from app.transcription_worker import acordar
+                    acordar()
+                    if drive_uploader.UPLOAD_ATIVO:
+                        drive_uploader.acordar()
             else:
-                print(f"⚠️ CallLog não encontrado para SID: {call_sid}")
+                logger.warning("⚠️ CallLog não encontrado para SID: %s", call_sid)
 
     return Response(content="", media_type="application/xml")
 
@@ -278,46 +281,51 @@ async def list_call_logs(
     limit: int = 50,
     offset: int = 0,
     current_user=Depends(get_current_user),
+    db=Depends(get_read_db),
 ):
     """Lista histórico de ligações."""
-    from app.database import async_session
     from app.models import CallLog
     from sqlalchemy import select
 
-    async with async_session() as db:
-        query = select(CallLog).order_by(CallLog.created_at.desc())
-        # SDR só vê suas próprias ligações
-        if current_user.role != "admin":
-            query = query.where(CallLog.user_id == current_user.id)
-        result = await db.execute(query.limit(limit).offset(offset))
-        logs = result.scalars().all()
-
-        return [
-            {
-                "id": log.id,
-                "call_sid": log.call_sid,
-                "from_number": log.from_number,
-                "to_number": log.to_number,
-                "direction": log.direction,
-                "status": log.status,
-                "duration": log.duration,
-                "recording_url": log.recording_url,
-                "local_recording_path": log.local_recording_path,
-                "drive_file_url": log.drive_file_url,
-                "user_name": log.user_name,
-                "contact_name": log.contact_name,
-                "transcription_status": log.transcription_status,
-                "transcription": log.transcription,
-                "transcription_insights": log.transcription_insights,
-                "created_at": log.created_at.isoformat() if log.created_at else None,
-            }
-            for log in logs
-        ]
+    query = select(CallLog).order_by(CallLog.created_at.desc())
+    # SDR só vê suas próprias ligações
+    if current_user.role != "admin":
+        query = query.where(CallLog.user_id == current_user.id)
+    result = await db.execute(query.limit(limit).offset(offset))
+    logs = result.scalars().all()
+
+    return [
+        {
+            "id": log.id,
+            "call_sid": log.call_sid,
+            "from_number": log.from_number,
+            "to_number": log.to_number,
+            "direction": log.direction,
+            "status": log.status,
+            "duration": log.duration,
+            "recording_url": log.recording_url,
+            "local_recording_path": log.local_recording_path,
+            "drive_file_url": log.drive_file_url,
+            "drive_upload_status": log.drive_upload_status,
+            "drive_upload_error": log.drive_upload_error,
+            "user_name": log.user_name,
+            "contact_name": log.contact_name,
+            "transcription_status": log.transcription_status,
+            "transcription": log.transcription,
+            "transcription_insights": log.transcription_insights,
+            "transcription_attempts": log.transcription_attempts or 0,
+            "transcription_error": log.transcription_error,
+            "transcription_timings": json.loads(log.transcription_timings) if log.transcription_timings else None,
+            "created_at": log.created_at.isoformat() if log.created_at else None,
+        }
+        for log in logs
+    ]
 
 
 async def post_call_to_exact_spotter(call_log):
     """Posta resumo da ligação na timeline do Exact Spotter."""
     from app.database import async_session
+    from app.exact_spotter import BASE_URL as EXACT_BASE_URL
     from app.models import Contact, ExactLead
     from sqlalchemy import select
 
@@ -339,7 +347,7 @@ async def post_call_to_exact_spotter(call_log):
         lead = result.scalar_one_or_none()
 
     if not lead:
-        print(f"⚠️ Lead não encontrado no Exact para telefone {phone}")
+        logger.warning("⚠️ Lead não encontrado no Exact para telefone %s", phone)
         return
 
     duration_min = f"{call_log.duration // 60}m{call_log.duration % 60:02d}s"
@@ -355,10 +363,10 @@ async def post_call_to_exact_spotter(call_log):
         f"{drive_info}"
     )
 
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("exact") as client:
         try:
             resp = await client.post(
-                "https://api.exactspotter.com/v3/timelineAdd",
+                f"{EXACT_BASE_URL}/timelineAdd",
                 headers={
                     "Content-Type": "application/json",
                     "token_exact": exact_token,
@@ -369,9 +377,9 @@ async def post_call_to_exact_spotter(call_log):
                     "userId": 415875,
                 },
             )
-            print(f"📝 Exact Spotter timeline: {resp.status_code}")
+            logger.info("📝 Exact Spotter timeline: %s", resp.status_code)
         except Exception as e:
-            print(f"❌ Erro ao postar no Exact: {e}")
+            logger.error("❌ Erro ao postar no Exact: %s", e)
 
 @router.post("/voice-incoming")
 async def voice_incoming_twiml(request: "Request"):
@@ -397,8 +405,16 @@ async def voice_incoming_twiml(request: "Request"):
 
 @router.get("/recording/{call_sid}")
 async def stream_recording(call_sid: str):
-    """Serve gravação salva localmente."""
+    """Serve gravação salva localmente, com suporte a HTTP Range.
+
+    O <audio> do front pede `Range: bytes=N-` para começar a tocar e a cada vez que o usuário
+    arrasta a barra. O FileResponse do Starlette (>= 0.39, fixado em requirements.txt)
+    responde 206 com só o pedaço pedido, lido do disco em streaming — sem isso, cada seek
+    baixava a gravação inteira de novo. `inline` para o navegador tocar em vez de oferecer
+    download.
+    """
     from fastapi.responses import FileResponse
+    from app.recordings import caminho_local
     from app.database import async_session
     from app.models import CallLog
     from sqlalchemy import select
@@ -412,7 +428,7 @@ async def stream_recording(call_sid: str):
 
     # Fallback: tenta pelo nome direto
     if not local_path:
-        direct_path = f"/home/ubuntu/pos-plataform/recordings/{call_sid}.mp3"
+        direct_path = caminho_local(call_sid)
         if os.path.exists(direct_path):
             local_path = direct_path
 
@@ -423,6 +439,7 @@ async def stream_recording(call_sid: str):
         path=local_path,
         media_type="audio/mpeg",
         filename=f"{call_sid}.mp3",
+        content_disposition_type="inline",
     )
 
 @router.delete("/recording/{call_sid}")
@@ -444,7 +461,7 @@ async def delete_recording(call_sid: str, current_user=Depends(get_current_user)
 
         if local_path and os.path.exists(local_path):
             os.remove(local_path)
-            print(f"🗑️ Gravação apagada: {local_path}")
+            logger.info("🗑️ Gravação apagada: %s", local_path)
 
         call_log.local_recording_path = None
         call_log.transcription_status = None
@@ -454,10 +471,14 @@ async def delete_recording(call_sid: str, current_user=Depends(get_current_user)
 
 @router.post("/transcribe/{call_id}")
 async def transcribe_call(call_id: int, current_user=Depends(get_current_user)):
-    """Aciona transcrição e geração de insights de uma ligação."""
+    """Enfileira a transcrição + insights de uma ligação e devolve na hora.
+
+    O trabalho é do transcription_worker. Re-enfileirar zera as tentativas: é um humano
+    pedindo de novo, inclusive depois de um 'error'. Se já está sendo processada, não mexe.
+    """
     from app.database import async_session
     from app.models import CallLog
-    from app.transcription import transcribe_audio, generate_insights
+    from app.transcription_worker import acordar, PENDENTE, PROCESSANDO
     from sqlalchemy import select
 
     async with async_session() as db:
@@ -470,32 +491,13 @@ async def transcribe_call(call_id: int, current_user=Depends(get_current_user)):
         if not call_log.local_recording_path:
             raise HTTPException(status_code=400, detail="Gravação não disponível")
 
-        call_log.transcription_status = "processing"
-        await db.commit()
-
-    try:
-        transcription = await transcribe_audio(call_log.local_recording_path)
-        insights = await generate_insights(
-            transcription=transcription,
-            duration=call_log.duration or 0,
-            user_name=call_log.user_name or "N/A",
-        )
-
-        async with async_session() as db:
-            result = await db.execute(select(CallLog).where(CallLog.id == call_id))
-            call_log = result.scalar_one_or_none()
-            call_log.transcription = transcription
-            call_log.transcription_insights = insights
-            call_log.transcription_status = "done"
+        if call_log.transcription_status != PROCESSANDO:
+            call_log.transcription_status = PENDENTE
+            call_log.transcription_attempts = 0
+            call_log.transcription_run_at = None
+            call_log.transcription_error = None
             await db.commit()
+        status = call_log.transcription_status
 
-        return {"status": "done", "transcription": transcription, "insights": insights}
-
-    except Exception as e:
-        async with async_session() as db:
-            result = await db.execute(select(CallLog).where(CallLog.id == call_id))
-            call_log = result.scalar_one_or_none()
-            if call_log:
-                call_log.transcription_status = "error"
-                await db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    acordar()
+    return {"status": status, "transcription_status": status}
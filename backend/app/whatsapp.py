@@ -1,11 +1,14 @@
-import httpx
+import os
+
+from app.metrics import cliente_http
 
 GRAPH_VERSION = "v22.0"
-BASE_URL = f"https://graph.facebook.com/{GRAPH_VERSION}"
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.facebook.com")
+BASE_URL = f"{GRAPH_BASE_URL}/{GRAPH_VERSION}"
 
 
 async def send_text_message(to: str, text: str, phone_number_id: str, token: str) -> dict:
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         response = await client.post(
             f"{BASE_URL}/{phone_number_id}/messages",
             headers={
@@ -31,7 +34,7 @@ async def send_interactive_buttons(to: str, body: str, buttons: list, phone_numb
     que volta em interactive.button_reply.id no webhook. Máximo 3 botões, título de até 20
     caracteres (quem chama já entrega truncado — ver nat_copy.BOTOES_LIVRES).
     """
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         response = await client.post(
             f"{BASE_URL}/{phone_number_id}/messages",
             headers={
@@ -99,7 +102,7 @@ async def send_template_message(to: str, template_name: str, language: str, phon
     if components:
         template_data["components"] = components
 
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         response = await client.post(
             f"{BASE_URL}/{phone_number_id}/messages",
             headers={
@@ -118,7 +121,7 @@ async def send_template_message(to: str, template_name: str, language: str, phon
 
 async def upload_media(file_bytes: bytes, mime_type: str, filename: str, phone_number_id: str, token: str) -> str:
     """Faz upload de mídia para Meta e retorna o media_id."""
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    async with cliente_http("graph", timeout=60.0) as client:
         response = await client.post(
             f"{BASE_URL}/{phone_number_id}/media",
             headers={"Authorization": f"Bearer {token}"},
@@ -141,7 +144,7 @@ async def send_media_message(to: str, media_id: str, media_type: str, phone_numb
         else:
             media_object["caption"] = caption
 
-    async with httpx.AsyncClient() as client:
+    async with cliente_http("graph") as client:
         response = await client.post(
             f"{BASE_URL}/{phone_number_id}/messages",
             headers={
@@ -163,7 +166,7 @@ async def fetch_template_body(waba_id: str, token: str, template_name: str, lang
     if not waba_id or not template_name:
         return None
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with cliente_http("graph", timeout=15.0) as client:
             response = await client.get(
                 f"{BASE_URL}/{waba_id}/message_templates",
                 headers={"Authorization": f"Bearer {token}"},
@@ -202,7 +205,7 @@ async def create_template(waba_id: str, token: str, name: str, language: str,
     Não levanta exceção: quem chama decide o que fazer com o corpo de erro do Meta
     (precisamos repassar o erro verbatim pra tela).
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with cliente_http("graph", timeout=30.0) as client:
         response = await client.post(
             f"{BASE_URL}/{waba_id}/message_templates",
             headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
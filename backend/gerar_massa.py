@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""Massa sintética com a forma da produção, num Postgres LOCAL, para benchmark e EXPLAIN.
+
+    cd backend
+    venv/bin/python gerar_massa.py --url postgresql+asyncpg://postgres@localhost:5432/cenat_bench
+    venv/bin/python gerar_massa.py --url ... --escala 0.1               # 10% dos volumes
+    venv/bin/python gerar_massa.py --url ... --mensagens 10000000 --semente 7
+    venv/bin/python gerar_massa.py --url ... --agora 2026-10-19T12:00   # datas fixas também
+    venv/bin/python gerar_massa.py --url ... --limpar                   # troca a massa anterior
+
+POR QUE ESTE SCRIPT EXISTE
+    Toda pergunta de desempenho era respondida no banco de produção, porque não havia outro
+    com dados de verdade. Aqui sai um banco com os mesmos volumes e a mesma FORMA — a cauda
+    longa de mensagens por contato, as rajadas de conversa, os meses de messages particionados —
+    e todo benchmark e a suíte de EXPLAIN (test_explain_consultas.py) rodam contra ela.
+
+🔴 NUNCA EM PRODUÇÃO — as travas, em ordem:
+    1. --url é obrigatório. O DATABASE_URL do .env NUNCA é usado, nem como padrão.
+    2. O banco cenat_whatsapp (o de produção) é recusado, com ou sem --limpar.
+    3. Banco com usuário, contato ou mensagem: recusa, a menos que --limpar (TRUNCATE ...
+       RESTART IDENTITY CASCADE das tabelas geradas).
+    4. Nada que envie é importado: só app.models, app.particoes, app.nat_copy (constantes),
+       app.nat_guard (para instalar_gatilhos), a lista de cursos de seed_courses.py e, para os
+       índices, migrate_indices_compostos. Não existe função de envio no processo.
+       app.database (e app.metrics, dele) vem junto de app.models e monta o engine do
+       DATABASE_URL no import — sem conectar: create_async_engine não abre conexão até alguém
+       usar, e aqui ninguém usa. Toda conexão do script é do engine próprio, criado do --url
+       (e é ele que vai para criar_indices).
+
+REPRODUTÍVEL
+    Cada tabela tem o seu gerador, semeado com (semente, tabela): mudar o volume de chamadas não
+    muda nenhuma mensagem. As datas são relativas a --agora (padrão: a hora cheia de agora).
+    Mesma semente + mesmo --agora + mesmos volumes = o mesmo banco, linha a linha, ids
+    inclusive (as tabelas são truncadas com RESTART IDENTITY antes da carga). Até a senha: o
+    bcrypt usa um sal fixo — todos os usuários entram com a senha SENHA.
+
+FORMA DOS DADOS
+    contatos   entrada acelerando no tempo (mais contatos recentes que antigos), 70% vindos da
+               Exact (a conversa abre com a boas-vindas), 85% com SDR, 80% no canal 1.
+    messages   por contato, lognormal (σ=SIGMA_CONVERSA): a maioria com um punhado (boas-vindas,
+               uma ou duas respostas), uma cauda de conversas com centenas. Dentro da conversa,
+               rajadas (minutos entre mensagens) e pausas (dias). Status, tipos, falhas com
+               error_code e nat_etapa nas proporções da produção; a metade das conversas que
+               terminam no lead fica com as últimas mensagens 'received' (não lidas).
+               Os ids seguem a ordem do tempo: os contatos vão em lotes, por ordem de entrada, e
+               cada lote sai ordenado por timestamp.
+    o resto    exact_leads (os primeiros ligados aos contatos da Exact pelo telefone),
+               notificações de janela, agendamentos (quase todos já enviados), documentos da
+               base com embedding de EMBEDDING_DIM dimensões (JSON, como o ai_routes grava),
+               nat_flow_state e call_logs com transcrição e upload ao Drive.
+
+COPY
+    copy_records_to_table do asyncpg (COPY binário), LOTE linhas por vez, tudo numa
+    transação. Num banco novo, os índices de migrate_indices_compostos.py vêm DEPOIS da carga
+    (um índice construído de uma vez é mais rápido que mantido linha a linha); com --limpar eles
+    já existem e o TRUNCATE os mantém. No fim, VACUUM ANALYZE. Escala 1 leva uns 4 minutos
+    e 2,3 GB.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import islice
+from urllib.parse import urlparse
+
+import bcrypt
+import numpy as np
+import orjson
+from sqlalchemy import text
+
+from app import particoes
+from app import nat_copy
+from app import nat_guard
+from app.database import Base
+from app.models import ETAPAS_VALIDAS
+from seed_courses import COURSES
+
+# Volumes com --escala 1: a ordem de grandeza que a produção vai ter.
+VOLUMES = {
+    "usuarios": 13,            # 1 admin + 12 SDRs
+    "canais": 2,
+    "contatos": 200_000,
+    "mensagens": 5_000_000,
+    "leads": 50_000,
+    "notificacoes": 300_000,
+    "agendamentos": 2_000,
+    "documentos": 2_000,
+    "estados_nat": 20_000,
+    "chamadas": 30_000,
+}
+FIXOS = ("usuarios", "canais")   # não escalam
+
+DIAS = 365                       # quanto de história
+SIGMA_CONVERSA = 1.3
+EMBEDDING_DIM = 1536             # text-embedding-3-small
+LOTE = 50_000
+CONTATOS_POR_LOTE = 2_000
+BANCO_PRODUCAO = "cenat_whatsapp"
+
+SENHA = "massa"
+_SAL = b"$2b$12$massasinteticamassasie"
+
+TABELAS = ("users", "channels", "contacts", "exact_leads", "messages", "notifications",
+           "scheduled_messages", "knowledge_documents", "nat_flow_state", "call_logs")
+
+Contato = namedtuple("Contato", "id wa_id nome criado canal sdr exact ia etapa n_msgs")
+
+_NOMES = ("Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela",
+          "João", "Larissa", "Marcos", "Natália", "Otávio", "Patrícia", "Rafael", "Sabrina", "Tiago",
+          "Vanessa", "Wagner", "Yasmin", "Camila", "Lucas", "Mariana", "Pedro", "Juliana")
+_SOBRENOMES = ("Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Rodrigues",
+               "Almeida", "Nascimento", "Ferreira", "Carvalho", "Gomes", "Ribeiro", "Martins")
+_DDDS = ("11", "21", "31", "41", "51", "61", "71", "81", "85", "27", "48", "62", "92", "98")
+_ENTRADAS = ("Oi, tenho interesse na pós", "Qual o valor do curso?", "É reconhecido pelo MEC?",
+             "Quanto tempo dura?", "Tem desconto à vista?", "Posso parcelar no cartão?",
+             "As aulas são ao vivo?", "Quando começa a próxima turma?", "Obrigada!",
+             "Pode me ligar amanhã de manhã?", "Vou pensar e te aviso", "Sim", "Prefiro outro horário")
+_SAIDAS = ("Olá! Tudo bem? Vi seu interesse na nossa pós-graduação 😊",
+           "O investimento é de 18x de R$ 329,00 ou R$ 5.290,00 à vista.",
+           "Sim, o certificado é reconhecido pelo MEC.", "A pós tem duração de 12 meses.",
+           "As aulas ficam gravadas e você assiste quando quiser.",
+           "Posso te ligar para explicar melhor?", "Te mandei o link da matrícula.",
+           "Qualquer dúvida estou por aqui!")
+_TEMPLATES = ("boas_vindas_pos", "lembrete_matricula", "reativacao_lead", "confirmacao_aula")
+_FALHAS = ((131049, "This message was not delivered to maintain healthy ecosystem engagement."),
+           (131026, "Message undeliverable"),
+           (131047, "Re-engagement message"),
+           (130472, "User's number is part of an experiment"))
+_ETAPAS = tuple(sorted(ETAPAS_VALIDAS))
+_ESTAGIOS = ("Novo", "Em contato", "Qualificado", "Matriculado", "Perdido")
+_FUNIS = (18535, 18537, 25588)
+
+
+# ------------------------------------------------------------------------------------------
+# Sementes e volumes
+# ------------------------------------------------------------------------------------------
+
+def _rng(semente: int, tabela: str) -> random.Random:
+    return random.Random(f"{semente}:{tabela}")
+
+
+def _rng_np(semente: int, tabela: str) -> np.random.Generator:
+    return np.random.default_rng(int(hashlib.sha256(f"{semente}:{tabela}".encode()).hexdigest()[:16], 16))
+
+
+def volumes(escala: float = 1.0, **sobrepor) -> dict:
+    """VOLUMES × escala (usuários e canais fixos); `sobrepor` troca qualquer um."""
+    v = {k: n if k in FIXOS else max(1, int(n * escala)) for k, n in VOLUMES.items()}
+    v.update({k: n for k, n in sobrepor.items() if n is not None})
+    if v["usuarios"] < 2:
+        raise ValueError("usuarios >= 2: o 1 é o admin, os SDRs vêm depois")
+    return v
+
+
+def wa_id(contato_id: int, ddd: str) -> str:
+    """Celular único por id: a multiplicação por um ímpar não múltiplo de 5 é bijeção mod 10^8."""
+    return f"55{ddd}9{(contato_id * 2654435761) % 10 ** 8:08d}"
+
+
+def _quando(rng: random.Random, agora: datetime, dias: int = DIAS) -> datetime:
+    """Um instante da história, mais provável perto de `agora` (a base cresce)."""
+    return agora - timedelta(seconds=int(dias * 86400 * rng.random() ** 1.6))
+
+
+def _nome(rng: random.Random) -> str:
+    return f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)}"
+
+
+def distribuir(rng: random.Random, total: int, n: int, sigma: float = SIGMA_CONVERSA) -> list[int]:
+    """`total` mensagens em `n` contatos, lognormal, cada um com pelo menos uma. Soma exata."""
+    if total < n:
+        raise ValueError(f"mensagens ({total}) < contatos ({n}): todo contato tem conversa")
+    pesos = [rng.lognormvariate(0, sigma) for _ in range(n)]
+    fator = (total - n) / sum(pesos)
+    contagem = [1 + int(p * fator) for p in pesos]
+    for i in rng.choices(range(n), weights=pesos, k=total - sum(contagem)):
+        contagem[i] += 1
+    return contagem
+
+
+# ------------------------------------------------------------------------------------------
+# Linhas de cada tabela: (colunas, iterável de tuplas)
+# ------------------------------------------------------------------------------------------
+
+def usuarios(v: dict):
+    senha = bcrypt.hashpw(SENHA.encode(), _SAL).decode()
+    colunas = ("name", "email", "password_hash", "role", "is_active", "token_version")
+    linhas = [("Admin Massa", "admin@massa.local", senha, "admin", True, 0)]
+    linhas += [(f"SDR {i:02d}", f"sdr{i:02d}@massa.local", senha, "atendente", True, 0)
+               for i in range(1, v["usuarios"])]
+    return colunas, linhas
+
+
+def canais(v: dict):
+    colunas = ("name", "phone_number", "phone_number_id", "whatsapp_token", "waba_id", "is_active")
+    return colunas, [(f"Canal {i}", f"55119000000{i:02d}", f"10000000000{i:04d}", "token-sintetico",
+                      f"20000000000{i:04d}", True) for i in range(1, v["canais"] + 1)]
+
+
+def gerar_contatos(semente: int, v: dict, agora: datetime) -> list[Contato]:
+    """A base de todas as outras tabelas. Ids 1..n na ordem de entrada."""
+    rng = _rng(semente, "contacts")
+    n = v["contatos"]
+    criados = sorted(_quando(rng, agora) for _ in range(n))
+    conversas = distribuir(_rng(semente, "messages.distribuicao"), v["mensagens"], n)
+    contatos = []
+    for i, criado in enumerate(criados, start=1):
+        contatos.append(Contato(
+            id=i, wa_id=wa_id(i, rng.choice(_DDDS)), nome=_nome(rng), criado=criado,
+            canal=1 if rng.random() < 0.8 or v["canais"] == 1 else rng.randint(2, v["canais"]),
+            sdr=rng.randint(2, v["usuarios"]) if rng.random() < 0.85 else None,
+            exact=rng.random() < 0.7, ia=rng.random() < 0.15, etapa=None, n_msgs=conversas[i - 1]))
+    # Fluxo da NAT: entre os que vieram da Exact.
+    da_exact = [c.id for c in contatos if c.exact]
+    rng_nat = _rng(semente, "nat_flow_state")
+    for cid in rng_nat.sample(da_exact, min(v["estados_nat"], len(da_exact))):
+        contatos[cid - 1] = contatos[cid - 1]._replace(etapa=rng_nat.choice(_ETAPAS))
+    return contatos
+
+
+def linhas_contatos(contatos: list[Contato]):
+    colunas = ("wa_id", "name", "lead_status", "ai_active", "channel_id", "created_at", "updated_at",
+               "assigned_to")
+    status = ("novo", "novo", "em_contato", "qualificado", "matriculado", "perdido")
+    return colunas, ((c.wa_id, c.nome, status[c.id % len(status)], c.ia, c.canal, c.criado, c.criado,
+                      c.sdr) for c in contatos)
+
+
+def _conversa(rng: random.Random, c: Contato, agora: datetime) -> list[tuple]:
+    # Instantes: rajadas de minutos, pausas de dias; comprimidos se passarem de `agora`.
+    instantes = [c.criado]
+    for _ in range(c.n_msgs - 1):
+        pausa = rng.expovariate(1 / 180) if rng.random() < 0.85 else rng.expovariate(1 / 172_800)
+        instantes.append(instantes[-1] + timedelta(seconds=pausa))
+    if instantes[-1] > agora:
+        escala = (agora - c.criado) / (instantes[-1] - c.criado)
+        instantes = [c.criado + (t - c.criado) * escala for t in instantes]
+
+    direcao = "outbound" if c.exact else "inbound"
+    linhas = []
+    for j, quando in enumerate(instantes):
+        if j and rng.random() < 0.6:
+            direcao = "inbound" if direcao == "outbound" else "outbound"
+        wamid = f"wamid.sint.{c.id}.{j}"
+        template = nat_etapa = codigo = titulo = None
+        if direcao == "outbound":
+            if j == 0:
+                template = nat_copy.NAT_BOASVINDAS if c.etapa else rng.choice(_TEMPLATES)
+                nat_etapa = template if c.etapa else None
+                tipo, conteudo = "template", f"[Template] {template}"
+            else:
+                tipo, conteudo = "text", rng.choice(_SAIDAS)
+            sorteio = rng.random()
+            status = "read" if sorteio < 0.70 else "delivered" if sorteio < 0.88 else "sent" if sorteio < 0.97 else "failed"
+            if status == "failed":
+                codigo, titulo = rng.choice(_FALHAS)
+            ia = c.ia and j > 0 and rng.random() < 0.7
+        else:
+            sorteio = rng.random()
+            tipo = "text" if sorteio < 0.82 else "audio" if sorteio < 0.90 else "image" if sorteio < 0.96 else "document" if sorteio < 0.98 else "button"
+            conteudo = rng.choice(_ENTRADAS) if tipo in ("text", "button") else f"[{tipo}]"
+            status, ia = "read", False
+        linhas.append([wamid, c.wa_id, c.canal, direcao, tipo, conteudo, quando, status, ia, quando,
+                       nat_etapa, template, codigo, titulo, None])
+
+    # Metade das conversas que terminam no lead: as últimas ficam sem ler.
+    if linhas[-1][3] == "inbound" and rng.random() < 0.5:
+        for linha in reversed(linhas):
+            if linha[3] != "inbound":
+                break
+            linha[7] = "received"
+    return [tuple(l) for l in linhas]
+
+
+def linhas_mensagens(semente: int, contatos: list[Contato], agora: datetime):
+    colunas = ("wa_message_id", "contact_wa_id", "channel_id", "direction", "message_type", "content",
+               "timestamp", "status", "sent_by_ai", "created_at", "nat_etapa", "template_name",
+               "error_code", "error_title", "error_details")
+
+    def gerar():
+        rng = _rng(semente, "messages")
+        for inicio in range(0, len(contatos), CONTATOS_POR_LOTE):
+            lote = []
+            for c in contatos[inicio:inicio + CONTATOS_POR_LOTE]:
+                lote.extend(_conversa(rng, c, agora))
+            lote.sort(key=lambda l: l[6])
+            yield from lote
+    return colunas, gerar()
+
+
+def linhas_leads(semente: int, v: dict, contatos: list[Contato], agora: datetime):
+    """Os primeiros leads são os contatos que vieram da Exact (mesmo telefone); o resto, sem conversa."""
+    rng = _rng(semente, "exact_leads")
+    colunas = ("exact_id", "name", "phone1", "source", "sub_source", "stage", "funnel_id", "sdr_name",
+               "register_date", "update_date", "synced_at", "welcome_sent_at", "welcome_status",
+               "welcome_wamid")
+    da_exact = [c for c in contatos if c.exact][:v["leads"]]
+    linhas = []
+    for i in range(v["leads"]):
+        exact_id = 1_000_000 + i
+        curso = rng.choice(COURSES)["alias"]
+        if i < len(da_exact):
+            c = da_exact[i]
+            registro = c.criado - timedelta(minutes=rng.uniform(1, 30))
+            linhas.append((exact_id, c.nome, c.wa_id, "Site", curso, rng.choice(_ESTAGIOS),
+                           rng.choice(_FUNIS), f"SDR {c.sdr - 1:02d}" if c.sdr else None, registro,
+                           registro + timedelta(days=rng.uniform(0, 20)), agora, c.criado, "sent",
+                           f"wamid.sint.{c.id}.0"))
+        else:
+            registro = _quando(rng, agora)
+            linhas.append((exact_id, _nome(rng), f"55{rng.choice(_DDDS)}8{i % 10 ** 8:08d}", "Site", curso,
+                           "Novo", rng.choice(_FUNIS), None, registro, registro, agora, None,
+                           "skipped", None))
+    return colunas, linhas
+
+
+def linhas_notificacoes(semente: int, v: dict, contatos: list[Contato], agora: datetime):
+    rng = _rng(semente, "notifications")
+    colunas = ("user_id", "contact_wa_id", "type", "ref", "title", "body", "is_read", "created_at")
+    janelas = (("window_1h", "1h"), ("window_3h", "3h"), ("window_5h", "5h"), ("window_20h", "20h"))
+
+    def gerar():
+        for _ in range(v["notificacoes"]):
+            c = rng.choice(contatos)
+            tipo, rotulo = rng.choice(janelas)
+            quando = _quando(rng, agora)
+            yield (c.sdr or 1, c.wa_id, tipo, f"wamid.sint.{c.id}.{rng.randrange(c.n_msgs)}",
+                   f"Lead aguardando há {rotulo}", f"{c.nome} sem resposta — janela de 24h correndo.",
+                   quando < agora - timedelta(days=2) or rng.random() < 0.5, quando)
+    return colunas, gerar()
+
+
+def linhas_agendamentos(semente: int, v: dict, agora: datetime):
+    """95% já foram (sent/failed); 5% pendentes nos próximos dias."""
+    rng = _rng(semente, "scheduled_messages")
+    colunas = ("template_name", "language", "channel_id", "lead_ids", "scheduled_at", "status",
+               "created_by", "created_by_name", "lead_count", "result", "created_at", "sent_at")
+    linhas = []
+    for _ in range(v["agendamentos"]):
+        leads = rng.sample(range(1, max(v["leads"], 50) + 1), rng.randint(1, 50))
+        if rng.random() < 0.05:
+            quando = agora + timedelta(hours=rng.uniform(1, 240))
+            status, resultado, enviado = "pending", None, None
+        else:
+            quando = _quando(rng, agora)
+            status = "sent" if rng.random() < 0.93 else "failed"
+            resultado = orjson.dumps({"enviados": len(leads) if status == "sent" else 0,
+                                      "falhas": 0 if status == "sent" else len(leads)}).decode()
+            enviado = quando + timedelta(seconds=rng.uniform(5, 300))
+        linhas.append((rng.choice(_TEMPLATES), "pt_BR", 1, orjson.dumps(leads).decode(), quando, status,
+                       1, "Admin Massa", len(leads), resultado, quando - timedelta(days=rng.uniform(0, 7)),
+                       enviado))
+    return colunas, linhas
+
+
+def linhas_documentos(semente: int, v: dict, agora: datetime):
+    """Trechos da base de conhecimento por curso, com embedding unitário em JSON."""
+    rng, rng_np = _rng(semente, "knowledge_documents"), _rng_np(semente, "knowledge_documents")
+    colunas = ("channel_id", "title", "content", "embedding", "chunk_index", "token_count", "created_at")
+
+    def gerar():
+        cursos = [c["short_name"] for c in COURSES]
+        for i in range(v["documentos"]):
+            titulo = cursos[i % len(cursos)]
+            conteudo = " ".join(rng.choice(_SAIDAS) for _ in range(rng.randint(6, 14)))
+            vetor = rng_np.standard_normal(EMBEDDING_DIM)
+            vetor = np.round(vetor / np.linalg.norm(vetor), 6)
+            yield (1, titulo, f"{titulo}. {conteudo}", orjson.dumps(vetor.tolist()).decode(),
+                   i // len(cursos), len(conteudo) // 4, agora - timedelta(days=rng.uniform(0, DIAS)))
+    return colunas, gerar()
+
+
+def linhas_estados_nat(semente: int, contatos: list[Contato], v: dict):
+    rng = _rng(semente, "nat_flow_state.linhas")
+    colunas = ("contact_wa_id", "exact_lead_id", "sdr_user_id", "etapa", "tentativas_contato",
+               "ultimo_wa_message_id", "transferido_em", "created_at", "updated_at", "assumido_por",
+               "assumido_em", "escalonamento_nivel")
+    # Lead da Exact de cada contato: o i-ésimo contato da Exact é o lead de id i (linhas_leads).
+    lead_de = {c.id: i for i, c in enumerate((c for c in contatos if c.exact), start=1) if i <= v["leads"]}
+    linhas = []
+    for c in contatos:
+        if c.etapa is None:
+            continue
+        atualizado = c.criado + timedelta(minutes=rng.uniform(1, 600))
+        transferido = atualizado if c.etapa == "aguardando_ligacao" else None
+        assumido = c.sdr if transferido and rng.random() < 0.7 else None
+        linhas.append((c.wa_id, lead_de.get(c.id), c.sdr, c.etapa, rng.randint(0, 3),
+                       f"wamid.sint.{c.id}.0", transferido, c.criado, atualizado, assumido,
+                       atualizado + timedelta(minutes=1) if assumido else None,
+                       0 if assumido else rng.choice((0, 0, 1, 2))))
+    return colunas, linhas
+
+
+def linhas_chamadas(semente: int, v: dict, contatos: list[Contato], agora: datetime):
+    rng = _rng(semente, "call_logs")
+    colunas = ("call_sid", "from_number", "to_number", "direction", "status", "duration", "recording_url",
+               "recording_sid", "transcription", "transcription_status", "transcription_attempts",
+               "drive_upload_status", "drive_upload_attempts", "user_id", "user_name", "contact_wa_id",
+               "contact_name", "channel_id", "created_at", "updated_at")
+    com_sdr = [c for c in contatos if c.sdr] or contatos
+
+    def gerar():
+        for _ in range(v["chamadas"]):
+            c = rng.choice(com_sdr)
+            sorteio = rng.random()
+            status = "completed" if sorteio < 0.65 else "no-answer" if sorteio < 0.85 else "busy" if sorteio < 0.93 else "failed"
+            atendida = status == "completed"
+            sid = f"CA{rng.getrandbits(128):032x}"
+            quando = _quando(rng, agora)
+            saida = rng.random() < 0.9
+            yield (sid, "+5511900000001" if saida else f"+{c.wa_id}", f"+{c.wa_id}" if saida else "+5511900000001",
+                   "outbound" if saida else "inbound", status,
+                   int(rng.lognormvariate(5.3, 0.8)) if atendida else 0,
+                   f"https://api.twilio.com/recordings/RE{sid[2:]}" if atendida else None,
+                   f"RE{sid[2:]}" if atendida else None,
+                   "SDR: Olá, aqui é da CENAT... Lead: Oi, pode falar." if atendida else None,
+                   "done" if atendida else None, 1 if atendida else 0,
+                   "done" if atendida else None, 1 if atendida else 0,
+                   c.sdr or 1, f"SDR {(c.sdr or 2) - 1:02d}", c.wa_id, c.nome, c.canal, quando,
+                   quando + timedelta(minutes=10))
+    return colunas, gerar()
+
+
+# ------------------------------------------------------------------------------------------
+# Carga
+# ------------------------------------------------------------------------------------------
+
+def conferir_destino(url: str) -> None:
+    """Trava 2: nunca o banco de produção."""
+    banco = urlparse(url.replace("+asyncpg", "")).path.lstrip("/")
+    if banco == BANCO_PRODUCAO:
+        raise SystemExit(f"🔴 {banco} é o banco de produção — gerar_massa.py só roda em banco local")
+
+
+async def copiar(conexao, tabela: str, colunas, linhas, lote: int = LOTE) -> int:
+    """COPY binário em lotes de `lote` linhas; devolve quantas foram."""
+    total = 0
+    linhas = iter(linhas)
+    while bloco := list(islice(linhas, lote)):
+        await conexao.copy_records_to_table(tabela, records=bloco, columns=list(colunas))
+        total += len(bloco)
+    return total
+
+
+async def gerar(motor, v: dict, semente: int = 42, agora: datetime | None = None,
+                limpar: bool = False, indices: bool = True, log=print) -> dict:
+    """Cria o esquema, carrega a massa, indexa e analisa. {tabela: linhas}."""
+    agora = agora or datetime.now().replace(minute=0, second=0, microsecond=0)
+    inicio = time.perf_counter()
+    contatos = gerar_contatos(semente, v, agora)
+    cargas = [
+        ("users", lambda: usuarios(v)),
+        ("channels", lambda: canais(v)),
+        ("contacts", lambda: linhas_contatos(contatos)),
+        ("exact_leads", lambda: linhas_leads(semente, v, contatos, agora)),
+        ("messages", lambda: linhas_mensagens(semente, contatos, agora)),
+        ("notifications", lambda: linhas_notificacoes(semente, v, contatos, agora)),
+        ("scheduled_messages", lambda: linhas_agendamentos(semente, v, agora)),
+        ("knowledge_documents", lambda: linhas_documentos(semente, v, agora)),
+        ("nat_flow_state", lambda: linhas_estados_nat(semente, contatos, v)),
+        ("call_logs", lambda: linhas_chamadas(semente, v, contatos, agora)),
+    ]
+    carregadas = {}
+    async with motor.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await particoes.preparar(conn, de=(agora - timedelta(days=DIAS + 1)).date())
+        await nat_guard.instalar_gatilhos(conn)
+        ocupado = (await conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM users) OR EXISTS (SELECT 1 FROM contacts) "
+            "OR EXISTS (SELECT 1 FROM messages)"))).scalar()
+        if ocupado and not limpar:
+            raise SystemExit("🔴 o banco já tem dados — use --limpar para trocar a massa")
+        # Trava 3 passou: vazio (ou --limpar). RESTART IDENTITY deixa os ids reproduzíveis.
+        await conn.execute(text(f"TRUNCATE {', '.join(TABELAS)} RESTART IDENTITY CASCADE"))
+        bruta = (await conn.get_raw_connection()).driver_connection
+        for tabela, linhas in cargas:
+            t0 = time.perf_counter()
+            colunas, registros = linhas()
+            carregadas[tabela] = await copiar(bruta, tabela, colunas, registros)
+            segundos = time.perf_counter() - t0
+            log(f"  {tabela:<20} {carregadas[tabela]:>10,} linhas  {segundos:6.1f}s  "
+                f"({carregadas[tabela] / max(segundos, 1e-6):,.0f}/s)")
+
+    if indices:
+        import migrate_indices_compostos
+        t0 = time.perf_counter()
+        await migrate_indices_compostos.criar_indices(motor)
+        log(f"  índices compostos                          {time.perf_counter() - t0:6.1f}s")
+    async with motor.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        t0 = time.perf_counter()
+        await conn.execute(text("VACUUM ANALYZE"))
+        log(f"  VACUUM ANALYZE                             {time.perf_counter() - t0:6.1f}s")
+    log(f"  total {time.perf_counter() - inicio:.0f}s")
+    return carregadas
+
+
+def _argumentos(argv=None):
+    p = argparse.ArgumentParser(description="Massa sintética com a forma da produção (banco LOCAL).")
+    p.add_argument("--url", required=True, help="postgresql+asyncpg://... de um banco LOCAL")
+    p.add_argument("--semente", type=int, default=42)
+    p.add_argument("--agora", type=datetime.fromisoformat, default=None,
+                   help="referência das datas (ISO); padrão: a hora cheia de agora")
+    p.add_argument("--escala", type=float, default=1.0, help="multiplica todos os volumes")
+    p.add_argument("--limpar", action="store_true", help="troca a massa de um banco que já tem dados")
+    p.add_argument("--sem-indices", action="store_true", help="não roda migrate_indices_compostos")
+    for nome in VOLUMES:
+        p.add_argument(f"--{nome.replace('_', '-')}", dest=nome, type=int, default=None)
+    return p.parse_args(argv)
+
+
+async def main(argv=None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    args = _argumentos(argv)
+    conferir_destino(args.url)
+    v = volumes(args.escala, **{k: getattr(args, k) for k in VOLUMES})
+    print(f"Massa sintética — semente {args.semente}, "
+          f"{v['contatos']:,} contatos, {v['mensagens']:,} mensagens")
+    motor = create_async_engine(args.url, poolclass=NullPool)
+    try:
+        await gerar(motor, v, args.semente, args.agora, limpar=args.limpar, indices=not args.sem_indices)
+        async with motor.connect() as conn:
+            tamanho = (await conn.execute(text(
+                "SELECT pg_size_pretty(pg_database_size(current_database()))"))).scalar()
+    finally:
+        await motor.dispose()
+    print(f"OK: banco com {tamanho}. Usuários: admin@massa.local / sdrNN@massa.local, senha '{SENHA}'")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
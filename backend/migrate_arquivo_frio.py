@@ -0,0 +1,56 @@
+"""Índice do arquivo frio (ver app/arquivo.py).
+
+    cd backend && venv/bin/python migrate_arquivo_frio.py
+
+Idempotente (CREATE TABLE IF NOT EXISTS) e numa única transação (engine.begin). Tabelas novas,
+nada de lock em tabela quente.
+
+  archive_batches         um registro por (tabela, mês) arquivado: arquivo, linhas, bytes, sha256
+  archive_message_blocks  por (contato, mês): offset e tamanho do quadro zstd das mensagens dele
+
+Rodar ANTES de ligar ARQUIVO_ENABLED=true. O arquivamento de messages depende também de
+migrate_messages_particionada.py (um mês sai por DETACH, não por DELETE).
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS archive_batches (
+                table_name  VARCHAR(40) NOT NULL,
+                month       DATE NOT NULL,
+                file_path   TEXT NOT NULL,
+                row_count   BIGINT NOT NULL,
+                size_bytes  BIGINT NOT NULL,
+                sha256      VARCHAR(64) NOT NULL,
+                archived_at TIMESTAMP DEFAULT now(),
+                PRIMARY KEY (table_name, month)
+            )
+        """))
+        # PK (contact_wa_id, month) é o índice da leitura: blocos de UM contato, do mês mais novo.
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS archive_message_blocks (
+                contact_wa_id VARCHAR(20) NOT NULL,
+                month         DATE NOT NULL,
+                "offset"      BIGINT NOT NULL,
+                size          INTEGER NOT NULL,
+                row_count     INTEGER NOT NULL,
+                first_at      TIMESTAMP NOT NULL,
+                last_at       TIMESTAMP NOT NULL,
+                PRIMARY KEY (contact_wa_id, month)
+            )
+        """))
+
+        tabelas = (await conn.execute(text("""
+            SELECT count(*) FROM information_schema.tables
+            WHERE table_name IN ('archive_batches', 'archive_message_blocks')
+        """))).scalar()
+
+    print(f"OK: {tabelas}/2 tabelas do arquivo frio")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,68 @@
+"""Migração da fila de upload ao Google Drive (call_logs).
+
+Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_drive_upload.py
+
+Idempotente (IF NOT EXISTS) e numa única transação (engine.begin).
+
+O que faz:
+  1. lock_timeout=3s — mesmo motivo de migrate_transcription_worker.py: call_logs é escrita
+     pelos webhooks do Twilio e o ALTER não pode enfileirá-los atrás dele.
+  2. Colunas da fila, consumidas por drive_uploader.py:
+       drive_upload_status       VARCHAR(20) — pending, processing, done, error
+       drive_upload_attempts     INTEGER NOT NULL DEFAULT 0
+       drive_upload_run_at       TIMESTAMP — NULL = já; preenchido = retentativa adiada
+       drive_upload_started_at   TIMESTAMP — quando o worker reivindicou (detecta travadas)
+       drive_upload_error        TEXT      — motivo da última falha, literal
+       drive_upload_uri          TEXT      — sessão de upload resumível aberta no Drive
+       drive_upload_progress     BIGINT    — bytes já confirmados pelo Drive
+  3. ÍNDICE PARCIAL em (drive_upload_run_at) WHERE status IN ('pending','processing'), pelo
+     mesmo raciocínio do índice da fila de transcrição.
+
+SEM BACKFILL de propósito: as gravações antigas NÃO entram na fila. Ligar o upload
+(DRIVE_UPLOAD_ENABLED=true) vale dali em diante; subir o histórico é uma decisão à parte,
+com um UPDATE explícito.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não travar os webhooks do Twilio atrás do ALTER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Colunas da fila.
+        await conn.execute(text(
+            "ALTER TABLE call_logs ADD COLUMN IF NOT EXISTS drive_upload_attempts "
+            "INTEGER NOT NULL DEFAULT 0"))
+        for coluna, tipo in (("drive_upload_status", "VARCHAR(20)"),
+                             ("drive_upload_run_at", "TIMESTAMP"),
+                             ("drive_upload_started_at", "TIMESTAMP"),
+                             ("drive_upload_error", "TEXT"),
+                             ("drive_upload_uri", "TEXT"),
+                             ("drive_upload_progress", "BIGINT")):
+            await conn.execute(text(
+                f"ALTER TABLE call_logs ADD COLUMN IF NOT EXISTS {coluna} {tipo}"))
+
+        # 3. WHERE do worker.
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_call_logs_fila_drive
+                ON call_logs (drive_upload_run_at)
+                WHERE drive_upload_status IN ('pending', 'processing')
+        """))
+
+        # Conferência dentro da mesma transação.
+        cols = (await conn.execute(text(
+            "SELECT count(*) FROM information_schema.columns "
+            "WHERE table_name = 'call_logs' AND column_name LIKE 'drive_upload_%'"
+        ))).scalar()
+
+    print(f"OK: call_logs ganhou {cols}/7 colunas da fila do Drive (+índice parcial)")
+    print("OK: nenhuma gravação enfileirada — vale a partir de DRIVE_UPLOAD_ENABLED=true")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,102 @@
+"""Triggers que avisam as telas em tempo real (ver app/eventos.py). Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_eventos_tempo_real.py
+
+Idempotente (CREATE OR REPLACE / DROP TRIGGER IF EXISTS) e numa única transação
+(engine.begin).
+
+O que faz:
+  1. lock_timeout=3s — CREATE TRIGGER pede lock em messages, que o webhook escreve o tempo
+     todo; melhor falhar e rodar de novo que enfileirar o webhook atrás da migração.
+  2. Função cenat_eventos_notificar(): monta o delta da linha e faz
+     pg_notify('cenat_eventos', json). Para messages e contacts, lê do contato o canal e o
+     assigned_to — é o que decide quem recebe — numa busca pelo índice único de wa_id.
+  3. Triggers AFTER ... FOR EACH ROW:
+       * messages      AFTER INSERT                  -> "mensagem"
+       * messages      AFTER UPDATE OF status        -> "status"    (só se mudou)
+       * notifications AFTER INSERT                  -> "notificacao"
+       * contacts      AFTER UPDATE OF assigned_to   -> "atribuicao" (só se mudou)
+
+O NOTIFY só é entregue no COMMIT: um INSERT revertido não avisa ninguém. O preview da
+mensagem é cortado em 140 caracteres para o payload ficar muito abaixo do teto de 8000 bytes
+do NOTIFY.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+GATILHOS = (
+    ("cenat_eventos_mensagem", "AFTER INSERT ON messages", ""),
+    ("cenat_eventos_status", "AFTER UPDATE OF status ON messages",
+     "WHEN (OLD.status IS DISTINCT FROM NEW.status)"),
+    ("cenat_eventos_notificacao", "AFTER INSERT ON notifications", ""),
+    ("cenat_eventos_atribuicao", "AFTER UPDATE OF assigned_to ON contacts",
+     "WHEN (OLD.assigned_to IS DISTINCT FROM NEW.assigned_to)"),
+)
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não enfileirar o webhook atrás do lock do CREATE TRIGGER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Uma função para as três tabelas; TG_TABLE_NAME/TG_OP dizem o evento.
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION cenat_eventos_notificar() RETURNS trigger AS $$
+            DECLARE
+                contato RECORD;
+                evento  JSONB;
+            BEGIN
+                IF TG_TABLE_NAME = 'notifications' THEN
+                    evento := jsonb_build_object(
+                        'tipo', 'notificacao', 'id', NEW.id, 'usuario', NEW.user_id,
+                        'type', NEW.type, 'title', left(NEW.title, 140),
+                        'wa_id', NEW.contact_wa_id);
+                ELSIF TG_TABLE_NAME = 'contacts' THEN
+                    evento := jsonb_build_object(
+                        'tipo', 'atribuicao', 'wa_id', NEW.wa_id, 'canal', NEW.channel_id,
+                        'atribuido', NEW.assigned_to, 'anterior', OLD.assigned_to);
+                ELSE
+                    SELECT channel_id, assigned_to INTO contato
+                      FROM contacts WHERE wa_id = NEW.contact_wa_id;
+                    IF TG_OP = 'INSERT' THEN
+                        evento := jsonb_build_object(
+                            'tipo', 'mensagem', 'wa_id', NEW.contact_wa_id, 'id', NEW.id,
+                            'direction', NEW.direction, 'status', NEW.status,
+                            'message_type', NEW.message_type,
+                            'preview', left(NEW.content, 140),
+                            'canal', coalesce(NEW.channel_id, contato.channel_id),
+                            'atribuido', contato.assigned_to);
+                    ELSE
+                        evento := jsonb_build_object(
+                            'tipo', 'status', 'wa_id', NEW.contact_wa_id, 'id', NEW.id,
+                            'status', NEW.status,
+                            'canal', coalesce(NEW.channel_id, contato.channel_id),
+                            'atribuido', contato.assigned_to);
+                    END IF;
+                END IF;
+                PERFORM pg_notify('cenat_eventos', evento::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+
+        # 3. Os gatilhos.
+        for nome, quando, condicao in GATILHOS:
+            tabela = quando.rsplit(" ON ", 1)[1]
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {nome} ON {tabela}"))
+            await conn.execute(text(f"""
+                CREATE TRIGGER {nome}
+                    {quando}
+                    FOR EACH ROW {condicao} EXECUTE FUNCTION cenat_eventos_notificar()
+            """))
+
+        # Conferência dentro da mesma transação.
+        instalados = (await conn.execute(text(
+            "SELECT count(*) FROM pg_trigger WHERE tgname LIKE 'cenat_eventos_%'"))).scalar()
+
+    print(f"OK: {instalados}/{len(GATILHOS)} triggers cenat_eventos_* instalados")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,56 @@
+"""Migração do resumo rolante do histórico da IA (ai_conversation_summaries).
+
+Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_history_summary.py
+
+Idempotente (IF NOT EXISTS) e numa única transação.
+
+O que faz:
+  1. lock_timeout=3s — ai_conversation_summaries é escrita pelo Kanban e pelo toggle de IA;
+     o ALTER precisa de ACCESS EXCLUSIVE e não pode ficar pendurado atrás de uma transação
+     longa.
+  2. history_summary TEXT — resumo das mensagens que já saíram da janela por orçamento de
+     tokens (ver ai_engine.get_conversation_window). NÃO é a coluna `summary`: aquela é o
+     texto do card no Kanban e continua sendo só do Kanban.
+  3. history_summary_until BIGINT — id da última Message incorporada ao resumo. É o que torna
+     o resumo INCREMENTAL: cada atualização manda para o modelo só as mensagens com id maior,
+     mais o resumo anterior, e não a conversa inteira de novo.
+
+Ambas nullable e sem DEFAULT: troca de catálogo, sem reescrever linhas. NULL = nada resumido
+ainda, que é exatamente o estado de todo card existente. Sem FK em history_summary_until:
+é um marcador de posição, e uma mensagem apagada não pode travar o card.
+
+Nenhum comportamento muda ao rodar isto: o resumo rolante nasce desligado
+(AI_ROLLING_SUMMARY) e as colunas ficam NULL até ele ser ligado.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não travar a API atrás de uma transação longa.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2-3. Resumo rolante + marcador de até onde ele cobre.
+        await conn.execute(text(
+            "ALTER TABLE ai_conversation_summaries "
+            "ADD COLUMN IF NOT EXISTS history_summary TEXT"))
+        await conn.execute(text(
+            "ALTER TABLE ai_conversation_summaries "
+            "ADD COLUMN IF NOT EXISTS history_summary_until BIGINT"))
+
+        # Conferência dentro da mesma transação.
+        cols = (await conn.execute(text(
+            "SELECT count(*) FROM information_schema.columns "
+            "WHERE table_name = 'ai_conversation_summaries' AND column_name IN "
+            "('history_summary', 'history_summary_until')"))).scalar()
+
+    print(f"OK: ai_conversation_summaries ganhou {cols}/2 colunas do resumo rolante")
+    print("Resumo rolante segue DESLIGADO até AI_ROLLING_SUMMARY=true.")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,151 @@
+"""Índices compostos das consultas quentes, criados sem travar escrita (CONCURRENTLY).
+
+    cd backend && venv/bin/python migrate_indices_compostos.py
+
+Pode rodar em horário comercial: CREATE INDEX CONCURRENTLY não bloqueia o webhook, só demora
+mais. Por isso NÃO é uma transação única como as outras migrações — CONCURRENTLY não roda
+dentro de transação. A conexão fica em AUTOCOMMIT, com lock_timeout=3s (cada passo espera no
+máximo isso por lock) e sem statement_timeout (o índice de messages leva minutos).
+
+Idempotente e retomável: índice que já existe e é válido fica; índice INVÁLIDO (sobra de uma
+execução interrompida — CONCURRENTLY que cai no meio deixa o índice lá, marcado inválido e
+ainda pago em toda escrita) é removido e refeito.
+
+Os índices, e a consulta que cada um atende:
+
+  idx_messages_contato_ts         última mensagem do contato: LATERAL da inbox
+                                  (routes.list_contacts), window_alerts_job e o histórico
+                                  paginado (arquivo.pagina_mensagens). Com só o índice de
+                                  contact_wa_id, cada contato lia TODAS as mensagens dele e
+                                  ordenava — sem Seq Scan, e lento do mesmo jeito.
+  idx_messages_nao_lidas          contagem de não lidas da inbox (parcial: inbound + received)
+  idx_messages_direcao_ts         contagens inbound/outbound do dashboard a partir de hoje
+  idx_notifications_user_recentes sino: as 50 mais novas do usuário
+  idx_notifications_dedup         dedup do window_alerts_job (já em migrate_notifications.py;
+                                  aqui para o banco criado só por create_tables — onde existe,
+                                  é no-op, mesmo nome)
+  idx_exact_leads_register_date   listagem da Exact, ORDER BY register_date DESC
+
+scheduled_messages (status, scheduled_at) NÃO está aqui: idx_sched_status_time já vem de
+migrate_scheduled_messages.py, e o planejador prefere o ix_scheduled_messages_status do
+modelo mesmo com ele — status e scheduled_at são estimados como independentes, e ele não sabe
+que quase todo 'pending' está no futuro. A suíte de EXPLAIN confere essa consulta sem exigir
+índice (só nada de Seq Scan e o orçamento).
+
+messages é particionada (migrate_messages_particionada.py), e CONCURRENTLY não vale na tabela
+mãe. O caminho é o da documentação do Postgres: CREATE INDEX ... ON ONLY messages (instantâneo,
+nasce inválido), CONCURRENTLY em cada partição e ALTER INDEX ... ATTACH PARTITION. Com a
+última partição anexada, o índice da mãe fica válido sozinho — e as partições que o job de
+app/particoes.py criar depois já nascem com ele.
+
+A conferência de que cada consulta USA o seu índice é test_explain_consultas.py, contra um
+Postgres de verdade.
+"""
+import asyncio
+
+from sqlalchemy import text
+from app.database import engine
+
+# (nome, tabela, colunas e WHERE)
+INDICES = [
+    ("idx_messages_contato_ts", "messages", '(contact_wa_id, "timestamp" DESC, id DESC)'),
+    ("idx_messages_nao_lidas", "messages",
+     "(contact_wa_id) WHERE direction = 'inbound' AND status = 'received'"),
+    ("idx_messages_direcao_ts", "messages", '(direction, "timestamp")'),
+    ("idx_notifications_user_recentes", "notifications", "(user_id, created_at DESC)"),
+    ("idx_notifications_dedup", "notifications", "(contact_wa_id, type, ref)"),
+    ("idx_exact_leads_register_date", "exact_leads", "(register_date)"),
+]
+
+
+async def _valido(conn, nome: str) -> bool | None:
+    """True/False se o índice existe (válido ou não); None se não existe."""
+    return (await conn.execute(text("""
+        SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(:nome)
+    """), {"nome": nome})).scalar()
+
+
+async def _criar(conn, nome: str, tabela: str, colunas: str) -> bool:
+    """CONCURRENTLY numa tabela comum (ou numa partição). True se criou ou refez."""
+    valido = await _valido(conn, nome)
+    if valido:
+        return False
+    if valido is False:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}"))
+    await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nome} ON {tabela} {colunas}"))
+    return True
+
+
+async def _criar_particionado(conn, nome: str, tabela: str, colunas: str) -> list[str]:
+    """ON ONLY na mãe, CONCURRENTLY + ATTACH em cada partição que ainda não tem. Devolve as feitas."""
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON ONLY {tabela} {colunas}"))
+    # Partições sem índice filho anexado a este (as criadas depois do ON ONLY já vêm com ele).
+    faltando = (await conn.execute(text("""
+        SELECT c.relname FROM pg_inherits t JOIN pg_class c ON c.oid = t.inhrelid
+        WHERE t.inhparent = to_regclass(:tabela)
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_inherits ti JOIN pg_index i ON i.indexrelid = ti.inhrelid
+              WHERE ti.inhparent = to_regclass(:nome) AND i.indrelid = c.oid)
+        ORDER BY c.relname
+    """), {"tabela": tabela, "nome": nome})).scalars().all()
+    for particao in faltando:
+        filho = f"{nome}__{particao}"
+        await _criar(conn, filho, particao, colunas)
+        await conn.execute(text(f"ALTER INDEX {nome} ATTACH PARTITION {filho}"))
+    return faltando
+
+
+async def autocommit(conn):
+    """A conexão como os passos CONCURRENTLY precisam: AUTOCOMMIT, lock_timeout de 3s e sem
+    statement_timeout."""
+    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+    await conn.execute(text("SET lock_timeout = '3s'"))
+    await conn.execute(text("SET statement_timeout = 0"))
+    return conn
+
+
+async def criar_indice(conn, nome: str, tabela: str, colunas: str) -> list[str]:
+    """Um índice sem travar escrita, em tabela comum ou particionada. Conexão de `autocommit`.
+
+    Devolve onde foi criado ou refeito — vazio se já existia válido. É o caminho de qualquer
+    migração que indexe uma tabela quente (migrate_template_health.py também o usa).
+    """
+    particionada = (await conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": tabela})).scalar()
+    if particionada:
+        return await _criar_particionado(conn, nome, tabela, colunas)
+    return [tabela] if await _criar(conn, nome, tabela, colunas) else []
+
+
+async def criar_indices(motor=engine) -> dict[str, list[str]]:
+    """Cria o que falta de INDICES. {nome: onde foi criado} — vazio se já estava tudo lá."""
+    feitos = {}
+    async with motor.connect() as conn:
+        conn = await autocommit(conn)
+        for nome, tabela, colunas in INDICES:
+            onde = await criar_indice(conn, nome, tabela, colunas)
+            if onde:
+                feitos[nome] = onde
+    return feitos
+
+
+async def migrate():
+    feitos = await criar_indices()
+
+    async with engine.connect() as conn:
+        estado = dict((await conn.execute(text("""
+            SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = ANY(:nomes)
+        """), {"nomes": [n for n, _, _ in INDICES]})).fetchall())
+
+    for nome, tabela, _ in INDICES:
+        situacao = "válido" if estado.get(nome) else ("INVÁLIDO" if nome in estado else "AUSENTE")
+        criado = ""
+        if nome in feitos:
+            onde = feitos[nome]
+            criado = " — criado agora" + (f" ({len(onde)} partições)" if onde != [tabela] else "")
+        print(f"OK: {nome} ({tabela}): {situacao}{criado}")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,236 @@
+"""messages particionada por mês em `timestamp` (ver app/particoes.py).
+
+    cd backend && venv/bin/python migrate_messages_particionada.py
+
+Rodar FORA do horário comercial: copia a tabela inteira, e as ESCRITAS em messages (webhook,
+envios) esperam a migração toda. Tudo numa única transação (engine.begin) — se qualquer passo
+falhar, messages fica exatamente como estava. Idempotente: se messages já é particionada, só
+garante a função, a DEFAULT e os meses à frente.
+
+A nova tabela é montada e carregada ao lado, como messages_particionada, e só troca de nome com
+a antiga no FIM. A ordem importa por causa dos locks:
+  * a fase longa (cópia, índices, FKs, ANALYZE) segura só o EXCLUSIVE em messages: leituras
+    (inbox, histórico, dashboard) seguem; escritas esperam;
+  * o RENAME pede ACCESS EXCLUSIVE, que barra também as leituras e só sai no COMMIT. Feito por
+    último, ele dura a troca de nomes e a conferência da poda (EXPLAINs) — segundos.
+Para subir do EXCLUSIVE ao ACCESS EXCLUSIVE, a troca espera as leituras em curso terminarem, até
+LOCK_TIMEOUT_TROCA; passou disso, tudo volta atrás e é rodar de novo.
+
+O que faz:
+  1. lock_timeout=3s para PEGAR o lock (se o webhook estiver no meio, falha e roda de novo);
+     statement_timeout desligado para a cópia. LOCK ... IN EXCLUSIVE MODE.
+  2. messages_particionada (LIKE messages INCLUDING DEFAULTS INCLUDING STORAGE)
+     PARTITION BY RANGE ("timestamp"), PK (id, timestamp) e UNIQUE (wa_message_id, timestamp) —
+     o Postgres exige a chave de partição em toda constraint única.
+  3. DEFAULT e um mês por partição, do mês da mensagem mais antiga até PARTICOES_FUTURAS meses
+     à frente, já com os nomes definitivos (messages_pAAAA_MM, messages_pdefault).
+  4. Cópia (INSERT ... SELECT) ANTES de índices e triggers: índice construído de uma vez é mais
+     rápido, e os triggers cenat_eventos_* não disparam um NOTIFY por linha copiada.
+  5. Índices da antiga recriados na nova com o sufixo _nova (mesma definição, em todas as
+     partições). Índice único sem `timestamp` vira índice comum: quem garante a unicidade é o
+     (wa_message_id, timestamp). FKs e CHECKs copiados.
+  6. ANALYZE e contagens iguais — ainda sem ter barrado leitura nenhuma.
+  7. Troca (ACCESS EXCLUSIVE daqui ao COMMIT): messages -> messages_antiga (índices ganham o
+     sufixo _antiga), messages_particionada -> messages (índices perdem o _nova). A sequence
+     messages_id_seq passa a pertencer à nova; triggers copiados e REMOVIDOS da antiga (não
+     avisa mais nada); as FKs da antiga saem (ela não segura mais DELETE de contato).
+     particoes.preparar instala a função cenat_criar_particoes_messages.
+  8. Conferência da poda: no EXPLAIN das consultas por janela de tempo, só as partições do
+     intervalo aparecem.
+
+messages_antiga FICA, intocada nos dados, para conferência. Depois de alguns dias:
+    DROP TABLE messages_antiga;
+"""
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from app.database import engine
+from app import particoes
+
+NOVA = "messages_particionada"
+LOCK_TIMEOUT_TROCA = "10s"
+
+# Consultas com o formato das de produção (dashboard, teto do nat_guard, saúde de entrega),
+# com o corte em literal para o EXPLAIN mostrar a poda já no planejamento. Nenhuma pode ler
+# partição de mês anterior ao do corte.
+CONSULTAS_PODA = {
+    "dashboard: semana": (timedelta(days=7), """
+        SELECT count(id) FROM messages WHERE "timestamp" >= '{corte}'"""),
+    "nat_guard: última hora": (timedelta(hours=1), """
+        SELECT count(*) FROM messages
+        WHERE nat_etapa IS NOT NULL AND "timestamp" >= '{corte}'"""),
+    "delivery_health: últimas 24h": (timedelta(hours=24), """
+        SELECT status, count(*) FROM messages
+        WHERE direction = 'outbound' AND "timestamp" >= '{corte}' GROUP BY status"""),
+}
+
+
+def _particoes_no_plano(plano) -> set[str]:
+    achadas = set()
+    if isinstance(plano, dict):
+        nome = plano.get("Relation Name", "")
+        if nome.startswith(particoes.PREFIXO):
+            achadas.add(nome)
+        for valor in plano.values():
+            achadas |= _particoes_no_plano(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            achadas |= _particoes_no_plano(item)
+    return achadas
+
+
+async def _particoes_lidas(conn, sql: str) -> set[str]:
+    plano = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar()
+    return _particoes_no_plano(json.loads(plano) if isinstance(plano, str) else plano)
+
+
+async def _ja_particionada(conn) -> bool:
+    return (await conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = 'messages'::regclass"))).scalar()
+
+
+async def _criar_meses(conn, de: date) -> list[str]:
+    """DEFAULT e os meses de `de` até PARTICOES_FUTURAS à frente, como partições da NOVA.
+
+    Não dá para usar a função SQL de particoes aqui: ela cria as partições de `messages`, que
+    até a troca ainda é a antiga.
+    """
+    await conn.execute(text(f"CREATE TABLE {particoes.PARTICAO_DEFAULT} PARTITION OF {NOVA} DEFAULT"))
+    hoje = date.today()
+    mes, ultimo = date(de.year, de.month, 1), hoje.month - 1 + particoes.PARTICOES_FUTURAS
+    ate = date(hoje.year + ultimo // 12, ultimo % 12 + 1, 1)
+    criadas = []
+    while mes <= ate:
+        proximo = (mes + timedelta(days=32)).replace(day=1)
+        nome = particoes.nome_particao(mes.year, mes.month)
+        await conn.execute(text(
+            f"CREATE TABLE {nome} PARTITION OF {NOVA} FOR VALUES FROM ('{mes}') TO ('{proximo}')"))
+        criadas.append(nome)
+        mes = proximo
+    return criadas
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Lock curto para pegar; sem limite para copiar.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+
+        if await _ja_particionada(conn):
+            criadas = await particoes.preparar(conn)
+            print(f"OK: messages já era particionada; partições novas: {criadas or 'nenhuma'}")
+            return
+
+        await conn.execute(text("LOCK TABLE messages IN EXCLUSIVE MODE"))
+
+        # Definições da tabela atual: "ON public.messages".
+        indices = (await conn.execute(text("""
+            SELECT c.relname AS nome, quote_ident(c.relname) AS nome_sql, pg_get_indexdef(i.indexrelid) AS definicao, i.indisunique AS unico,
+                   EXISTS (SELECT 1 FROM pg_attribute a
+                           WHERE a.attrelid = i.indrelid AND a.attname = 'timestamp'
+                             AND a.attnum = ANY(i.indkey::int2[])) AS com_timestamp
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'messages'::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        """))).fetchall()
+        constraints = (await conn.execute(text("""
+            SELECT conname, pg_get_constraintdef(oid) AS definicao
+            FROM pg_constraint
+            WHERE conrelid = 'messages'::regclass AND contype IN ('f', 'c')
+        """))).fetchall()
+        triggers = (await conn.execute(text("""
+            SELECT tgname, pg_get_triggerdef(oid) AS definicao
+            FROM pg_trigger WHERE tgrelid = 'messages'::regclass AND NOT tgisinternal
+        """))).fetchall()
+        mais_antiga = (await conn.execute(text('SELECT min("timestamp") FROM messages'))).scalar()
+
+        # 2. A nova, vazia e com outro nome: messages segue sendo a antiga para quem lê.
+        await conn.execute(text(f"""
+            CREATE TABLE {NOVA} (LIKE messages INCLUDING DEFAULTS INCLUDING STORAGE)
+                PARTITION BY RANGE ("timestamp")
+        """))
+        await conn.execute(text(f'ALTER TABLE {NOVA} ADD CONSTRAINT {NOVA}_pkey PRIMARY KEY (id, "timestamp")'))
+        await conn.execute(text(f"""
+            ALTER TABLE {NOVA}
+                ADD CONSTRAINT messages_wamid_ts_key UNIQUE (wa_message_id, "timestamp")
+        """))
+
+        # 3. DEFAULT e os meses (do mais antigo até os futuros).
+        criadas = await _criar_meses(conn, (mais_antiga or datetime.now()).date())
+
+        # 4. Os dados.
+        copiadas = (await conn.execute(text(
+            f"INSERT INTO {NOVA} SELECT * FROM messages"))).rowcount
+
+        # 5. Índices, com nome provisório; FKs e CHECKs.
+        for r in indices:
+            definicao = r.definicao.replace(
+                f"INDEX {r.nome_sql} ON public.messages ",
+                f'INDEX "{r.nome}_nova" ON public.{NOVA} ', 1)
+            if definicao == r.definicao:
+                raise RuntimeError(f"definição inesperada do índice {r.nome}: {r.definicao}")
+            if r.unico and not r.com_timestamp:
+                definicao = definicao.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)
+            await conn.execute(text(definicao))
+        for r in constraints:
+            await conn.execute(text(f'ALTER TABLE {NOVA} ADD CONSTRAINT "{r.conname}" {r.definicao}'))
+
+        # 6. Estatísticas e contagens, antes da troca.
+        await conn.execute(text(f"ANALYZE {NOVA}"))
+        na_antiga = (await conn.execute(text("SELECT count(*) FROM messages"))).scalar()
+        na_nova = (await conn.execute(text(f"SELECT count(*) FROM {NOVA}"))).scalar()
+        if na_antiga != na_nova or copiadas != na_antiga:
+            raise RuntimeError(f"contagem diferente: antiga={na_antiga} nova={na_nova} — nada alterado")
+
+        # 7. A troca. Daqui ao COMMIT, nem leitura passa.
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_TROCA}'"))
+        await conn.execute(text("ALTER TABLE messages RENAME TO messages_antiga"))
+        for nome in ["messages_pkey"] + [r.nome for r in indices]:
+            await conn.execute(text(f'ALTER INDEX IF EXISTS "{nome}" RENAME TO "{nome}_antiga"'))
+        await conn.execute(text(f"ALTER TABLE {NOVA} RENAME TO messages"))
+        await conn.execute(text(f"ALTER INDEX {NOVA}_pkey RENAME TO messages_pkey"))
+        for r in indices:
+            await conn.execute(text(f'ALTER INDEX "{r.nome}_nova" RENAME TO "{r.nome}"'))
+        await conn.execute(text("ALTER SEQUENCE messages_id_seq OWNED BY messages.id"))
+        for r in constraints:
+            if r.definicao.startswith("FOREIGN KEY"):
+                await conn.execute(text(f'ALTER TABLE messages_antiga DROP CONSTRAINT "{r.conname}"'))
+        for r in triggers:
+            await conn.execute(text(f'DROP TRIGGER "{r.tgname}" ON messages_antiga'))
+            await conn.execute(text(r.definicao))
+        await particoes.preparar(conn)
+
+        # 8. Conferência da poda, dentro da mesma transação.
+        meses = (await conn.execute(text("""
+            SELECT count(*) FROM pg_inherits WHERE inhparent = 'messages'::regclass
+        """))).scalar()
+
+        # Poda: o mês corrente com limite fechado lê UMA partição; as janelas de produção
+        # (sem limite superior) leem do mês do corte em diante, mais a DEFAULT — vazias.
+        agora = datetime.now()
+        mes = date(agora.year, agora.month, 1)
+        proximo = (mes + timedelta(days=32)).replace(day=1)
+        podas = {"mês corrente (limite fechado)": await _particoes_lidas(conn, f"""
+            SELECT count(*) FROM messages WHERE "timestamp" >= '{mes}' AND "timestamp" < '{proximo}'""")}
+        if podas["mês corrente (limite fechado)"] != {particoes.nome_particao(mes.year, mes.month)}:
+            raise RuntimeError(f"poda não funcionou no mês corrente: {podas['mês corrente (limite fechado)']}")
+        for nome, (janela, sql) in CONSULTAS_PODA.items():
+            corte = agora - janela
+            lidas = podas[nome] = await _particoes_lidas(conn, sql.format(corte=corte))
+            primeira = particoes.nome_particao(corte.year, corte.month)
+            velhas = {p for p in lidas if p < primeira and p != particoes.PARTICAO_DEFAULT}
+            if velhas:
+                raise RuntimeError(f"{nome}: lendo partições fora da janela: {sorted(velhas)}")
+
+    print(f"OK: {na_nova} mensagens copiadas para messages particionada "
+          f"({meses} partições, {len(criadas)} mensais criadas agora + DEFAULT)")
+    print(f"OK: {len(indices)} índices, {len(constraints)} constraints e {len(triggers)} triggers recriados")
+    for nome, lidas in podas.items():
+        print(f"OK: poda — {nome}: {', '.join(sorted(lidas))}")
+    print("OK: messages_antiga mantida para conferência (DROP TABLE messages_antiga quando quiser)")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,54 @@
+"""Versão do nat_config, para o cache do nat_guard. Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_nat_guard_cache.py
+
+Idempotente (IF NOT EXISTS / CREATE OR REPLACE) e numa única transação (engine.begin).
+
+O que faz:
+  1. lock_timeout=3s — o ALTER em nat_config é instantâneo, mas o guard lê essa linha antes
+     de cada envio da NAT e não pode ficar na fila atrás de um lock.
+  2. nat_config.versao INTEGER NOT NULL DEFAULT 1.
+  3. Triggers (nat_guard.instalar_gatilhos, os mesmos que o create_tables instala):
+     BEFORE UPDATE: versao = versao + 1, updated_at = NOW(), e pg_notify('nat_config', nova
+     versão); AFTER DELETE: pg_notify('nat_config', '0') — apagar a linha também desliga.
+     Por trigger, e não no código, porque o kill switch é operado com UPDATE à mão no psql —
+     é exatamente esse UPDATE que tem que invalidar o cache de todos os processos.
+
+O NOTIFY só é entregue no COMMIT do UPDATE: um UPDATE revertido não invalida nada, e o que
+foi commitado invalida antes de qualquer leitura nova poder ver a linha nova.
+
+Nenhuma tabela nova para o teto por hora: a janela por minuto vive em memória no nat_guard e
+é reconciliada com o COUNT agrupado de messages, coberto pelo índice parcial
+idx_messages_nat_etapa_ts que já existe (migrate_nat_sprint3.py).
+"""
+import asyncio
+from sqlalchemy import text
+from app import nat_guard
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não travar o guard atrás do ALTER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Versão da linha.
+        await conn.execute(text(
+            "ALTER TABLE nat_config ADD COLUMN IF NOT EXISTS versao INTEGER NOT NULL DEFAULT 1"))
+
+        # 3. Triggers que versionam e avisam (UPDATE e DELETE).
+        await nat_guard.instalar_gatilhos(conn)
+
+        # Conferência dentro da mesma transação.
+        versao = (await conn.execute(text(
+            "SELECT versao FROM nat_config WHERE id = 1"))).scalar()
+        gatilhos = (await conn.execute(text(
+            "SELECT count(DISTINCT tgname) FROM pg_trigger WHERE tgname = ANY(:nomes)"),
+            {"nomes": list(nat_guard.GATILHOS_CONFIG)})).scalar()
+
+    print(f"OK: nat_config.versao = {versao} (None = singleton ainda não criado)")
+    print(f"OK: triggers do nat_config: {gatilhos} de {len(nat_guard.GATILHOS_CONFIG)} instalados")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,84 @@
+"""Saúde de entrega por template: messages.template_name e os baldes por minuto.
+
+Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_template_health.py
+
+Idempotente (IF NOT EXISTS). Os passos 1-4 numa única transação (engine.begin); o 5 fora
+dela, porque CREATE INDEX CONCURRENTLY não roda dentro de transação.
+
+O que faz:
+  1. lock_timeout=3s — messages é a tabela mais quente do projeto (webhook da Meta grava nela
+     a cada mensagem); o ALTER não pode enfileirar o webhook atrás de si.
+  2. messages.template_name TEXT — nullable, sem DEFAULT: no Postgres 11+ é só catálogo, sem
+     reescrever a tabela. Preenchido por todo caminho que envia template, daqui em diante.
+  3. template_delivery_minuto (channel_id, template_name, minuto) -> entregues, falhas.
+     Escrita pelo webhook de status (delivery_health.contar_desfecho), lida por
+     delivery_health.avaliar. channel_id NOT NULL com 0 para "sem canal": NULL não entra
+     em chave primária, e o ON CONFLICT precisa da chave inteira.
+  4. Índice em (minuto) — o WHERE da avaliação e da poda.
+  5. Índice parcial em messages (template_name, timestamp) WHERE status='failed' — o erro mais
+     frequente de um fluxo, consultado só quando vai virar notificação. CONCURRENTLY, pelo
+     mesmo caminho de migrate_indices_compostos.py (AUTOCOMMIT, índice inválido de uma
+     execução interrompida é refeito, ON ONLY + ATTACH se messages já for particionada): um
+     CREATE INDEX comum em messages segura o webhook — insert e status — pelo build inteiro.
+
+SEM BACKFILL: as mensagens antigas não têm como dizer de que template vieram (só o texto
+renderizado foi guardado), e os baldes nascem vazios. O alerta por fluxo vale do deploy em
+diante; nos primeiros 60 minutos a janela ainda está enchendo.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+from migrate_indices_compostos import autocommit, criar_indice
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não travar o webhook atrás do ALTER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Nome do template em cada envio.
+        await conn.execute(text(
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS template_name TEXT"))
+
+        # 3. Baldes por minuto.
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS template_delivery_minuto (
+                channel_id INTEGER NOT NULL,
+                template_name TEXT NOT NULL,
+                minuto TIMESTAMP NOT NULL,
+                entregues INTEGER NOT NULL DEFAULT 0,
+                falhas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (channel_id, template_name, minuto)
+            )
+        """))
+
+        # 4. WHERE da avaliação e da poda.
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_template_delivery_minuto
+                ON template_delivery_minuto (minuto)
+        """))
+
+        # Conferência dentro da mesma transação.
+        coluna = (await conn.execute(text(
+            "SELECT count(*) FROM information_schema.columns "
+            "WHERE table_name = 'messages' AND column_name = 'template_name'"))).scalar()
+        tabela = (await conn.execute(text(
+            "SELECT to_regclass('template_delivery_minuto') IS NOT NULL"))).scalar()
+
+    # 5. Erro mais frequente por fluxo — sem travar o webhook.
+    async with engine.connect() as conn:
+        conn = await autocommit(conn)
+        feito = await criar_indice(
+            conn, "idx_messages_template_falhas", "messages",
+            "(template_name, \"timestamp\") WHERE status = 'failed' AND template_name IS NOT NULL")
+
+    print(f"OK: messages.template_name {'criada' if coluna else 'AUSENTE'}")
+    print(f"OK: template_delivery_minuto {'criada' if tabela else 'AUSENTE'}")
+    print(f"OK: idx_messages_template_falhas {'criado agora' if feito else 'já existia'}")
+    print("OK: sem backfill — o alerta por template vale a partir do deploy")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,38 @@
+"""Versão do token por usuário (revogação imediata, ver CACHE DO USUÁRIO em app/auth.py).
+
+    cd backend && venv/bin/python migrate_token_version.py
+
+Idempotente (ADD COLUMN IF NOT EXISTS) e numa única transação (engine.begin).
+
+  users.token_version INTEGER NOT NULL DEFAULT 0
+
+DEFAULT constante é operação de catálogo no Postgres (11+): não reescreve a tabela. Todos
+nascem com 0, que é o valor assumido para os tokens já emitidos sem a claim "tv" — ninguém é
+deslogado pela migração. lock_timeout=3s pelo mesmo motivo das outras: users é lida em todo
+login, melhor falhar e rodar de novo que enfileirar os logins atrás do ALTER.
+
+Rodar ANTES de subir o código que lê a coluna.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        await conn.execute(text("SET lock_timeout = '3s'"))
+        await conn.execute(text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0"))
+
+        coluna = (await conn.execute(text("""
+            SELECT data_type, is_nullable, column_default
+            FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'token_version'
+        """))).fetchone()
+
+    print(f"OK: users.token_version {coluna.data_type} nullable={coluna.is_nullable} "
+          f"default={coluna.column_default}")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
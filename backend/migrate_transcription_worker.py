@@ -0,0 +1,81 @@
+"""Migração da fila de transcrição de ligações (call_logs).
+
+Rodar uma vez:
+
+    cd backend && venv/bin/python migrate_transcription_worker.py
+
+Idempotente (IF NOT EXISTS) e numa única transação (engine.begin).
+
+O que faz:
+  1. lock_timeout=3s — call_logs é escrita pelos webhooks do Twilio a cada ligação; o ALTER
+     precisa de ACCESS EXCLUSIVE e não pode enfileirar os webhooks atrás dele.
+  2. Colunas da fila, consumidas por transcription_worker.py:
+       transcription_attempts     INTEGER NOT NULL DEFAULT 0 — tentativas já consumidas
+       transcription_run_at       TIMESTAMP — NULL = já; preenchido = retentativa adiada
+       transcription_started_at   TIMESTAMP — quando o worker reivindicou (detecta travadas)
+       transcription_finished_at  TIMESTAMP — desfecho final (done ou error)
+       transcription_error        TEXT      — motivo da última falha, literal
+       transcription_timings      TEXT      — JSON com ms de cada etapa (whisper, insights)
+  3. ÍNDICE PARCIAL em (transcription_run_at) WHERE status IN ('pending','processing'): é o
+     WHERE do worker, a cada 30s. Parcial porque a fila é um punhado de linhas e o histórico
+     (done/error/NULL) cresce para sempre — indexá-lo seria pagar escrita por nada.
+  4. Backfill: linhas 'processing' ÓRFÃS (o endpoint antigo morreu no meio, com o processo)
+     voltam para 'pending'. Antes deste worker nada as tiraria de lá.
+
+O DEFAULT 0 de attempts é troca de catálogo em PG 11+ (default não volátil), sem reescrever
+a tabela. As demais colunas são nullable sem default.
+
+Nenhuma gravação é transcrita AO RODAR isto — mas as 'pending' que o webhook de gravação
+já marcou passam a ser consumidas pelo worker no próximo boot da API.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não travar os webhooks do Twilio atrás do ALTER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Colunas da fila.
+        await conn.execute(text(
+            "ALTER TABLE call_logs ADD COLUMN IF NOT EXISTS transcription_attempts "
+            "INTEGER NOT NULL DEFAULT 0"))
+        for coluna, tipo in (("transcription_run_at", "TIMESTAMP"),
+                             ("transcription_started_at", "TIMESTAMP"),
+                             ("transcription_finished_at", "TIMESTAMP"),
+                             ("transcription_error", "TEXT"),
+                             ("transcription_timings", "TEXT")):
+            await conn.execute(text(
+                f"ALTER TABLE call_logs ADD COLUMN IF NOT EXISTS {coluna} {tipo}"))
+
+        # 3. WHERE do worker.
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_call_logs_fila_transcricao
+                ON call_logs (transcription_run_at)
+                WHERE transcription_status IN ('pending', 'processing')
+        """))
+
+        # 4. Órfãs do endpoint síncrono.
+        orfas = (await conn.execute(text(
+            "UPDATE call_logs SET transcription_status = 'pending' "
+            "WHERE transcription_status = 'processing'"))).rowcount
+
+        # Conferência dentro da mesma transação.
+        cols = (await conn.execute(text(
+            "SELECT count(*) FROM information_schema.columns "
+            "WHERE table_name = 'call_logs' AND column_name IN "
+            "('transcription_attempts', 'transcription_run_at', 'transcription_started_at', "
+            "'transcription_finished_at', 'transcription_error', 'transcription_timings')"
+        ))).scalar()
+        fila = (await conn.execute(text(
+            "SELECT count(*) FROM call_logs WHERE transcription_status = 'pending'"))).scalar()
+
+    print(f"OK: call_logs ganhou {cols}/6 colunas da fila de transcrição (+índice parcial)")
+    print(f"OK: {orfas} linha(s) 'processing' órfã(s) devolvida(s) para 'pending'")
+    print(f"OK: {fila} gravação(ões) na fila — o worker consome no próximo boot da API")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
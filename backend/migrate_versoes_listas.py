@@ -0,0 +1,61 @@
+"""Triggers que avançam as versões das listagens (GET condicional, ver app/respostas.py).
+
+    cd backend && venv/bin/python migrate_versoes_listas.py
+
+Rodar DEPOIS de migrate_eventos_tempo_real.py: mensagens e status já avisam por aqueles
+triggers. Idempotente (CREATE OR REPLACE / DROP TRIGGER IF EXISTS) e numa única transação
+(engine.begin).
+
+O que faz:
+  1. lock_timeout=3s — CREATE TRIGGER pede lock na tabela; melhor falhar e rodar de novo que
+     enfileirar o webhook atrás da migração.
+  2. Função cenat_versoes_notificar(): pg_notify('cenat_versoes', <nome da tabela>). Sem
+     delta: quem escuta só precisa saber QUE a tabela mudou.
+  3. Um trigger AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ... FOR EACH STATEMENT por
+     tabela de TABELAS. Por COMANDO, não por linha, e o Postgres junta NOTIFYs iguais da mesma
+     transação: o sync da Exact atualizando mil leads gera UM aviso, no COMMIT.
+
+Nenhum trigger toca outra tabela — nada de UPDATE em contacts a cada mensagem, que seguraria
+o lock da linha do contato pela transação inteira de um disparo em massa.
+"""
+import asyncio
+from sqlalchemy import text
+from app.database import engine
+
+TABELAS = ("contacts", "contact_tags", "tags", "ai_conversation_summaries", "exact_leads")
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        # 1. Não enfileirar o webhook atrás do lock do CREATE TRIGGER.
+        await conn.execute(text("SET lock_timeout = '3s'"))
+
+        # 2. Uma função para todas; TG_TABLE_NAME é o payload.
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION cenat_versoes_notificar() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('cenat_versoes', TG_TABLE_NAME);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+
+        # 3. Os gatilhos, um por tabela.
+        for tabela in TABELAS:
+            nome = f"cenat_versoes_{tabela}"
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {nome} ON {tabela}"))
+            await conn.execute(text(f"""
+                CREATE TRIGGER {nome}
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabela}
+                    FOR EACH STATEMENT EXECUTE FUNCTION cenat_versoes_notificar()
+            """))
+
+        # Conferência dentro da mesma transação.
+        instalados = (await conn.execute(text(
+            "SELECT count(*) FROM pg_trigger WHERE tgname LIKE 'cenat_versoes_%'"))).scalar()
+
+    print(f"OK: {instalados}/{len(TABELAS)} triggers cenat_versoes_* instalados")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
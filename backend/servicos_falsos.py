@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""Dublês HTTP da Meta (Graph), Exact Spotter, OpenAI, Twilio e do relay do pedagógico.
+
+    cd backend
+    venv/bin/python servicos_falsos.py                          # 127.0.0.1:9100, sem atraso
+    venv/bin/python servicos_falsos.py --latencia-ms 150 --variacao-ms 100 --erros 0.01
+    venv/bin/python servicos_falsos.py --por-segundo 80 --ajuste openai.latencia_ms=2500
+    venv/bin/python servicos_falsos.py --ajuste graph.limite=0.05 --ajuste exact.erros=0.2
+
+e o backend apontado para eles (o script imprime as linhas prontas para o .env):
+
+    GRAPH_BASE_URL=http://127.0.0.1:9100/graph
+    EXACT_BASE_URL=http://127.0.0.1:9100/exact/v3
+    OPENAI_BASE_URL=http://127.0.0.1:9100/openai/v1
+    TWILIO_BASE_URL=http://127.0.0.1:9100/twilio
+    CS_RELAY_URL=http://127.0.0.1:9100/cs/api/webhook/whatsapp
+
+POR QUE ESTE SCRIPT EXISTE
+    O caminho de envio (whatsapp.py, disparo, NAT), o sync da Exact (exact_spotter.py), a IA
+    (ai_engine.py), a transcrição (transcription.py) e a Twilio (twilio_routes.py) só rodavam
+    contra os serviços de verdade: medir vazão ou ver o que acontece quando a Meta devolve
+    limite era mandar mensagem para lead. Aqui cada um tem um dublê com as rotas que o backend
+    chama e o formato de resposta que ele lê — e com o comportamento ajustável.
+
+🔴 NADA SAI DAQUI. Nenhuma rota repassa nada para fora; tudo é gerado na hora. O backend só fala
+    com os dublês se as *_BASE_URL acima estiverem no ambiente — sem elas, o padrão é o serviço
+    de verdade. Nunca suba o backend de produção com elas.
+
+COMPORTAMENTO (por serviço, `Comportamento`)
+    latencia_ms / variacao_ms   atraso de cada resposta: latencia ± variacao, uniforme
+    erros                       fração respondida com 5xx, no formato de erro do serviço
+    limite                      fração respondida com o código de LIMITE do serviço
+    por_segundo                 teto de vazão (balde de fichas, rajada de 1 s); acima dele, o
+                                código de limite. 0 = sem teto.
+
+    O limite responde NA HORA (o serviço de verdade recusa antes de processar); erro e sucesso
+    esperam a latência. Os códigos de limite são os que o backend vai ver em produção:
+      graph   HTTP 400, error.code 130429 (Rate limit hit — teto de vazão da Cloud API)
+      exact   HTTP 429, sem corpo JSON
+      openai  HTTP 429, rate_limit_exceeded + retry-after (o SDK tenta de novo sozinho)
+      twilio  HTTP 429, code 20429
+      cs      HTTP 429
+
+MEDIR
+    GET /_estado: por serviço, as requisições por resultado (ok, erro, limite), quantas estão
+    em voo agora e o PICO de simultâneas — é o pico que mostra se o backend segura a mão
+    (semáforos, lotes) ou abre uma conexão por mensagem. DELETE /_estado zera.
+
+NO MESMO PROCESSO
+    `criar_app(...)` devolve o app ASGI: um teste fala com ele por httpx.ASGITransport, sem
+    porta. `servir(app, porta)` sobe o uvicorn numa task do loop atual, para um benchmark que
+    roda o backend e os dublês juntos.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+SERVICOS = ("graph", "exact", "openai", "twilio", "cs")
+PORTA = 9100
+LEADS_EXACT = 2_000              # leads que o /Leads pagina
+EMBEDDING_DIM = 1536             # text-embedding-3-small
+GRAVACAO_KB = 512                # tamanho do MP3 servido em /Recordings
+FUNIS = (18535, 18537, 25588)
+SUBSOURCES = ("pospics2025", "poscuidaremliberdadeturma5", "possaudementalinfantojuvenil")
+
+
+@dataclass
+class Comportamento:
+    latencia_ms: float = 0
+    variacao_ms: float = 0
+    erros: float = 0
+    limite: float = 0
+    por_segundo: float = 0
+
+
+class _Balde:
+    """Balde de fichas: `por_segundo` fichas por segundo, no máximo um segundo guardado."""
+
+    def __init__(self, por_segundo: float):
+        self.taxa = por_segundo
+        self.fichas = por_segundo
+        self.antes = time.monotonic()
+
+    def tirar(self) -> bool:
+        if self.taxa <= 0:
+            return True
+        agora = time.monotonic()
+        self.fichas = min(self.taxa, self.fichas + (agora - self.antes) * self.taxa)
+        self.antes = agora
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return True
+        return False
+
+
+class Estado:
+    """Contadores de todos os dublês de um app."""
+
+    def __init__(self):
+        self.zerar()
+
+    def zerar(self):
+        self.resultados = Counter()     # (servico, ok|erro|limite) -> n
+        self.em_voo = Counter()
+        self.pico = Counter()
+        self.sequencia = 0              # ids gerados (wamid, CA..., media_id)
+
+    def proximo(self) -> int:
+        self.sequencia += 1
+        return self.sequencia
+
+    def resumo(self) -> dict:
+        return {s: {"ok": self.resultados[s, "ok"], "erro": self.resultados[s, "erro"],
+                    "limite": self.resultados[s, "limite"], "em_voo": self.em_voo[s],
+                    "pico": self.pico[s]} for s in SERVICOS}
+
+
+# ------------------------------------------------------------------------------------------
+# Respostas de erro e de limite, no formato de cada serviço
+# ------------------------------------------------------------------------------------------
+
+def _erro_graph(codigo: int, mensagem: str, status: int) -> JSONResponse:
+    return JSONResponse({"error": {"message": mensagem, "type": "OAuthException", "code": codigo,
+                                   "error_data": {"messaging_product": "whatsapp", "details": mensagem},
+                                   "fbtrace_id": "AfalsoFbtrace"}}, status_code=status)
+
+
+def _erro_openai(status: int, tipo: str, codigo: str | None, mensagem: str, **headers) -> JSONResponse:
+    return JSONResponse({"error": {"message": mensagem, "type": tipo, "param": None, "code": codigo}},
+                        status_code=status, headers=headers)
+
+
+def _erro_twilio(codigo: int, mensagem: str, status: int) -> JSONResponse:
+    return JSONResponse({"code": codigo, "message": mensagem, "status": status,
+                         "more_info": f"https://www.twilio.com/docs/errors/{codigo}"}, status_code=status)
+
+
+LIMITE = {
+    "graph": lambda: _erro_graph(130429, "(#130429) Rate limit hit", 400),
+    "exact": lambda: Response("Too Many Requests", status_code=429),
+    "openai": lambda: _erro_openai(429, "requests", "rate_limit_exceeded",
+                                   "Rate limit reached for requests", **{"retry-after": "1"}),
+    "twilio": lambda: _erro_twilio(20429, "Too Many Requests", 429),
+    "cs": lambda: Response("Too Many Requests", status_code=429),
+}
+ERRO = {
+    "graph": lambda: _erro_graph(131000, "Something went wrong", 500),
+    "exact": lambda: JSONResponse({"message": "An error has occurred."}, status_code=500),
+    "openai": lambda: _erro_openai(500, "server_error", None,
+                                   "The server had an error while processing your request."),
+    "twilio": lambda: _erro_twilio(20500, "Internal Server Error", 500),
+    "cs": lambda: Response("Bad Gateway", status_code=502),
+}
+
+
+def _com_comportamento(app: FastAPI, servico: str, c: Comportamento, estado: Estado, rng: random.Random):
+    balde = _Balde(c.por_segundo)
+
+    @app.middleware("http")
+    async def comportamento(request: Request, call_next):
+        if not balde.tirar() or rng.random() < c.limite:
+            estado.resultados[servico, "limite"] += 1
+            return LIMITE[servico]()
+        estado.em_voo[servico] += 1
+        estado.pico[servico] = max(estado.pico[servico], estado.em_voo[servico])
+        try:
+            atraso = c.latencia_ms + rng.uniform(-c.variacao_ms, c.variacao_ms)
+            if atraso > 0:
+                await asyncio.sleep(atraso / 1000)
+            if rng.random() < c.erros:
+                estado.resultados[servico, "erro"] += 1
+                return ERRO[servico]()
+            resposta = await call_next(request)
+            estado.resultados[servico, "ok" if resposta.status_code < 400 else "erro"] += 1
+            return resposta
+        finally:
+            estado.em_voo[servico] -= 1
+
+
+# ------------------------------------------------------------------------------------------
+# Meta — Graph API (whatsapp.py, routes.py)
+# ------------------------------------------------------------------------------------------
+
+def _graph(estado: Estado) -> FastAPI:
+    app = FastAPI()
+
+    def sem_token(request: Request):
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return _erro_graph(190, "Invalid OAuth access token.", 401)
+
+    @app.post("/{versao}/{phone_number_id}/messages")
+    async def enviar(versao: str, phone_number_id: str, request: Request):
+        if recusa := sem_token(request):
+            return recusa
+        corpo = await request.json()
+        if not corpo.get("to") or not corpo.get("type"):
+            return _erro_graph(100, "(#100) Invalid parameter", 400)
+        return {"messaging_product": "whatsapp",
+                "contacts": [{"input": corpo["to"], "wa_id": corpo["to"]}],
+                "messages": [{"id": f"wamid.falso.{estado.proximo()}"}]}
+
+    @app.post("/{versao}/{phone_number_id}/media")
+    async def subir_midia(versao: str, phone_number_id: str, request: Request):
+        if recusa := sem_token(request):
+            return recusa
+        await request.form()
+        return {"id": str(900_000_000 + estado.proximo())}
+
+    @app.get("/{versao}/{waba_id}/message_templates")
+    async def listar_templates(versao: str, waba_id: str, request: Request, name: str | None = None):
+        if recusa := sem_token(request):
+            return recusa
+        nomes = [name] if name else ["boas_vindas_pos", "lembrete_matricula", "nat_boasvindas"]
+        return {"data": [{"name": n, "language": "pt_BR", "status": "APPROVED", "category": "MARKETING",
+                          "id": str(int(hashlib.sha256(n.encode()).hexdigest()[:12], 16)),
+                          "components": [{"type": "BODY", "text": "Olá {{1}}! Vi seu interesse na pós."}]}
+                         for n in nomes], "paging": {"cursors": {}}}
+
+    @app.post("/{versao}/{waba_id}/message_templates")
+    async def criar_template(versao: str, waba_id: str, request: Request):
+        if recusa := sem_token(request):
+            return recusa
+        corpo = await request.json()
+        return {"id": str(800_000_000 + estado.proximo()), "status": "PENDING",
+                "category": corpo.get("category", "MARKETING")}
+
+    @app.get("/_midia/{media_id}")
+    async def baixar_midia(media_id: str):
+        return Response(b"\xff\xd8\xff\xe0" + b"\0" * 2048, media_type="image/jpeg")
+
+    @app.get("/{versao}/{media_id}")
+    async def midia(versao: str, media_id: str, request: Request):
+        if recusa := sem_token(request):
+            return recusa
+        raiz = str(request.url).rsplit(f"/{versao}/", 1)[0]      # com o /graph do mount
+        return {"url": f"{raiz}/_midia/{media_id}", "mime_type": "image/jpeg",
+                "sha256": hashlib.sha256(media_id.encode()).hexdigest(), "file_size": 2052,
+                "id": media_id, "messaging_product": "whatsapp"}
+
+    return app
+
+
+# ------------------------------------------------------------------------------------------
+# Exact Spotter (exact_spotter.py, exact_routes.py, twilio_routes.py)
+# ------------------------------------------------------------------------------------------
+
+def lead_exact(i: int, agora: datetime) -> dict:
+    """O i-ésimo lead (0 = o mais novo), no formato do /Leads."""
+    registro = agora - timedelta(minutes=37 * i)
+    return {"id": 2_000_000 - i, "lead": f"Lead Falso {i}", "phone1": f"55119{(i * 2654435761) % 10 ** 8:08d}",
+            "phone2": None, "stage": "Novo", "funnelId": FUNIS[i % len(FUNIS)],
+            "source": {"id": 1, "value": "Site"}, "subSource": {"id": 2, "value": SUBSOURCES[i % len(SUBSOURCES)]},
+            "sdr": {"id": 415875, "name": "SDR Falso"}, "registerDate": registro.isoformat(),
+            "updateDate": registro.isoformat(), "description": None, "city": "São Paulo", "state": "SP",
+            "publicLink": None}
+
+
+def _exact(estado: Estado, leads: int) -> FastAPI:
+    app = FastAPI()
+    agora = datetime.now().replace(microsecond=0)
+
+    @app.middleware("http")
+    async def token(request: Request, call_next):
+        if not request.headers.get("token_exact"):
+            return JSONResponse({"message": "Authorization has been denied for this request."},
+                                status_code=401)
+        return await call_next(request)
+
+    def filtro_id(request: Request, campo: str) -> int | None:
+        filtro = request.query_params.get("$filter", "")
+        prefixo = f"{campo} eq "
+        return int(filtro[len(prefixo):]) if filtro.startswith(prefixo) else None
+
+    @app.get("/v3/Leads")
+    async def listar_leads(request: Request):
+        if (exact_id := filtro_id(request, "id")) is not None:
+            i = 2_000_000 - exact_id
+            return {"value": [lead_exact(i, agora)] if 0 <= i < leads else []}
+        skip = int(request.query_params.get("$skip", 0))
+        top = int(request.query_params.get("$top", 500))
+        return {"value": [lead_exact(i, agora) for i in range(skip, min(skip + top, leads))]}
+
+    @app.get("/v3/Persons")
+    async def pessoas(request: Request):
+        lead_id = filtro_id(request, "leadId")
+        return {"value": [{"name": f"Pessoa do lead {lead_id}", "email": f"lead{lead_id}@falso.local",
+                           "jobTitle": None, "phone1": None}]}
+
+    @app.get("/v3/QualificationHistories")
+    async def qualificacoes(request: Request):
+        return {"value": []}
+
+    @app.get("/v3/Funnels")
+    async def funis():
+        return {"value": [{"id": f, "value": f"Funil {f}"} for f in FUNIS]}
+
+    @app.post("/v3/timelineAdd")
+    async def timeline(request: Request):
+        corpo = await request.json()
+        if not corpo.get("leadId"):
+            return JSONResponse({"message": "leadId obrigatório"}, status_code=400)
+        return JSONResponse({"id": estado.proximo()}, status_code=201)
+
+    return app
+
+
+# ------------------------------------------------------------------------------------------
+# OpenAI (ai_engine.py, ai_routes.py, transcription.py, google_calendar.py)
+# ------------------------------------------------------------------------------------------
+
+def embedding(texto: str, dimensoes: int = EMBEDDING_DIM) -> list[float]:
+    """Vetor unitário determinístico do texto: o mesmo texto, o mesmo vetor."""
+    semente = int(hashlib.sha256(texto.encode()).hexdigest()[:16], 16)
+    vetor = np.random.default_rng(semente).standard_normal(dimensoes)
+    return (vetor / np.linalg.norm(vetor)).round(6).tolist()
+
+
+def _tokens(texto: str) -> int:
+    return max(1, len(texto) // 4)
+
+
+def _openai(estado: Estado) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def chave(request: Request, call_next):
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return _erro_openai(401, "invalid_request_error", "invalid_api_key", "Incorrect API key provided.")
+        return await call_next(request)
+
+    @app.post("/v1/chat/completions")
+    async def completar(request: Request):
+        corpo = await request.json()
+        pedido = " ".join(str(m.get("content", "")) for m in corpo.get("messages", []))
+        # Quem pede JSON (google_calendar, formato do resumo) faz json.loads: "{}" é o "nada
+        # detectado" de todos eles. O resto recebe um texto que passa por qualquer divisão
+        # de mensagem (message_split) sem surpresa.
+        quer_json = "JSON" in pedido or (corpo.get("response_format") or {}).get("type") == "json_object"
+        resposta = "{}" if quer_json else "Olá! Posso te ajudar com mais alguma informação sobre a pós?"
+        return {"id": f"chatcmpl-falso{estado.proximo()}", "object": "chat.completion",
+                "created": int(time.time()), "model": corpo.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                             "message": {"role": "assistant", "content": resposta, "refusal": None}}],
+                "usage": {"prompt_tokens": _tokens(pedido), "completion_tokens": _tokens(resposta),
+                          "total_tokens": _tokens(pedido) + _tokens(resposta)}}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        corpo = await request.json()
+        entradas = corpo["input"] if isinstance(corpo["input"], list) else [corpo["input"]]
+        dimensoes = corpo.get("dimensions") or EMBEDDING_DIM
+        tokens = sum(_tokens(str(e)) for e in entradas)
+        return {"object": "list", "model": corpo.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": embedding(str(e), dimensoes)}
+                         for i, e in enumerate(entradas)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcrever(request: Request):
+        formulario = await request.form()
+        audio = await formulario["file"].read()
+        return {"text": f"Transcrição simulada de {len(audio)} bytes de áudio."}
+
+    return app
+
+
+# ------------------------------------------------------------------------------------------
+# Twilio (twilio_routes.py, recordings.py)
+# ------------------------------------------------------------------------------------------
+
+def _data_twilio(quando: datetime) -> str:
+    return quando.strftime("%a, %d %b %Y %H:%M:%S +0000")
+
+
+def _twilio(estado: Estado, gravacao_kb: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def autenticacao(request: Request, call_next):
+        if not request.headers.get("authorization", "").startswith("Basic "):
+            return _erro_twilio(20003, "Authenticate", 401)
+        return await call_next(request)
+
+    def chamada(conta: str, sid: str, para: str = "+5511900000000", de: str = "+5511900000001",
+                status: str = "queued") -> dict:
+        agora = _data_twilio(datetime.now(timezone.utc))
+        return {"sid": sid, "account_sid": conta, "to": para, "from": de, "status": status,
+                "direction": "outbound-api", "date_created": agora, "date_updated": agora,
+                "start_time": None, "end_time": None, "duration": None, "price": None,
+                "api_version": "2010-04-01", "uri": f"/2010-04-01/Accounts/{conta}/Calls/{sid}.json"}
+
+    @app.post("/2010-04-01/Accounts/{conta}/Calls.json")
+    async def ligar(conta: str, request: Request):
+        formulario = await request.form()
+        if not formulario.get("To") or not formulario.get("From"):
+            return _erro_twilio(21201, "No 'To' number is specified", 400)
+        sid = f"CA{hashlib.md5(str(estado.proximo()).encode()).hexdigest()}"
+        return JSONResponse(chamada(conta, sid, formulario["To"], formulario["From"]), status_code=201)
+
+    @app.get("/2010-04-01/Accounts/{conta}/Calls/{sid}.json")
+    async def ver_chamada(conta: str, sid: str):
+        return chamada(conta, sid, status="completed")
+
+    @app.get("/2010-04-01/Accounts/{conta}/Recordings/{arquivo}")
+    async def gravacao(conta: str, arquivo: str):
+        # Cabeçalho de frame MP3 e silêncio: recordings.py confere só o Content-Length.
+        return Response(b"\xff\xfb\x90\x00" + b"\0" * (gravacao_kb * 1024 - 4), media_type="audio/mpeg")
+
+    return app
+
+
+def _cs(estado: Estado) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/webhook/whatsapp")
+    async def relay(request: Request):
+        await request.body()
+        return {"status": "ok"}
+
+    return app
+
+
+# ------------------------------------------------------------------------------------------
+# App e servidor
+# ------------------------------------------------------------------------------------------
+
+def criar_app(comportamentos: dict[str, Comportamento] | None = None, semente: int = 42,
+              leads: int = LEADS_EXACT, gravacao_kb: int = GRAVACAO_KB) -> FastAPI:
+    """Os cinco dublês sob /graph, /exact, /openai, /twilio e /cs, mais o /_estado."""
+    comportamentos = comportamentos or {}
+    estado = Estado()
+    rng = random.Random(semente)
+    app = FastAPI(title="Serviços falsos")
+    app.state.estado = estado
+
+    subapps = {"graph": _graph(estado), "exact": _exact(estado, leads), "openai": _openai(estado),
+               "twilio": _twilio(estado, gravacao_kb), "cs": _cs(estado)}
+    for servico, subapp in subapps.items():
+        _com_comportamento(subapp, servico, comportamentos.get(servico, Comportamento()), estado, rng)
+        app.mount(f"/{servico}", subapp)
+
+    @app.get("/_estado")
+    async def ver_estado():
+        return estado.resumo()
+
+    @app.delete("/_estado")
+    async def zerar_estado():
+        estado.zerar()
+        return estado.resumo()
+
+    return app
+
+
+def variaveis(base: str) -> dict[str, str]:
+    """As variáveis de ambiente que apontam o backend para os dublês em `base`."""
+    base = base.rstrip("/")
+    return {"GRAPH_BASE_URL": f"{base}/graph", "EXACT_BASE_URL": f"{base}/exact/v3",
+            "OPENAI_BASE_URL": f"{base}/openai/v1", "TWILIO_BASE_URL": f"{base}/twilio",
+            "CS_RELAY_URL": f"{base}/cs/api/webhook/whatsapp"}
+
+
+@asynccontextmanager
+async def servir(app, porta: int = PORTA, host: str = "127.0.0.1"):
+    """uvicorn numa task do loop atual, enquanto durar o `async with`."""
+    import uvicorn
+
+    servidor = uvicorn.Server(uvicorn.Config(app, host=host, port=porta, log_level="warning"))
+    tarefa = asyncio.create_task(servidor.serve())
+    while not servidor.started:
+        if tarefa.done():
+            tarefa.result()         # a porta ocupada, por exemplo, sobe aqui
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://{host}:{porta}"
+    finally:
+        servidor.should_exit = True
+        await tarefa
+
+
+def comportamentos(args) -> dict[str, Comportamento]:
+    """--latencia-ms & cia. para todos, depois cada --ajuste servico.campo=valor."""
+    base = Comportamento(args.latencia_ms, args.variacao_ms, args.erros, args.limite, args.por_segundo)
+    resultado = {s: replace(base) for s in SERVICOS}
+    campos = {f.name for f in fields(Comportamento)}
+    for ajuste in args.ajuste:
+        chave, _, valor = ajuste.partition("=")
+        servico, _, campo = chave.partition(".")
+        if servico not in resultado or campo not in campos or not valor:
+            raise SystemExit(f"--ajuste inválido: {ajuste!r} (servico.campo=valor; serviços: "
+                             f"{', '.join(SERVICOS)}; campos: {', '.join(sorted(campos))})")
+        setattr(resultado[servico], campo, float(valor))
+    return resultado
+
+
+def _argumentos(argv=None):
+    p = argparse.ArgumentParser(description="Dublês HTTP da Meta, Exact, OpenAI, Twilio e do relay.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=PORTA)
+    p.add_argument("--latencia-ms", type=float, default=0)
+    p.add_argument("--variacao-ms", type=float, default=0)
+    p.add_argument("--erros", type=float, default=0, help="fração de 5xx")
+    p.add_argument("--limite", type=float, default=0, help="fração com o código de limite")
+    p.add_argument("--por-segundo", type=float, default=0, help="teto de vazão por serviço (0 = sem)")
+    p.add_argument("--ajuste", action="append", default=[], metavar="SERVICO.CAMPO=VALOR")
+    p.add_argument("--semente", type=int, default=42)
+    p.add_argument("--leads", type=int, default=LEADS_EXACT, help="leads no /Leads da Exact")
+    p.add_argument("--gravacao-kb", type=int, default=GRAVACAO_KB)
+    return p.parse_args(argv)
+
+
+async def main(argv=None):
+    args = _argumentos(argv)
+    app = criar_app(comportamentos(args), args.semente, args.leads, args.gravacao_kb)
+    async with servir(app, args.porta, args.host) as base:
+        print(f"Serviços falsos em {base} — para o backend (.env):")
+        for nome, valor in variaveis(base).items():
+            print(f"  {nome}={valor}")
+        print(f"Contadores: curl {base}/_estado", flush=True)
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,265 @@
+"""Cache semântico de respostas da IA (ai_cache) e sua ligação em generate_ai_response.
+
+Rodar: cd backend && venv/bin/python test_ai_cache.py
+
+NADA SAI PARA A REDE: embeddings são vetores montados à mão e o chat completion é um
+AsyncMock. O banco é falso (só devolve config, contato e card) — histórico, RAG, catálogo e
+versão da base são substituídos por patch, porque o que está em teste é a DECISÃO de usar ou
+não o cache, não as queries.
+
+  1. pergunta parecida, mesmo canal/base/assinatura -> acerto, com o nome do NOVO lead
+  2. pergunta diferente (abaixo do limiar)          -> miss
+  3. outro curso de interesse / outro canal          -> miss (assinatura e canal na chave)
+  4. base mudou (versão) ou invalidar()              -> miss
+  5. TTL vencida                                     -> miss e entrada descartada
+  6. resposta cita nome e lead atual não tem nome    -> miss (sem substituição honesta)
+  7. elegibilidade: lead já falou antes / atendente respondeu -> recusa; só template -> aceita
+  8. generate_ai_response: 2ª pergunta parecida NÃO chama o chat; conversa com estado chama
+  9. cache desligado (padrão)                        -> nem embedding extra, nem consulta
+"""
+import asyncio
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+
+from app import ai_cache
+from app import ai_engine
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _limpar():
+    ai_cache._entradas.clear()
+    ai_cache._geracao.clear()
+    for k in ai_cache._metricas:
+        ai_cache._metricas[k] = 0
+
+
+def _vetor(angulo):
+    """Vetor unitário 2D. Cosseno entre dois = cos(diferença dos ângulos)."""
+    return [float(np.cos(angulo)), float(np.sin(angulo))]
+
+
+PERGUNTA = _vetor(0.0)
+PARECIDA = _vetor(0.1)      # cos ≈ 0.995 — acima de 0.95
+DIFERENTE = _vetor(0.5)     # cos ≈ 0.878 — abaixo
+VERSAO = (10, 42, 0)
+CHAVE = ai_cache.assinatura("prompt", "gpt-5-mini", 500, "Saúde Mental")
+RESPOSTA = "Oi Maria! O curso de Saúde Mental custa 12x de R$ 300. Maria, posso ajudar?"
+
+
+# ==========================================================================================
+# 1-6: buscar / guardar
+# ==========================================================================================
+
+def teste_1_acerto_com_nome_trocado():
+    print("\n1) pergunta parecida → acerto, nome do novo lead")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria Souza", agora=0)
+    guardada = ai_cache._entradas[1][0]["resposta"]
+    check("nome do lead original não fica guardado", "Maria" not in guardada, guardada)
+
+    r = ai_cache.buscar(1, VERSAO, CHAVE, PARECIDA, "João Pedro", agora=10)
+    check("acerto devolve a resposta com o primeiro nome do novo lead",
+          r == RESPOSTA.replace("Maria", "João"), repr(r))
+    check("métrica de acerto contada", ai_cache.estatisticas()["acertos"] == 1)
+
+
+def teste_2_pergunta_diferente():
+    print("\n2) pergunta diferente → miss")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    r = ai_cache.buscar(1, VERSAO, CHAVE, DIFERENTE, "João", agora=10)
+    check("abaixo do limiar não reaproveita", r is None, repr(r))
+    check("métrica de perda contada", ai_cache.estatisticas()["perdas"] == 1)
+
+
+def teste_3_outro_curso_ou_canal():
+    print("\n3) outro curso / outro canal → miss")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    outra = ai_cache.assinatura("prompt", "gpt-5-mini", 500, "Psicanálise")
+    check("outro curso de interesse não reaproveita",
+          ai_cache.buscar(1, VERSAO, outra, PERGUNTA, "João", agora=10) is None)
+    check("outro canal não reaproveita",
+          ai_cache.buscar(2, VERSAO, CHAVE, PERGUNTA, "João", agora=10) is None)
+
+
+def teste_4_base_mudou():
+    print("\n4) base de conhecimento mudou → miss")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    check("versão nova da base não reaproveita",
+          ai_cache.buscar(1, (11, 43, 0), CHAVE, PERGUNTA, "João", agora=10) is None)
+    check("entrada da versão velha descartada", ai_cache._entradas[1] == [])
+
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    ai_cache.invalidar(1)
+    check("invalidar() esvazia o canal", 1 not in ai_cache._entradas)
+    check("invalidar() muda a geração local", ai_cache._geracao.get(1) == 1)
+
+
+def teste_5_ttl():
+    print("\n5) TTL vencida → miss")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    r = ai_cache.buscar(1, VERSAO, CHAVE, PERGUNTA, "João", agora=ai_cache.TTL_SEGUNDOS + 1)
+    check("entrada vencida não é usada", r is None)
+    check("entrada vencida contada como expirada", ai_cache.estatisticas()["expiradas"] == 1)
+
+
+def teste_6_sem_nome():
+    print("\n6) resposta com nome, lead atual sem nome → miss")
+    _limpar()
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, RESPOSTA, "Maria", agora=0)
+    check("sem nome para substituir → miss",
+          ai_cache.buscar(1, VERSAO, CHAVE, PERGUNTA, "", agora=10) is None)
+
+    ai_cache.guardar(1, VERSAO, CHAVE, PERGUNTA, "Custa 12x de R$ 300.", "Maria", agora=0)
+    check("resposta sem nome serve para lead sem nome",
+          ai_cache.buscar(1, VERSAO, CHAVE, PERGUNTA, "", agora=10) == "Custa 12x de R$ 300.")
+
+    check("palavra inteira: 'Ana' não mexe em 'Análise'",
+          ai_cache._anonimizar("Ana, a Análise começa já", "Ana") == "⟦nome⟧, a Análise começa já")
+
+
+# ==========================================================================================
+# 7: elegibilidade
+# ==========================================================================================
+
+def teste_7_elegibilidade():
+    print("\n7) elegibilidade — nunca com estado na conversa")
+    tpl = {"role": "assistant", "content": "[mensagem de template enviada]"}
+    atual = {"role": "user", "content": "quanto custa?"}
+    check("só boas-vindas + pergunta atual → elegível",
+          ai_cache.elegivel([tpl, atual], "quanto custa?"))
+    check("pergunta atual ainda fora do histórico → elegível",
+          ai_cache.elegivel([tpl], "quanto custa?"))
+    check("lead já falou antes → recusa",
+          not ai_cache.elegivel([tpl, {"role": "user", "content": "sou enfermeira"}, atual],
+                                "quanto custa?"))
+    check("atendente já respondeu texto livre → recusa",
+          not ai_cache.elegivel([tpl, {"role": "assistant", "content": "Oi!"}, atual],
+                                "quanto custa?"))
+    longa = "quero saber tudo sobre a pós " * 200
+    check("pergunta atual cortada pela janela ainda conta como a atual → elegível",
+          ai_cache.elegivel([tpl, {"role": "user", "content": ai_engine.truncar_tokens(longa, 400)}],
+                            longa))
+    check("lead mandou mídia antes → recusa",
+          not ai_cache.elegivel([{"role": "user", "content": "[mídia enviada]"}, atual],
+                                "quanto custa?"))
+
+
+# ==========================================================================================
+# 8-9: generate_ai_response
+# ==========================================================================================
+
+def _res(valor):
+    m = MagicMock()
+    m.scalar_one_or_none.return_value = valor
+    return m
+
+
+def _db(nome):
+    """Config, contato e card, nesta ordem — as três leituras diretas de generate_ai_response."""
+    cfg = SimpleNamespace(is_enabled=True, system_prompt="prompt", model="gpt-5-mini",
+                          temperature="0.7", max_tokens=500)
+    contato = SimpleNamespace(name=nome)
+    card = SimpleNamespace(lead_course="Saúde Mental")
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[_res(cfg), _res(contato), _res(card)])
+    return db
+
+
+def _chat(texto):
+    resp = SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop",
+                                                    message=SimpleNamespace(content=texto))])
+    return AsyncMock(return_value=resp)
+
+
+async def _gerar(nome, pergunta, vetor, history, chat):
+    with patch.object(ai_engine, "get_conversation_window", AsyncMock(return_value=(history, []))), \
+         patch.object(ai_engine, "search_knowledge", AsyncMock(return_value=[])), \
+         patch.object(ai_engine, "get_course_catalog", AsyncMock(return_value=[])), \
+         patch.object(ai_engine, "generate_embedding", AsyncMock(return_value=vetor)) as emb, \
+         patch.object(ai_cache, "versao_base", AsyncMock(return_value=VERSAO)), \
+         patch.object(ai_engine.client.chat.completions, "create", chat):
+        r = await ai_engine.generate_ai_response("5583999990000", pergunta, 1, _db(nome))
+    return r, emb
+
+
+async def teste_8_generate_ai_response():
+    print("\n8) generate_ai_response com cache ligado")
+    _limpar()
+    tpl = {"role": "assistant", "content": "[mensagem de template enviada]"}
+    with patch.object(ai_cache, "CACHE_ATIVO", True):
+        chat = _chat(RESPOSTA)
+        r1, _ = await _gerar("Maria", "quanto custa?", PERGUNTA,
+                             [tpl, {"role": "user", "content": "quanto custa?"}], chat)
+        check("1ª pergunta chama o chat", chat.await_count == 1 and r1 == RESPOSTA)
+
+        r2, _ = await _gerar("João", "qual o valor?", PARECIDA,
+                             [tpl, {"role": "user", "content": "qual o valor?"}], chat)
+        check("2ª pergunta parecida NÃO chama o chat", chat.await_count == 1,
+              f"chamadas={chat.await_count}")
+        check("2ª resposta sai com o nome do novo lead", r2 == RESPOSTA.replace("Maria", "João"),
+              repr(r2))
+
+        com_estado = [tpl, {"role": "user", "content": "sou psicóloga"},
+                      {"role": "assistant", "content": "Que ótimo!"},
+                      {"role": "user", "content": "qual o valor?"}]
+        r3, _ = await _gerar("João", "qual o valor?", PARECIDA, com_estado, chat)
+        check("conversa com estado chama o chat mesmo com pergunta igual",
+              chat.await_count == 2)
+        check("inelegível contado", ai_cache.estatisticas()["inelegiveis"] == 1)
+
+
+async def teste_9_desligado():
+    print("\n9) cache desligado (padrão)")
+    _limpar()
+    check("nasce desligado sem AI_CACHE_ENABLED", ai_cache.CACHE_ATIVO is False)
+    tpl = {"role": "assistant", "content": "[mensagem de template enviada]"}
+    chat = _chat(RESPOSTA)
+    await _gerar("Maria", "quanto custa?", PERGUNTA, [tpl], chat)
+    _, emb = await _gerar("João", "qual o valor?", PARECIDA, [tpl], chat)
+    check("desligado: toda pergunta chama o chat", chat.await_count == 2)
+    check("desligado: nenhum embedding extra fora do RAG", emb.await_count == 0)
+    check("desligado: nada guardado", ai_cache.estatisticas()["entradas"] == 0)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("CACHE SEMÂNTICO DE RESPOSTAS DA IA")
+    print("Nenhuma chamada de rede. Nenhuma conexão de banco.")
+    print("=" * 90)
+
+    teste_1_acerto_com_nome_trocado()
+    teste_2_pergunta_diferente()
+    teste_3_outro_curso_ou_canal()
+    teste_4_base_mudou()
+    teste_5_ttl()
+    teste_6_sem_nome()
+    teste_7_elegibilidade()
+    await teste_8_generate_ai_response()
+    await teste_9_desligado()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
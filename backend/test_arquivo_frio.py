@@ -0,0 +1,364 @@
+"""Arquivo frio: meses velhos em JSONL.zst, fora do banco, e o histórico paginando até eles.
+
+Rodar: cd backend && venv/bin/python test_arquivo_frio.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: a sessão é um dublê que guarda o SQL e os objetos
+adicionados; os arquivos são gravados de verdade num diretório temporário.
+
+  1. corte e caminhos: o que fica no banco, onde cada mês vai parar
+  2. arquivo: quadros zstd em sequência, conferência (linhas + sha256), .parcial até conferir
+  3. messages: um quadro por contato, blocos com offset/tamanho, registro e DROP na mesma transação
+  4. messages: falha no meio não dropa nem commita, e não deixa arquivo pela metade
+  5. notifications: DELETE ... RETURNING e o arquivo juntos
+  6. paginação: quente primeiro, depois o arquivo; cursor (timestamp, id); bloco sumido ou
+     corrompido é pulado
+  7. rota: sem cursor, o mesmo JSON de antes; com cursor, a página
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import orjson
+import zstandard as zstd
+
+from app import arquivo as a
+from app.models import ArchiveBatch, ArchiveMessageBlock
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _mensagem(i, contato, ts):
+    return {"id": i, "wa_message_id": f"wamid.{i}", "contact_wa_id": contato, "channel_id": 1,
+            "direction": "inbound" if i % 2 else "outbound", "message_type": "text",
+            "content": f"Olá, mensagem {i} — sobre a pós 😊", "timestamp": ts, "status": "read",
+            "sent_by_ai": None, "created_at": ts, "nat_etapa": None, "template_name": None,
+            "error_code": None, "error_title": None, "error_details": None}
+
+
+class _Fluxo:
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def mappings(self):
+        return self
+
+    def __aiter__(self):
+        return self._gerar()
+
+    async def _gerar(self):
+        for linha in self.linhas:
+            yield linha
+
+
+class Sessao:
+    """Responde ao pg_inherits, ao to_regclass, ao stream da partição e ao DELETE RETURNING."""
+    def __init__(self, anexada=False, existe=True, linhas=(), quentes=(), blocos=()):
+        self.anexada = anexada
+        self.existe = existe
+        self.linhas = list(linhas)
+        self.quentes = list(quentes)
+        self.blocos = list(blocos)
+        self.sqls = []
+        self.adicionados = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sqls.append(sql)
+        r = MagicMock()
+        if "pg_inherits" in sql:
+            r.scalar.return_value = 1 if self.anexada else None
+        elif "to_regclass" in sql:
+            r.scalar.return_value = self.existe
+        elif "RETURNING" in sql:
+            r.mappings.return_value.all.return_value = self.linhas
+        elif "archive_message_blocks" in sql:
+            r.scalars.return_value.all.return_value = self.blocos
+        elif "FROM messages" in sql:
+            r.mappings.return_value.all.return_value = self.quentes
+        return r
+
+    async def stream(self, stmt):
+        self.sqls.append(str(stmt))
+        return _Fluxo(self.linhas)
+
+    def add(self, obj):
+        self.adicionados.append(obj)
+
+    def add_all(self, objs):
+        self.adicionados.extend(objs)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        return False
+
+
+def _sessoes(*sessoes):
+    fila = iter(sessoes)
+    return patch.object(a, "async_session", lambda: next(fila))
+
+
+# ==========================================================================================
+
+def teste_1_corte():
+    print("1) corte e caminhos")
+    with patch.object(a, "ARQUIVO_MESES", 12):
+        check("12 meses: out/2026 mantém desde out/2025", a.corte(date(2026, 10, 19)) == date(2025, 10, 1))
+        check("virada de ano", a.corte(date(2026, 1, 5)) == date(2025, 1, 1))
+    with patch.object(a, "ARQUIVO_MESES", 0):
+        check("0 meses: só o corrente fica", a.corte(date(2026, 3, 31)) == date(2026, 3, 1))
+    check("caminho por tabela/ano/mês", a.caminho("messages", date(2025, 3, 1)) == "messages/2025/03.jsonl.zst")
+    check("próximo mês (dezembro)", a._proximo_mes(date(2025, 12, 1)) == date(2026, 1, 1))
+
+
+async def teste_2_arquivo():
+    print("2) arquivo")
+    mes = date(2025, 1, 1)
+    g = a._Gravacao("messages", mes)
+    check("grava em .parcial", os.path.exists(g.parcial) and not os.path.exists(g.final))
+    ts = datetime(2025, 1, 3, 9, 0)
+    p1 = await g.quadro([_mensagem(1, "5511", ts), _mensagem(2, "5511", ts)])
+    p2 = await g.quadro([_mensagem(3, "5522", ts)])
+    sha, tamanho = await g.concluir()
+    check("conferido vira o definitivo", os.path.exists(g.final) and not os.path.exists(g.parcial))
+    with open(g.final, "rb") as f:
+        bruto = f.read()
+    check("sha256 e tamanho do arquivo", sha == hashlib.sha256(bruto).hexdigest() and tamanho == len(bruto))
+    check("offsets encadeados", p1 == (0, p1[1]) and p2 == (p1[1], tamanho - p1[1]))
+    with zstd.ZstdDecompressor().stream_reader(open(g.final, "rb"), read_across_frames=True) as leitor:
+        linhas = leitor.read().splitlines()
+    check("zstd comum lê os quadros em sequência", [orjson.loads(l)["id"] for l in linhas] == [1, 2, 3])
+    quadro = a._ler_quadro(g.final, *p2)
+    check("um quadro sozinho, por seek", [m["id"] for m in quadro] == [3])
+    check("data no formato do isoformat()", quadro[0]["timestamp"] == ts.isoformat())
+    try:
+        a._conferir(g.final, 4)
+        check("contagem errada: recusado", False)
+    except ValueError:
+        check("contagem errada: recusado", True)
+
+    g = a._Gravacao("notifications", mes)
+    await g.quadro([{"id": 1}])
+    g.descartar()
+    check("descartar apaga o .parcial", not os.path.exists(g.parcial))
+
+
+async def teste_3_messages():
+    print("3) messages")
+    mes = date(2025, 2, 1)
+    base = datetime(2025, 2, 10, 8, 0)
+    linhas = [_mensagem(i, c, base + timedelta(minutes=i)) for i, c in
+              ((1, "5511"), (2, "5511"), (5, "5511"), (3, "5522"), (4, "5533"), (6, "5533"))]
+    desanexar, dados, registro = Sessao(anexada=True), Sessao(linhas=linhas), Sessao()
+    chamadas = []
+
+    async def desanexar_falso(db, ano, m):
+        chamadas.append((ano, m))
+
+    antes = a.linhas_arquivadas.valor(tabela="messages")
+    with _sessoes(desanexar, dados, registro), patch.object(a.particoes, "desanexar", desanexar_falso):
+        n = await a.arquivar_messages(mes)
+    check("DETACH primeiro, numa transação própria", chamadas == [(2025, 2)] and desanexar.commits == 1)
+    check("lê a partição solta ordenada por contato",
+          any("FROM messages_p2025_02 ORDER BY contact_wa_id" in s for s in dados.sqls))
+    blocos = [o for o in registro.adicionados if isinstance(o, ArchiveMessageBlock)]
+    lote = [o for o in registro.adicionados if isinstance(o, ArchiveBatch)]
+    check("um bloco por contato", [(b.contact_wa_id, b.row_count) for b in blocos]
+          == [("5511", 3), ("5522", 1), ("5533", 2)])
+    arquivo = os.path.join(a.ARQUIVO_DIR, "messages/2025/02.jsonl.zst")
+    lidos = a._ler_quadro(arquivo, blocos[2].offset, blocos[2].size)
+    check("bloco aponta para o quadro certo", [m["id"] for m in lidos] == [4, 6])
+    check("first_at/last_at do bloco", blocos[0].first_at == linhas[0]["timestamp"]
+          and blocos[0].last_at == linhas[2]["timestamp"])
+    check("lote com linhas e sha256", len(lote) == 1 and lote[0].row_count == 6 == n
+          and lote[0].file_path == "messages/2025/02.jsonl.zst" and len(lote[0].sha256) == 64)
+    check("exportação só lê: nada gravado, nada commitado", not dados.adicionados and dados.commits == 0
+          and not any("DROP" in s for s in dados.sqls))
+    check("registro, DROP da partição e commit numa transação à parte",
+          registro.sqls == ["DROP TABLE messages_p2025_02"] and registro.commits == 1)
+    check("sem DELETE", not any("DELETE" in s for s in dados.sqls + registro.sqls))
+    check("métrica", a.linhas_arquivadas.valor(tabela="messages") == antes + 6)
+
+    with _sessoes(Sessao(anexada=False), Sessao(existe=False)):
+        check("sem partição do mês: None", await a.arquivar_messages(date(2024, 1, 1)) is None)
+
+
+async def teste_4_falha():
+    print("4) falha no meio")
+    mes = date(2025, 3, 1)
+    dados = Sessao(linhas=[_mensagem(1, "5511", datetime(2025, 3, 1, 10, 0))])
+
+    def disco_cheio(*a_, **k):
+        raise OSError(28, "No space left on device")
+
+    with _sessoes(Sessao(anexada=False), dados), patch.object(a, "_conferir", disco_cheio):
+        try:
+            await a.arquivar_messages(mes)
+            check("erro propagado", False)
+        except OSError:
+            check("erro propagado", True)
+    check("sem DROP e sem commit", not any("DROP" in s for s in dados.sqls) and dados.commits == 0)
+    final = os.path.join(a.ARQUIVO_DIR, "messages/2025/03.jsonl.zst")
+    check("nem arquivo nem .parcial", not os.path.exists(final) and not os.path.exists(final + ".parcial"))
+
+
+async def teste_5_notifications():
+    print("5) notifications")
+    mes = date(2025, 4, 1)
+    linhas = [{"id": i, "user_id": 1, "contact_wa_id": "5511", "type": "window_1h", "ref": None,
+               "title": "Janela", "body": None, "is_read": True,
+               "created_at": datetime(2025, 4, 30 - i, 12, 0)} for i in range(3)]
+    db = Sessao(linhas=linhas)
+    with _sessoes(db):
+        n = await a.arquivar_tabela("notifications", mes)
+    check("DELETE ... RETURNING do mês", "DELETE FROM notifications" in db.sqls[0] and "RETURNING" in db.sqls[0])
+    arquivo = os.path.join(a.ARQUIVO_DIR, "notifications/2025/04.jsonl.zst")
+    lidas = a._ler_quadro(arquivo, 0, os.path.getsize(arquivo))
+    check("arquivo com as 3, em ordem de created_at", [m["id"] for m in lidas] == [2, 1, 0])
+    check("lote e commit", n == 3 and db.commits == 1 and isinstance(db.adicionados[0], ArchiveBatch))
+    with _sessoes(Sessao(linhas=[])):
+        check("mês vazio: 0, sem arquivo", await a.arquivar_tabela("nat_button_events", mes) == 0
+              and not os.path.exists(os.path.join(a.ARQUIVO_DIR, "nat_button_events")))
+
+
+async def teste_6_paginacao():
+    print("6) paginação")
+    base = datetime(2025, 5, 1, 8, 0)
+    velhas = [_mensagem(i, "5511", base + timedelta(minutes=i)) for i in range(1, 6)]
+    with _sessoes(Sessao(), Sessao(linhas=velhas), Sessao()):
+        await a.arquivar_messages(date(2025, 5, 1))
+    bloco = ArchiveMessageBlock(contact_wa_id="5511", month=date(2025, 5, 1), offset=0,
+                                size=os.path.getsize(os.path.join(a.ARQUIVO_DIR, "messages/2025/05.jsonl.zst")),
+                                row_count=5, first_at=velhas[0]["timestamp"], last_at=velhas[-1]["timestamp"])
+    quentes = [_mensagem(i, "5511", datetime(2026, 10, 1, 9, 0) + timedelta(minutes=i)) for i in (12, 11, 10)]
+
+    db = Sessao(quentes=quentes[:2], blocos=[bloco])
+    pagina = await a.pagina_mensagens(db, "5511", limite=2)
+    check("página cheia no quente: não abre o arquivo",
+          [m["id"] for m in pagina] == [11, 12] and not any("archive" in s for s in db.sqls))
+
+    db = Sessao(quentes=quentes, blocos=[bloco])
+    pagina = await a.pagina_mensagens(db, "5511", limite=5)
+    check("continua pelo arquivo, em ordem cronológica", [m["id"] for m in pagina] == [4, 5, 10, 11, 12],
+          f"{[m['id'] for m in pagina]}")
+    check("mesmo formato nas duas origens", set(pagina[0]) == set(pagina[-1])
+          and pagina[0]["timestamp"] == velhas[3]["timestamp"].isoformat())
+
+    db = Sessao(quentes=[], blocos=[bloco])
+    cursor = velhas[3]
+    pagina = await a.pagina_mensagens(db, "5511", cursor["timestamp"], cursor["id"], limite=10)
+    check("cursor (timestamp, id) dentro do arquivo", [m["id"] for m in pagina] == [1, 2, 3])
+    hot_sql = next(s for s in db.sqls if "FROM messages" in s)
+    check("quente com poda e comparação de tupla", "messages.timestamp <=" in hot_sql
+          and "(messages.timestamp, messages.id) <" in hot_sql, hot_sql)
+
+    sumido = ArchiveMessageBlock(contact_wa_id="5511", month=date(2024, 1, 1), offset=0, size=10,
+                                 row_count=1, first_at=datetime(2024, 1, 1), last_at=datetime(2024, 1, 1))
+    antes = a.leituras_arquivo.valor(resultado="ausente")
+    db = Sessao(quentes=[], blocos=[bloco, sumido])
+    pagina = await a.pagina_mensagens(db, "5511", limite=10)
+    check("bloco sumido é pulado e contado", len(pagina) == 5
+          and a.leituras_arquivo.valor(resultado="ausente") == antes + 1)
+
+    truncado = ArchiveMessageBlock(contact_wa_id="5511", month=date(2025, 5, 1), offset=0,
+                                   size=bloco.size - 5, row_count=5, first_at=bloco.first_at,
+                                   last_at=bloco.last_at)
+    ruim = os.path.join(a.ARQUIVO_DIR, "messages/2024/02.jsonl.zst")
+    os.makedirs(os.path.dirname(ruim), exist_ok=True)
+    with open(ruim, "wb") as f:
+        f.write(zstd.ZstdCompressor().compress(b'{"id": 1, "sem fim\n'))
+    nao_json = ArchiveMessageBlock(contact_wa_id="5511", month=date(2024, 2, 1), offset=0,
+                                   size=os.path.getsize(ruim), row_count=1,
+                                   first_at=datetime(2024, 2, 1), last_at=datetime(2024, 2, 1))
+    antes = a.leituras_arquivo.valor(resultado="corrompido")
+    db = Sessao(quentes=[], blocos=[truncado, bloco, nao_json])
+    pagina = await a.pagina_mensagens(db, "5511", limite=10)
+    check("quadro truncado e JSON quebrado: pulados e contados, sem 500",
+          [m["id"] for m in pagina] == [1, 2, 3, 4, 5]
+          and a.leituras_arquivo.valor(resultado="corrompido") == antes + 2,
+          f"{[m['id'] for m in pagina]}")
+
+
+def teste_7_rota():
+    print("7) rota")
+    from fastapi.testclient import TestClient
+    from app.auth import get_current_user
+    from app.database import get_db
+    from app.main import app
+
+    linha = _mensagem(7, "5511", datetime(2025, 1, 31, 14, 5, 9))
+    db = Sessao(quentes=[linha])
+
+    async def dar_sessao():
+        yield db
+
+    async def usuario():
+        return SimpleNamespace(id=7, role="admin")
+
+    app.dependency_overrides.update({get_db: dar_sessao, get_current_user: usuario})
+    try:
+        cliente = TestClient(app)
+        r = cliente.get("/api/contacts/5511/messages")
+        check("sem cursor: mesmo JSON de antes", r.json() == [{
+            "id": 7, "wa_message_id": "wamid.7", "direction": "inbound", "type": "text",
+            "content": linha["content"], "timestamp": "2025-01-31T14:05:09", "status": "read",
+            "sent_by_ai": False, "channel_id": 1}], r.text[:200])
+        chamadas = []
+
+        async def pagina(db_, wa_id, antes, antes_id, limite):
+            chamadas.append((wa_id, antes, antes_id, limite))
+            return []
+
+        with patch.object(a, "pagina_mensagens", pagina):
+            cliente.get("/api/contacts/5511/messages?before=2025-01-31T14:05:09&before_id=7&limit=20")
+            cliente.get("/api/contacts/5511/messages?limit=5")
+        check("com cursor: pagina_mensagens", chamadas == [
+            ("5511", datetime(2025, 1, 31, 14, 5, 9), 7, 20), ("5511", None, None, 5)], f"{chamadas}")
+        check("limit acima de 500: 422", cliente.get("/api/contacts/5511/messages?limit=501").status_code == 422)
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("ARQUIVO FRIO — MESES VELHOS EM JSONL.ZST")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    with tempfile.TemporaryDirectory() as diretorio, patch.object(a, "ARQUIVO_DIR", diretorio):
+        teste_1_corte()
+        await teste_2_arquivo()
+        await teste_3_messages()
+        await teste_4_falha()
+        await teste_5_notifications()
+        await teste_6_paginacao()
+        await asyncio.to_thread(teste_7_rota)
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
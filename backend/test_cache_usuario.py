@@ -0,0 +1,257 @@
+"""Cache do usuário autenticado e revogação pela claim "tv" (ver app/auth.py).
+
+Rodar: cd backend && venv/bin/python test_cache_usuario.py
+
+NENHUMA CONEXÃO DE BANCO: a sessão é um dublê que conta os SELECTs e devolve o usuário que o
+teste mandar.
+
+  1. primeira chamada lê do banco; as seguintes, dentro do TTL, não
+  2. cada request recebe um User próprio, sem o hash da senha
+  3. TTL venceu: lê de novo; cache limitado a AUTH_CACHE_MAX (sai o menos usado)
+  4. inexistente ou inativo: 401, e nada guardado
+  5. claim "tv": diferente da versão do usuário = 401; token antigo sem "tv" vale como 0
+  6. desativar / trocar papel sobe a versão e invalida: o token velho cai no request seguinte
+  7. leitura que começou antes de uma invalidação não guarda o que leu
+  8. login emite a claim; contador de hit/miss
+"""
+import asyncio
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from app import auth
+from app import auth_routes
+from app.models import User
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class _Sessao:
+    """Devolve `usuario` em todo SELECT e conta quantos houve."""
+
+    def __init__(self, usuario=None):
+        self.usuario = usuario
+        self.selects = 0
+        self.commits = 0
+
+    async def execute(self, *a, **k):
+        self.selects += 1
+        return SimpleNamespace(scalar_one_or_none=lambda: self.usuario)
+
+    async def commit(self):
+        self.commits += 1
+
+
+def _usuario(**campos):
+    base = dict(id=7, name="Ana", email="ana@cenat", password_hash="$2b$hash", role="comercial",
+                is_active=True, created_at=None, token_version=0)
+    base.update(campos)
+    return User(**base)
+
+
+def _token(user_id=7, **claims):
+    return auth.create_access_token({"sub": str(user_id), "role": "comercial", **claims})
+
+
+async def _autenticar(token, db):
+    try:
+        return await auth.usuario_do_token(token, db)
+    except HTTPException as e:
+        return e
+
+
+def _limpar():
+    auth.invalidar_usuario()
+
+
+# ==========================================================================================
+
+async def teste_1_hit():
+    print("1) cache dentro do TTL")
+    _limpar()
+    db = _Sessao(_usuario())
+    token = _token(tv=0)
+    primeiro = await _autenticar(token, db)
+    for _ in range(5):
+        ultimo = await _autenticar(token, db)
+    check("um SELECT para seis requests", db.selects == 1, f"{db.selects}")
+    check("mesmo usuário", isinstance(ultimo, User) and ultimo.id == 7 and ultimo.role == "comercial"
+          and ultimo.name == "Ana")
+    check("primeira chamada também recebe o User", isinstance(primeiro, User) and primeiro.id == 7)
+
+
+async def teste_2_copia():
+    print("2) um User por request")
+    _limpar()
+    db = _Sessao(_usuario())
+    token = _token(tv=0)
+    a = await _autenticar(token, db)
+    b = await _autenticar(token, db)
+    a.name = "mexido por uma rota"
+    check("objetos diferentes", a is not b and a is not db.usuario)
+    check("mexer num não muda o próximo", (await _autenticar(token, db)).name == "Ana")
+    check("sem hash da senha em memória", b.password_hash is None)
+
+
+async def teste_3_ttl_e_limite():
+    print("3) TTL e limite")
+    _limpar()
+    db = _Sessao(_usuario())
+    agora = [1000.0]
+    with patch.object(auth.time, "monotonic", lambda: agora[0]):
+        await _autenticar(_token(tv=0), db)
+        agora[0] += auth.AUTH_CACHE_TTL_S - 0.1
+        await _autenticar(_token(tv=0), db)
+        check("dentro do TTL: sem SELECT", db.selects == 1)
+        agora[0] += 0.2
+        await _autenticar(_token(tv=0), db)
+        check("venceu: SELECT de novo", db.selects == 2)
+
+    _limpar()
+    with patch.object(auth, "AUTH_CACHE_MAX", 3):
+        for uid in range(1, 6):
+            await _autenticar(_token(uid, tv=0), _Sessao(_usuario(id=uid)))
+    check("no máximo AUTH_CACHE_MAX", len(auth._usuarios) == 3, f"{list(auth._usuarios)}")
+    check("saíram os mais antigos", list(auth._usuarios) == [3, 4, 5])
+
+
+async def teste_4_inexistente_inativo():
+    print("4) inexistente / inativo")
+    _limpar()
+    sumido = _Sessao(None)
+    r1 = await _autenticar(_token(tv=0), sumido)
+    r2 = await _autenticar(_token(tv=0), sumido)
+    check("inexistente: 401 e nada guardado", isinstance(r1, HTTPException) and r1.status_code == 401
+          and isinstance(r2, HTTPException) and sumido.selects == 2)
+    inativo = _Sessao(_usuario(is_active=False))
+    r = await _autenticar(_token(tv=0), inativo)
+    check("inativo: 401", isinstance(r, HTTPException) and r.status_code == 401)
+    check("cache vazio", not auth._usuarios)
+    lixo = await _autenticar("nao-e-jwt", _Sessao(_usuario()))
+    check("token inválido: 401 antes do cache", isinstance(lixo, HTTPException) and lixo.status_code == 401)
+
+
+async def teste_5_claim():
+    print("5) claim tv")
+    _limpar()
+    db = _Sessao(_usuario(token_version=2))
+    velho = await _autenticar(_token(tv=1), db)
+    check("tv antigo: 401", isinstance(velho, HTTPException) and velho.status_code == 401
+          and "revogada" in velho.detail)
+    atual = await _autenticar(_token(tv=2), db)
+    check("tv atual: passa, e do cache", isinstance(atual, User) and db.selects == 1, f"{db.selects}")
+    _limpar()
+    db = _Sessao(_usuario(token_version=0))
+    sem = await _autenticar(_token(), db)
+    check("token sem tv vale como 0", isinstance(sem, User))
+    db.usuario = _usuario(token_version=1)
+    _limpar()
+    check("...até a primeira revogação", isinstance(await _autenticar(_token(), db), HTTPException))
+
+
+async def teste_6_revogacao():
+    print("6) desativar / trocar papel")
+    admin = SimpleNamespace(id=1, role="admin")
+
+    _limpar()
+    ana = _usuario()
+    db = _Sessao(ana)
+    token = _token(tv=0)
+    await _autenticar(token, db)
+    await auth_routes.update_user(7, auth_routes.UpdateUserRequest(is_active=False), db, admin)
+    check("desativar sobe a versão", ana.token_version == 1 and db.commits == 1)
+    check("e tira do cache", 7 not in auth._usuarios)
+    r = await _autenticar(token, db)
+    check("token velho cai no request seguinte", isinstance(r, HTTPException) and r.status_code == 401)
+
+    _limpar()
+    bia = _usuario(id=8, name="Bia")
+    db = _Sessao(bia)
+    token = _token(8, tv=0)
+    await _autenticar(token, db)
+    await auth_routes.update_user(8, auth_routes.UpdateUserRequest(role="admin"), db, admin)
+    r = await _autenticar(token, db)
+    check("trocar papel revoga", bia.token_version == 1 and isinstance(r, HTTPException))
+    check("com o token novo, entra como admin",
+          (await _autenticar(_token(8, tv=1), db)).role == "admin")
+
+    _limpar()
+    caio = _usuario(id=9, name="Caio")
+    db = _Sessao(caio)
+    await _autenticar(_token(9, tv=0), db)
+    await auth_routes.update_user(9, auth_routes.UpdateUserRequest(name="Caio S."), db, admin)
+    novo = await _autenticar(_token(9, tv=0), db)
+    check("só renomear: não revoga, mas o nome novo aparece já",
+          caio.token_version == 0 and isinstance(novo, User) and novo.name == "Caio S.")
+
+
+async def teste_7_corrida():
+    print("7) leitura contemporânea a uma invalidação")
+    _limpar()
+
+    class SessaoLenta(_Sessao):
+        async def execute(self, *a, **k):
+            resultado = await super().execute(*a, **k)
+            auth.invalidar_usuario(7)       # a mudança commitou enquanto o SELECT voltava
+            return resultado
+
+    db = SessaoLenta(_usuario())
+    r = await _autenticar(_token(tv=0), db)
+    check("responde com o que leu", isinstance(r, User))
+    check("mas não guarda", 7 not in auth._usuarios)
+
+
+async def teste_8_login_e_metricas():
+    print("8) login e métricas")
+    _limpar()
+    senha = auth.hash_password("segredo")
+    db = _Sessao(_usuario(password_hash=senha, token_version=4))
+    resposta = await auth_routes.login(auth_routes.LoginRequest(email="ana@cenat", password="segredo"), db)
+    claims = auth.jwt.decode(resposta["access_token"], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    check("login emite tv", claims.get("tv") == 4, f"{claims}")
+
+    _limpar()
+    hit, miss = auth.consultas_usuario.valor(resultado="hit"), auth.consultas_usuario.valor(resultado="miss")
+    db = _Sessao(_usuario())
+    for _ in range(3):
+        await _autenticar(_token(tv=0), db)
+    check("1 miss, 2 hits", auth.consultas_usuario.valor(resultado="miss") == miss + 1
+          and auth.consultas_usuario.valor(resultado="hit") == hit + 2)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("CACHE DO USUÁRIO AUTENTICADO E REVOGAÇÃO POR VERSÃO DO TOKEN")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    await teste_1_hit()
+    await teste_2_copia()
+    await teste_3_ttl_e_limite()
+    await teste_4_inexistente_inativo()
+    await teste_5_claim()
+    await teste_6_revogacao()
+    await teste_7_corrida()
+    await teste_8_login_e_metricas()
+    _limpar()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,225 @@
+"""Trabalho de CPU fora do event loop, e o vigia que aponta quem trava o loop.
+
+Rodar: cd backend && venv/bin/python test_cpu_executor.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: a sessão é um dublê e o bcrypt roda de verdade
+(é o ponto: medir que ele não segura o loop).
+
+  1. executar: roda em thread do pool "cpu", devolve o resultado, repassa a exceção, mede
+  2. o loop continua andando enquanto o bcrypt do login roda
+  3. login e cadastro passam pelo pool; senha errada continua 401
+  4. search_knowledge: pontuação no pool, mesmo resultado e mesma ordem de antes
+  5. vigia: trava de verdade vira log COM a função culpada, contador e histograma
+"""
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from app import ai_engine
+from app import auth
+from app import auth_routes
+from app import cpu_executor as cpu
+from app.models import User
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class _Captura(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.mensagens = []
+
+    def emit(self, registro):
+        self.mensagens.append(registro.getMessage())
+
+
+def _espiar_executar(modulo, chamadas):
+    real = cpu.executar
+
+    async def espiao(fn, *a, **k):
+        chamadas.append(fn.__name__)
+        return await real(fn, *a, **k)
+    return patch.object(modulo, "executar", espiao)
+
+
+# ==========================================================================================
+
+async def teste_1_executar():
+    print("1) executar")
+    thread = await cpu.executar(lambda: threading.current_thread().name)
+    check("roda numa thread do pool", thread.startswith("cpu"), thread)
+    check("devolve o resultado", await cpu.executar(sum, [1, 2, 3]) == 6)
+
+    def quebra():
+        raise ValueError("x")
+
+    try:
+        await cpu.executar(quebra)
+        check("repassa a exceção", False)
+    except ValueError:
+        check("repassa a exceção", True)
+    antes = cpu.duracao_tarefa.contagem(tarefa="sum")
+    await cpu.executar(sum, [1])
+    check("mede por função", cpu.duracao_tarefa.contagem(tarefa="sum") == antes + 1)
+
+
+async def teste_2_loop_livre():
+    print("2) o loop anda durante o bcrypt")
+    hashed = auth.hash_password("segredo")
+    batidas = 0
+    parar = False
+
+    async def ticar():
+        nonlocal batidas
+        while not parar:
+            batidas += 1
+            await asyncio.sleep(0.005)
+
+    tarefa = asyncio.create_task(ticar())
+    inicio = time.perf_counter()
+    ok = await cpu.executar(auth.verify_password, "segredo", hashed)
+    duracao = time.perf_counter() - inicio
+    parar = True
+    await tarefa
+    esperado = duracao / 0.005
+    check("senha confere", ok)
+    check("o loop bateu durante o hash", batidas >= esperado * 0.3,
+          f"{batidas} batidas em {duracao * 1000:.0f} ms")
+
+
+class _Sessao:
+    def __init__(self, resultado=None):
+        self.resultado = resultado
+        self.adicionados = []
+
+    async def execute(self, *a, **k):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.resultado,
+                               scalars=lambda: SimpleNamespace(all=lambda: self.resultado or []))
+
+    def add(self, obj):
+        self.adicionados.append(obj)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        obj.id = 99
+
+
+async def teste_3_login():
+    print("3) login e cadastro")
+    auth.invalidar_usuario()
+    usuario = User(id=7, name="Ana", email="ana@cenat", password_hash=auth.hash_password("segredo"),
+                   role="comercial", is_active=True, token_version=0)
+    chamadas = []
+    with _espiar_executar(auth_routes, chamadas):
+        r = await auth_routes.login(auth_routes.LoginRequest(email="ana@cenat", password="segredo"),
+                                    _Sessao(usuario))
+        try:
+            await auth_routes.login(auth_routes.LoginRequest(email="ana@cenat", password="errada"),
+                                    _Sessao(usuario))
+            errada = None
+        except HTTPException as e:
+            errada = e.status_code
+        db = _Sessao(None)
+        await auth_routes.register(
+            auth_routes.RegisterRequest(name="Bia", email="bia@cenat", password="nova"),
+            db, SimpleNamespace(id=1, role="admin"))
+    check("login ok", "access_token" in r)
+    check("senha errada: 401", errada == 401)
+    check("verify e hash pelo pool", chamadas == ["verify_password", "verify_password", "hash_password"],
+          f"{chamadas}")
+    check("hash gravado confere", auth.verify_password("nova", db.adicionados[0].password_hash))
+
+
+async def teste_4_busca():
+    print("4) search_knowledge")
+    docs = [
+        SimpleNamespace(title="A", content="a", embedding=json.dumps([1.0, 0.0])),
+        SimpleNamespace(title="B", content="b", embedding=json.dumps([0.7, 0.7])),
+        SimpleNamespace(title="ruim", content="x", embedding="{não é json"),
+        SimpleNamespace(title="C", content="c", embedding=json.dumps([0.0, 1.0])),
+    ]
+    chamadas = []
+    with _espiar_executar(ai_engine, chamadas):
+        achados = await ai_engine.search_knowledge("q", 1, _Sessao(docs), top_k=2,
+                                                   query_embedding=[1.0, 0.1])
+    check("pontuação no pool", chamadas == ["_pontuar_documentos"], f"{chamadas}")
+    check("mesma ordem e corte", [d["title"] for d in achados] == ["A", "B"], f"{achados}")
+    check("embedding ilegível ignorado, como antes",
+          all(d["title"] != "ruim" for d in achados))
+    check("sem documentos: vazio, sem ir ao pool",
+          await ai_engine.search_knowledge("q", 1, _Sessao([]), query_embedding=[1.0]) == [])
+
+
+def _funcao_que_trava_o_loop():
+    time.sleep(0.35)
+
+
+async def teste_5_vigia():
+    print("5) vigia do loop")
+    captura = _Captura()
+    cpu.logger.addHandler(captura)
+    antes_travas = cpu.travamentos.valor()
+    antes_hist = cpu.atraso_loop.contagem()
+    with patch.object(cpu, "LOOP_LAG_INTERVALO_S", 0.02), \
+         patch.object(cpu, "LOOP_LAG_LIMIAR_MS", 100):
+        tarefa = asyncio.create_task(cpu.monitorar_loop())
+        await asyncio.sleep(0.1)
+        calmo = cpu.travamentos.valor()
+        _funcao_que_trava_o_loop()          # trava o loop DE PROPÓSITO
+        await asyncio.sleep(0.1)
+        tarefa.cancel()
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
+    cpu.logger.removeHandler(captura)
+    pilhas = [m for m in captura.mensagens if "parado há" in m]
+    check("calmo: nenhum aviso", calmo == antes_travas)
+    check("trava contada uma vez", cpu.travamentos.valor() == antes_travas + 1,
+          f"{cpu.travamentos.valor() - antes_travas}")
+    check("log aponta a função culpada", pilhas and "_funcao_que_trava_o_loop" in pilhas[0],
+          pilhas[0][:200] if pilhas else "sem log")
+    check("atraso total logado", any("atrasou" in m for m in captura.mensagens))
+    check("histograma alimentado", cpu.atraso_loop.contagem() > antes_hist)
+    check("batida limpa ao sair", cpu._batida is None)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("CPU FORA DO EVENT LOOP — POOL E VIGIA")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    await teste_1_executar()
+    await teste_2_loop_livre()
+    await teste_3_login()
+    await teste_4_busca()
+    await teste_5_vigia()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,272 @@
+"""Disponibilidade da agenda: um freebusy para a janela inteira, varredura e cache.
+
+Rodar: cd backend && venv/bin/python test_disponibilidade_agenda.py
+
+NADA SAI PARA A REDE: `executar` do google_calendar é trocado por um Google falso que
+responde freebusy a partir de uma lista de eventos em memória (filtrando pela janela pedida,
+como o Google faz) e conta as consultas. Cada consulta dorme LATENCIA — é o que torna a
+comparação do caso 8 uma medida do número de idas ao Google.
+
+  1. _mesclar: sobrepostos, encostados e fora de ordem viram intervalos disjuntos
+  2. _varrer == algoritmo antigo (slot x ocupado) em 300 dias aleatórios
+  3. get_available_dates: UMA consulta, com todas as agendas de CALENDARS e a janela inteira
+  4. get_available_slots logo depois: cache, nenhuma consulta nova
+  5. TTL vencido -> consulta de novo
+  6. create_event invalida; consulta em voo durante a invalidação não repõe o cache velho
+  7. /book confere direto no Google (sem cache) e recusa horário já ocupado
+  8. horário em UTC ("Z") convertido para SP; comparação de tempo com o dia a dia antigo
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from app import calendar_routes as cr
+from app import google_calendar as gc
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+AGORA = datetime(2026, 10, 19, 9, 0)          # segunda-feira
+CAL = gc.CALENDARS["victoria"]["calendar_id"]
+LATENCIA = 0.02
+
+
+class GoogleFalso:
+    """freebusy/insert em memória. Eventos em horário de SP, devolvidos em UTC ('Z')."""
+
+    def __init__(self, eventos=None):
+        self.eventos = {CAL: list(eventos or [])}
+        self.consultas = []
+        self.inseridos = []
+        self.antes_de_responder = None
+
+    async def executar(self, fn, *args, timeout=None, **kwargs):
+        await asyncio.sleep(LATENCIA)
+        if fn is gc._consultar_freebusy:
+            body = args[0]
+            self.consultas.append(body)
+            if self.antes_de_responder:
+                self.antes_de_responder()
+            ini, fim = gc._para_sp(body["timeMin"]), gc._para_sp(body["timeMax"])
+            utc = lambda d: (d + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            return {"calendars": {
+                item["id"]: {"busy": [{"start": utc(a), "end": utc(b)}
+                                      for a, b in self.eventos.get(item["id"], [])
+                                      if a < fim and b > ini]}
+                for item in body["items"]}}
+        if fn is gc._inserir_evento:
+            calendar_id, evento = args
+            a = datetime.fromisoformat(evento["start"]["dateTime"])
+            b = datetime.fromisoformat(evento["end"]["dateTime"])
+            self.eventos.setdefault(calendar_id, []).append((a, b))
+            self.inseridos.append((a, b))
+            return {"htmlLink": "https://cal/e"}
+        raise AssertionError(fn)
+
+    def patch(self):
+        return patch.object(gc, "executar", new=self.executar)
+
+
+def _antigo(busy: list[dict], dia: date, duration_min=30) -> list[dict]:
+    """get_available_slots como era: cada slot contra cada ocupado, reparseando."""
+    slots = []
+    current = datetime.combine(dia, datetime.min.time()).replace(hour=8)
+    end_of_day = current.replace(hour=18)
+    while current + timedelta(minutes=duration_min) <= end_of_day:
+        slot_end = current + timedelta(minutes=duration_min)
+        is_free = True
+        for b in busy:
+            busy_start = datetime.fromisoformat(b["start"].replace("Z", "+00:00")).replace(tzinfo=None) + timedelta(hours=-3)
+            busy_end = datetime.fromisoformat(b["end"].replace("Z", "+00:00")).replace(tzinfo=None) + timedelta(hours=-3)
+            if current < busy_end and slot_end > busy_start:
+                is_free = False
+                break
+        if is_free:
+            slots.append({"start": current.strftime("%H:%M"), "end": slot_end.strftime("%H:%M")})
+        current += timedelta(minutes=duration_min)
+    return slots
+
+
+def _eventos_aleatorios(rng, dia, n):
+    eventos = []
+    for _ in range(n):
+        a = datetime.combine(dia, datetime.min.time()) + timedelta(minutes=rng.randrange(6 * 60, 20 * 60, 5))
+        eventos.append((a, a + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 240]))))
+    return eventos
+
+
+# ==========================================================================================
+# 1-2: peças puras
+# ==========================================================================================
+
+def teste_1_mesclar():
+    print("\n1) _mesclar")
+    h = lambda x: datetime(2026, 10, 20, int(x), int(x % 1 * 60))
+    r = gc._mesclar([(h(11), h(12)), (h(9), h(10)), (h(9.5), h(11)), (h(14), h(15)), (h(14.25), h(14.5))])
+    check("sobrepostos e encostados fundidos, em ordem",
+          r == [(h(9), h(12)), (h(14), h(15))], f"{r}")
+
+
+def teste_2_varredura():
+    print("\n2) _varrer == algoritmo antigo")
+    rng = random.Random(7)
+    divergencias = 0
+    for k in range(300):
+        dia = date(2026, 10, 20) + timedelta(days=k)
+        eventos = _eventos_aleatorios(rng, dia, rng.randrange(0, 12))
+        busy = [{"start": (a + timedelta(hours=3)).isoformat() + "Z",
+                 "end": (b + timedelta(hours=3)).isoformat() + "Z"} for a, b in eventos]
+        duracao = rng.choice([15, 30, 60])
+        if gc._varrer(gc._mesclar(eventos), dia, duracao) != _antigo(busy, dia, duracao):
+            divergencias += 1
+    check("mesmos slots em 300 dias aleatórios", divergencias == 0, f"{divergencias} divergências")
+
+
+# ==========================================================================================
+# 3-7: consultas e cache
+# ==========================================================================================
+
+async def teste_3_a_5():
+    print("\n3) get_available_dates")
+    gc.invalidar_disponibilidade()
+    g = GoogleFalso([(datetime(2026, 10, 21, 8), datetime(2026, 10, 21, 18))])   # quarta cheia
+    with g.patch():
+        datas = await gc.get_available_dates(CAL, days_ahead=5, agora=AGORA)
+    check("uma consulta só", len(g.consultas) == 1, f"{len(g.consultas)}")
+    body = g.consultas[0]
+    check("todas as agendas de CALENDARS na mesma consulta",
+          {i["id"] for i in body["items"]} == {c["calendar_id"] for c in gc.CALENDARS.values()})
+    check("janela de amanhã até o último dia candidato",
+          body["timeMin"].startswith("2026-10-20T08:00") and body["timeMax"].startswith("2026-10-30T18:00"),
+          f"{body['timeMin']} .. {body['timeMax']}")
+    check("5 dias úteis, pulando a quarta lotada e o fim de semana",
+          [d["date"] for d in datas] == ["2026-10-20", "2026-10-22", "2026-10-23",
+                                         "2026-10-26", "2026-10-27"], f"{[d['date'] for d in datas]}")
+
+    print("\n4) slots de um dia logo depois")
+    with g.patch():
+        slots = await gc.get_available_slots(CAL, "2026-10-22")
+    check("servido do cache", len(g.consultas) == 1 and len(slots) == 20, f"{len(g.consultas)}")
+
+    print("\n5) TTL")
+    relogio = SimpleNamespace(monotonic=lambda: time.monotonic() + gc.CACHE_TTL_SEGUNDOS + 1)
+    with g.patch(), patch.object(gc, "_time", new=relogio):
+        await gc.get_available_slots(CAL, "2026-10-22")
+    check("vencido -> consulta de novo", len(g.consultas) == 2)
+
+
+async def teste_6_invalidacao():
+    print("\n6) create_event invalida")
+    gc.invalidar_disponibilidade()
+    g = GoogleFalso()
+    with g.patch():
+        antes = await gc.get_available_slots(CAL, "2026-10-22")
+        await gc.create_event(CAL, "x", "y", datetime(2026, 10, 22, 10), datetime(2026, 10, 22, 11))
+        depois = await gc.get_available_slots(CAL, "2026-10-22")
+    check("novo evento some da disponibilidade na hora",
+          "10:00" in [s["start"] for s in antes] and "10:00" not in [s["start"] for s in depois]
+          and len(g.consultas) == 2)
+
+    # Consulta em voo: o evento é criado enquanto o Google responde a consulta antiga.
+    gc.invalidar_disponibilidade()
+    g = GoogleFalso()
+    g.antes_de_responder = lambda: (setattr(g, "antes_de_responder", None),
+                                    gc.invalidar_disponibilidade())
+    with g.patch():
+        await gc.get_available_slots(CAL, "2026-10-22")
+    check("resultado de antes da invalidação não entra no cache", gc._cache == {})
+
+
+async def teste_7_book():
+    print("\n7) /book")
+    gc.invalidar_disponibilidade()
+    g = GoogleFalso()
+    with g.patch():
+        await gc.get_available_dates(CAL, agora=AGORA)          # cache quente
+        # Evento criado direto no Google, depois do cache.
+        g.eventos[CAL].append((datetime(2026, 10, 22, 14), datetime(2026, 10, 22, 15)))
+        try:
+            await cr.book_appointment("victoria", "Ana", "+55", "TCC", "2026-10-22", "14:00")
+            recusou = False
+        except HTTPException as e:
+            recusou = e.status_code == 409
+        check("horário ocupado fora do cache recusado (409)", recusou)
+
+        r = await cr.book_appointment("victoria", "Ana", "+55", "TCC", "2026-10-22", "15:00")
+    check("horário livre agendado", r["success"] and g.inseridos == [
+        (datetime(2026, 10, 22, 15), datetime(2026, 10, 22, 15, 30))])
+    check("cache invalidado depois do /book", gc._cache == {})
+
+
+async def teste_8_fuso_e_tempo():
+    print("\n8) fuso e tempo")
+    check("13:00Z -> 10:00 em SP", gc._para_sp("2026-10-22T13:00:00Z") == datetime(2026, 10, 22, 10))
+    check("offset explícito respeitado",
+          gc._para_sp("2026-10-22T10:00:00-03:00") == datetime(2026, 10, 22, 10))
+
+    rng = random.Random(3)
+    eventos = [e for k in range(12) for e in _eventos_aleatorios(rng, date(2026, 10, 20) + timedelta(days=k), 6)]
+
+    g = GoogleFalso(eventos)
+    gc.invalidar_disponibilidade()
+    inicio = time.perf_counter()
+    with g.patch():
+        novo = await gc.get_available_dates(CAL, agora=AGORA)
+    t_novo = time.perf_counter() - inicio
+
+    # O jeito antigo: um get_available_slots (e um freebusy) por dia candidato.
+    g_antigo = GoogleFalso(eventos)
+    inicio = time.perf_counter()
+    antigo = []
+    with g_antigo.patch():
+        for dia in gc._dias_uteis(AGORA.date(), 5):
+            slots = await gc.get_available_slots(CAL, dia.isoformat(), usar_cache=False)
+            if slots:
+                antigo.append(dia.isoformat())
+            if len(antigo) >= 5:
+                break
+    t_antigo = time.perf_counter() - inicio
+    print(f"     dia a dia: {len(g_antigo.consultas)} consultas, {t_antigo * 1000:.0f} ms   "
+          f"janela única: {len(g.consultas)} consulta, {t_novo * 1000:.0f} ms")
+    check("mesmas datas", [d["date"] for d in novo] == antigo)
+    check("uma consulta em vez de uma por dia", len(g.consultas) == 1 < len(g_antigo.consultas))
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("DISPONIBILIDADE DA AGENDA")
+    print("Nenhuma chamada de rede. Google Calendar substituído por um falso em memória.")
+    print("=" * 90)
+
+    teste_1_mesclar()
+    teste_2_varredura()
+    await teste_3_a_5()
+    await teste_6_invalidacao()
+    await teste_7_book()
+    await teste_8_fuso_e_tempo()
+    gc.invalidar_disponibilidade()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,362 @@
+"""Upload resumível ao Drive (google_drive.enviar_gravacao) + fila do drive_uploader.
+
+Rodar: cd backend && venv/bin/python test_drive_uploader.py
+
+NADA SAI PARA A REDE: o Drive é o HttpMockSequence do próprio googleapiclient, com o cliente
+montado a partir do documento de discovery que vem no pacote (sem rede). Isso exercita o
+protocolo resumível DE VERDADE — abertura de sessão, PUT por pedaço com Content-Range, 308
+com Range, consulta de estado na retomada — e não um MagicMock que concorda com tudo. A fila
+usa os mesmos dublês de test_transcricao_worker.py.
+
+  1. 10 MB em pedaços de 4 MB: 1 POST de sessão + 3 PUTs, progresso reportado por pedaço
+  2. retomada com uri salvo: consulta o Drive, continua do byte confirmado, sem novo POST;
+     sessão que já tinha terminado não reenvia nada; sessão expirada sobe HttpError 404
+  3. cache de pastas: uma busca por pasta, mesmo com duas threads pedindo ao mesmo tempo
+  4. worker: link gravado, status done, sessão limpa; progresso persistido a cada pedaço
+  5. sessão expirada (404) -> pending com uri limpo; última tentativa -> error;
+     gravação sumida -> error direto
+  6. _reivindicar usa FOR UPDATE SKIP LOCKED e leva o uri salvo no snapshot
+  7. webhook de gravação só enfileira com DRIVE_UPLOAD_ENABLED
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMockSequence
+from sqlalchemy.dialects import postgresql
+
+from app import drive_uploader as du
+from app import google_drive as gd
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+AGORA = datetime(2026, 10, 19, 14, 0, 0)
+DIR = tempfile.mkdtemp(prefix="drive_teste_")
+MB = 1024 * 1024
+TAMANHO = 10 * MB
+SESSAO = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&upload_id=abc"
+
+
+def _gravacao(nome="CA1.mp3", tamanho=TAMANHO):
+    caminho = os.path.join(DIR, nome)
+    with open(caminho, "wb") as f:
+        f.write(os.urandom(tamanho))
+    return caminho
+
+
+def _drive_falso(respostas):
+    """Cliente real do Drive v3 sobre um HttpMockSequence."""
+    http = HttpMockSequence(respostas)
+    return build("drive", "v3", http=http, static_discovery=True), http
+
+
+def _patches_drive(servico, http):
+    return (patch.object(gd, "get_drive_service", return_value=servico),
+            patch.object(gd, "http_autorizado", return_value=http),
+            patch.object(gd, "get_root_folder_id", return_value="raiz"),
+            patch.object(gd, "get_or_create_folder", return_value="pasta"))
+
+
+FIM = ({"status": "200"}, '{"id": "f1", "webViewLink": "https://drive/f1"}')
+PERMISSAO = ({"status": "200"}, "{}")
+
+
+# ==========================================================================================
+# 1-3: google_drive
+# ==========================================================================================
+
+async def teste_1_upload_em_pedacos():
+    print("\n1) upload resumível em pedaços")
+    caminho = _gravacao()
+    servico, http = _drive_falso([
+        ({"status": "200", "location": SESSAO}, ""),
+        ({"status": "308", "range": f"bytes=0-{4 * MB - 1}"}, ""),
+        ({"status": "308", "range": f"bytes=0-{8 * MB - 1}"}, ""),
+        FIM, PERMISSAO,
+    ])
+    progresso = []
+
+    async def ao_avancar(uri, enviados):
+        progresso.append((uri, enviados))
+
+    p1, p2, p3, p4 = _patches_drive(servico, http)
+    with p1, p2, p3, p4:
+        link = await gd.enviar_gravacao(caminho, "x.mp3", "Geral", ao_avancar=ao_avancar)
+
+    reqs = http.request_sequence
+    check("link devolvido", link == "https://drive/f1")
+    check("abre sessão resumível com POST",
+          reqs[0][1] == "POST" and "uploadType=resumable" in reqs[0][0])
+    faixas = [r[3].get("Content-Range") for r in reqs[1:4]]
+    check("3 PUTs de até 4 MB, na ordem",
+          faixas == [f"bytes 0-{4 * MB - 1}/{TAMANHO}", f"bytes {4 * MB}-{8 * MB - 1}/{TAMANHO}",
+                     f"bytes {8 * MB}-{TAMANHO - 1}/{TAMANHO}"], f"{faixas}")
+    check("progresso reportado depois de cada pedaço confirmado",
+          progresso == [(SESSAO, 4 * MB), (SESSAO, 8 * MB)], f"{progresso}")
+    check("permissão de leitura por link", reqs[4][1] == "POST" and "permissions" in reqs[4][0])
+
+
+async def teste_2_retomada():
+    print("\n2) retomada com uri salvo")
+    caminho = _gravacao()
+    servico, http = _drive_falso([
+        ({"status": "308", "range": f"bytes=0-{8 * MB - 1}"}, ""),   # "já tenho 8 MB"
+        FIM, PERMISSAO,
+    ])
+    p1, p2, p3, p4 = _patches_drive(servico, http)
+    with p1, p2, p3, p4:
+        link = await gd.enviar_gravacao(caminho, "x.mp3", "Geral", uri=SESSAO)
+    reqs = http.request_sequence
+    check("primeiro pede o estado da sessão (bytes */total)",
+          reqs[0][0] == SESSAO and reqs[0][3].get("Content-Range") == f"bytes */{TAMANHO}",
+          f"{reqs[0][3]}")
+    check("continua do byte 8 MB, sem abrir sessão nova",
+          reqs[1][3].get("Content-Range") == f"bytes {8 * MB}-{TAMANHO - 1}/{TAMANHO}"
+          and not any(r[1] == "POST" and "uploadType" in r[0] for r in reqs), f"{reqs[1][3]}")
+    check("concluído", link == "https://drive/f1")
+
+    servico, http = _drive_falso([FIM, PERMISSAO])                  # "já tenho tudo"
+    p1, p2, p3, p4 = _patches_drive(servico, http)
+    with p1, p2, p3, p4:
+        link = await gd.enviar_gravacao(caminho, "x.mp3", "Geral", uri=SESSAO)
+    reqs = http.request_sequence
+    check("sessão já concluída: nenhum pedaço reenviado",
+          link == "https://drive/f1" and len(reqs) == 2 and "permissions" in reqs[1][0],
+          f"{[(r[1], r[0][-30:]) for r in reqs]}")
+
+    servico, http = _drive_falso([({"status": "404"}, '{"error": {"code": 404}}')])
+    p1, p2, p3, p4 = _patches_drive(servico, http)
+    try:
+        with p1, p2, p3, p4:
+            await gd.enviar_gravacao(caminho, "x.mp3", "Geral", uri=SESSAO)
+        erro = None
+    except Exception as e:
+        erro = e
+    check("sessão expirada: HttpError 404, que o worker reconhece",
+          erro is not None and du._sessao_expirada(erro), repr(erro))
+
+
+def teste_3_cache_de_pastas():
+    print("\n3) cache de pastas")
+    buscas = []
+
+    def buscar(nome, pai=None):
+        buscas.append((nome, pai))
+        time.sleep(0.05)                   # alarga a janela da corrida
+        return f"id-{nome}"
+
+    gd._pastas.clear()
+    with patch.object(gd, "_buscar_ou_criar_pasta", side_effect=buscar):
+        ids = []
+        threads = [threading.Thread(target=lambda: ids.append(gd.get_or_create_folder("Geral", "raiz")))
+                   for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ids.append(gd.get_or_create_folder("Geral", "raiz"))
+        gd.get_or_create_folder("Victória", "raiz")
+    check("uma busca por pasta, mesmo em corrida", buscas == [("Geral", "raiz"), ("Victória", "raiz")],
+          f"{buscas}")
+    check("todos recebem o mesmo id", set(ids) == {"id-Geral"})
+    gd._pastas.clear()
+
+
+# ==========================================================================================
+# 4-6: drive_uploader
+# ==========================================================================================
+
+class SessaoFalsa:
+    def __init__(self, resposta=None):
+        self.statements = []
+        self.commits = 0
+        self._resposta = resposta
+
+    async def execute(self, stmt, *a, **kw):
+        self.statements.append(stmt)
+        r = MagicMock()
+        r.scalar_one_or_none.return_value = self._resposta
+        return r
+
+    async def commit(self):
+        self.commits += 1
+
+
+def fabrica_de_sessao(sessao):
+    class CM:
+        async def __aenter__(self):
+            return sessao
+
+        async def __aexit__(self, *a):
+            return False
+    return lambda: CM()
+
+
+class FilaFalsa:
+    def __init__(self, trabalhos):
+        self.trabalhos = list(trabalhos)
+        self.gravados = {}
+        self.historico = []
+
+    async def reivindicar(self, db, corte):
+        return self.trabalhos.pop(0) if self.trabalhos else None
+
+    async def gravar(self, call_id, **valores):
+        self.historico.append(dict(valores))
+        self.gravados.setdefault(call_id, {}).update(valores)
+
+
+def _trabalho(i, attempts=1, caminho=None, uri=None):
+    return {"id": i, "local_recording_path": caminho or _gravacao(f"CA{i}.mp3", 10),
+            "from_number": "+5583", "to_number": "+5511", "duration": 125, "user_name": None,
+            "created_at": AGORA, "uri": uri, "attempts": attempts}
+
+
+async def _rodar(fila, enviar):
+    with patch.object(du, "_reivindicar", new=fila.reivindicar), \
+         patch.object(du, "_gravar", new=fila.gravar), \
+         patch.object(du, "async_session", new=fabrica_de_sessao(SessaoFalsa())), \
+         patch.object(gd, "enviar_gravacao", new=enviar):
+        return await du.processar_fila(agora=AGORA, concorrencia=2)
+
+
+class HttpErrorFalso(Exception):
+    def __init__(self, status):
+        super().__init__(f"HttpError {status}")
+        self.resp = SimpleNamespace(status=status)
+
+
+async def teste_4_worker_feliz():
+    print("\n4) worker: caminho feliz")
+
+    async def enviar(caminho, nome, pasta, *, uri=None, ao_avancar=None):
+        await ao_avancar(SESSAO, 4 * MB)
+        await ao_avancar(SESSAO, 8 * MB)
+        enviar.args = (nome, pasta)
+        return "https://drive/f1"
+
+    fila = FilaFalsa([_trabalho(1)])
+    resumo = await _rodar(fila, enviar)
+    g = fila.gravados[1]
+    check("done com link gravado", resumo == {"done": 1} and g["drive_file_url"] == "https://drive/f1"
+          and g["drive_upload_status"] == "done", f"{resumo}")
+    check("sessão limpa ao concluir", g["drive_upload_uri"] is None)
+    check("progresso persistido a cada pedaço",
+          [h.get("drive_upload_progress") for h in fila.historico[:2]] == [4 * MB, 8 * MB])
+    check("nome pela hora da ligação, pasta Geral sem consultora",
+          enviar.args == ("2026-10-19_1400_+5583_para_+5511_2m05s.mp3", "Geral"), f"{enviar.args}")
+
+
+async def teste_5_falhas():
+    print("\n5) falhas")
+    fila = FilaFalsa([_trabalho(1, attempts=1, uri=SESSAO)])
+    resumo = await _rodar(fila, AsyncMock(side_effect=HttpErrorFalso(404)))
+    g = fila.gravados[1]
+    check("sessão expirada -> pending, uri limpo, run_at empurrado",
+          resumo == {"pending": 1} and g["drive_upload_uri"] is None
+          and g["drive_upload_run_at"] == AGORA + timedelta(seconds=du.ATRASO_RETENTATIVA_SEGUNDOS),
+          f"{g}")
+
+    fila = FilaFalsa([_trabalho(1, attempts=1, uri=SESSAO)])
+    await _rodar(fila, AsyncMock(side_effect=TimeoutError("pedaço demorou")))
+    check("falha transitória mantém a sessão para retomar",
+          "drive_upload_uri" not in fila.gravados[1])
+
+    fila = FilaFalsa([_trabalho(1, attempts=du.MAX_TENTATIVAS)])
+    resumo = await _rodar(fila, AsyncMock(side_effect=HttpErrorFalso(500)))
+    check("última tentativa -> error", resumo == {"error": 1})
+
+    enviar = AsyncMock()
+    fila = FilaFalsa([_trabalho(1, caminho=os.path.join(DIR, "sumiu.mp3"))])
+    resumo = await _rodar(fila, enviar)
+    check("gravação sumida -> error sem chamar o Drive",
+          resumo == {"error": 1} and enviar.await_count == 0)
+
+
+async def teste_6_reivindicar():
+    print("\n6) _reivindicar")
+    call_log = SimpleNamespace(id=7, local_recording_path="/x.mp3", from_number="a", to_number="b",
+                               duration=30, user_name="Victória", created_at=AGORA,
+                               drive_upload_uri=SESSAO, drive_upload_attempts=2)
+    db = SessaoFalsa(resposta=call_log)
+    trabalho = await du._reivindicar(db, AGORA)
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    check("SELECT usa FOR UPDATE SKIP LOCKED", "FOR UPDATE SKIP LOCKED" in sql)
+    check("snapshot leva o uri salvo e a tentativa contada",
+          trabalho["uri"] == SESSAO and trabalho["attempts"] == 3, f"{trabalho}")
+    check("não commita", db.commits == 0)
+
+
+# ==========================================================================================
+# 7: webhook
+# ==========================================================================================
+
+async def teste_7_webhook():
+    print("\n7) webhook de gravação")
+    from app import database, twilio_routes
+    from app import recordings as rec
+
+    form = {"CallSid": "CA9", "RecordingSid": "RE9", "RecordingStatus": "completed",
+            "RecordingUrl": "https://api.twilio.com/Recordings/RE9"}
+    request = SimpleNamespace(form=AsyncMock(return_value=form))
+    for ativo in (False, True):
+        call_log = SimpleNamespace(call_sid="CA9", recording_sid=None, recording_url=None,
+                                   local_recording_path=None, transcription_status=None,
+                                   drive_upload_status=None)
+        du._acordar.clear()
+        with patch.object(database, "async_session", new=fabrica_de_sessao(SessaoFalsa(call_log))), \
+             patch.object(rec, "baixar_gravacao", new=AsyncMock(return_value=10)), \
+             patch.object(du, "UPLOAD_ATIVO", new=ativo):
+            await twilio_routes.recording_status_webhook(request)
+        if ativo:
+            check("ligado: enfileira e acorda o uploader",
+                  call_log.drive_upload_status == "pending" and du._acordar.is_set())
+        else:
+            check("desligado: não enfileira",
+                  call_log.drive_upload_status is None and not du._acordar.is_set())
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("UPLOAD RESUMÍVEL AO DRIVE + FILA")
+    print("Nada enviado. Nenhuma conexão de banco. Nenhuma chamada de rede.")
+    print("=" * 90)
+
+    try:
+        await teste_1_upload_em_pedacos()
+        await teste_2_retomada()
+        teste_3_cache_de_pastas()
+        await teste_4_worker_feliz()
+        await teste_5_falhas()
+        await teste_6_reivindicar()
+        await teste_7_webhook()
+    finally:
+        shutil.rmtree(DIR, ignore_errors=True)
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,348 @@
+"""Eventos em tempo real: do NOTIFY ao stream SSE de cada tela, filtrado por usuário.
+
+Rodar: cd backend && venv/bin/python test_eventos_tempo_real.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: o NOTIFY é o callback chamado à mão, como o asyncpg
+chamaria, e a conexão de LISTEN é um dublê. Que os triggers disparem no COMMIT é propriedade
+do Postgres; aqui se confere o que o código faz com o que chega.
+
+  1. quem vê o quê: admin tudo, SDR só os contatos dele, notificação só do dono
+  2. ao_notificar distribui às telas certas; payload ilegível não derruba nada
+  3. fila cheia vira UM resync, contado
+  4. escuta caiu/voltou: estado para todas as telas, e resync na volta
+  5. fluxo SSE: retry, estado, evento formatado; sair remove a assinatura; sessão que deixou
+     de valer encerra o stream
+  6. ticket + GET /api/eventos/stream: ticket de uso único, que não vale como token nem o
+     token como ticket; sessão do banco fechada antes do stream
+  7. a conexão de LISTEN do nat_scheduler escuta o canal e liga/desliga a escuta
+  8. migração: um trigger por tabela/evento, no canal que o código escuta
+"""
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import eventos as ev
+from app import metrics as m
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _drenar(assinatura):
+    itens = []
+    while not assinatura.fila.empty():
+        itens.append(assinatura.fila.get_nowait())
+    return itens
+
+
+def _limpar():
+    ev._assinaturas.clear()
+    ev._escuta_ativa = False
+    ev._gatilhos_ok = False
+
+
+MSG_DO_7 = {"tipo": "mensagem", "wa_id": "5511900000001", "id": 10, "canal": 1, "atribuido": 7}
+
+
+# ==========================================================================================
+
+def teste_1_visibilidade():
+    print("1) quem vê o quê")
+    admin = ev.Assinatura(usuario_id=1, admin=True)
+    sdr7 = ev.Assinatura(usuario_id=7, admin=False)
+    sdr8 = ev.Assinatura(usuario_id=8, admin=False)
+    check("mensagem: admin e o SDR do contato", ev.visivel(MSG_DO_7, admin)
+          and ev.visivel(MSG_DO_7, sdr7) and not ev.visivel(MSG_DO_7, sdr8))
+    sem_dono = dict(MSG_DO_7, atribuido=None)
+    check("contato sem SDR: só admin", ev.visivel(sem_dono, admin) and not ev.visivel(sem_dono, sdr7))
+    notif = {"tipo": "notificacao", "id": 3, "usuario": 7}
+    check("notificação: só o dono, nem o admin", ev.visivel(notif, sdr7)
+          and not ev.visivel(notif, admin) and not ev.visivel(notif, sdr8))
+    troca = {"tipo": "atribuicao", "wa_id": "5511", "atribuido": 8, "anterior": 7}
+    check("atribuição: quem perdeu e quem ganhou", ev.visivel(troca, sdr7) and ev.visivel(troca, sdr8)
+          and not ev.visivel(troca, ev.Assinatura(usuario_id=9, admin=False)))
+
+
+async def teste_2_ao_notificar():
+    print("2) ao_notificar")
+    _limpar()
+    admin, sdr7, sdr8 = ev.assinar(1, True), ev.assinar(7, False), ev.assinar(8, False)
+    for a in (admin, sdr7, sdr8):
+        _drenar(a)                           # o estado inicial
+    antes = ev.recebidos.valor(tipo="mensagem")
+    ev.ao_notificar(None, 123, ev.CANAL, json.dumps(MSG_DO_7))
+    ev.ao_notificar(None, 123, ev.CANAL, "{não é json")
+    ev.ao_notificar(None, 123, ev.CANAL, json.dumps({"sem": "tipo"}))
+    check("admin e SDR 7 recebem", _drenar(admin) == [MSG_DO_7] and _drenar(sdr7) == [MSG_DO_7])
+    check("SDR 8 não", _drenar(sdr8) == [])
+    check("contado por tipo", ev.recebidos.valor(tipo="mensagem") == antes + 1)
+    _limpar()
+
+
+async def teste_3_fila_cheia():
+    print("3) fila cheia")
+    _limpar()
+    with patch.object(ev, "EVENTOS_FILA", 5):
+        lenta = ev.assinar(1, True)
+    antes = ev.transbordos.valor()
+    for i in range(12):
+        ev.distribuir(dict(MSG_DO_7, id=i))
+    itens = _drenar(lenta)
+    check("fila limitada", len(itens) <= 5, f"{len(itens)}")
+    check("um resync no lugar dos deltas perdidos",
+          sum(e["tipo"] == ev.TIPO_RESYNC for e in itens) == 1, f"{[e['tipo'] for e in itens]}")
+    check("transbordo contado", ev.transbordos.valor() > antes)
+    check("gauge de conexões", "\neventos_conexoes 1\n" in m.exposicao())
+    _limpar()
+
+
+async def teste_4_escuta():
+    print("4) escuta caiu/voltou")
+    _limpar()
+    tela = ev.assinar(7, False)
+    check("a tela nasce sabendo que o tempo real está fora",
+          _drenar(tela) == [{"tipo": ev.TIPO_ESTADO, "tempo_real": False}])
+    ev.escuta(True)
+    check("voltou: estado e resync", [e["tipo"] for e in _drenar(tela)] == ["estado", "resync"])
+    ev.escuta(True)
+    check("repetido não reenvia", _drenar(tela) == [])
+    ev.escuta(False)
+    check("caiu: estado falso", _drenar(tela) == [{"tipo": ev.TIPO_ESTADO, "tempo_real": False}])
+    _limpar()
+
+
+async def teste_5_fluxo():
+    print("5) fluxo SSE")
+    _limpar()
+    ev._escuta_ativa = True
+    gerador = ev.fluxo(7, False)
+    primeiro = await gerador.__anext__()
+    estado = await gerador.__anext__()
+    ev.distribuir(MSG_DO_7)
+    mensagem = await gerador.__anext__()
+    check("retry primeiro", primeiro == "retry: 5000\n\n")
+    check("estado em SSE", estado.startswith("event: estado\n")
+          and json.loads(estado.split("data: ", 1)[1]) == {"tipo": "estado", "tempo_real": True})
+    check("evento com o tipo no `event:`", mensagem.startswith("event: mensagem\ndata: ")
+          and mensagem.endswith("\n\n") and json.loads(mensagem.split("data: ", 1)[1]) == MSG_DO_7)
+    with patch.object(ev, "PING_SEGUNDOS", 0.01):
+        ping = await gerador.__anext__()
+    check("ping quando nada acontece", ping == ": ping\n\n")
+    check("assinatura viva enquanto lê", len(ev._assinaturas) == 1)
+    await gerador.aclose()
+    check("sair remove a assinatura", len(ev._assinaturas) == 0)
+
+    valendo = [True]
+    conferidas = []
+
+    async def conferir():
+        conferidas.append(1)
+        return valendo[0]
+
+    with patch.object(ev, "PING_SEGUNDOS", 0.01):
+        gerador = ev.fluxo(7, False, conferir)
+        await gerador.__anext__()            # retry
+        await gerador.__anext__()            # estado
+        await asyncio.sleep(0.02)
+        ev.distribuir(MSG_DO_7)
+        entregue = await gerador.__anext__()
+        check("reconfere mesmo com evento chegando", conferidas and entregue.startswith(
+            "event: mensagem\n"), f"{len(conferidas)} conferências")
+        valendo[0] = False
+        await asyncio.sleep(0.02)
+        try:
+            await gerador.__anext__()
+            encerrou = False
+        except StopAsyncIteration:
+            encerrou = True
+    check("sessão que não vale mais encerra o stream", encerrou)
+    check("e remove a assinatura", len(ev._assinaturas) == 0)
+    _limpar()
+
+
+def teste_6_endpoint():
+    print("6) ticket e GET /api/eventos/stream")
+    from app import auth
+    from app import eventos_routes as rotas
+    from app import main as app_main
+
+    abertas = []
+
+    class Sessao:
+        async def __aenter__(self):
+            abertas.append(self)
+            self.aberta = True
+            return self
+
+        async def __aexit__(self, *a):
+            self.aberta = False
+            return False
+
+    usuario = SimpleNamespace(id=7, role="comercial", token_version=2)
+
+    async def da_sessao(user_id, versao, db):
+        if (user_id, versao) != (7, 2):
+            raise HTTPException(status_code=401, detail="Sessão revogada, faça login novamente")
+        return usuario
+
+    async def consumir(ticket):
+        with patch.object(auth, "usuario_da_sessao", da_sessao):
+            return await auth.usuario_do_ticket(ticket, None)
+
+    async def como_token(token):
+        with patch.object(auth, "usuario_da_sessao", da_sessao):
+            return await auth.usuario_do_token(token, None)
+
+    async def status(corrotina):
+        try:
+            await corrotina
+        except HTTPException as e:
+            return e.status_code
+        return 200
+
+    ticket = auth.criar_ticket_eventos(usuario)
+    check("ticket vale uma vez", asyncio.run(consumir(ticket)) is usuario)
+    check("a segunda é 401", asyncio.run(status(consumir(ticket))) == 401)
+    check("ticket não autentica a API", asyncio.run(status(como_token(
+        auth.criar_ticket_eventos(usuario)))) == 401)
+    sessao = auth.create_access_token({"sub": "7", "tv": 2})
+    check("token da sessão não abre o stream", asyncio.run(status(consumir(sessao))) == 401)
+    usuario.token_version = 3
+    check("ticket de sessão revogada: 401",
+          asyncio.run(status(consumir(auth.criar_ticket_eventos(SimpleNamespace(
+              id=7, token_version=2))))) == 200
+          and asyncio.run(status(consumir(auth.criar_ticket_eventos(SimpleNamespace(
+              id=7, token_version=1))))) == 401)
+    usuario.token_version = 2
+
+    cliente = TestClient(app_main.app)
+    check("ticket exige login", cliente.post("/api/eventos/ticket").status_code in (401, 403))
+    with patch.object(rotas, "async_session", Sessao):
+        r = cliente.get("/api/eventos/stream?ticket=lixo")
+    check("401 com ticket inválido", r.status_code == 401)
+    check("422 sem ticket",
+          cliente.get("/api/eventos/stream").status_code == 422)
+
+    async def aceitar(ticket, db):
+        return usuario
+
+    async def chamar():
+        with patch.object(rotas, "async_session", Sessao), \
+             patch.object(rotas, "usuario_do_ticket", aceitar):
+            return await rotas.stream_eventos(ticket="ok")
+
+    resposta = asyncio.run(chamar())
+    check("text/event-stream, sem cache nem buffer do nginx",
+          resposta.media_type == "text/event-stream"
+          and resposta.headers["cache-control"] == "no-cache"
+          and resposta.headers["x-accel-buffering"] == "no")
+    check("sessão do banco fechada antes do stream", abertas and not abertas[-1].aberta)
+    _limpar()
+
+
+async def teste_7_listen():
+    print("7) conexão de LISTEN do nat_scheduler")
+    from app import nat_scheduler as ns
+
+    _limpar()
+    canais, estados = [], []
+
+    class Conexao:
+        def add_termination_listener(self, cb):
+            self.cair = cb
+
+        async def add_listener(self, canal, cb):
+            canais.append((canal, cb))
+
+        async def fetchval(self, sql, nomes):
+            return len(nomes)
+
+        def is_closed(self):
+            return False
+
+        async def close(self):
+            pass
+
+    conexao = Conexao()
+    asyncpg_falso = SimpleNamespace(connect=AsyncMock(return_value=conexao))
+    escuta_real = ev.escuta
+
+    def espiar(ativa):
+        estados.append(ativa)
+        escuta_real(ativa)
+
+    with patch.dict(sys.modules, {"asyncpg": asyncpg_falso}), \
+         patch.object(ns.eventos, "escuta", espiar), \
+         patch.object(ns, "acordar", lambda: None), \
+         patch.object(ns, "INTERVALO_SEGUNDOS", 3600):
+        tarefa = asyncio.create_task(ns.escutar_agendamentos())
+        for _ in range(20):
+            await asyncio.sleep(0)
+        escutando = ev._escuta_ativa
+        conexao.cair(conexao)
+        for _ in range(20):
+            await asyncio.sleep(0)
+        tarefa.cancel()
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
+    check("escuta o canal dos eventos", (ev.CANAL, ev.ao_notificar) in canais,
+          f"{[c for c, _ in canais]}")
+    check("e o das versões das listagens", (ev.CANAL_VERSOES, ev.ao_notificar_tabela) in canais)
+    check("liga ao conectar e desliga quando cai", escutando and estados == [True, False],
+          f"{estados}")
+    _limpar()
+
+
+def teste_8_migracao():
+    print("8) migração")
+    import inspect
+    import migrate_eventos_tempo_real as mig
+
+    fonte = inspect.getsource(mig.migrate)
+    check("notifica no canal que o código escuta", f"pg_notify('{ev.CANAL}'" in fonte)
+    tabelas = {quando.rsplit(" ON ", 1)[1] for _, quando, _ in mig.GATILHOS}
+    check("messages, notifications e contacts", tabelas == {"messages", "notifications", "contacts"})
+    check("status e atribuição só quando mudam",
+          all("IS DISTINCT FROM" in cond for _, quando, cond in mig.GATILHOS if "UPDATE" in quando))
+    check("preview cortado (teto de 8000 bytes do NOTIFY)", "left(NEW.content, 140)" in fonte)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("EVENTOS EM TEMPO REAL — NOTIFY, BARRAMENTO E SSE")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    teste_1_visibilidade()
+    await teste_2_ao_notificar()
+    await teste_3_fila_cheia()
+    await teste_4_escuta()
+    await teste_5_fluxo()
+    await asyncio.to_thread(teste_6_endpoint)
+    await teste_7_listen()
+    teste_8_migracao()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
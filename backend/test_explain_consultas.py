@@ -0,0 +1,461 @@
+"""Planos das consultas quentes: nenhum Seq Scan onde não pode, o índice certo, dentro do orçamento.
+
+Rodar: cd backend && venv/bin/python test_explain_consultas.py
+Com banco: EXPLAIN_DATABASE_URL=postgresql+asyncpg://... venv/bin/python test_explain_consultas.py
+
+NADA É ENVIADO. Sem EXPLAIN_DATABASE_URL, NENHUMA CONEXÃO DE BANCO: roda a leitura dos planos
+(sobre planos de exemplo) e a migração contra um dublê, e avisa que a parte real foi pulada.
+
+Com EXPLAIN_DATABASE_URL (um Postgres DESCARTÁVEL — nunca o de produção): tudo acontece no
+schema explain_suite, criado no início e apagado no fim. A massa é a de gerar_massa.py (mesma
+forma da produção; EXPLAIN_ESCALA=1 → um décimo dos volumes de lá, 500 mil mensagens num ano,
+sempre com a mesma semente), que já deixa os índices de migrate_indices_compostos e o VACUUM
+ANALYZE; depois, para cada consulta de CONSULTAS, um EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) —
+o segundo, com o cache quente, como em produção.
+Falha se o plano:
+  * faz Seq Scan numa tabela fora de `seq_ok` (partições de messages contam como messages);
+  * não usa o índice esperado (índice de partição conta como o da mãe);
+  * passa de `orcamento_ms` × EXPLAIN_FOLGA (padrão 1; máquina lenta ou escala maior, suba).
+
+Sem Seq Scan não basta: sem idx_messages_contato_ts, a última mensagem do contato sai do índice
+de contact_wa_id + Sort — nada de Seq Scan, e cada contato lê todas as mensagens dele. Por isso
+o índice esperado.
+
+  1. leitura do plano: Seq Scans, índices usados, tempo e buffers
+  2. veredito: Seq Scan proibido/permitido, índice esperado (com o de partição), orçamento
+  3. cobertura: todo índice da migração tem consulta, toda consulta esperada tem índice
+  4. migração contra dublê: AUTOCOMMIT, ON ONLY + CONCURRENTLY + ATTACH, inválido refeito
+  5. banco real (EXPLAIN_DATABASE_URL), ou o aviso de que foi pulado
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import gerar_massa
+import migrate_indices_compostos as mig
+from app import particoes
+
+falhas = []
+
+SCHEMA = "explain_suite"
+ESCALA = float(os.getenv("EXPLAIN_ESCALA", "1"))
+FOLGA = float(os.getenv("EXPLAIN_FOLGA", "1"))
+
+SEMENTE = 42
+# Um décimo de gerar_massa.VOLUMES × ESCALA. As tabelas pequenas vêm infladas: com 200
+# agendamentos, Seq Scan É o plano certo, e a pergunta aqui é a de quando elas crescerem.
+MASSA = {"agendamentos": 40_000, "leads": 100_000, "notificacoes": 200_000}
+
+# Um relógio só para a massa e para as consultas, e em parâmetro, como as rotas e os jobs
+# passam (o `now` do Python, não o do banco).
+AGORA = datetime.now().replace(microsecond=0)
+HOJE = AGORA.replace(hour=0, minute=0, second=0)
+
+
+# Consultas com o formato das de produção (o SQL das rotas e dos jobs, não uma versão
+# "parecida"): se uma delas mudar, mude aqui junto. `params` que dependem da massa são uma
+# função do contato com a conversa mais longa (a cauda da distribuição de gerar_massa).
+CONSULTAS = {
+    "inbox do SDR (routes.list_contacts)": dict(
+        sql="""
+        SELECT c.wa_id, c.name, lm.content AS last_message, lm.timestamp AS last_message_time,
+               lm.direction, COALESCE(ur.unread, 0) AS unread
+        FROM contacts c
+        LEFT JOIN LATERAL (
+            SELECT content, timestamp, direction
+            FROM messages WHERE contact_wa_id = c.wa_id
+            ORDER BY timestamp DESC LIMIT 1
+        ) lm ON true
+        LEFT JOIN LATERAL (
+            SELECT COUNT(*) AS unread
+            FROM messages
+            WHERE contact_wa_id = c.wa_id AND direction = 'inbound' AND status = 'received'
+        ) ur ON true
+        WHERE c.assigned_to = :user_id
+        ORDER BY lm.timestamp DESC NULLS LAST""",
+        params={"user_id": 3},
+        indices=("idx_messages_contato_ts", "idx_messages_nao_lidas"),
+        orcamento_ms=400, seq_ok=("contacts",)),
+    "window_alerts_job (main.py)": dict(
+        sql="""
+        SELECT c.wa_id, c.name, c.assigned_to, lm.wa_message_id AS ref, lm.timestamp AS ts
+        FROM contacts c
+        JOIN LATERAL (
+            SELECT wa_message_id, timestamp, direction
+            FROM messages WHERE contact_wa_id = c.wa_id
+            ORDER BY timestamp DESC LIMIT 1
+        ) lm ON true
+        WHERE c.assigned_to IS NOT NULL
+          AND lm.direction = 'inbound'
+          AND lm.timestamp >= :cutoff""",
+        params={"cutoff": AGORA - timedelta(hours=24)},
+        indices=("idx_messages_contato_ts",),
+        orcamento_ms=3000, seq_ok=("contacts",)),
+    "dedup do alerta de janela (main.py)": dict(
+        sql="SELECT 1 FROM notifications WHERE contact_wa_id = :wa AND type = :t AND ref = :ref LIMIT 1",
+        params=lambda longa: {"wa": longa.wa_id, "t": "window_3h", "ref": f"wamid.sint.{longa.id}.0"},
+        indices=("idx_notifications_dedup",),
+        orcamento_ms=20, seq_ok=()),
+    "sino: 50 mais novas (routes.list_notifications)": dict(
+        sql="""
+        SELECT * FROM notifications WHERE user_id = :user_id
+        ORDER BY created_at DESC LIMIT 50""",
+        params={"user_id": 3},
+        indices=("idx_notifications_user_recentes",),
+        orcamento_ms=20, seq_ok=()),
+    "agendamentos vencidos (scheduled_messages_job)": dict(
+        sql="""
+        SELECT * FROM scheduled_messages
+        WHERE status = 'pending' AND scheduled_at <= :agora""",
+        params={"agora": AGORA},
+        indices=(),             # qualquer índice serve (ver migrate_indices_compostos.py)
+        orcamento_ms=20, seq_ok=()),
+    "leads da Exact (exact_routes.list_leads)": dict(
+        sql="SELECT * FROM exact_leads ORDER BY register_date DESC LIMIT :limit",
+        params={"limit": 100},
+        indices=("idx_exact_leads_register_date",),
+        orcamento_ms=20, seq_ok=()),
+    "dashboard: inbound de hoje (routes.get_dashboard)": dict(
+        sql="""
+        SELECT count(id) FROM messages
+        WHERE "timestamp" >= :hoje AND direction = 'inbound'""",
+        params={"hoje": HOJE},
+        indices=("idx_messages_direcao_ts",),
+        orcamento_ms=50, seq_ok=()),
+    "histórico da conversa longa (arquivo.pagina_mensagens)": dict(
+        sql="""
+        SELECT * FROM messages WHERE contact_wa_id = :wa
+        ORDER BY "timestamp" DESC, id DESC LIMIT 50""",
+        params=lambda longa: {"wa": longa.wa_id},
+        indices=("idx_messages_contato_ts",),
+        orcamento_ms=20, seq_ok=()),
+}
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+# ------------------------------------------------------------------------------------------
+# Leitura do plano (JSON do EXPLAIN)
+# ------------------------------------------------------------------------------------------
+
+def _nos(plano):
+    """Todos os nós do plano, em profundidade."""
+    if isinstance(plano, list):
+        for item in plano:
+            yield from _nos(item)
+    elif isinstance(plano, dict):
+        if "Node Type" in plano:
+            yield plano
+        for chave in ("Plan", "Plans"):
+            if chave in plano:
+                yield from _nos(plano[chave])
+
+
+def _tabela(relacao: str) -> str:
+    """Partição de messages conta como messages."""
+    if relacao.startswith(particoes.PREFIXO):
+        return "messages"
+    return relacao
+
+
+def _leu(no: dict) -> bool:
+    """O nó examinou alguma linha? Sem ANALYZE no plano, conta que sim.
+
+    O planejador varre a partição vazia (os meses à frente, a DEFAULT) em sequência — custo
+    zero, e não é regressão nenhuma.
+    """
+    if "Actual Rows" not in no:
+        return True
+    return no["Actual Rows"] + no.get("Rows Removed by Filter", 0) > 0
+
+
+def seq_scans(plano) -> set[str]:
+    return {_tabela(n["Relation Name"]) for n in _nos(plano) if n["Node Type"] == "Seq Scan" and _leu(n)}
+
+
+def indices_usados(plano, mae: dict | None = None) -> set[str]:
+    """Índices lidos; o de uma partição vira o da mãe (mae: {índice filho: índice da mãe})."""
+    mae = mae or {}
+    return {mae.get(n["Index Name"], n["Index Name"]) for n in _nos(plano) if "Index Name" in n}
+
+
+def tempo_ms(plano) -> float:
+    return float(plano[0]["Execution Time"])
+
+
+def buffers(plano) -> tuple[int, int]:
+    raiz = plano[0]["Plan"]
+    return raiz.get("Shared Hit Blocks", 0), raiz.get("Shared Read Blocks", 0)
+
+
+def problemas(consulta: dict, plano, mae: dict | None = None, folga: float = 1.0) -> list[str]:
+    """O que está errado no plano desta consulta; vazio se está bom."""
+    achados = []
+    proibidos = seq_scans(plano) - set(consulta["seq_ok"])
+    if proibidos:
+        achados.append(f"Seq Scan em {', '.join(sorted(proibidos))}")
+    faltando = set(consulta["indices"]) - indices_usados(plano, mae)
+    if faltando:
+        achados.append(f"sem {', '.join(sorted(faltando))}")
+    teto = consulta["orcamento_ms"] * folga
+    if tempo_ms(plano) > teto:
+        achados.append(f"{tempo_ms(plano):.1f} ms > orçamento {teto:.0f} ms")
+    return achados
+
+
+# ------------------------------------------------------------------------------------------
+# Planos de exemplo (formato do EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) do Postgres 14)
+# ------------------------------------------------------------------------------------------
+
+PLANO_INBOX = [{"Plan": {
+    "Node Type": "Sort", "Shared Hit Blocks": 5120, "Shared Read Blocks": 3, "Plans": [
+        {"Node Type": "Nested Loop", "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "contacts"},
+            {"Node Type": "Limit", "Plans": [{"Node Type": "Merge Append", "Plans": [
+                {"Node Type": "Index Scan", "Relation Name": "messages_p2026_10",
+                 "Index Name": "idx_messages_contato_ts__messages_p2026_10"},
+                {"Node Type": "Index Scan", "Relation Name": "messages_p2026_11",
+                 "Index Name": "messages_p2026_11_contact_wa_id_timestamp_idx"},
+            ]}]},
+            {"Node Type": "Aggregate", "Plans": [
+                {"Node Type": "Index Only Scan", "Relation Name": "messages_p2026_10",
+                 "Index Name": "idx_messages_nao_lidas__messages_p2026_10"},
+                {"Node Type": "Seq Scan", "Relation Name": "messages_p2026_12",
+                 "Actual Rows": 0, "Rows Removed by Filter": 0}]},
+        ]}]},
+    "Planning Time": 1.2, "Execution Time": 85.4}]
+
+PLANO_SEQ = [{"Plan": {"Node Type": "Limit", "Plans": [{"Node Type": "Sort", "Plans": [
+    {"Node Type": "Seq Scan", "Relation Name": "notifications"}]}]},
+    "Execution Time": 142.0}]
+
+MAE = {"idx_messages_contato_ts__messages_p2026_10": "idx_messages_contato_ts",
+       "messages_p2026_11_contact_wa_id_timestamp_idx": "idx_messages_contato_ts",
+       "idx_messages_nao_lidas__messages_p2026_10": "idx_messages_nao_lidas"}
+
+
+def teste_1_leitura():
+    print("1) leitura do plano")
+    check("Seq Scans", seq_scans(PLANO_INBOX) == {"contacts"} and seq_scans(PLANO_SEQ) == {"notifications"})
+    check("partição vazia varrida não conta", "messages" not in seq_scans(PLANO_INBOX))
+    check("partição de messages conta como messages",
+          seq_scans([{"Plan": {"Node Type": "Seq Scan", "Relation Name": "messages_pdefault"}}]) == {"messages"})
+    check("índices como estão no plano", "idx_messages_contato_ts__messages_p2026_10" in indices_usados(PLANO_INBOX))
+    check("índice de partição vira o da mãe (inclusive o de nome automático)",
+          indices_usados(PLANO_INBOX, MAE) == {"idx_messages_contato_ts", "idx_messages_nao_lidas"})
+    check("tempo de execução", tempo_ms(PLANO_INBOX) == 85.4)
+    check("buffers da raiz (hit, read)", buffers(PLANO_INBOX) == (5120, 3) and buffers(PLANO_SEQ) == (0, 0))
+
+
+def teste_2_veredito():
+    print("2) veredito")
+    inbox = CONSULTAS["inbox do SDR (routes.list_contacts)"]
+    check("inbox boa: nada a apontar", problemas(inbox, PLANO_INBOX, MAE) == [])
+    check("sem o mapa de partições, o índice esperado falta",
+          any("sem idx_messages" in p for p in problemas(inbox, PLANO_INBOX)))
+    sino = CONSULTAS["sino: 50 mais novas (routes.list_notifications)"]
+    achados = problemas(sino, PLANO_SEQ)
+    check("Seq Scan proibido apontado", "Seq Scan em notifications" in achados, f"{achados}")
+    check("índice esperado ausente apontado", "sem idx_notifications_user_recentes" in achados)
+    check("orçamento estourado apontado", any("orçamento 20 ms" in p for p in achados))
+    check("folga multiplica o orçamento",
+          not any("orçamento" in p for p in problemas(sino, PLANO_SEQ, folga=10)))
+    permitido = dict(sino, seq_ok=("notifications",), indices=(), orcamento_ms=1000)
+    check("Seq Scan em seq_ok passa", problemas(permitido, PLANO_SEQ) == [])
+
+
+def teste_3_cobertura():
+    print("3) cobertura")
+    migrados = {n for n, _, _ in mig.INDICES}
+    esperados = {i for c in CONSULTAS.values() for i in c["indices"]}
+    check("toda consulta espera índice que a migração cria", esperados <= migrados, ", ".join(esperados - migrados))
+    check("todo índice da migração tem consulta que o usa", migrados <= esperados, ", ".join(migrados - esperados))
+    check("toda consulta tem orçamento", all(c["orcamento_ms"] > 0 for c in CONSULTAS.values()))
+
+
+# ------------------------------------------------------------------------------------------
+# Migração contra dublê
+# ------------------------------------------------------------------------------------------
+
+class _Resultado:
+    def __init__(self, valor=None, lista=()):
+        self.valor = valor
+        self.lista = list(lista)
+
+    def scalar(self):
+        return self.valor
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.lista
+
+
+class ConexaoFalsa:
+    """messages particionada com duas partições; uma já tem o índice. Um índice inválido."""
+    def __init__(self, invalidos=(), validos=(), faltando=("messages_p2026_09", "messages_p2026_10")):
+        self.invalidos = set(invalidos)
+        self.validos = set(validos)
+        self.faltando = list(faltando)
+        self.sqls = []
+        self.opcoes = {}
+
+    async def execution_options(self, **opcoes):
+        self.opcoes.update(opcoes)
+        return self
+
+    async def execute(self, stmt, params=None):
+        sql = " ".join(str(stmt).split())
+        self.sqls.append(sql)
+        params = params or {}
+        if "relkind = 'p'" in sql:
+            return _Resultado(params["t"] == "messages")
+        if "indisvalid" in sql:
+            nome = params["nome"]
+            return _Resultado(False if nome in self.invalidos else (True if nome in self.validos else None))
+        if "pg_inherits" in sql:
+            return _Resultado(lista=self.faltando)
+        return _Resultado()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        return False
+
+
+class MotorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def connect(self):
+        return self.conn
+
+
+async def teste_4_migracao():
+    print("4) migração contra dublê")
+    conn = ConexaoFalsa(invalidos={"idx_exact_leads_register_date"},
+                        validos={"idx_notifications_dedup"})
+    feitos = await mig.criar_indices(MotorFalso(conn))
+    sqls = conn.sqls
+    check("AUTOCOMMIT (CONCURRENTLY não roda em transação)", conn.opcoes.get("isolation_level") == "AUTOCOMMIT")
+    check("lock_timeout curto e sem statement_timeout, antes de tudo",
+          sqls[0] == "SET lock_timeout = '3s'" and sqls[1] == "SET statement_timeout = 0")
+    check("mãe particionada: ON ONLY, sem CONCURRENTLY",
+          'CREATE INDEX IF NOT EXISTS idx_messages_contato_ts ON ONLY messages (contact_wa_id, "timestamp" DESC, id DESC)' in sqls)
+    filho = "idx_messages_contato_ts__messages_p2026_09"
+    criar = f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {filho} ON messages_p2026_09 (contact_wa_id, "timestamp" DESC, id DESC)'
+    anexar = f"ALTER INDEX idx_messages_contato_ts ATTACH PARTITION {filho}"
+    check("partição: CONCURRENTLY e depois ATTACH", criar in sqls and sqls.index(criar) < sqls.index(anexar))
+    check("só as partições que faltam", feitos["idx_messages_contato_ts"] == ["messages_p2026_09", "messages_p2026_10"])
+    check("tabela comum: CONCURRENTLY direto",
+          "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_recentes ON notifications "
+          "(user_id, created_at DESC)" in sqls)
+    check("válido fica como está", "idx_notifications_dedup" not in feitos
+          and not any("idx_notifications_dedup ON" in s for s in sqls))
+    drop = "DROP INDEX CONCURRENTLY IF EXISTS idx_exact_leads_register_date"
+    check("inválido: DROP CONCURRENTLY e refeito", drop in sqls
+          and any(s.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exact_leads_register_date")
+                  for s in sqls[sqls.index(drop):]))
+
+    conn = ConexaoFalsa(validos={n for n, _, _ in mig.INDICES}, faltando=())
+    check("tudo pronto: nada feito", await mig.criar_indices(MotorFalso(conn)) == {})
+
+
+# ------------------------------------------------------------------------------------------
+# Banco real
+# ------------------------------------------------------------------------------------------
+
+def _massa() -> dict:
+    return gerar_massa.volumes(ESCALA / 10, **{k: max(1, int(v * ESCALA)) for k, v in MASSA.items()})
+
+
+async def _mae_dos_indices(conn) -> dict:
+    linhas = (await conn.execute(text("""
+        SELECT c.relname, p.relname FROM pg_inherits t
+        JOIN pg_class c ON c.oid = t.inhrelid JOIN pg_class p ON p.oid = t.inhparent
+        WHERE c.relkind = 'i'
+    """))).fetchall()
+    return dict(linhas)
+
+
+async def teste_5_banco_real():
+    print("5) banco real")
+    url = os.getenv("EXPLAIN_DATABASE_URL")
+    if not url:
+        print("  ⏭️  pulado — defina EXPLAIN_DATABASE_URL (Postgres descartável) para rodar os EXPLAIN")
+        return
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    admin = create_async_engine(url, poolclass=NullPool)
+    motor = create_async_engine(url, poolclass=NullPool,
+                                connect_args={"server_settings": {"search_path": SCHEMA}})
+    try:
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+        massa = _massa()
+        inicio = time.perf_counter()
+        await gerar_massa.gerar(motor, massa, SEMENTE, AGORA, log=lambda linha: None)
+        longa = max(gerar_massa.gerar_contatos(SEMENTE, massa, AGORA), key=lambda c: c.n_msgs)
+        print(f"  massa: {massa['mensagens']} mensagens, {massa['contatos']} contatos, a conversa "
+              f"mais longa com {longa.n_msgs} ({time.perf_counter() - inicio:.0f}s para gerar e indexar)")
+
+        async with motor.connect() as conn:
+            mae = await _mae_dos_indices(conn)
+            for nome, consulta in CONSULTAS.items():
+                sql = text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + consulta["sql"])
+                params = consulta["params"]
+                params = params(longa) if callable(params) else params
+                for _ in range(2):          # o primeiro aquece o cache; vale o segundo
+                    plano = (await conn.execute(sql, params)).scalar()
+                plano = json.loads(plano) if isinstance(plano, str) else plano
+                achados = problemas(consulta, plano, mae, FOLGA)
+                lidos, do_disco = buffers(plano)
+                check(nome, not achados, "; ".join(achados) or
+                      f"{tempo_ms(plano):.1f} ms (orçamento {consulta['orcamento_ms'] * FOLGA:.0f}), "
+                      f"buffers {lidos} hit / {do_disco} read")
+    finally:
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await motor.dispose()
+        await admin.dispose()
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("PLANOS DAS CONSULTAS QUENTES — SEQ SCAN, ÍNDICE ESPERADO E ORÇAMENTO")
+    print("Nada enviado. Banco só com EXPLAIN_DATABASE_URL, num schema descartável.")
+    print("=" * 90 + "\n")
+
+    teste_1_leitura()
+    teste_2_veredito()
+    teste_3_cobertura()
+    await teste_4_migracao()
+    await teste_5_banco_real()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,307 @@
+"""Massa sintética (gerar_massa.py): reproduzível, com a forma certa, e cabendo no esquema.
+
+Rodar: cd backend && venv/bin/python test_gerar_massa.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: as linhas são geradas em memória, numa escala
+pequena, e conferidas contra os modelos; o COPY roda contra um dublê da conexão do asyncpg.
+A carga de verdade (COPY, índices, VACUUM) é exercitada por test_explain_consultas.py com
+EXPLAIN_DATABASE_URL.
+
+  1. volumes: escala, usuários e canais fixos, sobreposição por tabela
+  2. distribuição por contato: soma exata, pelo menos uma, cauda longa
+  3. reproduzível: mesma semente, mesmas linhas; uma tabela não mexe na outra
+  4. messages: tempo dentro da conversa, ordem dos ids, status e falhas coerentes
+  5. cabe no esquema: colunas existem, tamanhos de String, NOT NULL, únicos
+  6. referências: contatos, usuários, canais, leads e etapas da NAT que existem
+  7. embeddings: dimensão e norma; senha confere no bcrypt
+  8. travas e COPY: cenat_whatsapp recusado, só os módulos da trava 4, lotes de LOTE linhas
+"""
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+from datetime import datetime
+
+import bcrypt
+import orjson
+from sqlalchemy import String
+
+import gerar_massa as g
+from app.database import Base
+from app.models import ETAPAS_VALIDAS
+
+falhas = []
+
+SEMENTE = 7
+AGORA = datetime(2026, 10, 19, 12, 0)
+V = g.volumes(0.002)            # 400 contatos, 10 mil mensagens
+
+
+def check(nome, condicao, detalhe=""):
+    if condicao:
+        print(f"  ✅ {nome}" + (f" — {detalhe}" if detalhe else ""))
+    else:
+        print(f"  ❌ {nome}" + (f" — {detalhe}" if detalhe else ""))
+        falhas.append(nome)
+
+
+def _tabelas(semente: int = SEMENTE, v: dict = V) -> dict:
+    """{tabela: (colunas, [linhas])}, na ordem da carga."""
+    contatos = g.gerar_contatos(semente, v, AGORA)
+    geradores = {
+        "users": g.usuarios(v),
+        "channels": g.canais(v),
+        "contacts": g.linhas_contatos(contatos),
+        "exact_leads": g.linhas_leads(semente, v, contatos, AGORA),
+        "messages": g.linhas_mensagens(semente, contatos, AGORA),
+        "notifications": g.linhas_notificacoes(semente, v, contatos, AGORA),
+        "scheduled_messages": g.linhas_agendamentos(semente, v, AGORA),
+        "knowledge_documents": g.linhas_documentos(semente, v, AGORA),
+        "nat_flow_state": g.linhas_estados_nat(semente, contatos, v),
+        "call_logs": g.linhas_chamadas(semente, v, contatos, AGORA),
+    }
+    return {t: (colunas, list(linhas)) for t, (colunas, linhas) in geradores.items()}
+
+
+def _coluna(tabelas, tabela, coluna):
+    colunas, linhas = tabelas[tabela]
+    i = colunas.index(coluna)
+    return [l[i] for l in linhas]
+
+
+TABELAS = _tabelas()
+CONTATOS = g.gerar_contatos(SEMENTE, V, AGORA)
+
+
+def teste_1_volumes():
+    print("1) volumes")
+    v = g.volumes(0.5)
+    check("escala multiplica", v["mensagens"] == g.VOLUMES["mensagens"] // 2, str(v["mensagens"]))
+    check("usuários e canais não escalam", (v["usuarios"], v["canais"]) ==
+          (g.VOLUMES["usuarios"], g.VOLUMES["canais"]))
+    check("escala minúscula ainda dá pelo menos 1", min(g.volumes(1e-9).values()) >= 1)
+    check("sobrepor troca só aquele", g.volumes(0.5, chamadas=3)["chamadas"] == 3
+          and g.volumes(0.5, chamadas=None)["chamadas"] == v["chamadas"])
+    try:
+        g.volumes(usuarios=1)
+        check("usuarios=1 recusado (sem SDR)", False)
+    except ValueError:
+        check("usuarios=1 recusado (sem SDR)", True)
+    carregadas = {t: len(linhas) for t, (_, linhas) in TABELAS.items()}
+    esperado = {"users": V["usuarios"], "channels": V["canais"], "contacts": V["contatos"],
+                "exact_leads": V["leads"], "messages": V["mensagens"], "notifications": V["notificacoes"],
+                "scheduled_messages": V["agendamentos"], "knowledge_documents": V["documentos"],
+                "nat_flow_state": V["estados_nat"], "call_logs": V["chamadas"]}
+    check("cada tabela com o volume pedido", carregadas == esperado,
+          str({t: n for t, n in carregadas.items() if n != esperado[t]}))
+    check("TABELAS do TRUNCATE = tabelas carregadas", set(g.TABELAS) == set(TABELAS))
+
+
+def teste_2_distribuicao():
+    print("2) mensagens por contato")
+    import random
+    contagem = g.distribuir(random.Random(1), 100_000, 5_000)
+    check("soma exata", sum(contagem) == 100_000, str(sum(contagem)))
+    check("todo contato com pelo menos uma", min(contagem) >= 1)
+    mediana, maximo = statistics.median(contagem), max(contagem)
+    check("cauda longa: a maior conversa passa de 20× a mediana", maximo > 20 * mediana,
+          f"mediana {mediana}, máximo {maximo}")
+    dez = sorted(contagem, reverse=True)[:500]
+    check("os 10% mais longos concentram mais de um terço", sum(dez) > 100_000 / 3, str(sum(dez)))
+    try:
+        g.distribuir(random.Random(1), 10, 20)
+        check("menos mensagens que contatos recusado", False)
+    except ValueError:
+        check("menos mensagens que contatos recusado", True)
+    check("os contatos carregam a distribuição", sum(c.n_msgs for c in CONTATOS) == V["mensagens"])
+
+
+def teste_3_reproduzivel():
+    print("3) reproduzível")
+    de_novo = _tabelas()
+    check("mesma semente → as mesmas linhas, tabela a tabela",
+          all(de_novo[t] == TABELAS[t] for t in TABELAS),
+          str([t for t in TABELAS if de_novo[t] != TABELAS[t]]))
+    outra = _tabelas(SEMENTE + 1)
+    check("outra semente → outras mensagens", outra["messages"] != TABELAS["messages"])
+    mais_chamadas = _tabelas(v={**V, "chamadas": V["chamadas"] * 2})
+    check("mudar o volume de uma tabela não mexe nas outras",
+          all(mais_chamadas[t] == TABELAS[t] for t in TABELAS if t != "call_logs"))
+    check("wa_id único por id", len({g.wa_id(i, "11") for i in range(1, 200_001)}) == 200_000)
+
+
+def teste_4_mensagens():
+    print("4) messages")
+    colunas, linhas = TABELAS["messages"]
+    c = {nome: i for i, nome in enumerate(colunas)}
+    criado = {ct.wa_id: ct.criado for ct in CONTATOS}
+    check("nada depois de AGORA", max(l[c["timestamp"]] for l in linhas) <= AGORA)
+    check("nada antes da entrada do contato",
+          all(l[c["timestamp"]] >= criado[l[c["contact_wa_id"]]] for l in linhas))
+    lote = [(int(l[c["wa_message_id"]].split(".")[2]) - 1) // g.CONTATOS_POR_LOTE for l in linhas]
+    check("ids na ordem do tempo dentro de cada lote de contatos", all(
+        a[c["timestamp"]] <= b[c["timestamp"]]
+        for (a, la), (b, lb) in zip(zip(linhas, lote), zip(linhas[1:], lote[1:])) if la == lb))
+    check("lotes em ordem de entrada dos contatos", lote == sorted(lote))
+    check("wa_message_id único", len({l[c["wa_message_id"]] for l in linhas}) == len(linhas))
+    falhou = [l for l in linhas if l[c["status"]] == "failed"]
+    check("falha só em outbound, sempre com error_code", falhou and all(
+        l[c["direction"]] == "outbound" and l[c["error_code"]] for l in falhou), f"{len(falhou)} falhas")
+    check("error_code só onde falhou",
+          all(l[c["error_code"]] is None for l in linhas if l[c["status"]] != "failed"))
+    check("'received' (não lida) só em inbound",
+          all(l[c["direction"]] == "inbound" for l in linhas if l[c["status"]] == "received"))
+    nao_lidas = {l[c["contact_wa_id"]] for l in linhas if l[c["status"]] == "received"}
+    check("há conversas com não lidas", 0 < len(nao_lidas) < V["contatos"], str(len(nao_lidas)))
+    primeiras = {l[c["wa_message_id"]]: l for l in linhas if l[c["wa_message_id"]].endswith(".0")}
+    da_nat = [ct for ct in CONTATOS if ct.etapa]
+    check("contato da NAT abre com a boas-vindas marcada em nat_etapa", all(
+        primeiras[f"wamid.sint.{ct.id}.0"][c["nat_etapa"]] == "nat_boasvindas" for ct in da_nat))
+    check("contato da Exact abre com template outbound", all(
+        primeiras[f"wamid.sint.{ct.id}.0"][c["message_type"]] == "template" for ct in CONTATOS if ct.exact))
+    check("sent_by_ai só em outbound",
+          all(l[c["direction"]] == "outbound" for l in linhas if l[c["sent_by_ai"]]))
+
+
+def teste_5_esquema():
+    print("5) cabe no esquema")
+    for tabela, (colunas, linhas) in TABELAS.items():
+        modelo = Base.metadata.tables[tabela].c
+        fora = [col for col in colunas if col not in modelo]
+        check(f"{tabela}: colunas existem", not fora, str(fora))
+        if fora:
+            continue
+        problemas = []
+        for i, col in enumerate(colunas):
+            coluna = modelo[col]
+            valores = [l[i] for l in linhas]
+            if not coluna.nullable and any(v is None for v in valores):
+                problemas.append(f"{col} NULL")
+            if isinstance(coluna.type, String) and coluna.type.length:
+                maior = max((len(v) for v in valores if v is not None), default=0)
+                if maior > coluna.type.length:
+                    problemas.append(f"{col} {maior} > {coluna.type.length}")
+            if coluna.unique and len(set(valores)) != len(valores):
+                problemas.append(f"{col} repetido")
+        obrigatorias = [c.name for c in modelo if not c.nullable and not c.primary_key
+                        and c.default is None and c.server_default is None]
+        problemas += [f"{c} faltando" for c in obrigatorias if c not in colunas]
+        check(f"{tabela}: tamanhos, NOT NULL e únicos", not problemas, "; ".join(problemas))
+
+
+def teste_6_referencias():
+    print("6) referências")
+    contatos = set(_coluna(TABELAS, "contacts", "wa_id"))
+    for tabela in ("messages", "notifications", "nat_flow_state", "call_logs"):
+        check(f"{tabela}.contact_wa_id existe em contacts",
+              set(_coluna(TABELAS, tabela, "contact_wa_id")) <= contatos)
+    usuarios = set(range(1, V["usuarios"] + 1))
+    for tabela, coluna in (("contacts", "assigned_to"), ("notifications", "user_id"),
+                           ("call_logs", "user_id"), ("scheduled_messages", "created_by"),
+                           ("nat_flow_state", "sdr_user_id"), ("nat_flow_state", "assumido_por")):
+        check(f"{tabela}.{coluna} é um usuário", set(_coluna(TABELAS, tabela, coluna)) - {None} <= usuarios)
+    check("ninguém atribuído ao admin", 1 not in set(_coluna(TABELAS, "contacts", "assigned_to")))
+    canais = set(range(1, V["canais"] + 1))
+    check("channel_id é um canal", all(set(_coluna(TABELAS, t, "channel_id")) <= canais
+                                       for t in ("contacts", "messages", "call_logs")))
+    leads = set(range(1, V["leads"] + 1))
+    check("nat_flow_state.exact_lead_id é um lead",
+          set(_coluna(TABELAS, "nat_flow_state", "exact_lead_id")) - {None} <= leads)
+    fone = dict(zip(range(1, V["leads"] + 1), _coluna(TABELAS, "exact_leads", "phone1")))
+    nat = TABELAS["nat_flow_state"]
+    check("o lead da NAT tem o telefone do contato", all(
+        fone[l[1]] == l[0] for l in nat[1] if l[1] is not None))
+    check("etapa da NAT é válida", set(_coluna(TABELAS, "nat_flow_state", "etapa")) <= ETAPAS_VALIDAS)
+    wamids = set(_coluna(TABELAS, "messages", "wa_message_id"))
+    check("ref da notificação é uma mensagem", set(_coluna(TABELAS, "notifications", "ref")) <= wamids)
+    check("welcome_wamid é uma mensagem",
+          set(_coluna(TABELAS, "exact_leads", "welcome_wamid")) - {None} <= wamids)
+    check("lead_ids do agendamento são leads", all(
+        set(orjson.loads(ids)) <= leads for ids in _coluna(TABELAS, "scheduled_messages", "lead_ids")))
+    pendentes = [q for q, s in zip(_coluna(TABELAS, "scheduled_messages", "scheduled_at"),
+                                   _coluna(TABELAS, "scheduled_messages", "status")) if s == "pending"]
+    check("agendamento pendente só no futuro", all(q > AGORA for q in pendentes), f"{len(pendentes)} pendentes")
+
+
+def teste_7_embeddings_e_senha():
+    print("7) embeddings e senha")
+    vetores = [orjson.loads(e) for e in _coluna(TABELAS, "knowledge_documents", "embedding")]
+    check("dimensão do text-embedding-3-small", {len(v) for v in vetores} == {g.EMBEDDING_DIM})
+    normas = [sum(x * x for x in v) ** 0.5 for v in vetores]
+    check("vetores unitários", all(abs(n - 1) < 1e-3 for n in normas), f"{min(normas):.4f}..{max(normas):.4f}")
+    check("vetores diferentes entre si", len({tuple(v[:8]) for v in vetores}) == len(vetores))
+    hash_ = _coluna(TABELAS, "users", "password_hash")[0]
+    check("senha SENHA confere no bcrypt", bcrypt.checkpw(g.SENHA.encode(), hash_.encode()))
+
+
+class _ConexaoCopy:
+    def __init__(self):
+        self.chamadas = []
+
+    async def copy_records_to_table(self, tabela, records, columns):
+        self.chamadas.append((tabela, len(records), columns))
+
+
+async def teste_8_travas_e_copy():
+    print("8) travas e COPY")
+    try:
+        g.conferir_destino("postgresql+asyncpg://postgres@localhost:5432/cenat_whatsapp")
+        check("cenat_whatsapp recusado", False)
+    except SystemExit:
+        check("cenat_whatsapp recusado", True)
+    try:
+        g.conferir_destino("postgresql+asyncpg://postgres@localhost:5432/cenat_bench")
+        check("banco local aceito", True)
+    except SystemExit:
+        check("banco local aceito", False)
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            g._argumentos([])
+        check("--url obrigatório", False)
+    except SystemExit:
+        check("--url obrigatório", True)
+
+    # Até aqui este teste só importou gerar_massa, app.database e app.models.
+    carregados = {m for m in sys.modules if m.startswith("app.")}
+    documentados = {"app.models", "app.particoes", "app.nat_copy", "app.nat_guard",
+                    "app.database", "app.metrics"}
+    check("só os módulos da trava 4 (e o que eles importam)", carregados <= documentados,
+          f"{sorted(carregados - documentados)}")
+
+    conexao = _ConexaoCopy()
+    total = await g.copiar(conexao, "messages", ("a", "b"), ((i, i) for i in range(25)), lote=10)
+    check("COPY em lotes de `lote` linhas", total == 25 and [n for _, n, _ in conexao.chamadas] == [10, 10, 5],
+          str(conexao.chamadas))
+    check("colunas passadas ao COPY", conexao.chamadas[0][2] == ["a", "b"])
+    conexao = _ConexaoCopy()
+    check("nada a copiar, nenhum COPY", await g.copiar(conexao, "t", ("a",), []) == 0 and not conexao.chamadas)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("MASSA SINTÉTICA — REPRODUTÍVEL, COM A FORMA DA PRODUÇÃO, CABENDO NO ESQUEMA")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    teste_1_volumes()
+    teste_2_distribuicao()
+    teste_3_reproduzivel()
+    teste_4_mensagens()
+    teste_5_esquema()
+    teste_6_referencias()
+    teste_7_embeddings_e_senha()
+    await teste_8_travas_e_copy()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,332 @@
+"""GET condicional das listagens (ETag -> 304 sem query) e compressão só do que comprime.
+
+Rodar: cd backend && venv/bin/python test_get_condicional.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: os avisos do NOTIFY são os callbacks chamados à mão,
+e a sessão das rotas é um dublê que EXPLODE se alguém executar query no caminho do 304.
+
+  1. versões: avançam com os avisos certos; sem escuta ou sem triggers, não existem
+  2. conferir_gatilhos: só liga com TODOS os triggers instalados
+  3. etag_lista: muda com a versão e com o escopo; leitura da réplica fica sem ETag
+  4. nao_modificado: 304 com a ETag, inclusive numa lista de If-None-Match
+  5. as quatro rotas: 200 com ETag, depois 304 sem tocar no banco, depois 200 de novo
+  6. compressão: JSON grande sim; pequeno, mídia, 206 e SSE não
+  7. migrações: cada tabela avisada vira um recurso, e os triggers exigidos são os criados
+"""
+import sys
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import database
+from app import eventos as ev
+from app import respostas as r
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _ligar():
+    ev._versoes.clear()
+    ev._escuta_ativa = True
+    ev._gatilhos_ok = True
+
+
+def _desligar():
+    ev._versoes.clear()
+    ev._escuta_ativa = False
+    ev._gatilhos_ok = False
+
+
+def _aviso(tipo, wa_id="5511900000001"):
+    import json
+    ev.ao_notificar(None, 1, ev.CANAL, json.dumps({"tipo": tipo, "wa_id": wa_id, "atribuido": 7}))
+
+
+SESSAO_PRIMARIO = SimpleNamespace(bind=database.engine)
+
+
+# ==========================================================================================
+
+def teste_1_versoes():
+    print("1) versões por recurso")
+    _desligar()
+    check("sem escuta: None", ev.versao(ev.RECURSO_CONTATOS) is None)
+    ev._escuta_ativa = True
+    check("escuta sem triggers: None", ev.versao(ev.RECURSO_CONTATOS) is None)
+    _ligar()
+    inbox, conversa = ev.versao(ev.RECURSO_CONTATOS), ev.versao(ev.RECURSO_MENSAGENS, "5511900000001")
+    outra = ev.versao(ev.RECURSO_MENSAGENS, "5511900000002")
+    _aviso("mensagem")
+    check("mensagem avança a inbox e a conversa",
+          ev.versao(ev.RECURSO_CONTATOS) != inbox
+          and ev.versao(ev.RECURSO_MENSAGENS, "5511900000001") != conversa)
+    check("e não a conversa dos outros", ev.versao(ev.RECURSO_MENSAGENS, "5511900000002") == outra)
+    conversa = ev.versao(ev.RECURSO_MENSAGENS, "5511900000001")
+    _aviso("status")
+    check("status avança a conversa", ev.versao(ev.RECURSO_MENSAGENS, "5511900000001") != conversa)
+    inbox, conversa = ev.versao(ev.RECURSO_CONTATOS), ev.versao(ev.RECURSO_MENSAGENS, "5511900000001")
+    _aviso("atribuicao")
+    check("atribuição avança só a inbox", ev.versao(ev.RECURSO_CONTATOS) != inbox
+          and ev.versao(ev.RECURSO_MENSAGENS, "5511900000001") == conversa)
+    kanban, exact = ev.versao(ev.RECURSO_KANBAN), ev.versao(ev.RECURSO_EXACT)
+    ev.ao_notificar_tabela(None, 1, ev.CANAL_VERSOES, "ai_conversation_summaries")
+    ev.ao_notificar_tabela(None, 1, ev.CANAL_VERSOES, "tabela_que_nao_existe")
+    check("aviso de tabela avança o recurso dela", ev.versao(ev.RECURSO_KANBAN) != kanban
+          and ev.versao(ev.RECURSO_EXACT) == exact)
+    inbox = ev.versao(ev.RECURSO_CONTATOS)
+    ev.escuta(False)
+    ev.escuta(True)
+    check("escuta caiu e voltou: nova geração", ev.versao(ev.RECURSO_CONTATOS) != inbox)
+    inbox = ev.versao(ev.RECURSO_CONTATOS)
+    limite = ev.MAX_VERSOES
+    try:
+        ev.MAX_VERSOES = 3
+        for i in range(5):
+            _aviso("status", wa_id=f"55{i}")
+    finally:
+        ev.MAX_VERSOES = limite
+    check("estourou o teto: zera e muda a geração",
+          len(ev._versoes) <= 3 and ev.versao(ev.RECURSO_CONTATOS)[0] != inbox[0])
+    ev._assinaturas.clear()
+    _desligar()
+
+
+async def teste_2_conferir():
+    print("2) conferir_gatilhos")
+    _desligar()
+
+    def conexao(instalados):
+        async def fetchval(sql, nomes):
+            return instalados(nomes)
+        return SimpleNamespace(fetchval=fetchval)
+
+    check("todos instalados: liga",
+          await ev.conferir_gatilhos(conexao(len)) and ev._gatilhos_ok)
+    check("faltando um: desliga",
+          not await ev.conferir_gatilhos(conexao(lambda n: len(n) - 1)) and not ev._gatilhos_ok)
+    _desligar()
+
+
+def teste_3_etag():
+    print("3) etag_lista")
+    _desligar()
+    check("sem versão confiável: sem ETag", r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS) is None)
+    _ligar()
+    a = r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS, None, 7, "comercial", 1, None)
+    check("ETag fraca", a.startswith('W/"') and a.endswith('"'), a)
+    check("estável", a == r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS, None, 7, "comercial", 1, None))
+    check("outro usuário/filtro: outra ETag",
+          a != r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS, None, 8, "comercial", 1, None)
+          and a != r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS, None, 7, "comercial", 2, None))
+    _aviso("mensagem")
+    check("mudou depois do aviso",
+          a != r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS, None, 7, "comercial", 1, None))
+    replica = object()
+    leitura_real = database.engine_leitura
+    try:
+        database.engine_leitura = replica
+        check("sessão da réplica: sem ETag",
+              r.etag_lista(SimpleNamespace(bind=replica), ev.RECURSO_CONTATOS) is None)
+        check("caiu para o primário: com ETag",
+              r.etag_lista(SESSAO_PRIMARIO, ev.RECURSO_CONTATOS) is not None)
+    finally:
+        database.engine_leitura = leitura_real
+    _desligar()
+
+
+def teste_4_nao_modificado():
+    print("4) nao_modificado")
+
+    def pedido(valor):
+        return SimpleNamespace(headers={"if-none-match": valor} if valor is not None else {})
+
+    etag = 'W/"abc"'
+    antes = r.nao_modificadas.valor(recurso="contacts")
+    resposta = r.nao_modificado(pedido(etag), etag, "contacts")
+    check("304 com ETag e no-cache", resposta is not None and resposta.status_code == 304
+          and resposta.headers["etag"] == etag
+          and resposta.headers["cache-control"] == r.CACHE_CONTROL)
+    check("contado", r.nao_modificadas.valor(recurso="contacts") == antes + 1)
+    check("dentro de uma lista", r.nao_modificado(pedido('W/"x", W/"abc"'), etag, "contacts") is not None)
+    check("outra ETag: segue", r.nao_modificado(pedido('W/"x"'), etag, "contacts") is None)
+    check("sem header: segue", r.nao_modificado(pedido(None), etag, "contacts") is None)
+    check("sem ETag própria: segue", r.nao_modificado(pedido(etag), None, "contacts") is None)
+
+
+class _Resultado:
+    def fetchall(self):
+        return []
+
+    def scalars(self):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class _Sessao:
+    """Sessão do primário; com `explodir`, qualquer query é falha do teste."""
+
+    bind = database.engine
+
+    def __init__(self):
+        self.explodir = False
+        self.queries = 0
+
+    async def execute(self, *a, **k):
+        self.queries += 1
+        if self.explodir:
+            raise AssertionError("query no caminho do 304")
+        return _Resultado()
+
+
+def teste_5_rotas():
+    print("5) as quatro rotas")
+    from app.auth import get_current_user
+    from app.database import get_db, get_read_db
+    from app.main import app
+
+    sessao = _Sessao()
+
+    async def dar_sessao():
+        yield sessao
+
+    async def usuario():
+        return SimpleNamespace(id=7, role="comercial")
+
+    app.dependency_overrides.update({get_db: dar_sessao, get_read_db: dar_sessao,
+                                     get_current_user: usuario})
+    cliente = TestClient(app)
+    _ligar()
+    rotas = (
+        ("/api/contacts?channel_id=1", "mensagem"),
+        ("/api/contacts/5511900000001/messages", "status"),
+        ("/api/kanban/cards?channel_id=1", "ai_conversation_summaries"),
+        ("/api/exact-leads?stage=novo", "exact_leads"),
+    )
+    try:
+        for url, aviso in rotas:
+            sessao.explodir = False
+            primeira = cliente.get(url)
+            etag = primeira.headers.get("etag")
+            check(f"{url}: 200 com ETag", primeira.status_code == 200 and bool(etag),
+                  f"{primeira.status_code} {etag}")
+            sessao.explodir, sessao.queries = True, 0
+            segunda = cliente.get(url, headers={"If-None-Match": etag})
+            check(f"{url}: 304 sem query", segunda.status_code == 304 and sessao.queries == 0
+                  and segunda.content == b"", f"{segunda.status_code} queries={sessao.queries}")
+            if aviso in ev.RECURSO_DA_TABELA:
+                ev.ao_notificar_tabela(None, 1, ev.CANAL_VERSOES, aviso)
+            else:
+                _aviso(aviso)
+            sessao.explodir = False
+            terceira = cliente.get(url, headers={"If-None-Match": etag})
+            check(f"{url}: mudou, 200 de novo", terceira.status_code == 200
+                  and terceira.headers.get("etag") not in (None, etag))
+        _desligar()
+        sessao.explodir = False
+        sem = cliente.get(rotas[0][0], headers={"If-None-Match": etag})
+        check("sem escuta: 200 sem ETag", sem.status_code == 200 and "etag" not in sem.headers)
+    finally:
+        app.dependency_overrides.clear()
+        _desligar()
+
+
+def teste_6_compressao():
+    print("6) compressão")
+    app = FastAPI()
+    app.add_middleware(r.CompressaoMiddleware)
+    grande = [{"wa_id": f"55119{i:08d}", "name": "Fulano de Tal"} for i in range(200)]
+
+    @app.get("/json")
+    async def json_grande():
+        return JSONResponse(grande)
+
+    @app.get("/pequeno")
+    async def json_pequeno():
+        return JSONResponse({"ok": True})
+
+    @app.get("/audio")
+    async def audio():
+        return Response(b"\0" * 5000, media_type="audio/mpeg")
+
+    @app.get("/parcial")
+    async def parcial():
+        return Response(b"a" * 5000, status_code=206, media_type="text/plain",
+                        headers={"Content-Range": "bytes 0-4999/10000"})
+
+    @app.get("/sse")
+    async def sse():
+        async def corpo():
+            yield "data: " + "x" * 5000 + "\n\n"
+        return StreamingResponse(corpo(), media_type="text/event-stream")
+
+    cliente = TestClient(app)
+    gz = {"Accept-Encoding": "gzip"}
+    resp = cliente.get("/json", headers=gz)
+    check("JSON grande: gzip", resp.headers.get("content-encoding") == "gzip"
+          and resp.json() == grande and "accept-encoding" in resp.headers.get("vary", "").lower())
+    check("e menor de verdade", int(resp.headers["content-length"]) < len(resp.content) / 3,
+          f"{resp.headers['content-length']} de {len(resp.content)} bytes")
+    check("JSON pequeno: direto", "content-encoding" not in cliente.get("/pequeno", headers=gz).headers)
+    check("áudio: direto", "content-encoding" not in cliente.get("/audio", headers=gz).headers)
+    parcial = cliente.get("/parcial", headers=gz)
+    check("206 (Range): direto", parcial.status_code == 206
+          and "content-encoding" not in parcial.headers and len(parcial.content) == 5000)
+    check("SSE: direto", "content-encoding" not in cliente.get("/sse", headers=gz).headers)
+    check("cliente sem gzip: direto",
+          "content-encoding" not in cliente.get("/json", headers={"Accept-Encoding": "identity"}).headers)
+
+
+def teste_7_migracoes():
+    print("7) migrações")
+    import migrate_eventos_tempo_real as mig_eventos
+    import migrate_versoes_listas as mig
+
+    check("toda tabela avisada vira um recurso", set(mig.TABELAS) == set(ev.RECURSO_DA_TABELA))
+    criados = {n for n, _, _ in mig_eventos.GATILHOS} | {f"cenat_versoes_{t}" for t in mig.TABELAS}
+    check("os triggers exigidos são os que as migrações criam",
+          set(ev.GATILHOS_VERSOES) <= criados, f"{set(ev.GATILHOS_VERSOES) - criados}")
+    check("por comando, não por linha", "FOR EACH STATEMENT" in
+          __import__("inspect").getsource(mig.migrate))
+
+
+def main():
+    import asyncio
+
+    print("\n" + "=" * 90)
+    print("GET CONDICIONAL (ETag/304) E COMPRESSÃO DAS LISTAGENS")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    teste_1_versoes()
+    asyncio.run(teste_2_conferir())
+    teste_3_etag()
+    teste_4_nao_modificado()
+    teste_5_rotas()
+    teste_6_compressao()
+    teste_7_migracoes()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    main()
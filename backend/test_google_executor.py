@@ -0,0 +1,182 @@
+"""Chamadas ao Google fora do event loop (google_executor + google_calendar + google_drive).
+
+Rodar: cd backend && venv/bin/python test_google_executor.py
+
+NADA SAI PARA A REDE: o "Google" é uma função que dorme (time.sleep — bloqueante de verdade,
+como o .execute() do googleapiclient) e o build/credenciais são MagicMock.
+
+  1. chamada bloqueante de 300 ms: o event loop segue rodando durante ela
+  2. pool limitado: 8 chamadas simultâneas, nunca mais que o tamanho do pool ao mesmo tempo
+  3. timeout por chamada -> TimeoutError para quem chamou; exceção do Google repassada intacta
+  4. serviço em cache: construído uma vez por thread, credenciais lidas uma vez
+  5. calendar (freebusy, insert) e drive (upload) rodam nas threads do pool, não no loop
+"""
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from app import google_calendar as gc
+from app import google_drive as gd
+from app import google_executor as ge
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+async def teste_1_loop_livre():
+    print("\n1) loop livre durante a chamada")
+    batidas = 0
+
+    async def relogio():
+        nonlocal batidas
+        while True:
+            await asyncio.sleep(0.01)
+            batidas += 1
+
+    tarefa = asyncio.create_task(relogio())
+    inicio = time.perf_counter()
+    r = await ge.executar(lambda: (time.sleep(0.3), "ok")[1])
+    duracao = time.perf_counter() - inicio
+    tarefa.cancel()
+    check("resultado devolvido", r == "ok")
+    # Bloqueando o loop, seriam 0 batidas durante os 300 ms.
+    check("loop bateu durante a chamada", batidas >= 15, f"{batidas} batidas em {duracao:.2f}s")
+
+
+async def teste_2_pool_limitado():
+    print("\n2) pool limitado")
+    ativos = {"agora": 0, "pico": 0}
+    trava = threading.Lock()
+
+    def google_lento():
+        with trava:
+            ativos["agora"] += 1
+            ativos["pico"] = max(ativos["pico"], ativos["agora"])
+        time.sleep(0.05)
+        with trava:
+            ativos["agora"] -= 1
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="google")
+    with patch.object(ge, "_executor", new=pool):
+        await asyncio.gather(*(ge.executar(google_lento) for _ in range(8)))
+    pool.shutdown()
+    check("nunca mais de 2 ao mesmo tempo", ativos["pico"] == 2, f"pico={ativos['pico']}")
+
+
+async def teste_3_timeout_e_erro():
+    print("\n3) timeout e erro")
+    try:
+        await ge.executar(time.sleep, 0.5, timeout=0.05)
+        estourou = False
+    except asyncio.TimeoutError:
+        estourou = True
+    check("TimeoutError para quem chamou", estourou)
+
+    class HttpErrorFalso(Exception):
+        pass
+
+    def falha():
+        raise HttpErrorFalso("403 quota")
+    try:
+        await ge.executar(falha)
+        repassou = False
+    except HttpErrorFalso as e:
+        repassou = "403" in str(e)
+    check("exceção do Google repassada sem embrulho", repassou)
+
+
+def teste_4_cache_por_thread():
+    print("\n4) serviço em cache por thread")
+    build = MagicMock(side_effect=lambda *a, **kw: object())
+    credenciais = MagicMock()
+    ge._credenciais.clear()
+    with patch("googleapiclient.discovery.build", new=build), \
+         patch("google_auth_httplib2.AuthorizedHttp"), \
+         patch("google.oauth2.service_account.Credentials.from_service_account_file",
+               new=credenciais):
+        a = ge.servico("drive", "v3", gd.SCOPES)
+        b = ge.servico("drive", "v3", gd.SCOPES)
+        check("mesma thread: mesmo objeto, um build", a is b and build.call_count == 1)
+
+        outros = []
+        t = threading.Thread(target=lambda: outros.append(ge.servico("drive", "v3", gd.SCOPES)))
+        t.start()
+        t.join()
+        check("outra thread: objeto próprio (httplib2 não é thread-safe)",
+              outros[0] is not a and build.call_count == 2)
+        check("credenciais lidas do disco uma vez só", credenciais.call_count == 1,
+              f"{credenciais.call_count}")
+    ge._credenciais.clear()
+
+
+async def teste_5_fora_do_loop():
+    print("\n5) calendar e drive nas threads do pool")
+    threads = []
+
+    def anotar(valor):
+        def fn(*a, **kw):
+            threads.append(threading.current_thread().name)
+            return valor
+        return fn
+
+    servico = MagicMock()
+    servico.freebusy().query().execute.side_effect = anotar(
+        {"calendars": {"cal": {"busy": []}}})
+    servico.events().insert().execute.side_effect = anotar({"htmlLink": "https://cal/e1"})
+    with patch.object(gc, "get_service", return_value=servico):
+        await gc.get_busy_slots("cal", "2026-10-20")
+        await gc.create_event("cal", "x", "y", datetime(2026, 10, 20, 10), datetime(2026, 10, 20, 11))
+    check("freebusy e insert rodaram no pool",
+          len(threads) == 2 and all(t.startswith("google") for t in threads), f"{threads}")
+
+    threads.clear()
+    drive = MagicMock()
+    drive.files().create().next_chunk.side_effect = anotar(
+        (None, {"id": "f1", "webViewLink": "https://drive/f1"}))
+    drive.permissions().create().execute.side_effect = anotar({})
+    with tempfile.NamedTemporaryFile(suffix=".mp3") as f, \
+         patch.object(gd, "get_drive_service", return_value=drive), \
+         patch.object(gd, "http_autorizado"), \
+         patch.object(gd, "get_root_folder_id", side_effect=anotar("raiz")), \
+         patch.object(gd, "get_or_create_folder", side_effect=anotar("pasta")), \
+         patch.object(gd, "MediaFileUpload"):
+        link = await gd.upload_recording_to_drive("u", "CA1", "+55", "+55", local_path=f.name)
+    check("upload ao Drive inteiro no pool (pastas, pedaço, permissão)",
+          link == "https://drive/f1" and len(threads) == 4
+          and all(t.startswith("google") for t in threads), f"{threads}")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("GOOGLE FORA DO EVENT LOOP")
+    print("Nenhuma chamada de rede.")
+    print("=" * 90)
+
+    await teste_1_loop_livre()
+    await teste_2_pool_limitado()
+    await teste_3_timeout_e_erro()
+    teste_4_cache_por_thread()
+    await teste_5_fora_do_loop()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
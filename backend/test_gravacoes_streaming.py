@@ -0,0 +1,267 @@
+"""Gravações: download em streaming para o disco, upload ao Drive a partir do disco, Range.
+
+Rodar: cd backend && venv/bin/python test_gravacoes_streaming.py
+
+NADA SAI PARA A REDE: a Twilio é um httpx.MockTransport que serve o corpo em pedaços, o Drive
+é um MagicMock e o banco é um dublê em memória. Os arquivos vão para um diretório temporário.
+
+  1. download em pedaços: arquivo final íntegro, várias escritas, nenhum .part sobrando
+  2. corpo menor que o Content-Length -> DownloadIncompleto, nada no destino
+  3. 404 da Twilio -> erro, gravação anterior no destino intacta
+  4. webhook de gravação usa o download em streaming e acorda a fila de transcrição
+  5. upload ao Drive lê do disco: nenhum segundo download da Twilio
+  6. GET /recording/{sid} com Range -> 206 só com o pedaço pedido; sem Range -> 200 inteiro
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+
+from app import recordings as rec
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+DIR = tempfile.mkdtemp(prefix="gravacoes_teste_")
+AUDIO = bytes(range(256)) * 4096            # 1 MiB, conteúdo conferível byte a byte
+
+
+class CorpoEmPedacos(httpx.AsyncByteStream):
+    def __init__(self, dados, pedaco=64 * 1024):
+        self.dados, self.pedaco = dados, pedaco
+
+    async def __aiter__(self):
+        for i in range(0, len(self.dados), self.pedaco):
+            yield self.dados[i:i + self.pedaco]
+
+
+def twilio_falsa(corpo=AUDIO, status=200, content_length=None):
+    pedidos = []
+
+    def responder(request):
+        pedidos.append(str(request.url))
+        tamanho = len(corpo) if content_length is None else content_length
+        return httpx.Response(status, headers={"content-length": str(tamanho)},
+                              stream=CorpoEmPedacos(corpo))
+    return httpx.AsyncClient(transport=httpx.MockTransport(responder)), pedidos
+
+
+class SessaoFalsa:
+    def __init__(self, resposta=None):
+        self.commits = 0
+        self._resposta = resposta
+
+    async def execute(self, stmt, *a, **kw):
+        r = MagicMock()
+        r.scalar_one_or_none.return_value = self._resposta
+        return r
+
+    async def commit(self):
+        self.commits += 1
+
+
+def fabrica_de_sessao(sessao):
+    class CM:
+        async def __aenter__(self):
+            return sessao
+
+        async def __aexit__(self, *a):
+            return False
+    return lambda: CM()
+
+
+# ==========================================================================================
+# 1-3: baixar_gravacao
+# ==========================================================================================
+
+async def teste_1_streaming():
+    print("\n1) download em pedaços")
+    destino = os.path.join(DIR, "CA1.mp3")
+    client, _ = twilio_falsa()
+    escritas = []
+    abrir = open
+
+    def abrir_espiando(*a, **kw):
+        f = abrir(*a, **kw)
+        escrever = f.write
+        f.write = lambda b: (escritas.append(len(b)), escrever(b))[1]
+        return f
+
+    with patch("builtins.open", new=abrir_espiando):
+        tamanho = await rec.baixar_gravacao("https://api.twilio.com/x.mp3", destino, client=client)
+    with open(destino, "rb") as f:
+        check("arquivo idêntico ao corpo", f.read() == AUDIO and tamanho == len(AUDIO))
+    check("escrito em vários pedaços, nenhum maior que PEDACO_BYTES",
+          len(escritas) > 1 and max(escritas) <= rec.PEDACO_BYTES, f"{len(escritas)} escritas")
+    check("nenhum .part sobrando", not os.path.exists(destino + ".part"))
+
+
+async def teste_2_incompleto():
+    print("\n2) corpo menor que o Content-Length")
+    destino = os.path.join(DIR, "CA2.mp3")
+    client, _ = twilio_falsa(content_length=len(AUDIO) + 1000)
+    try:
+        await rec.baixar_gravacao("https://api.twilio.com/x.mp3", destino, client=client)
+        levantou = False
+    except rec.DownloadIncompleto:
+        levantou = True
+    check("DownloadIncompleto", levantou)
+    check("nada no destino, nenhum .part",
+          not os.path.exists(destino) and not os.path.exists(destino + ".part"))
+
+
+async def teste_3_erro_http():
+    print("\n3) 404 da Twilio")
+    destino = os.path.join(DIR, "CA3.mp3")
+    with open(destino, "wb") as f:
+        f.write(b"gravacao anterior")
+    client, _ = twilio_falsa(corpo=b"not found", status=404)
+    try:
+        await rec.baixar_gravacao("https://api.twilio.com/x.mp3", destino, client=client)
+        levantou = False
+    except httpx.HTTPStatusError:
+        levantou = True
+    with open(destino, "rb") as f:
+        check("HTTPStatusError e arquivo anterior intacto",
+              levantou and f.read() == b"gravacao anterior")
+
+
+# ==========================================================================================
+# 4-5: webhook e Drive
+# ==========================================================================================
+
+async def teste_4_webhook():
+    print("\n4) webhook de gravação")
+    from app import database, twilio_routes
+    from app import transcription_worker as tw
+
+    call_log = SimpleNamespace(call_sid="CA4", recording_sid=None, recording_url=None,
+                               local_recording_path=None, transcription_status=None)
+    db = SessaoFalsa(resposta=call_log)
+    baixar = AsyncMock(return_value=len(AUDIO))
+    form = {"CallSid": "CA4", "RecordingSid": "RE4", "RecordingStatus": "completed",
+            "RecordingUrl": "https://api.twilio.com/Recordings/RE4"}
+    request = SimpleNamespace(form=AsyncMock(return_value=form))
+    tw._acordar.clear()
+    with patch.object(database, "async_session", new=fabrica_de_sessao(db)), \
+         patch.object(rec, "baixar_gravacao", new=baixar):
+        await twilio_routes.recording_status_webhook(request)
+    args = baixar.await_args
+    check("baixa o .mp3 para o caminho padrão",
+          args.args == ("https://api.twilio.com/Recordings/RE4.mp3", rec.caminho_local("CA4")),
+          f"{args}")
+    check("CallLog com caminho local e pending",
+          call_log.local_recording_path == rec.caminho_local("CA4")
+          and call_log.transcription_status == "pending" and db.commits == 1)
+    check("fila de transcrição acordada", tw._acordar.is_set())
+
+    call_log.local_recording_path = None
+    call_log.transcription_status = None
+    with patch.object(database, "async_session", new=fabrica_de_sessao(db)), \
+         patch.object(rec, "baixar_gravacao", new=AsyncMock(side_effect=rec.DownloadIncompleto("x"))):
+        await twilio_routes.recording_status_webhook(request)
+    check("download falhou -> sem caminho local, sem pending",
+          call_log.local_recording_path is None and call_log.transcription_status is None)
+
+
+async def teste_5_drive_do_disco():
+    print("\n5) upload ao Drive a partir do disco")
+    from app import google_drive as gd
+
+    caminho = os.path.join(DIR, "CA1.mp3")                 # gravado no teste 1
+    client, pedidos = twilio_falsa()
+    servico = MagicMock()
+    servico.files().create().next_chunk.return_value = (
+        None, {"id": "f1", "webViewLink": "https://drive/f1"})
+    midia = MagicMock()
+    with patch.object(gd, "get_drive_service", return_value=servico), \
+         patch.object(gd, "http_autorizado"), \
+         patch.object(gd, "get_root_folder_id", return_value="raiz"), \
+         patch.object(gd, "get_or_create_folder", return_value="pasta"), \
+         patch.object(gd, "MediaFileUpload", new=midia), \
+         patch.object(httpx, "AsyncClient", return_value=client):
+        link = await gd.upload_recording_to_drive("https://api.twilio.com/x.mp3", "CA1",
+                                                  "+55", "+55", local_path=caminho)
+    check("link devolvido", link == "https://drive/f1")
+    check("mídia lida do arquivo local, em pedaços",
+          midia.call_args.args == (caminho,) and midia.call_args.kwargs.get("resumable") is True,
+          f"{midia.call_args}")
+    check("nenhum download da Twilio", pedidos == [], f"{pedidos}")
+
+
+# ==========================================================================================
+# 6: Range
+# ==========================================================================================
+
+def teste_6_range():
+    print("\n6) GET /recording/{sid} com Range")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app import database, twilio_routes
+
+    caminho = os.path.join(DIR, "CA1.mp3")
+    db = SessaoFalsa(resposta=SimpleNamespace(local_recording_path=caminho))
+    app = FastAPI()
+    app.include_router(twilio_routes.router)
+    with patch.object(database, "async_session", new=fabrica_de_sessao(db)):
+        cliente = TestClient(app)
+        r = cliente.get("/api/twilio/recording/CA1", headers={"Range": "bytes=1000-1999"})
+        check("206 com só o pedaço pedido",
+              r.status_code == 206 and r.content == AUDIO[1000:2000],
+              f"{r.status_code}, {len(r.content)} bytes")
+        check("Content-Range correto",
+              r.headers.get("content-range") == f"bytes 1000-1999/{len(AUDIO)}",
+              r.headers.get("content-range"))
+
+        r = cliente.get("/api/twilio/recording/CA1", headers={"Range": f"bytes={len(AUDIO) - 10}-"})
+        check("Range aberto no fim (seek perto do final)",
+              r.status_code == 206 and r.content == AUDIO[-10:])
+
+        r = cliente.get("/api/twilio/recording/CA1")
+        check("sem Range -> 200 inteiro, anunciando Accept-Ranges",
+              r.status_code == 200 and r.content == AUDIO
+              and r.headers.get("accept-ranges") == "bytes")
+        check("inline, para o navegador tocar",
+              r.headers.get("content-disposition", "").startswith("inline"),
+              r.headers.get("content-disposition"))
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("GRAVAÇÕES: STREAMING, DRIVE A PARTIR DO DISCO, RANGE")
+    print("Nada enviado. Nenhuma conexão de banco. Nenhuma chamada de rede.")
+    print("=" * 90)
+
+    try:
+        await teste_1_streaming()
+        await teste_2_incompleto()
+        await teste_3_erro_http()
+        await teste_4_webhook()
+        await teste_5_drive_do_disco()
+        teste_6_range()
+    finally:
+        shutil.rmtree(DIR, ignore_errors=True)
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
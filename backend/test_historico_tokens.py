@@ -0,0 +1,238 @@
+"""Histórico da IA por orçamento de tokens + resumo rolante (ai_engine).
+
+Rodar: cd backend && venv/bin/python test_historico_tokens.py
+
+NADA SAI PARA A REDE: a contagem é a do próprio count_tokens (o200k_base; estimativa por
+caracteres se o encoder não estiver no cache local) e o chat completion do resumo rolante é
+um AsyncMock. As verificações medem com a mesma régua que o código usa, então valem nos dois
+casos. O banco é falso e só devolve as Messages montadas aqui.
+
+  1. conversa curta cabe inteira, em ordem cronológica
+  2. texto colado gigante é CORTADO, não expulsa a conversa
+  3. orçamento estourado -> janela contígua, a mais nova sempre entra
+  4. prompt limitado: nenhuma janela passa do orçamento, seja qual for a conversa
+  5. get_conversation_window devolve as que ficaram de fora, em ordem cronológica
+  6. resumo rolante: poucas novas -> não chama o modelo; o bastante -> chama e avança o marcador
+  7. resumo rolante desligado (padrão) -> nunca chama o modelo
+  8. pergunta atual gigante: entra UMA vez, cortada, e o prompt respeita o orçamento
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app import ai_engine as ae
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _custo(janela):
+    return sum(ae.count_tokens(m["content"]) + ae.TOKENS_POR_MENSAGEM_CHAT for m in janela)
+
+
+TEXTAO = "Sou enfermeira há doze anos e trabalho em CAPS. " * 300   # ~3 mil tokens
+
+
+# ==========================================================================================
+# 1-4: montar_janela (pura)
+# ==========================================================================================
+
+def teste_1_conversa_curta():
+    print("\n1) conversa curta cabe inteira")
+    itens = [{"role": "user", "content": "quanto custa?"},
+             {"role": "assistant", "content": "Oi! Tudo bem?"},
+             {"role": "user", "content": "oi"}]                       # mais nova primeiro
+    janela, usadas = ae.montar_janela(itens, 1500)
+    check("todas entraram", usadas == 3, f"usadas={usadas}")
+    check("ordem cronológica", [m["content"] for m in janela] == ["oi", "Oi! Tudo bem?", "quanto custa?"])
+
+
+def teste_2_texto_gigante_cortado():
+    print("\n2) texto colado gigante é cortado")
+    itens = [{"role": "user", "content": "e o valor?"},
+             {"role": "user", "content": TEXTAO},
+             {"role": "assistant", "content": "Qual sua formação?"}]
+    janela, usadas = ae.montar_janela(itens, 1500, por_mensagem=400)
+    check("as três entraram", usadas == 3, f"usadas={usadas}")
+    cortada = janela[1]["content"]
+    check("textão cortado no teto por mensagem", ae.count_tokens(cortada) <= 400,
+          f"{ae.count_tokens(cortada)} tokens")
+    check("corte mantém o começo e marca o corte",
+          cortada.startswith("Sou enfermeira") and cortada.endswith(ae.MARCA_CORTE))
+
+
+def teste_3_orcamento_estourado():
+    print("\n3) orçamento estourado → janela contígua")
+    itens = [{"role": "user", "content": f"mensagem {i} " + "palavra " * 60} for i in range(20)]
+    janela, usadas = ae.montar_janela(itens, 300, por_mensagem=400)
+    check("só as mais novas entram", 0 < usadas < 20, f"usadas={usadas}")
+    check("a mais nova é a última da janela", janela[-1]["content"].startswith("mensagem 0 "))
+    check("contígua: mensagens 0..n-1", all(m["content"].startswith(f"mensagem {usadas - 1 - i} ")
+                                            for i, m in enumerate(janela)))
+
+    sozinha, n = ae.montar_janela([{"role": "user", "content": TEXTAO}], 100, por_mensagem=400)
+    check("mais nova entra sempre, cortada ao orçamento", n == 1 and _custo(sozinha) <= 100,
+          f"custo={_custo(sozinha)}")
+
+
+def teste_4_prompt_limitado():
+    print("\n4) nenhuma janela passa do orçamento")
+    conversas = [
+        [{"role": "user", "content": TEXTAO}] * 10,
+        [{"role": "assistant", "content": "ok"}] * 500,
+        [{"role": "user", "content": "🙂" * 900}, {"role": "user", "content": "a " * 50}] * 5,
+    ]
+    piores = [_custo(ae.montar_janela(c, 1500, por_mensagem=400)[0]) for c in conversas]
+    check("custo da janela <= 1500 em todos os formatos", max(piores) <= 1500, f"{piores}")
+
+
+# ==========================================================================================
+# 5: get_conversation_window
+# ==========================================================================================
+
+def _msg(i, direction="inbound", content=None, message_type="text"):
+    return SimpleNamespace(id=i, direction=direction, message_type=message_type,
+                           content=content if content is not None else f"msg {i} " + "x " * 80,
+                           timestamp=datetime(2026, 10, 1) + timedelta(minutes=i))
+
+
+def _db_com(mensagens):
+    res = MagicMock()
+    res.scalars.return_value.all.return_value = sorted(mensagens, key=lambda m: m.id, reverse=True)
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=res)
+    return db
+
+
+async def teste_5_window():
+    print("\n5) get_conversation_window devolve as que ficaram de fora")
+    mensagens = [_msg(i) for i in range(1, 31)]
+    history, antigas = await ae.get_conversation_window("5583999990000", _db_com(mensagens), 400)
+    check("janela + antigas = tudo", len(history) + len(antigas) == 30,
+          f"{len(history)} + {len(antigas)}")
+    check("antigas em ordem cronológica, terminando onde a janela começa",
+          [m.id for m in antigas] == list(range(1, len(antigas) + 1)))
+    tpl = [_msg(1, "outbound", "template:boas_vindas", "template")]
+    h, a = await ae.get_conversation_window("5583999990000", _db_com(tpl), 400)
+    check("template continua virando placeholder", h == [{"role": "assistant",
+          "content": "[mensagem de template enviada]"}] and a == [])
+
+
+# ==========================================================================================
+# 6-7: resumo rolante
+# ==========================================================================================
+
+def _chat(texto):
+    resp = SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop",
+                                                    message=SimpleNamespace(content=texto))])
+    return AsyncMock(return_value=resp)
+
+
+async def teste_6_resumo_incremental():
+    print("\n6) resumo rolante incremental")
+    card = SimpleNamespace(contact_wa_id="5583999990000", history_summary=None,
+                           history_summary_until=None)
+    chat = _chat("Lead é enfermeira e quer Saúde Mental.")
+    with patch.object(ae, "RESUMO_ROLANTE_ATIVO", True), \
+         patch.object(ae.client.chat.completions, "create", chat):
+        r = await ae.resumo_rolante(card, [_msg(i) for i in range(1, 4)], None)
+        check("menos que o mínimo de novas → não chama o modelo",
+              chat.await_count == 0 and r == "")
+
+        r = await ae.resumo_rolante(card, [_msg(i) for i in range(1, 9)], None)
+        check("mínimo atingido → chama o modelo uma vez", chat.await_count == 1)
+        check("resumo gravado no card e devolvido",
+              card.history_summary == r == "Lead é enfermeira e quer Saúde Mental.")
+        check("marcador avança até a última incorporada", card.history_summary_until == 8)
+
+        await ae.resumo_rolante(card, [_msg(i) for i in range(1, 11)], None)
+        check("só 2 novas depois do marcador → não chama de novo", chat.await_count == 1)
+
+        await ae.resumo_rolante(card, [_msg(i) for i in range(1, 15)], None)
+        enviado = chat.await_args.kwargs["messages"][1]["content"]
+        check("atualização manda o resumo anterior + só as novas",
+              "Lead é enfermeira" in enviado and "msg 9 " in enviado and "msg 8 " not in enviado)
+
+
+async def teste_7_desligado():
+    print("\n7) resumo rolante desligado (padrão)")
+    check("nasce desligado sem AI_ROLLING_SUMMARY", ae.RESUMO_ROLANTE_ATIVO is False)
+    card = SimpleNamespace(contact_wa_id="x", history_summary=None, history_summary_until=None)
+    chat = _chat("nunca")
+    with patch.object(ae.client.chat.completions, "create", chat):
+        r = await ae.resumo_rolante(card, [_msg(i) for i in range(1, 40)], None)
+    check("desligado: nenhuma chamada ao modelo", chat.await_count == 0 and r == "")
+
+
+# ==========================================================================================
+# 8: a pergunta atual, cortada, não é mandada de novo inteira
+# ==========================================================================================
+
+def _res(valor):
+    m = MagicMock()
+    m.scalar_one_or_none.return_value = valor
+    return m
+
+
+async def teste_8_pergunta_atual_gigante():
+    print("\n8) pergunta atual gigante entra uma vez só")
+    anteriores = [{"role": "assistant", "content": "Qual sua formação?"},
+                  {"role": "user", "content": "oi"}]
+    janela, _ = ae.montar_janela([{"role": "user", "content": TEXTAO}] + anteriores, 1500)
+    check("e_pergunta_atual reconhece a versão cortada", ae.e_pergunta_atual(janela[-1], TEXTAO))
+    check("e_pergunta_atual não confunde prefixo sem marca de corte",
+          not ae.e_pergunta_atual({"role": "user", "content": "Sou enfermeira"}, TEXTAO))
+    check("e_pergunta_atual só vale para o lead",
+          not ae.e_pergunta_atual({"role": "assistant", "content": TEXTAO}, TEXTAO))
+
+    cfg = SimpleNamespace(is_enabled=True, system_prompt="prompt", model="gpt-5-mini",
+                          temperature="0.7", max_tokens=500)
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[_res(cfg), _res(SimpleNamespace(name="Ana")), _res(None)])
+    chat = _chat("resposta")
+    with patch.object(ae, "get_conversation_window", AsyncMock(return_value=(janela, []))), \
+         patch.object(ae, "search_knowledge", AsyncMock(return_value=[])), \
+         patch.object(ae, "get_course_catalog", AsyncMock(return_value=[])), \
+         patch.object(ae.client.chat.completions, "create", chat):
+        await ae.generate_ai_response("5583999990000", TEXTAO, 1, db)
+    enviadas = chat.await_args.kwargs["messages"][1:]
+    do_lead = [m for m in enviadas if m["content"].startswith("Sou enfermeira")]
+    check("a pergunta vai ao modelo uma vez só", len(do_lead) == 1, f"{len(do_lead)} vezes")
+    check("e vai cortada: o histórico cabe no orçamento", _custo(enviadas) <= 1500,
+          f"custo={_custo(enviadas)}")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("HISTÓRICO DA IA POR ORÇAMENTO DE TOKENS")
+    print("Nenhuma chamada de rede. Nenhuma conexão de banco.")
+    print("=" * 90)
+
+    teste_1_conversa_curta()
+    teste_2_texto_gigante_cortado()
+    teste_3_orcamento_estourado()
+    teste_4_prompt_limitado()
+    await teste_5_window()
+    await teste_6_resumo_incremental()
+    await teste_7_desligado()
+    await teste_8_pergunta_atual_gigante()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
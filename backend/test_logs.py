@@ -0,0 +1,215 @@
+"""Logs estruturados: JSON, fila fora do loop, descarte com fila cheia, amostragem e níveis.
+
+Rodar: cd backend && venv/bin/python test_logs.py
+
+NADA SAI DA MÁQUINA: o stdout é trocado por um stream em memória (às vezes propositalmente
+lento, para provar que quem espera é a thread do QueueListener e não o event loop).
+
+  1. formato: uma linha JSON por registro, com os `extra=` e o traceback separado
+  2. não bloqueia: stdout travado 50ms por linha, 200 linhas no loop em poucos ms
+  3. fila cheia: descarta e conta em log_records_dropped_total, sem exceção
+  4. amostragem: 1 a cada N por molde; linhas sem `amostra` passam todas
+  5. níveis por módulo (LOG_LEVELS) e loggers do uvicorn na mesma fila; token/ticket da URL
+     não chegam ao access log
+  6. SQL echo desligado por padrão
+"""
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+from app import logs
+from app import metrics as m
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class StreamLento(io.StringIO):
+    """stdout que demora `atraso` segundos por escrita — um journald engasgado."""
+
+    def __init__(self, atraso=0.0):
+        super().__init__()
+        self.atraso = atraso
+        self.liberado = threading.Event()
+        self.liberado.set()
+
+    def write(self, s):
+        self.liberado.wait()
+        time.sleep(self.atraso)
+        return super().write(s)
+
+
+def _linhas(stream):
+    return [json.loads(l) for l in stream.getvalue().splitlines() if l.strip()]
+
+
+def _reconfigurar(stream, **envs):
+    logs.encerrar_logs()
+    envs.setdefault("LOG_FORMATO", "json")
+    with patch.multiple(logs, **envs):
+        logs.configurar_logs(stream=stream)
+
+
+# ==========================================================================================
+
+def teste_1_formato():
+    print("1) formato")
+    saida = StreamLento()
+    _reconfigurar(saida)
+    logger = logging.getLogger("app.teste_formato")
+    logger.info("📤 NAT enviou '%s' para %s", "nat_boas_vindas", "5511900000001",
+                extra={"etapa": "nat_boas_vindas"})
+    try:
+        raise ValueError("quebrou")
+    except ValueError:
+        logger.exception("❌ falhou ao enviar")
+    logs.encerrar_logs()
+
+    linhas = _linhas(saida)
+    check("duas linhas JSON", len(linhas) == 2, f"{len(linhas)}")
+    primeira = linhas[0]
+    check("campos padrão", primeira["level"] == "INFO" and primeira["logger"] == "app.teste_formato"
+          and primeira["msg"] == "📤 NAT enviou 'nat_boas_vindas' para 5511900000001"
+          and primeira["ts"].endswith("+00:00"), f"{primeira}")
+    check("extra vira campo", primeira.get("etapa") == "nat_boas_vindas")
+    check("traceback em 'exc', fora da msg",
+          linhas[1]["msg"] == "❌ falhou ao enviar" and "ValueError: quebrou" in linhas[1]["exc"])
+
+
+async def teste_2_nao_bloqueia():
+    print("2) não bloqueia o loop")
+    saida = StreamLento(atraso=0.05)
+    _reconfigurar(saida)
+    logger = logging.getLogger("app.teste_carga")
+    inicio = time.perf_counter()
+    for i in range(200):
+        logger.info("💾 linha %s", i)
+    gasto = time.perf_counter() - inicio
+    check("200 linhas em menos de 50ms (o stdout levaria 10s)", gasto < 0.05, f"{gasto*1000:.1f}ms")
+    await asyncio.sleep(0)
+    escritas_ate_aqui = len(saida.getvalue().splitlines())
+    check("a escrita ficou para a thread", escritas_ate_aqui < 200, f"{escritas_ate_aqui}")
+    saida.atraso = 0
+    logs.encerrar_logs()
+    check("encerrar escoa a fila inteira", len(_linhas(saida)) == 200)
+
+
+def teste_3_fila_cheia():
+    print("3) fila cheia")
+    saida = StreamLento()
+    saida.liberado.clear()               # stdout travado de vez
+    _reconfigurar(saida, LOG_FILA=5)
+    antes = logs._descartados.valor()
+    logger = logging.getLogger("app.teste_cheia")
+    erro = None
+    try:
+        for i in range(50):
+            logger.warning("⚠️ linha %s", i)
+    except Exception as e:
+        erro = e
+    descartadas = logs._descartados.valor() - antes
+    check("nenhuma exceção para quem loga", erro is None, f"{erro}")
+    check("descartadas contadas", 40 <= descartadas <= 45, f"{descartadas}")
+    check("contador no /metrics", "log_records_dropped_total" in m.exposicao())
+    saida.liberado.set()
+    logs.encerrar_logs()
+
+
+def teste_4_amostragem():
+    print("4) amostragem")
+    saida = StreamLento()
+    _reconfigurar(saida)
+    logger = logging.getLogger("app.teste_amostra")
+    for i in range(100):
+        logger.error("❌ Relay CS falhou: %s", f"erro {i}", extra={"amostra": 10})
+    for i in range(7):
+        logger.info("♻️ outro molde %s", i, extra={"amostra": 10})
+    for i in range(5):
+        logger.info("✅ sem amostra %s", i)
+    logs.encerrar_logs()
+
+    linhas = _linhas(saida)
+    relay = [l for l in linhas if l["msg"].startswith("❌ Relay")]
+    check("1 a cada 10, começando pela primeira",
+          [l["msg"] for l in relay] == [f"❌ Relay CS falhou: erro {i}" for i in range(0, 100, 10)],
+          f"{len(relay)}")
+    check("a linha que sai diz quanto vale", all(l["amostra"] == 10 for l in relay))
+    check("contagem por molde: o outro molde tem a sua primeira",
+          sum(l["msg"].startswith("♻️") for l in linhas) == 1)
+    check("sem amostra passam todas", sum(l["msg"].startswith("✅") for l in linhas) == 5)
+
+
+def teste_5_niveis():
+    print("5) níveis por módulo e uvicorn")
+    saida = StreamLento()
+    _reconfigurar(saida, LOG_LEVELS="app.teste_verboso=DEBUG, app.teste_quieto=warning,lixo")
+    logging.getLogger("app.teste_verboso").debug("🔎 detalhe")
+    logging.getLogger("app.teste_quieto").info("📨 rotina")
+    logging.getLogger("app.teste_quieto").warning("⚠️ importante")
+    logging.getLogger("app.outro").debug("🔎 não deve sair")
+    logging.getLogger("uvicorn.access").info('%s - "%s %s HTTP/%s" %d',
+                                             "127.0.0.1:5000", "POST", "/webhook", "1.1", 200)
+    for url in ("/api/eventos/stream?token=eyJ.segredo.abc", "/api/eventos/stream?ticket=eyJ.t&x=1"):
+        logging.getLogger("uvicorn.access").info('%s - "%s %s HTTP/%s" %d',
+                                                 "127.0.0.1:5000", "GET", url, "1.1", 200)
+    logs.encerrar_logs()
+
+    msgs = [l["msg"] for l in _linhas(saida)]
+    check("DEBUG liberado só no módulo pedido", "🔎 detalhe" in msgs and "🔎 não deve sair" not in msgs)
+    check("WARNING no módulo quieto corta o INFO", msgs.count("⚠️ importante") == 1
+          and "📨 rotina" not in msgs)
+    check("access log do uvicorn sai pela fila, em JSON",
+          '127.0.0.1:5000 - "POST /webhook HTTP/1.1" 200' in msgs, f"{msgs}")
+    check("credencial da query vira ***",
+          '127.0.0.1:5000 - "GET /api/eventos/stream?token=*** HTTP/1.1" 200' in msgs
+          and '127.0.0.1:5000 - "GET /api/eventos/stream?ticket=***&x=1 HTTP/1.1" 200' in msgs
+          and not any("eyJ" in m for m in msgs), f"{msgs}")
+    for nome in ("app.teste_verboso", "app.teste_quieto"):
+        logging.getLogger(nome).setLevel(logging.NOTSET)
+
+
+def teste_6_sql_echo():
+    print("6) SQL echo")
+    from app import database
+
+    check("desligado por padrão", database.SQL_ECHO is False and database.engine.echo is False)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("LOGS ESTRUTURADOS — JSON, FILA, AMOSTRAGEM E NÍVEIS")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    try:
+        teste_1_formato()
+        await teste_2_nao_bloqueia()
+        teste_3_fila_cheia()
+        teste_4_amostragem()
+        teste_5_niveis()
+        teste_6_sql_echo()
+    finally:
+        logs.encerrar_logs()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
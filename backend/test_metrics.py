@@ -0,0 +1,221 @@
+"""Métricas do /metrics: rota, banco e APIs externas no formato texto do Prometheus.
+
+Rodar: cd backend && venv/bin/python test_metrics.py
+
+NADA SAI DA MÁQUINA: as APIs externas respondem por httpx.MockTransport, e o banco é um
+SQLite em memória com os MESMOS hooks que database.py pendura no engine do Postgres. O que
+o SQLite não prova é o asyncpg em si; o que ele prova é o caminho do hook até o request —
+inclusive de dentro do greenlet em que o SQLAlchemy async roda o driver.
+
+  1. formato: HELP/TYPE, baldes cumulativos, +Inf, _sum e _count, rótulo escapado
+  2. rota: molde da rota (não o path cru), status, 404 sem rota
+  3. banco: statements contados por request — também de dentro do greenlet — e job à parte
+  4. externas: status HTTP, exceção vira o nome da classe, HttpError vira o status dele
+  5. GET /metrics: aberto sem METRICS_TOKEN, 401 com token errado
+"""
+import asyncio
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.util import greenlet_spawn
+
+from app import metrics as m
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _app_com_banco():
+    engine = create_engine("sqlite://")
+    m.instrumentar_engine(engine)
+    app = FastAPI()
+    app.add_middleware(m.MetricasMiddleware)
+
+    @app.get("/api/contacts/{wa_id}")
+    async def contato(wa_id: str):
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        return {"wa_id": wa_id}
+
+    @app.get("/api/greenlet")
+    async def via_greenlet():
+        # O que o AsyncSession faz por baixo: o execute síncrono num greenlet filho.
+        def consultar():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        await greenlet_spawn(consultar)
+        return {}
+
+    @app.get("/api/quebra")
+    async def quebra():
+        from fastapi import HTTPException
+        raise HTTPException(status_code=409, detail="conflito")
+
+    return app, engine
+
+
+# ==========================================================================================
+
+def teste_1_formato():
+    print("1) formato")
+    h = m.Histograma("teste_formato_seconds", "Só para o teste.", ("rota",), baldes=(0.1, 1))
+    h.observar(0.05, rota='/a"b')
+    h.observar(0.5, rota='/a"b')
+    h.observar(3, rota='/a"b')
+    c = m.Contador("teste_formato_total", "Só para o teste.")
+    c.inc()
+    c.inc(2)
+    texto = m.exposicao()
+    try:
+        check("HELP e TYPE", "# TYPE teste_formato_seconds histogram" in texto
+              and "# HELP teste_formato_total Só para o teste." in texto)
+        check("baldes cumulativos",
+              'teste_formato_seconds_bucket{rota="/a\\"b",le="0.1"} 1' in texto
+              and 'teste_formato_seconds_bucket{rota="/a\\"b",le="1"} 2' in texto
+              and 'teste_formato_seconds_bucket{rota="/a\\"b",le="+Inf"} 3' in texto)
+        check("_sum e _count", 'teste_formato_seconds_sum{rota="/a\\"b"} 3.55' in texto
+              and 'teste_formato_seconds_count{rota="/a\\"b"} 3' in texto)
+        check("contador sem rótulo", "\nteste_formato_total 3\n" in texto)
+    finally:
+        m._registro.remove(h)
+        m._registro.remove(c)
+
+
+def teste_2_e_3_rota_e_banco():
+    print("2) rota  3) banco")
+    app, engine = _app_com_banco()
+    cliente = TestClient(app)
+    for wa in ("5511900000001", "5511900000002"):
+        cliente.get(f"/api/contacts/{wa}")
+    cliente.get("/api/quebra")
+    cliente.get("/nao/existe")
+
+    rota = "/api/contacts/{wa_id}"
+    check("molde da rota, não o path cru",
+          m.http_duracao.contagem(method="GET", route=rota, status=200) == 2
+          and "5511900000001" not in m.exposicao())
+    check("status de erro registrado",
+          m.http_duracao.contagem(method="GET", route="/api/quebra", status=409) == 1)
+    check("404 sem rota cai num rótulo só",
+          m.http_duracao.contagem(method="GET", route=m.ROTA_DESCONHECIDA, status=404) == 1)
+
+    check("3 statements por request", m.http_statements.contagem(route=rota) == 2
+          and m.http_statements.soma(route=rota) == 6, f"{m.http_statements.soma(route=rota)}")
+    check("tempo de SQL somado por request", m.http_sql_segundos.soma(route=rota) > 0)
+
+    cliente.get("/api/greenlet")
+    check("contados de dentro do greenlet", m.http_statements.soma(route="/api/greenlet") == 2,
+          f"{m.http_statements.soma(route='/api/greenlet')}")
+
+    antes = m.sql_duracao.contagem(origem="background")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    check("fora de request conta como background",
+          m.sql_duracao.contagem(origem="background") == antes + 1)
+
+    antes = m.sql_erros.valor(origem="background")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM tabela_que_nao_existe"))
+    except Exception:
+        pass
+    check("erro de SQL contado", m.sql_erros.valor(origem="background") == antes + 1)
+
+
+async def teste_4_externas():
+    print("4) externas")
+
+    def responder(request):
+        if request.url.path == "/cai":
+            raise httpx.ConnectTimeout("sem resposta", request=request)
+        return httpx.Response(200 if request.url.path == "/ok" else 503, json={})
+
+    async with m.cliente_http("teste_ext", transport=httpx.MockTransport(responder)) as c:
+        await c.get("https://graph.facebook.com/ok")
+        await c.get("https://graph.facebook.com/ok")
+        await c.get("https://graph.facebook.com/fora")
+        try:
+            await c.get("https://graph.facebook.com/cai")
+        except httpx.ConnectTimeout:
+            pass
+    check("status HTTP como rótulo",
+          m.externo_duracao.contagem(service="teste_ext", status=200) == 2
+          and m.externo_duracao.contagem(service="teste_ext", status=503) == 1)
+    check("exceção vira o nome da classe",
+          m.externo_duracao.contagem(service="teste_ext", status="ConnectTimeout") == 1)
+
+    class HttpErrorFalso(Exception):
+        resp = SimpleNamespace(status=429)
+
+    try:
+        with m.medir_externo("teste_google"):
+            raise HttpErrorFalso()
+    except HttpErrorFalso:
+        pass
+    with m.medir_externo("teste_google"):
+        pass
+    check("HttpError do Google vira o status dele; sucesso sem status vira ok",
+          m.externo_duracao.contagem(service="teste_google", status=429) == 1
+          and m.externo_duracao.contagem(service="teste_google", status="ok") == 1)
+
+    from app import google_executor as ge
+    await ge.executar(lambda: "ok")
+    check("google_executor mede o que roda no pool",
+          m.externo_duracao.contagem(service="google", status="ok") >= 1)
+
+
+def teste_5_endpoint():
+    print("5) GET /metrics")
+    from app import main as app_main
+
+    cliente = TestClient(app_main.app)
+    r = cliente.get("/metrics")
+    check("aberto sem METRICS_TOKEN", r.status_code == 200
+          and r.headers["content-type"].startswith("text/plain; version=0.0.4")
+          and "# TYPE http_request_duration_seconds histogram" in r.text)
+    cliente.get("/health")
+    r = cliente.get("/metrics")
+    check("o próprio app é medido", 'route="/health"' in r.text)
+
+    with patch.object(m, "METRICS_TOKEN", "segredo"):
+        negado = cliente.get("/metrics", headers={"Authorization": "Bearer errado"})
+        aceito = cliente.get("/metrics", headers={"Authorization": "Bearer segredo"})
+    check("401 com token errado, 200 com o certo",
+          negado.status_code == 401 and aceito.status_code == 200)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("MÉTRICAS — ROTA, BANCO E APIs EXTERNAS")
+    print("Nada enviado. Nenhuma conexão de banco de verdade.")
+    print("=" * 90 + "\n")
+
+    teste_1_formato()
+    teste_2_e_3_rota_e_banco()
+    await teste_4_externas()
+    teste_5_endpoint()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -323,7 +323,7 @@ async def caso_11_nat_sim_sem_formacao():
 async def caso_12_template_sem_payload_nao_regride():
     """O corpo enviado sem button_payloads tem que ser IDENTICO ao de antes da mudanca."""
     captura = _CapturaHTTP()
-    with patch("app.whatsapp.httpx.AsyncClient", captura):
+    with patch("app.metrics.httpx.AsyncClient", captura):
         await send_template_message(to="5583999998888", template_name="nat_boasvindas",
                                     language="pt_BR", phone_number_id="p", token="t",
                                     parameters=["Fulano", "Psicologia"])
@@ -344,7 +344,7 @@ async def caso_12_template_sem_payload_nao_regride():
 
     # Sem parâmetros também: nada de "components" vazio no corpo.
     captura2 = _CapturaHTTP()
-    with patch("app.whatsapp.httpx.AsyncClient", captura2):
+    with patch("app.metrics.httpx.AsyncClient", captura2):
         await send_template_message(to="x", template_name="t", language="pt_BR",
                                     phone_number_id="p", token="t")
     assert "components" not in captura2.enviado["template"], captura2.enviado
@@ -352,7 +352,7 @@ async def caso_12_template_sem_payload_nao_regride():
 
     # COM payloads: os componentes de botão entram por índice, sem tocar no body.
     captura3 = _CapturaHTTP()
-    with patch("app.whatsapp.httpx.AsyncClient", captura3):
+    with patch("app.metrics.httpx.AsyncClient", captura3):
         await send_template_message(to="x", template_name="nat_boasvindas", language="pt_BR",
                                     phone_number_id="p", token="t",
                                     parameters=["Fulano", "Psicologia"],
@@ -0,0 +1,264 @@
+"""nat_guard: cache do nat_config invalidado por versão e teto por hora em janela por minuto.
+
+Rodar: cd backend && venv/bin/python test_nat_guard_cache.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: o banco é um dublê que conta as consultas, e o
+NOTIFY é o callback chamado à mão, como o asyncpg chamaria. Que os triggers de
+nat_guard.instalar_gatilhos de fato disparem no UPDATE e no DELETE é o smoke contra o Postgres
+que prova.
+
+  1. sem LISTEN: o nat_config é relido a cada chamada (comportamento antigo)
+  2. com LISTEN: uma leitura só; NOTIFY de versão nova derruba o cache
+  3. NOTIFY no meio de uma leitura: o que foi lido NÃO entra no cache
+  4. LISTEN caiu: volta a ler a cada chamada, e o kill switch vale na hora
+  5. janela por minuto: soma só a última hora, reconcilia pelo MAIOR valor
+  6. reconciliação falha -> o guard bloqueia (falha fechada)
+  7. custo: 10.000 chamadas ao contador sem nenhuma query
+  8. triggers: sem eles o LISTEN não autoriza o cache; DELETE da linha avisa e desliga
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from app import nat_guard as ng
+from app.models import ExactLead, NatConfig
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+AGORA = datetime(2026, 7, 27, 10, 30, 15)
+CORTE = datetime(2026, 7, 25)
+
+
+def _cfg(enabled=True, teto=20, versao=1):
+    return NatConfig(id=1, nat_enabled=enabled, nat_start_at=CORTE, max_envios_hora=teto,
+                     versao=versao)
+
+
+def _lead():
+    lead = ExactLead(exact_id=1, name="Fulano", phone1="5583999998888", funnel_id=ng.FUNIL_NAT)
+    lead.register_date = datetime(2026, 7, 26, 10, 0)
+    return lead
+
+
+class BancoFalso:
+    """Responde à leitura do nat_config, do Contact e do COUNT agrupado. Conta as consultas."""
+    def __init__(self, config, baldes=(), falha_contagem=False):
+        self.config = config
+        self.baldes = list(baldes)
+        self.falha_contagem = falha_contagem
+        self.leituras_config = 0
+        self.contagens = 0
+        self.durante_leitura = None
+
+    async def execute(self, stmt, *a, **kw):
+        sql = str(stmt)
+        r = MagicMock()
+        if "FROM nat_config" in sql:
+            self.leituras_config += 1
+            if self.durante_leitura:
+                self.durante_leitura()
+            r.scalar_one_or_none.return_value = self.config
+        elif "date_trunc" in sql:
+            self.contagens += 1
+            if self.falha_contagem:
+                raise ConnectionError("banco fora")
+            r.all.return_value = self.baldes
+        else:
+            r.first.return_value = (4,)
+        return r
+
+
+def _zerar():
+    ng.escuta_config(False)
+    ng._envios_por_minuto.clear()
+    ng._reconciliado_em = None
+
+
+def _contador(n):
+    async def contar(db):
+        return n
+    return contar
+
+
+# ==========================================================================================
+
+async def teste_1_sem_listen():
+    print("1) sem LISTEN")
+    _zerar()
+    db = BancoFalso(_cfg())
+    for _ in range(3):
+        await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("3 chamadas, 3 leituras", db.leituras_config == 3, f"{db.leituras_config}")
+
+
+async def teste_2_com_listen():
+    print("2) com LISTEN")
+    _zerar()
+    ng.escuta_config(True)
+    db = BancoFalso(_cfg(versao=7))
+    for _ in range(5):
+        pode, _ = await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("5 chamadas, 1 leitura", db.leituras_config == 1 and pode, f"{db.leituras_config}")
+
+    ng.ao_notificar_config(None, 1, ng.CANAL_CONFIG, "7")
+    await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("NOTIFY da mesma versão não derruba", db.leituras_config == 1)
+
+    db.config = _cfg(enabled=False, versao=8)
+    ng.ao_notificar_config(None, 1, ng.CANAL_CONFIG, "8")
+    pode, motivo = await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("versão nova: relê e o kill switch vale", db.leituras_config == 2 and not pode,
+          motivo)
+
+
+async def teste_3_notify_durante_leitura():
+    print("3) NOTIFY no meio de uma leitura")
+    _zerar()
+    ng.escuta_config(True)
+    db = BancoFalso(_cfg(versao=1))
+    db.durante_leitura = lambda: ng.ao_notificar_config(None, 1, ng.CANAL_CONFIG, "2")
+    await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    db.durante_leitura = None
+    check("leitura possivelmente velha não foi guardada", ng._config_cache is None)
+    await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("a seguinte relê e aí guarda", db.leituras_config == 2 and ng._config_cache is not None)
+
+
+async def teste_4_listen_caiu():
+    print("4) LISTEN caiu")
+    _zerar()
+    ng.escuta_config(True)
+    db = BancoFalso(_cfg())
+    await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    ng.escuta_config(False)
+    db.config = _cfg(enabled=False)     # desligado sem NOTIFY nenhum chegar
+    pode, motivo = await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("relê sem depender de aviso", db.leituras_config == 2 and not pode, motivo)
+
+
+async def teste_5_janela():
+    print("5) janela por minuto")
+    _zerar()
+    for _ in range(2):
+        ng.registrar_envio_nat(AGORA - timedelta(minutes=61))
+    for _ in range(3):
+        ng.registrar_envio_nat(AGORA - timedelta(minutes=5))
+    ng.registrar_envio_nat(AGORA)
+    minuto_do_banco = AGORA.replace(second=0) - timedelta(minutes=5)
+    outro_processo = AGORA.replace(second=0) - timedelta(minutes=20)
+    db = BancoFalso(_cfg(), baldes=[(minuto_do_banco, 1), (outro_processo, 4)])
+
+    total = await ng.envios_nat_ultima_hora(db, agora=AGORA)
+    check("fora da hora não conta; banco soma o outro processo; memória ganha do banco",
+          total == 3 + 1 + 4, f"{total}")
+    await ng.envios_nat_ultima_hora(db, agora=AGORA)
+    check("uma reconciliação só dentro de RECONCILIAR_SEGUNDOS", db.contagens == 1)
+
+    ng._reconciliado_em = time.monotonic() - ng.RECONCILIAR_SEGUNDOS - 1
+    await ng.envios_nat_ultima_hora(db, agora=AGORA)
+    check("venceu: reconcilia de novo", db.contagens == 2)
+
+    db = BancoFalso(_cfg(teto=8))
+    with patch.object(ng, "_agora_sp", return_value=AGORA):
+        pode, motivo = await ng.nat_pode_atuar(_lead(), db)
+    check("guard usa a janela por padrão e bloqueia no teto", not pode and "8/8" in motivo,
+          motivo)
+
+
+async def teste_6_falha_fechada():
+    print("6) reconciliação falha")
+    _zerar()
+    db = BancoFalso(_cfg(), falha_contagem=True)
+    pode, motivo = await ng.nat_pode_atuar(_lead(), db)
+    check("bloqueia", not pode and "banco fora" in motivo, motivo)
+
+
+async def teste_7_custo():
+    print("7) custo")
+    _zerar()
+    db = BancoFalso(_cfg())
+    for i in range(60):
+        ng.registrar_envio_nat(AGORA - timedelta(minutes=i))
+    await ng.envios_nat_ultima_hora(db, agora=AGORA)
+    inicio = time.perf_counter()
+    for _ in range(10_000):
+        await ng.envios_nat_ultima_hora(db, agora=AGORA)
+    micros = (time.perf_counter() - inicio) / 10_000 * 1e6
+    check("nenhuma query além da reconciliação inicial", db.contagens == 1)
+    check("microssegundos por chamada", micros < 200, f"{micros:.1f}µs")
+
+
+class ConexaoListen:
+    """A conexão asyncpg do LISTEN: só responde quantos triggers existem."""
+    def __init__(self, instalados):
+        self.instalados = instalados
+
+    async def fetchval(self, sql, nomes):
+        return len([n for n in nomes if n in self.instalados])
+
+
+async def teste_8_gatilhos():
+    print("8) triggers do nat_config")
+    _zerar()
+    so_update = ConexaoListen({"nat_config_versionar"})
+    check("faltando o de DELETE: não autoriza", not await ng.conferir_gatilhos(so_update))
+    check("banco do create_all sem migração: não autoriza",
+          not await ng.conferir_gatilhos(ConexaoListen(set())))
+    ng.escuta_config(await ng.conferir_gatilhos(ConexaoListen(set())))
+    db = BancoFalso(_cfg())
+    for _ in range(3):
+        await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("LISTEN de pé sem trigger: relê a cada chamada", db.leituras_config == 3,
+          f"{db.leituras_config}")
+
+    todos = ConexaoListen(set(ng.GATILHOS_CONFIG))
+    check("todos instalados: autoriza", await ng.conferir_gatilhos(todos))
+    ng.escuta_config(await ng.conferir_gatilhos(todos))
+    db = BancoFalso(_cfg(versao=3))
+    await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    db.config = None                                    # DELETE FROM nat_config
+    ng.ao_notificar_config(None, 1, ng.CANAL_CONFIG, "0")
+    pode, motivo = await ng.nat_pode_atuar(_lead(), db, contar_envios=_contador(0))
+    check("DELETE avisa com versão 0: relê e ausência desliga", db.leituras_config == 2 and not pode,
+          motivo)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("NAT GUARD — CACHE DO nat_config E JANELA POR MINUTO")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    try:
+        await teste_1_sem_listen()
+        await teste_2_com_listen()
+        await teste_3_notify_durante_leitura()
+        await teste_4_listen_caiu()
+        await teste_5_janela()
+        await teste_6_falha_fechada()
+        await teste_7_custo()
+        await teste_8_gatilhos()
+    finally:
+        _zerar()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,251 @@
+"""Agendador da NAT: lote com SKIP LOCKED, trabalhadores concorrentes e despertador.
+
+Rodar: cd backend && venv/bin/python test_nat_scheduler_lote.py
+
+NADA SAI PARA O BANCO: a fila é a FilaFalsa de test_nat_sprint3 (só _proximas_acoes e
+_finalizar dublados), cada trabalhador ganha a própria SessaoFalsa, e o NOTIFY é conferido no
+SQL que o agendar manda executar. Que o Postgres de fato salte as linhas travadas é o smoke
+contra o banco real que responde, não este arquivo.
+
+  1. o SELECT do lote: FOR UPDATE SKIP LOCKED, LIMIT n, ORDER BY run_at
+  2. 40 ações, 4 trabalhadores: cada uma executa UMA vez, e os handlers se sobrepõem
+  3. handler que falha no meio do lote: só o savepoint dele volta, as vizinhas executam
+  4. commit do lote falha: resumo conta o erro e o lote não é repescado em rajada
+  5. agendar que vence antes do próximo tique faz pg_notify; o de daqui a 2 min, não
+  6. despertador: só adianta, e o NOTIFY recebido acorda o job no vencimento
+"""
+import asyncio
+import sys
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from app import nat_scheduler as ns
+from app.models import ACAO_EXECUTADO, ACAO_PENDENTE
+from test_nat_sprint3 import AGORA, FilaFalsa, ResultadoFalso, SessaoFalsa
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def fabrica_por_trabalhador(sessoes, commit_falha=False):
+    """Uma SessaoFalsa NOVA por `async with async_session()`, como o pool de verdade."""
+    class CM:
+        async def __aenter__(self):
+            sessao = SessaoFalsa()
+            if commit_falha:
+                sessao.commit = AsyncMock(side_effect=ConnectionError("conexão caiu"))
+            sessoes.append(sessao)
+            return sessao
+
+        async def __aexit__(self, *a):
+            return False
+    return lambda: CM()
+
+
+def _sql(stmt):
+    return " ".join(str(stmt.compile(dialect=postgresql.dialect(),
+                                     compile_kwargs={"literal_binds": True})).split())
+
+
+# ==========================================================================================
+
+async def teste_1_select_do_lote():
+    print("1) SELECT do lote")
+    capturado = {}
+
+    def resposta(stmt):
+        capturado["sql"] = _sql(stmt)
+        return ResultadoFalso()
+
+    class Resultado(ResultadoFalso):
+        def scalars(self):
+            return self
+
+        def all(self):
+            return []
+
+    sessao = SessaoFalsa(resposta_execute=lambda s: (resposta(s), Resultado())[1])
+    lote = await ns._proximas_acoes(sessao, AGORA, 7)
+    sql = capturado["sql"]
+    check("FOR UPDATE SKIP LOCKED", "FOR UPDATE SKIP LOCKED" in sql, sql[-60:])
+    check("LIMIT do tamanho pedido", "LIMIT 7" in sql)
+    check("ORDER BY run_at", "ORDER BY nat_scheduled_actions.run_at" in sql)
+    check("fila vazia -> lista vazia", lote == [])
+
+
+async def teste_2_concorrencia():
+    print("2) 40 ações, 4 trabalhadores")
+    fila = FilaFalsa()
+    for i in range(40):
+        fila.inserir(kind="__t__", wa=f"55119000000{i:02d}")
+    chamadas, rodando, pico = [], [0], [0]
+
+    async def handler(acao, db):
+        rodando[0] += 1
+        pico[0] = max(pico[0], rodando[0])
+        await asyncio.sleep(0.01)
+        rodando[0] -= 1
+        chamadas.append(acao["id"])
+
+    sessoes = []
+    p1, p2 = fila.patches()
+    with p1, p2, patch.dict(ns._HANDLERS, {"__t__": handler}), \
+         patch.object(ns, "async_session", new=fabrica_por_trabalhador(sessoes)):
+        resumo = await ns.processar_pendentes(agora=AGORA, limite=100, concorrencia=4)
+
+    check("cada ação executada exatamente uma vez",
+          sorted(chamadas) == list(range(1, 41)), f"{len(chamadas)} chamadas")
+    check("handlers em paralelo, sem passar da concorrência", 1 < pico[0] <= 4,
+          f"pico={pico[0]}")
+    check("um commit por lote, não por ação",
+          sum(s.commits for s in sessoes) == 40 // ns.LOTE,
+          f"{sum(s.commits for s in sessoes)} commits")
+    check("resumo", resumo == {ACAO_EXECUTADO: 40}, f"{resumo}")
+
+    fila2 = FilaFalsa()
+    for i in range(30):
+        fila2.inserir(kind="__t__", wa=f"55119000001{i:02d}")
+    chamadas.clear()
+    p1, p2 = fila2.patches()
+    with p1, p2, patch.dict(ns._HANDLERS, {"__t__": handler}), \
+         patch.object(ns, "async_session", new=fabrica_por_trabalhador([])):
+        resumo = await ns.processar_pendentes(agora=AGORA, limite=15, concorrencia=4)
+    check("teto da passada respeitado", len(chamadas) == 15, f"{len(chamadas)}")
+
+
+async def teste_3_falha_no_meio_do_lote():
+    print("3) handler que falha no meio do lote")
+    fila = FilaFalsa()
+    for i in range(5):
+        fila.inserir(kind="__t__", wa=f"55119000002{i:02d}")
+
+    async def handler(acao, db):
+        db.add(f"efeito-{acao['id']}")
+        if acao["id"] == 3:
+            raise RuntimeError("falha proposital")
+
+    sessoes = []
+    p1, p2 = fila.patches()
+    with p1, p2, patch.dict(ns._HANDLERS, {"__t__": handler}), \
+         patch.object(ns, "async_session", new=fabrica_por_trabalhador(sessoes)):
+        resumo = await ns.processar_pendentes(agora=AGORA, concorrencia=1)
+
+    check("vizinhas executadas", [fila.por_id(i).status for i in (1, 2, 4, 5)]
+          == [ACAO_EXECUTADO] * 4)
+    check("a que falhou segue pendente, com run_at empurrado",
+          fila.por_id(3).status == ACAO_PENDENTE and fila.por_id(3).run_at > AGORA)
+    check("só o efeito dela foi revertido",
+          sessoes[0].adicionados == ["efeito-1", "efeito-2", "efeito-4", "efeito-5"],
+          f"{sessoes[0].adicionados}")
+    check("resumo", resumo == {ACAO_EXECUTADO: 4, ACAO_PENDENTE: 1}, f"{resumo}")
+
+
+async def teste_4_commit_falha():
+    print("4) commit do lote falha")
+    fila = FilaFalsa()
+    fila.inserir(kind="__t__")
+    chamadas = []
+
+    async def handler(acao, db):
+        chamadas.append(acao["id"])
+
+    # O dublê de _finalizar grava na hora; o banco de verdade desfaria no rollback. Aqui o
+    # que se confere é o trabalhador: contabiliza o erro e não repesca o lote em rajada.
+    p1, p2 = fila.patches()
+    with p1, p2, patch.dict(ns._HANDLERS, {"__t__": handler}), \
+         patch.object(ns, "async_session", new=fabrica_por_trabalhador([], commit_falha=True)):
+        resumo = await ns.processar_pendentes(agora=AGORA, concorrencia=1)
+    check("erro contabilizado, sem contar como executado", resumo == {"erro": 1}, f"{resumo}")
+    check("lote não repescado na mesma passada", chamadas == [1], f"{chamadas}")
+
+
+async def teste_5_notify():
+    print("5) agendar e pg_notify")
+    for atraso, espera_notify in ((timedelta(seconds=20), True),
+                                  (timedelta(minutes=2), False)):
+        sessao = SessaoFalsa()
+        parametros = []
+        executar = sessao.execute
+
+        async def execute(stmt, params=None):
+            parametros.append(params)
+            return await executar(stmt)
+        sessao.execute = execute
+        with patch.object(ns, "cancelar", new=AsyncMock(return_value=0)), \
+             patch.object(ns, "_agora_sp", return_value=AGORA):
+            await ns.agendar("__t__", "5511900000001", AGORA + atraso, {}, sessao)
+        notifies = [p for s, p in zip(sessao.statements, parametros) if "pg_notify" in str(s)]
+        check(f"run_at +{int(atraso.total_seconds())}s -> "
+              f"{'NOTIFY' if espera_notify else 'sem NOTIFY'}",
+              len(notifies) == (1 if espera_notify else 0), f"{len(notifies)}")
+        if notifies:
+            params = notifies[0]
+            check("canal e payload com o run_at",
+                  params == {"canal": ns.CANAL_NOTIFY,
+                             "run_at": (AGORA + atraso).isoformat()}, f"{params}")
+
+
+async def teste_6_despertador():
+    print("6) despertador")
+    ns._acordar.clear()
+    ns._despertador = None
+    with patch.object(ns, "FOLGA_DESPERTAR_SEGUNDOS", 0.01):
+        ns.despertar_em(AGORA + timedelta(seconds=30), agora=AGORA)
+        primeiro = ns._despertador
+        ns.despertar_em(AGORA + timedelta(seconds=90), agora=AGORA)
+        check("vencimento mais tarde não atrasa o despertador", ns._despertador is primeiro)
+
+        # NOTIFY de uma ação que vence daqui a 50ms: o job acorda nela.
+        with patch.object(ns, "_agora_sp", return_value=AGORA):
+            ns._ao_notificar(None, 1, ns.CANAL_NOTIFY,
+                             (AGORA + timedelta(seconds=0.05)).isoformat())
+        check("vencimento mais cedo substitui o anterior",
+              ns._despertador is not primeiro and primeiro.cancelled())
+        check("ainda não acordou", not ns._acordar.is_set())
+        try:
+            await asyncio.wait_for(ns._acordar.wait(), timeout=1)
+            acordou = True
+        except asyncio.TimeoutError:
+            acordou = False
+        check("acordou no vencimento, sem esperar o tique", acordou)
+
+        ns._acordar.clear()
+        ns._ao_notificar(None, 1, ns.CANAL_NOTIFY, "lixo")
+        check("payload ilegível acorda na hora", ns._acordar.is_set())
+    ns._despertador.cancel()
+    ns._despertador = None
+    ns._acordar.clear()
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("AGENDADOR DA NAT — LOTE, CONCORRÊNCIA E DESPERTADOR")
+    print("Nada enviado. Nada gravado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    await teste_1_select_do_lote()
+    await teste_2_concorrencia()
+    await teste_3_falha_no_meio_do_lote()
+    await teste_4_commit_falha()
+    await teste_5_notify()
+    await teste_6_despertador()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -154,13 +154,18 @@ def fabrica_de_sessao(sessao):
 
 
 class FilaFalsa:
-    """A fila do agendador em memória, com o comportamento de _proxima_acao e _finalizar.
+    """A fila do agendador em memória, com o comportamento de _proximas_acoes e _finalizar.
 
     Só estes DOIS pontos são substituídos. _executar_acao, processar_pendentes, _snapshot, o
     despacho por kind e o savepoint de falha rodam de verdade.
+
+    `travadas` imita o efeito do SKIP LOCKED entre os trabalhadores concorrentes de uma
+    passada: o que um reivindicou, os outros não veem até o desfecho ser gravado. Não prova
+    nada sobre o Postgres (ver DIVISÃO DE TRABALHO) — só impede o dublê de executar em dobro.
     """
     def __init__(self):
         self.acoes = []
+        self.travadas = set()
         self._id = 1
 
     def inserir(self, kind=KIND_SLA_CHECK, wa="5511900000001", run_at=VENCIDA,
@@ -176,13 +181,16 @@ class FilaFalsa:
     def por_id(self, acao_id):
         return next(a for a in self.acoes if a.id == acao_id)
 
-    async def proxima_acao(self, db, corte):
-        vencidas = [a for a in self.acoes
-                    if a.status == ACAO_PENDENTE and a.run_at <= corte]
+    async def proximas_acoes(self, db, corte, quantas):
+        vencidas = [a for a in self.acoes if a.status == ACAO_PENDENTE
+                    and a.run_at <= corte and a.id not in self.travadas]
         vencidas.sort(key=lambda a: a.run_at)
-        return vencidas[0] if vencidas else None
+        lote = vencidas[:quantas]
+        self.travadas.update(a.id for a in lote)
+        return lote
 
     async def finalizar(self, db, acao_id, status, agora, attempts=None, run_at=None):
+        self.travadas.discard(acao_id)
         acao = self.por_id(acao_id)
         acao.status = status
         if attempts is not None:
@@ -193,7 +201,7 @@ class FilaFalsa:
             acao.processed_at = agora
 
     def patches(self):
-        return (patch.object(ns, "_proxima_acao", new=self.proxima_acao),
+        return (patch.object(ns, "_proximas_acoes", new=self.proximas_acoes),
                 patch.object(ns, "_finalizar", new=self.finalizar))
 
 
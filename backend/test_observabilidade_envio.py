@@ -9,10 +9,11 @@ efeito colateral que um suite não pode ter.
 
 DIVISÃO DE TRABALHO, para não fingir cobertura que não existe:
 
-  * O SQL — a janela de 1h, o `count(*) FILTER`, o índice parcial em welcome_wamid — só o
-    Postgres responde de verdade, e foi exercido contra o banco real durante as Fases 3 e 4
-    (dry-run de 254 leads, replay hora a hora do incidente). Um dublê que "confirmasse" o
-    resultado de um GROUP BY estaria confirmando a si mesmo.
+  * O SQL — a janela de 1h, o upsert dos baldes por minuto, o DISTINCT ON do estado de cada
+    fluxo, o índice parcial em welcome_wamid — só o Postgres responde de verdade, e fica para
+    o smoke contra o banco real (as Fases 3 e 4 fizeram o dry-run de 254 leads e o replay hora
+    a hora do incidente). Um dublê que "confirmasse" o resultado de um GROUP BY estaria
+    confirmando a si mesmo.
   * A LÓGICA — o pareamento por wamid, a recusa a desfazer um `failed`, o savepoint que
     protege o lote, as transições do alerta e a histerese entre os dois limiares — é o que
     este arquivo cobre, e cobre de verdade: `_realimentar_welcome_status`, `receive_webhook`
@@ -30,6 +31,7 @@ DIVISÃO DE TRABALHO, para não fingir cobertura que não existe:
  10. regressão dos suites existentes
 """
 import asyncio
+import json
 import subprocess
 import sys
 from types import SimpleNamespace
@@ -65,6 +67,9 @@ class ResultadoFalso:
     def first(self):
         return self._valor
 
+    def all(self):
+        return self._valor or []
+
 
 class SavepointFalso:
     """Emula begin_nested: na exceção, desfaz o que foi adicionado DENTRO dele e propaga."""
@@ -237,7 +242,7 @@ async def teste_4_falha_nao_derruba_lote():
     print("\n4) falha ao atualizar o lead → o lote de status segue processando")
 
     mensagens = {w: SimpleNamespace(wa_message_id=w, status="sent", error_code=None,
-                                    error_title=None, error_details=None)
+                                    error_title=None, error_details=None, template_name=None)
                  for w in ("wamid.A", "wamid.B", "wamid.C")}
 
     def responder(stmt):
@@ -261,7 +266,7 @@ async def teste_4_falha_nao_derruba_lote():
             {"id": "wamid.C", "status": "read"},
         ]}}]}]
     }
-    request = SimpleNamespace(json=AsyncMock(return_value=corpo))
+    request = SimpleNamespace(body=AsyncMock(return_value=json.dumps(corpo).encode()))
 
     # O do meio explode. Sem o savepoint + except do webhook, a transação do asyncpg ficaria
     # abortada e o wamid.C nem seria tentado.
@@ -271,7 +276,7 @@ async def teste_4_falha_nao_derruba_lote():
 
     # httpx mockado: sem isto o webhook faz um POST REAL para a CS Platform.
     with patch.object(app_main, "_realimentar_welcome_status", realimentar_com_bomba), \
-         patch.object(app_main.httpx, "AsyncClient") as relay:
+         patch.object(app_main, "cliente_http") as relay:
         relay.return_value.__aenter__.return_value.post = AsyncMock()
         await app_main.receive_webhook(request, db)
 
@@ -293,7 +298,9 @@ async def teste_4_falha_nao_derruba_lote():
 # ==========================================================================================
 
 class SessaoSaude(SessaoFalsa):
-    """Sessão que responde às 3 consultas do delivery_health a partir de números fixos.
+    """Sessão que responde às consultas do delivery_health a partir de números fixos.
+
+    Os números são de UM fluxo (canal 1, TEMPLATE) — o que a soma dos baldes devolveria.
 
     O estado do alerta NÃO é fixo: sai das notificações que os próprios ciclos adicionaram, que
     é como o código lê em produção (`ORDER BY id DESC`). É o que torna os testes 6 e 7 reais —
@@ -312,24 +319,34 @@ class SessaoSaude(SessaoFalsa):
         self.statements.append(stmt)
 
         if "FROM notifications" in texto:
-            saude = [n for n in self.notificacoes()
-                     if n.type in (dh.TIPO_QUEBROU, dh.TIPO_VOLTOU)]
-            return ResultadoFalso(
-                SimpleNamespace(type=saude[-1].type) if saude else None)
+            ultima = {}
+            for n in self.notificacoes():
+                if n.type in (dh.TIPO_QUEBROU, dh.TIPO_VOLTOU) and n.ref:
+                    ultima[n.ref] = SimpleNamespace(ref=n.ref, type=n.type)
+            return ResultadoFalso(list(ultima.values()))
 
         if "coalesce(error_code" in texto:
             return ResultadoFalso(
                 SimpleNamespace(codigo=self.erro_top, n=self.falhas_)
                 if self.erro_top else None)
 
-        if "count(*) FILTER" in texto:
-            return ResultadoFalso(
-                SimpleNamespace(total=self.total, falhas=self.falhas_))
+        if "FROM template_delivery_minuto" in texto:
+            return ResultadoFalso([SimpleNamespace(
+                channel_id=1, template_name=TEMPLATE, total=self.total, falhas=self.falhas_)]
+                if self.total else [])
 
         # select(User.id) — a gestora existe.
         return ResultadoFalso((dh.GESTOR_USER_ID,))
 
 
+TEMPLATE = "boas_vindas_nat"
+
+
+def fluxo(r):
+    """O resultado do único fluxo da SessaoSaude."""
+    return r["fluxos"][0]
+
+
 # ==========================================================================================
 # 5 e 6: quebra e não-repetição
 # ==========================================================================================
@@ -337,7 +354,7 @@ class SessaoSaude(SessaoFalsa):
 async def teste_5_alerta_quebrou():
     print("\n5) 10 envios / 6 falhas → notifica a gestão")
     db = SessaoSaude(total=10, falhas_=6, erro_top="131042")
-    r = await dh.avaliar(db)
+    r = fluxo(await dh.avaliar(db))
 
     notifs = db.notificacoes()
     check("uma notificação criada", len(notifs) == 1, f"{len(notifs)}")
@@ -350,14 +367,18 @@ async def teste_5_alerta_quebrou():
     check("corpo traz total, falhas e taxa",
           "6 de 10" in corpo and "60%" in corpo, corpo)
     check("corpo traz o error_code mais frequente", "131042" in corpo, corpo)
+    check("corpo e título dizem QUAL template",
+          TEMPLATE in corpo and TEMPLATE in notifs[0].title, notifs[0].title)
+    check("estado do fluxo guardado no ref", notifs[0].ref == f"template:1:{TEMPLATE}",
+          notifs[0].ref)
 
 
 async def teste_6_nao_repete():
     print("\n6) mesma condição no ciclo seguinte → NÃO notifica de novo")
     db = SessaoSaude(total=10, falhas_=6, erro_top="131042")
     await dh.avaliar(db)                      # ciclo 1: quebra
-    r2 = await dh.avaliar(db)                 # ciclo 2: mesma condição
-    r3 = await dh.avaliar(db)                 # ciclo 3: idem
+    r2 = fluxo(await dh.avaliar(db))          # ciclo 2: mesma condição
+    r3 = fluxo(await dh.avaliar(db))          # ciclo 3: idem
 
     check("segue com UMA notificação depois de 3 ciclos",
           len(db.notificacoes()) == 1, f"{len(db.notificacoes())}")
@@ -366,7 +387,7 @@ async def teste_6_nao_repete():
     check("estado continua 'alerta'", r3["estado"] == "alerta")
 
     # Histerese: entre 10% e 50% ninguém é avisado de nada.
-    r4 = await dh.avaliar(db.ajustar(total=10, falhas_=3))   # 30%
+    r4 = fluxo(await dh.avaliar(db.ajustar(total=10, falhas_=3)))   # 30%
     check("taxa de 30% (entre os limiares) não normaliza nem re-alerta",
           r4["transicao"] is None and r4["estado"] == "alerta")
 
@@ -383,20 +404,20 @@ async def teste_7_recuperacao():
     # ANTES de normalizar: 128 envios com 3 falhas é 2%, abaixo do limiar de 10% — mas com
     # falhas reais. É o cenário de 24/07: uma campanha em massa saudável escondendo a
     # boas-vindas 100% morta. Anunciar "normalizou" aqui seria um falso "está tudo bem".
-    r_falso = await dh.avaliar(db.ajustar(total=128, falhas_=3))
+    r_falso = fluxo(await dh.avaliar(db.ajustar(total=128, falhas_=3)))
     check("taxa de 2% COM falhas não anuncia normalização (anti-diluição)",
           r_falso["transicao"] is None and r_falso["estado"] == "alerta",
           f"transicao={r_falso['transicao']}")
 
     db.erro_top = None
-    r = await dh.avaliar(db.ajustar(total=10, falhas_=0))
+    r = fluxo(await dh.avaliar(db.ajustar(total=10, falhas_=0)))
     notifs = db.notificacoes()
     check("normalização notificada", len(notifs) == 2 and notifs[1].type == dh.TIPO_VOLTOU,
           f"{[n.type for n in notifs]}")
     check("transição registrada como alerta→normal",
           r["estado_anterior"] == "alerta" and r["estado"] == "normal")
 
-    r2 = await dh.avaliar(db)
+    r2 = fluxo(await dh.avaliar(db))
     check("ciclo seguinte não notifica de novo",
           len(db.notificacoes()) == 2 and r2["transicao"] is None)
 
@@ -408,7 +429,7 @@ async def teste_7_recuperacao():
 async def teste_8_volume_baixo():
     print("\n8) 3 envios / 3 falhas → NÃO alerta (abaixo do mínimo)")
     db = SessaoSaude(total=3, falhas_=3, erro_top="131042")
-    r = await dh.avaliar(db)
+    r = fluxo(await dh.avaliar(db))
     check("nenhuma notificação com 3 envios", db.notificacoes() == [],
           f"{len(db.notificacoes())}")
     check("estado continua normal apesar de 100% de falha",
@@ -419,8 +440,9 @@ async def teste_8_volume_baixo():
     await dh.avaliar(db2)                                    # entra em alerta
     r2 = await dh.avaliar(db2.ajustar(total=0, falhas_=0))
     check("janela sem nenhum envio NÃO anuncia normalização",
-          r2["transicao"] is None and r2["estado"] == "alerta",
-          f"transicao={r2['transicao']}")
+          r2["fluxos"] == [] and len(db2.notificacoes()) == 1
+          and r2["em_alerta"] == [f"template:1:{TEMPLATE}"],
+          f"em_alerta={r2['em_alerta']}")
 
 
 # ==========================================================================================
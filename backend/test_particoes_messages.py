@@ -0,0 +1,281 @@
+"""messages particionada por mês: modelo, job que cria os meses à frente e DETACH dos velhos.
+
+Rodar: cd backend && venv/bin/python test_particoes_messages.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: o banco é um dublê que guarda o SQL recebido. Que a
+cópia, a troca de nomes e a poda funcionem de verdade é a conferência do fim de
+migrate_messages_particionada.py, contra o Postgres.
+
+  1. modelo: PK (id, timestamp), UNIQUE (wa_message_id, timestamp), PARTITION BY RANGE
+  2. o UPDATE de status do ORM leva o timestamp no WHERE (cai numa partição só)
+  3. nomes das partições e a função SQL (DEFAULT com linhas do mês: move e faz ATTACH)
+  4. garantir_particoes: sem migração devolve None; com, lock curto e os meses à frente
+  5. job: dorme antes, avisa UMA vez sem migração, sobrevive a erro do banco
+  6. desanexar: só mês passado, só partição de messages, DETACH com lock curto
+  7. conferência da migração: partições lidas num EXPLAIN (FORMAT JSON); create_tables prepara
+"""
+import asyncio
+import logging
+import sys
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app import particoes as p
+from app.models import Message
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class BancoFalso:
+    """Guarda o SQL e responde à checagem da função, ao pg_inherits e à criação dos meses."""
+    def __init__(self, migrado=True, criadas=(), anexada=True, falha=None):
+        self.migrado = migrado
+        self.criadas = list(criadas)
+        self.anexada = anexada
+        self.falha = falha
+        self.sqls = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sqls.append((sql, params))
+        if self.falha:
+            raise self.falha
+        r = MagicMock()
+        if "to_regproc" in sql:
+            r.scalar.return_value = self.migrado
+        elif "pg_inherits" in sql:
+            r.scalar.return_value = 1 if self.anexada else None
+        elif "cenat_criar_particoes_messages(" in sql:
+            r.scalars.return_value.all.return_value = self.criadas
+        return r
+
+    async def commit(self):
+        self.commits += 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        return False
+
+
+class _Captura(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.mensagens = []
+
+    def emit(self, registro):
+        self.mensagens.append((registro.levelno, registro.getMessage()))
+
+
+# ==========================================================================================
+
+def teste_1_modelo():
+    print("1) modelo")
+    tabela = Message.__table__
+    check("PK (id, timestamp)", [c.name for c in tabela.primary_key.columns] == ["id", "timestamp"])
+    unicas = [tuple(c.name for c in u.columns) for u in tabela.constraints
+              if u.__class__.__name__ == "UniqueConstraint"]
+    check("UNIQUE (wa_message_id, timestamp)", unicas == [("wa_message_id", "timestamp")], f"{unicas}")
+    check("wa_message_id segue indexado (status do webhook)",
+          any([c.name for c in i.columns] == ["wa_message_id"] and not i.unique for i in tabela.indexes))
+    ddl = str(CreateTable(tabela).compile(dialect=postgresql.dialect()))
+    check("DDL particionada", 'PARTITION BY RANGE ("timestamp")' in ddl)
+    check("id continua BIGSERIAL", "id BIGSERIAL" in ddl)
+
+
+def teste_2_update():
+    print("2) UPDATE do ORM")
+    check("mapper conhece a PK composta",
+          [c.name for c in inspect(Message).primary_key] == ["id", "timestamp"])
+    # O flush identifica a linha pela identidade: é ela que vai para o WHERE do UPDATE.
+    quando = datetime(2026, 10, 19, 9, 30)
+    chave = inspect(Message).identity_key_from_primary_key((42, quando))
+    check("identidade (id, timestamp)", chave[1] == (42, quando), f"{chave}")
+
+
+def teste_3_nomes_e_funcao():
+    print("3) nomes e função SQL")
+    check("messages_pAAAA_MM", p.nome_particao(2026, 3) == "messages_p2026_03")
+    check("ordem lexical = ordem temporal", p.nome_particao(2025, 12) < p.nome_particao(2026, 1))
+    f = p.FUNCAO_SQL
+    check("cria com PARTITION OF quando a DEFAULT não tem o mês", "PARTITION OF messages FOR VALUES" in f)
+    check("com linhas na DEFAULT: move e ATTACH",
+          "DELETE FROM messages_pdefault" in f and "ATTACH PARTITION" in f)
+    check("só cria o que não existe", "to_regclass(nome) IS NULL" in f)
+    check("devolve os nomes criados", "RETURNS SETOF text" in f and "RETURN NEXT nome" in f)
+
+
+async def teste_4_garantir():
+    print("4) garantir_particoes")
+    db = BancoFalso(migrado=False)
+    check("sem migração: None", await p.garantir_particoes(db) is None)
+    check("sem migração: nada além da checagem", len(db.sqls) == 1)
+
+    db = BancoFalso(criadas=["messages_p2026_12"])
+    criadas = await p.garantir_particoes(db, meses_a_frente=2)
+    sqls = [s for s, _ in db.sqls]
+    check("devolve as criadas", criadas == ["messages_p2026_12"])
+    check("lock_timeout curto ANTES de criar",
+          "lock_timeout = '3s'" in sqls[1] and "cenat_criar_particoes_messages" in sqls[2])
+    check("meses à frente repassados", db.sqls[2][1] == {"meses": 2})
+
+    db = BancoFalso(criadas=[])
+    await p.preparar(db, de=date(2024, 5, 17))
+    sqls = [s for s, _ in db.sqls]
+    check("preparar: função, DEFAULT e meses desde `de`",
+          "CREATE OR REPLACE FUNCTION" in sqls[0] and "DEFAULT" in sqls[1]
+          and db.sqls[2][1]["de"] == date(2024, 5, 17))
+
+
+async def _rodar_job(bancos, ciclos):
+    dormidas = []
+
+    async def dormir(segundos):
+        dormidas.append(segundos)
+        if len(dormidas) > ciclos:
+            raise asyncio.CancelledError
+
+    fila = iter(bancos)
+    captura = _Captura()
+    p.logger.addHandler(captura)
+    p.logger.setLevel(logging.INFO)
+    with patch.object(p.asyncio, "sleep", dormir), \
+         patch.object(p, "async_session", lambda: next(fila)):
+        try:
+            await p.manter_particoes_job()
+        except asyncio.CancelledError:
+            pass
+    p.logger.removeHandler(captura)
+    return dormidas, captura.mensagens
+
+
+async def teste_5_job():
+    print("5) job")
+    sem = [BancoFalso(migrado=False) for _ in range(3)]
+    dormidas, logs = await _rodar_job(sem, 3)
+    check("dorme antes de trabalhar", dormidas[0] == p.INTERVALO_SEGUNDOS and sem[0].sqls)
+    avisos = [m for n, m in logs if n == logging.WARNING]
+    check("sem migração: avisa uma vez só", len(avisos) == 1, f"{avisos}")
+
+    bancos = [BancoFalso(falha=ConnectionError("banco fora")),
+              BancoFalso(criadas=["messages_p2027_01"])]
+    dormidas, logs = await _rodar_job(bancos, 2)
+    check("erro vira log e o loop segue", any(n == logging.ERROR for n, _ in logs) and len(dormidas) == 3)
+    check("criação logada e commitada",
+          any("messages_p2027_01" in m for _, m in logs) and bancos[1].commits == 1)
+
+
+async def teste_6_desanexar():
+    print("6) desanexar")
+    hoje = date(2026, 10, 19)
+    for ano, mes, nome in ((2026, 10, "mês corrente"), (2026, 11, "mês futuro"), (2027, 1, "ano seguinte")):
+        db = BancoFalso()
+        try:
+            await p.desanexar(db, ano, mes, hoje=hoje)
+            check(f"{nome}: recusado", False)
+        except ValueError:
+            check(f"{nome}: recusado sem tocar no banco", db.sqls == [])
+
+    db = BancoFalso(anexada=False)
+    try:
+        await p.desanexar(db, 2026, 1, hoje=hoje)
+        check("não anexada: recusado", False)
+    except ValueError:
+        check("não anexada: recusado, sem DETACH", not any("DETACH" in s for s, _ in db.sqls))
+
+    db = BancoFalso()
+    nome = await p.desanexar(db, 2025, 12, hoje=hoje)
+    sqls = [s for s, _ in db.sqls]
+    check("devolve o nome", nome == "messages_p2025_12")
+    check("lock curto e DETACH simples (DEFAULT proíbe CONCURRENTLY)",
+          "lock_timeout" in sqls[1] and sqls[2] == "ALTER TABLE messages DETACH PARTITION messages_p2025_12")
+    check("sem DELETE", not any("DELETE" in s for s in sqls))
+    check("commit é de quem chama", db.commits == 0)
+
+
+async def teste_7_migracao():
+    print("7) conferência da migração")
+    import migrate_messages_particionada as m
+    from app import create_tables
+
+    plano = [{"Plan": {"Node Type": "Aggregate", "Plans": [{"Node Type": "Append", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "messages_p2026_10"},
+        {"Node Type": "Index Scan", "Relation Name": "messages_pdefault"},
+        {"Node Type": "Seq Scan", "Relation Name": "contacts"},
+    ]}]}}]
+    check("partições lidas no plano", m._particoes_no_plano(plano) == {"messages_p2026_10", "messages_pdefault"})
+    check("janelas de produção conferidas", set(m.CONSULTAS_PODA) >= {
+        "dashboard: semana", "nat_guard: última hora", "delivery_health: últimas 24h"})
+    check("corte em literal (poda no planejamento)",
+          all("'{corte}'" in sql for _, sql in m.CONSULTAS_PODA.values()))
+
+    chamadas = []
+
+    class Conexao:
+        async def run_sync(self, fn):
+            chamadas.append("create_all")
+
+    class Engine:
+        def begin(self):
+            conn = Conexao()
+
+            class Ctx:
+                async def __aenter__(self):
+                    return conn
+
+                async def __aexit__(self, *a):
+                    return False
+            return Ctx()
+
+    async def preparar(conn):
+        chamadas.append("preparar")
+
+    async def instalar_gatilhos(conn):
+        chamadas.append("gatilhos")
+
+    with patch.object(create_tables, "engine", Engine()), \
+         patch.object(create_tables.particoes, "preparar", preparar), \
+         patch.object(create_tables.nat_guard, "instalar_gatilhos", instalar_gatilhos):
+        await create_tables.create_all()
+    check("create_tables: create_all, as partições e os triggers do nat_config",
+          chamadas == ["create_all", "preparar", "gatilhos"], f"{chamadas}")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("MESSAGES PARTICIONADA POR MÊS — JOB E DETACH")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    teste_1_modelo()
+    teste_2_update()
+    teste_3_nomes_e_funcao()
+    await teste_4_garantir()
+    await teste_5_job()
+    await teste_6_desanexar()
+    await teste_7_migracao()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
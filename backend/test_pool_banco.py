@@ -0,0 +1,187 @@
+"""Pool de conexões: configuração por ambiente, espera medida, timeout contado e teto por rota.
+
+Rodar: cd backend && venv/bin/python test_pool_banco.py
+
+NENHUMA CONEXÃO DE BANCO DE VERDADE: o pool recebe conexões de mentira (o PoolMedido é o mesmo
+que o engine usa, só sem o asyncpg atrás), e o SET LOCAL é conferido num SQLite em memória
+que troca o statement por um SELECT inofensivo depois de anotá-lo.
+
+  1. criar_engine: pool, pre_ping, recycle, statement_timeout e cache do asyncpg pelo ambiente
+  2. pool seco: a espera é limitada por DB_POOL_TIMEOUT, contada e medida
+  3. gauges do pool no /metrics
+  4. get_db_com_timeout: SET LOCAL no início de CADA transação da sessão
+  5. GET /api/debug/pool só para admin
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import Session
+from sqlalchemy.util import greenlet_spawn
+
+from app import database as d
+from app import metrics as m
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class ConexaoFalsa:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ==========================================================================================
+
+def teste_1_criar_engine():
+    print("1) criar_engine")
+    engine = d.criar_engine()
+    pool = engine.pool
+    check("PoolMedido com o tamanho do ambiente",
+          isinstance(pool, d.PoolMedido) and pool.size() == d.DB_POOL_SIZE
+          and pool._max_overflow == d.DB_MAX_OVERFLOW and pool.timeout() == d.DB_POOL_TIMEOUT)
+    check("pre_ping e recycle", pool._pre_ping is d.DB_POOL_PRE_PING
+          and pool._recycle == d.DB_POOL_RECYCLE)
+    check("echo desligado", engine.echo is False)
+
+    with patch.object(d, "create_async_engine", wraps=d.create_async_engine) as criar:
+        d.criar_engine()
+    kwargs = criar.call_args.kwargs["connect_args"]
+    check("statement_timeout global no server_settings",
+          kwargs["server_settings"]["statement_timeout"] == str(d.DB_STATEMENT_TIMEOUT_MS),
+          f"{kwargs.get('server_settings')}")
+    check("cache de prepared statements",
+          kwargs["prepared_statement_cache_size"] == d.DB_PREPARED_CACHE)
+
+    menor = d.criar_engine(pool_size=2, pool_timeout=1)
+    check("sobrepor troca só o que foi pedido",
+          menor.pool.size() == 2 and menor.pool.timeout() == 1
+          and menor.pool._max_overflow == d.DB_MAX_OVERFLOW)
+
+
+async def teste_2_pool_seco():
+    print("2) pool seco")
+    pool = d.PoolMedido(ConexaoFalsa, pool_size=1, max_overflow=0, timeout=0.2)
+    checkouts, timeouts = d.espera_pool.contagem(), d.timeouts_pool.valor()
+    resultado = {}
+
+    def esgotar():
+        emprestada = pool.connect()
+        resultado["durante"] = d.estado_pool(pool)
+        inicio = time.perf_counter()
+        try:
+            pool.connect()
+        except PoolTimeout:
+            resultado["erro"] = True
+        resultado["esperou"] = time.perf_counter() - inicio
+        emprestada.close()
+        resultado["depois"] = d.estado_pool(pool)
+
+    await greenlet_spawn(esgotar)
+    check("em uso enquanto emprestada", resultado["durante"]["in_use"] == 1
+          and resultado["durante"]["idle"] == 0)
+    check("espera limitada pelo timeout, com erro", resultado.get("erro") is True
+          and 0.2 <= resultado["esperou"] < 1, f"{resultado['esperou']:.3f}s")
+    check("timeout contado", d.timeouts_pool.valor() == timeouts + 1)
+    check("as duas esperas medidas, a do timeout inclusive",
+          d.espera_pool.contagem() == checkouts + 2 and resultado["depois"]["espera_total_s"] >= 0.2)
+    check("devolvida volta a ociosa", resultado["depois"]["in_use"] == 0
+          and resultado["depois"]["idle"] == 1)
+
+
+def teste_3_gauges():
+    print("3) gauges")
+    texto = m.exposicao()
+    check("TYPE gauge", "# TYPE db_pool_in_use gauge" in texto
+          and "# TYPE db_pool_idle gauge" in texto and "# TYPE db_pool_overflow gauge" in texto)
+    check("valores lidos do engine", "\ndb_pool_in_use 0\n" in texto)
+    check("espera e timeouts expostos", "db_pool_checkout_wait_seconds_bucket" in texto
+          and "\ndb_pool_timeouts_total " in texto)
+
+
+def teste_4_timeout_por_rota():
+    print("4) SET LOCAL por transação")
+    engine = create_engine("sqlite://")
+    vistos = []
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def anotar(conn, cursor, statement, parameters, context, executemany):
+        vistos.append(statement)
+        if statement.startswith("SET LOCAL"):
+            return "SELECT 1", ()
+        return statement, parameters
+
+    with Session(engine) as sessao:
+        event.listen(sessao, "after_begin", d._timeout_local(5000))
+        sessao.execute(text("SELECT 42"))
+        sessao.commit()
+        sessao.execute(text("SELECT 43"))
+        sessao.rollback()
+    check("SET LOCAL antes do primeiro statement de cada transação",
+          vistos == ["SET LOCAL statement_timeout = 5000", "SELECT 42",
+                     "SET LOCAL statement_timeout = 5000", "SELECT 43"], f"{vistos}")
+
+    from app import main as app_main
+    webhook = next(r for r in app_main.app.routes
+                   if getattr(r, "path", None) == "/webhook" and "POST" in r.methods)
+    fabrica = webhook.dependant.dependencies[0].call
+    check("webhook usa a sessão com teto próprio", fabrica.__qualname__.startswith(
+        "get_db_com_timeout"), fabrica.__qualname__)
+
+
+def teste_5_debug_pool():
+    print("5) GET /api/debug/pool")
+    from app import main as app_main
+    from app.auth import get_current_user
+
+    cliente = TestClient(app_main.app)
+    app_main.app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(role="comercial")
+    try:
+        negado = cliente.get("/api/debug/pool")
+        app_main.app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(role="admin")
+        aceito = cliente.get("/api/debug/pool")
+    finally:
+        app_main.app.dependency_overrides.clear()
+    check("403 para não admin", negado.status_code == 403)
+    corpo = aceito.json() if aceito.status_code == 200 else {}
+    check("admin vê o retrato do pool", {"in_use", "idle", "overflow", "timeouts",
+                                        "espera_total_s"} <= set(corpo), f"{corpo}")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("POOL DE CONEXÕES — CONFIGURAÇÃO, ESPERA, TIMEOUTS E TETO POR ROTA")
+    print("Nada enviado. Nenhuma conexão de banco de verdade.")
+    print("=" * 90 + "\n")
+
+    teste_1_criar_engine()
+    await teste_2_pool_seco()
+    teste_3_gauges()
+    teste_4_timeout_por_rota()
+    teste_5_debug_pool()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
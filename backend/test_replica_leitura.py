@@ -0,0 +1,205 @@
+"""Réplica de leitura: para onde get_read_db manda cada sessão, e por quê.
+
+Rodar: cd backend && venv/bin/python test_replica_leitura.py
+
+NENHUMA CONEXÃO DE BANCO: réplica e primário são fábricas de sessão de mentira que só dizem
+quem são (e, a réplica, se está de pé). O que se confere é a DECISÃO de roteamento; o
+read-only de verdade fica no server_settings do engine de leitura, conferido no item 6.
+
+  1. sem DATABASE_READ_URL: tudo no primário, como antes
+  2. réplica de pé: leitura vai para ela
+  3. X-Read-Primary: 1 força o primário
+  4. read-your-writes: quem escreveu com sucesso lê do primário pela janela; erro não marca
+  5. réplica fora: cai no primário e não tenta de novo até a pausa vencer
+  6. engine de leitura sobe read-only, com pool próprio
+  7. as seis rotas de leitura declaram get_read_db
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database as d
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+class SessaoFalsa:
+    def __init__(self, nome, fora=False):
+        self.nome, self.fora = nome, fora
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        return False
+
+    async def connection(self):
+        if self.fora:
+            raise ConnectionRefusedError("réplica desligada")
+
+
+class Fabrica:
+    def __init__(self, nome, fora=False):
+        self.nome, self.fora, self.abertas = nome, fora, 0
+
+    def __call__(self):
+        self.abertas += 1
+        return SessaoFalsa(self.nome, self.fora)
+
+
+async def _destino(headers=None):
+    gerador = d.get_read_db(SimpleNamespace(headers=headers or {}))
+    sessao = await gerador.__anext__()
+    await gerador.aclose()
+    return sessao.nome
+
+
+def _cenario(replica):
+    d._escritas.clear()
+    return patch.multiple(d, async_session=Fabrica("primario"), async_session_leitura=replica,
+                          _replica_fora_ate=0.0)
+
+
+# ==========================================================================================
+
+async def teste_1_sem_replica():
+    print("1) sem réplica")
+    antes = d.sessoes_leitura.valor(destino="primario", motivo="sem_replica")
+    with _cenario(None):
+        destino = await _destino()
+    check("primário", destino == "primario")
+    check("contado como sem_replica",
+          d.sessoes_leitura.valor(destino="primario", motivo="sem_replica") == antes + 1)
+
+
+async def teste_2_replica():
+    print("2) réplica de pé")
+    with _cenario(Fabrica("replica")):
+        destino = await _destino({"authorization": "Bearer a"})
+    check("réplica", destino == "replica")
+
+
+async def teste_3_header():
+    print("3) X-Read-Primary")
+    with _cenario(Fabrica("replica")):
+        sim = await _destino({d.HEADER_LER_PRIMARIO: "1"})
+        nao = await _destino({d.HEADER_LER_PRIMARIO: "0"})
+    check("1 força o primário", sim == "primario")
+    check("0 segue para a réplica", nao == "replica")
+
+
+async def teste_4_read_your_writes():
+    print("4) read-your-writes")
+    app = FastAPI()
+    app.add_middleware(d.LeituraAposEscritaMiddleware)
+
+    @app.post("/api/contacts/{wa_id}/notes")
+    async def salvar(wa_id: str):
+        return {"ok": True}
+
+    @app.post("/api/contacts/{wa_id}/erro")
+    async def quebrar(wa_id: str):
+        from fastapi import HTTPException
+        raise HTTPException(status_code=422, detail="inválido")
+
+    cliente = TestClient(app)
+    with _cenario(Fabrica("replica")):
+        cliente.post("/api/contacts/5511/erro", headers={"Authorization": "Bearer b"})
+        apos_erro = await _destino({"authorization": "Bearer b"})
+        cliente.post("/api/contacts/5511/notes", headers={"Authorization": "Bearer a"})
+        quem_escreveu = await _destino({"authorization": "Bearer a"})
+        outro = await _destino({"authorization": "Bearer b"})
+        d._escritas["Bearer a"] = time.monotonic() - d.DB_READ_APOS_ESCRITA_S - 1
+        janela_vencida = await _destino({"authorization": "Bearer a"})
+        cliente.post("/api/contacts/5511/notes")
+        sem_token = set(d._escritas)
+    check("escrita com erro não marca", apos_erro == "replica")
+    check("quem escreveu lê do primário", quem_escreveu == "primario")
+    check("outro usuário segue na réplica", outro == "replica")
+    check("janela vencida volta à réplica", janela_vencida == "replica")
+    check("sem Authorization não marca nada", sem_token == {"Bearer a"}, f"{sem_token}")
+
+
+async def teste_5_replica_fora():
+    print("5) réplica fora")
+    replica = Fabrica("replica", fora=True)
+    with _cenario(replica):
+        primeira = await _destino()
+        segunda = await _destino()
+        tentativas = replica.abertas
+        replica.fora = False
+        d._replica_fora_ate = time.monotonic() - 1
+        depois = await _destino()
+    check("cai no primário na hora", primeira == "primario")
+    check("pausada: a segunda nem tenta a réplica", segunda == "primario" and tentativas == 1,
+          f"{tentativas} tentativas")
+    check("pausa vencida: volta à réplica", depois == "replica")
+
+
+def teste_6_engine_leitura():
+    print("6) engine de leitura")
+    with patch.object(d, "create_async_engine", wraps=d.create_async_engine) as criar:
+        engine = d.criar_engine(somente_leitura=True, pool_size=d.DB_READ_POOL_SIZE)
+    ajustes = criar.call_args.kwargs["connect_args"]["server_settings"]
+    check("default_transaction_read_only", ajustes.get("default_transaction_read_only") == "on")
+    check("se identifica à parte no pg_stat_activity",
+          ajustes["application_name"] == "cenat-backend-leitura")
+    check("pool próprio", engine.pool.size() == d.DB_READ_POOL_SIZE
+          and isinstance(engine.pool, d.PoolMedido))
+    with patch.object(d, "create_async_engine", wraps=d.create_async_engine) as criar:
+        d.criar_engine()
+    check("o primário não é read-only", "default_transaction_read_only"
+          not in criar.call_args.kwargs["connect_args"]["server_settings"])
+
+
+def teste_7_rotas():
+    print("7) rotas de leitura")
+    from app import main as app_main
+
+    def usa_leitura(rota):
+        return any(dep.call is d.get_read_db for dep in rota.dependant.dependencies)
+
+    por_nome = {getattr(r, "name", None): r for r in app_main.app.routes}
+    for nome in ("dashboard_stats", "list_contacts", "list_exact_leads", "exact_leads_stats",
+                 "kanban_stats", "list_call_logs"):
+        check(f"{nome} lê pela get_read_db", nome in por_nome and usa_leitura(por_nome[nome]))
+    check("o webhook segue no primário", not usa_leitura(por_nome["receive_webhook"]))
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("RÉPLICA DE LEITURA — ROTEAMENTO, READ-YOUR-WRITES E QUEDA PARA O PRIMÁRIO")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    await teste_1_sem_replica()
+    await teste_2_replica()
+    await teste_3_header()
+    await teste_4_read_your_writes()
+    await teste_5_replica_fora()
+    teste_6_engine_leitura()
+    teste_7_rotas()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
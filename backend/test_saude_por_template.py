@@ -0,0 +1,345 @@
+"""Saúde de entrega por fluxo (canal, template), a partir de contadores por minuto.
+
+Rodar: cd backend && venv/bin/python test_saude_por_template.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: a sessão é um dublê que guarda os baldes por minuto
+num dict e responde à soma deles. O SQL de verdade (ON CONFLICT, DISTINCT ON) fica para o
+smoke contra o Postgres — aqui se confere o que o código manda e o que ele decide.
+
+  1. contar_desfecho conta TRANSIÇÃO: sent→delivered e sent→failed contam; read depois de
+     delivered e failed reentregue, não
+  2. webhook de status soma no balde do template; mensagem sem template não toca no balde
+  3. a diluição de 24/07 16h: campanha saudável + boas-vindas morta -> só a boas-vindas alerta
+  4. estado por fluxo: um fluxo em alerta não segura nem repete o alerta de outro
+  5. NAT grava template_name só quando sai template
+  6. avaliar lê baldes, nunca varre messages
+  7. delivered e read da mesma mensagem em dois webhooks simultâneos: UMA entrega no balde
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app import delivery_health as dh
+from app.models import Notification
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+AGORA = datetime(2026, 7, 24, 16, 40, 27)
+
+
+class Resultado:
+    def __init__(self, valor=None, linhas=()):
+        self._valor, self._linhas = valor, list(linhas)
+
+    def first(self):
+        return self._valor
+
+    def all(self):
+        return self._linhas
+
+
+class Savepoint:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        return False
+
+
+class SessaoBaldes:
+    """Baldes por minuto em memória + as notificações que os ciclos adicionaram."""
+    def __init__(self):
+        self.baldes = {}          # (canal, template, minuto) -> [entregues, falhas]
+        self.adicionados = []
+        self.sqls = []
+
+    def add(self, obj):
+        self.adicionados.append(obj)
+
+    def begin_nested(self):
+        return Savepoint()
+
+    async def commit(self):
+        pass
+
+    def notificacoes(self):
+        return [o for o in self.adicionados if isinstance(o, Notification)]
+
+    def encher(self, canal, template, entregues, falhas_):
+        self.baldes[(canal, template, AGORA.replace(second=0))] = [entregues, falhas_]
+
+    async def execute(self, stmt, params=None, *a, **kw):
+        sql = str(stmt)
+        self.sqls.append(sql)
+        if "INSERT INTO template_delivery_minuto" in sql:
+            chave = (params["canal"], params["template"], params["minuto"])
+            balde = self.baldes.setdefault(chave, [0, 0])
+            balde[0] += params["entregues"]
+            balde[1] += params["falhas"]
+            return Resultado()
+        if "FROM template_delivery_minuto" in sql:
+            soma = {}
+            for (canal, template, minuto), (e, f) in self.baldes.items():
+                if params["inicio"] <= minuto <= params["agora"]:
+                    t = soma.setdefault((canal, template), [0, 0])
+                    t[0] += e + f
+                    t[1] += f
+            return Resultado(linhas=[
+                SimpleNamespace(channel_id=c, template_name=t, total=v[0], falhas=v[1])
+                for (c, t), v in sorted(soma.items())])
+        if "FROM notifications" in sql:
+            ultima = {}
+            for n in self.notificacoes():
+                ultima[n.ref] = SimpleNamespace(ref=n.ref, type=n.type)
+            return Resultado(linhas=list(ultima.values()))
+        if "coalesce(error_code" in sql:
+            return Resultado(SimpleNamespace(codigo="131042", n=params and 1))
+        return Resultado((dh.GESTOR_USER_ID,))           # select(User.id)
+
+
+def msg(status="sent", template="boas_vindas_nat", canal=1, direction="outbound"):
+    return SimpleNamespace(status=status, template_name=template, channel_id=canal,
+                           direction=direction)
+
+
+# ==========================================================================================
+
+async def teste_1_transicoes():
+    print("1) contar_desfecho conta transição")
+    db = SessaoBaldes()
+    casos = [
+        ("sent", "delivered", True), ("delivered", "read", False), ("sent", "read", True),
+        ("sent", "failed", True), ("failed", "failed", False), ("read", "delivered", False),
+        ("sent", "sent", False),
+    ]
+    for anterior, novo, espera in casos:
+        contou = await dh.contar_desfecho(db, msg(), anterior, novo, agora=AGORA)
+        check(f"{anterior} -> {novo}: {'conta' if espera else 'não conta'}", contou is espera)
+    balde = db.baldes[(1, "boas_vindas_nat", AGORA.replace(second=0))]
+    check("balde do minuto truncado: 2 entregues, 1 falha", balde == [2, 1], f"{balde}")
+
+    check("sem template -> não conta",
+          not await dh.contar_desfecho(db, msg(template=None), "sent", "failed", agora=AGORA))
+    check("recebida -> não conta",
+          not await dh.contar_desfecho(db, msg(direction="inbound"), "sent", "failed",
+                                       agora=AGORA))
+    await dh.contar_desfecho(db, msg(canal=None), "sent", "failed", agora=AGORA)
+    check("canal NULL vira 0 na chave", (0, "boas_vindas_nat", AGORA.replace(second=0))
+          in db.baldes)
+
+
+async def teste_2_webhook():
+    print("2) webhook de status")
+    from app import main as app_main
+
+    mensagens = {"wamid.T": SimpleNamespace(status="sent", template_name="campanha_julho",
+                                            channel_id=1, direction="outbound",
+                                            error_code=None, error_title=None,
+                                            error_details=None),
+                 "wamid.X": SimpleNamespace(status="sent", template_name=None, channel_id=1,
+                                            direction="outbound", error_code=None,
+                                            error_title=None, error_details=None)}
+    contador = AsyncMock(return_value=True)
+
+    class Sessao(SessaoBaldes):
+        async def execute(self, stmt, params=None, *a, **kw):
+            r = Resultado()
+            for w, m in mensagens.items():
+                if w in str(stmt.compile(compile_kwargs={"literal_binds": True})):
+                    r.scalar_one_or_none = lambda m=m: m
+                    return r
+            r.scalar_one_or_none = lambda: None
+            return r
+
+    corpo = {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {
+        "statuses": [{"id": "wamid.T", "status": "delivered"},
+                     {"id": "wamid.X", "status": "delivered"}]}}]}]}
+    request = SimpleNamespace(body=AsyncMock(return_value=json.dumps(corpo).encode()))
+    with patch.object(app_main, "contar_desfecho", contador), \
+         patch.object(app_main, "_realimentar_welcome_status", AsyncMock()), \
+         patch.object(app_main, "cliente_http") as relay:
+        relay.return_value.__aenter__.return_value.post = AsyncMock()
+        await app_main.receive_webhook(request, Sessao())
+
+    chamadas = [c.args for c in contador.await_args_list]
+    check("contou só a mensagem de template, com o status ANTERIOR",
+          len(chamadas) == 1 and chamadas[0][1] is mensagens["wamid.T"]
+          and chamadas[0][2:] == ("sent", "delivered"), f"{chamadas}")
+
+
+async def teste_3_diluicao():
+    print("3) campanha saudável + boas-vindas morta (24/07 16h)")
+    db = SessaoBaldes()
+    db.encher(1, "campanha_julho", entregues=125, falhas_=0)
+    db.encher(1, "boas_vindas_nat", entregues=0, falhas_=6)
+    r = await dh.avaliar(db, agora=AGORA)
+
+    por_template = {m["template"]: m for m in r["fluxos"]}
+    check("boas-vindas quebrou", por_template["boas_vindas_nat"]["transicao"] == dh.TIPO_QUEBROU)
+    check("campanha segue normal", por_template["campanha_julho"]["transicao"] is None
+          and por_template["campanha_julho"]["estado"] == dh.ESTADO_NORMAL)
+    notifs = db.notificacoes()
+    check("uma notificação, do template certo",
+          len(notifs) == 1 and "boas_vindas_nat" in notifs[0].body, f"{len(notifs)}")
+    check("agregado continua disponível no resumo", r["total"] == 131 and r["falhas"] == 6)
+
+
+async def teste_4_estado_por_fluxo():
+    print("4) estado por fluxo")
+    db = SessaoBaldes()
+    db.encher(1, "boas_vindas_nat", entregues=0, falhas_=6)
+    await dh.avaliar(db, agora=AGORA)
+
+    db.encher(2, "lembrete_aula", entregues=1, falhas_=9)
+    r = await dh.avaliar(db, agora=AGORA)
+    por_template = {m["template"]: m for m in r["fluxos"]}
+    check("alerta de um fluxo não impede o do outro",
+          por_template["lembrete_aula"]["transicao"] == dh.TIPO_QUEBROU)
+    check("o primeiro não repete", por_template["boas_vindas_nat"]["transicao"] is None)
+    check("dois fluxos em alerta", r["em_alerta"] == ["template:1:boas_vindas_nat",
+                                                     "template:2:lembrete_aula"],
+          f"{r['em_alerta']}")
+
+    db.encher(1, "boas_vindas_nat", entregues=8, falhas_=0)
+    r = await dh.avaliar(db, agora=AGORA)
+    por_template = {m["template"]: m for m in r["fluxos"]}
+    check("normalizar um não normaliza o outro",
+          por_template["boas_vindas_nat"]["transicao"] == dh.TIPO_VOLTOU
+          and por_template["lembrete_aula"]["estado"] == dh.ESTADO_ALERTA)
+
+
+async def teste_5_nat_grava_template():
+    print("5) NAT grava template_name só em template")
+    from app import nat_sender
+    from app.models import Message
+
+    contato = SimpleNamespace(wa_id="5511900000001", name="Maria", channel_id=1)
+    canal = SimpleNamespace(id=1, phone_number_id="pn", whatsapp_token="tok")
+    ok = AsyncMock(return_value={"messages": [{"id": "wamid.OUT"}]})
+    gravados = {}
+    for aberta in (True, False):
+        sessao = SessaoBaldes()
+        sessao.execute = AsyncMock(return_value=SimpleNamespace(
+            scalar_one_or_none=lambda: contato))
+        with patch.object(nat_sender, "nat_pode_atuar", new=AsyncMock(return_value=(True, "ok"))), \
+             patch.object(nat_sender, "_resolver_canal", new=AsyncMock(return_value=canal)), \
+             patch.object(nat_sender, "janela_aberta", new=AsyncMock(return_value=aberta)), \
+             patch.object(nat_sender, "send_text_message", new=ok), \
+             patch.object(nat_sender, "send_interactive_buttons", new=ok), \
+             patch.object(nat_sender, "send_template_message", new=ok):
+            await nat_sender.send_nat_message("5511900000001", "nat_confirma_transferencia",
+                                              sessao, nome="Maria")
+        m = [o for o in sessao.adicionados if isinstance(o, Message)]
+        gravados[aberta] = m[0] if m else None
+    check("janela aberta (texto livre) -> sem template_name",
+          gravados[True] is not None and gravados[True].template_name is None)
+    check("janela fechada (template) -> template_name = etapa",
+          gravados[False] is not None
+          and gravados[False].template_name == "nat_confirma_transferencia",
+          f"{gravados[False] and gravados[False].template_name}")
+
+
+async def teste_6_nao_varre_messages():
+    print("6) avaliar lê baldes")
+    db = SessaoBaldes()
+    db.encher(1, "campanha_julho", entregues=5000, falhas_=10)
+    await dh.avaliar(db, agora=AGORA)
+    check("nenhuma consulta a messages sem transição",
+          not any("FROM messages" in s for s in db.sqls), f"{len(db.sqls)} consultas")
+
+
+async def teste_7_webhooks_simultaneos():
+    print("7) delivered e read em dois webhooks simultâneos")
+    from app import main as app_main
+
+    gravado = {"status": "sent"}               # o que está commitado no "banco"
+    trava = asyncio.Lock()                     # a trava da linha
+    baldes = SessaoBaldes()                    # o balde é compartilhado pelos dois webhooks
+    travadas = []
+
+    class Sessao(SessaoBaldes):
+        def __init__(self):
+            super().__init__()
+            self.linha = None
+            self.com_trava = False
+
+        async def execute(self, stmt, params=None, *a, **kw):
+            sql = str(stmt)
+            if "template_delivery_minuto" in sql:
+                return await baldes.execute(stmt, params)
+            r = Resultado()
+            if "FROM messages" in sql:
+                if "FOR UPDATE" in sql:
+                    await trava.acquire()
+                    self.com_trava = True
+                    travadas.append(1)
+                # A leitura devolve o commitado; o sleep deixa o outro webhook chegar aqui
+                # antes de este commitar — o intervalo de milissegundos da Meta.
+                self.linha = SimpleNamespace(status=gravado["status"], template_name="campanha_julho",
+                                             channel_id=1, direction="outbound", error_code=None,
+                                             error_title=None, error_details=None)
+                await asyncio.sleep(0.01)
+                r.scalar_one_or_none = lambda: self.linha
+                return r
+            r.scalar_one_or_none = lambda: None
+            return r
+
+        async def commit(self):
+            if self.linha is not None:
+                gravado["status"] = self.linha.status
+            if self.com_trava:
+                self.com_trava = False
+                trava.release()
+
+    def pedido(status):
+        corpo = {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {
+            "statuses": [{"id": "wamid.T", "status": status}]}}]}]}
+        return SimpleNamespace(body=AsyncMock(return_value=json.dumps(corpo).encode()))
+
+    with patch.object(app_main, "_realimentar_welcome_status", AsyncMock()), \
+         patch.object(app_main, "cliente_http") as relay:
+        relay.return_value.__aenter__.return_value.post = AsyncMock()
+        await asyncio.gather(app_main.receive_webhook(pedido("delivered"), Sessao()),
+                             app_main.receive_webhook(pedido("read"), Sessao()))
+
+    entregues = sum(e for e, _ in baldes.baldes.values())
+    check("status lido com a linha travada", len(travadas) == 2)
+    check("uma entrega só no balde", entregues == 1, f"{entregues}")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("SAÚDE DE ENTREGA POR TEMPLATE — contadores por minuto")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    await teste_1_transicoes()
+    await teste_2_webhook()
+    await teste_3_diluicao()
+    await teste_4_estado_por_fluxo()
+    await teste_5_nat_grava_template()
+    await teste_6_nao_varre_messages()
+    await teste_7_webhooks_simultaneos()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
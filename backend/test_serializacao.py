@@ -0,0 +1,224 @@
+"""JSON rápido: orjson na saída das rotas e no corpo do webhook, com as mesmas datas de antes.
+
+Rodar: cd backend && venv/bin/python test_serializacao.py
+
+NADA É ENVIADO, NENHUMA CONEXÃO DE BANCO: dados sintéticos, relay da CS mockado.
+
+  1. datas: o orjson escreve exatamente o `.isoformat()` (naive, microssegundos, fuso, date)
+  2. mesmo JSON que jsonable_encoder + json.dumps: Decimal, set, pydantic, chave int, unicode
+  3. o app usa RespostaJSON por padrão; com_etag entrega RespostaJSON direto
+  4. ler_json: parse igual ao request.json(); JSON inválido continua ValueError
+  5. webhook: o relay da CS recebe os bytes como chegaram
+  6. benchmark list_contacts: 5.000 contatos — antes (encoder + json) x depois (orjson)
+  7. benchmark receive_webhook: parse de um lote de 50 status — json x orjson. Só relatório:
+     o corpo é pequeno, e a razão de microssegundos oscila com a máquina; o que se confere é
+     o parse dar o mesmo objeto
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app import serializacao as s
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+def _antes(conteudo) -> bytes:
+    """O caminho de hoje: jsonable_encoder do FastAPI + render do JSONResponse do Starlette."""
+    return JSONResponse(jsonable_encoder(conteudo)).body
+
+
+def _contatos(n: int) -> list[dict]:
+    base = datetime(2025, 1, 31, 14, 5, 9)
+    return [
+        {
+            "wa_id": f"55119{i:08d}",
+            "name": f"Contato Sintético {i} — São Paulo",
+            "lead_status": "novo",
+            "notes": None,
+            "channel_id": 1 + i % 3,
+            "last_message": "Olá! Gostaria de saber mais sobre a pós em saúde mental 😊",
+            "last_message_time": (base + timedelta(minutes=i, microseconds=i)).isoformat(),
+            "direction": "inbound",
+            "tags": [{"id": 1, "name": "quente", "color": "#f00"}],
+            "unread": i % 5,
+            "ai_active": bool(i % 2),
+            "created_at": base.isoformat(),
+            "assigned_to": 7,
+        }
+        for i in range(n)
+    ]
+
+
+def _webhook(n_status: int) -> bytes:
+    return json.dumps({"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{
+        "field": "messages", "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"display_phone_number": "5511999999999", "phone_number_id": "123"},
+            "statuses": [{"id": f"wamid.HBgN{i:020d}", "status": "delivered",
+                          "timestamp": str(1738332309 + i), "recipient_id": f"55119{i:08d}",
+                          "conversation": {"id": f"c{i}", "origin": {"type": "marketing"}},
+                          "pricing": {"billable": True, "pricing_model": "CBP",
+                                      "category": "marketing"}}
+                         for i in range(n_status)]}}]}]}).encode()
+
+
+def _cronometrar(fn, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+# ==========================================================================================
+
+def teste_1_datas():
+    print("1) datas no formato do isoformat()")
+    casos = {
+        "naive": datetime(2025, 1, 31, 14, 5, 9),
+        "microssegundos": datetime(2025, 1, 31, 14, 5, 9, 123456),
+        "UTC": datetime(2025, 1, 31, 14, 5, 9, tzinfo=timezone.utc),
+        "São Paulo": datetime(2025, 1, 31, 14, 5, 9, tzinfo=timezone(timedelta(hours=-3))),
+        "date": date(2025, 1, 31),
+    }
+    for nome, valor in casos.items():
+        check(nome, s.dumps(valor) == json.dumps(valor.isoformat()).encode(), s.dumps(valor).decode())
+
+
+def teste_2_paridade():
+    print("2) mesmo JSON de antes")
+
+    class Modelo(BaseModel):
+        nome: str
+        quando: datetime
+
+    conteudo = {
+        "preco": Decimal("1997.50"), "parcelas": Decimal("12"),
+        "ids": {3},
+        "modelo": Modelo(nome="Ana", quando=datetime(2025, 1, 1, 8, 0)),
+        1: "chave int",
+        "texto": "ação — ✅", "nada": None, "lista": [1, 2.5, True],
+        "quando": datetime(2025, 1, 31, 14, 5, 9, 5),
+    }
+    antes = json.loads(_antes(conteudo))
+    depois = json.loads(s.dumps(conteudo))
+    check("equivalente", antes == depois, f"{antes} != {depois}" if antes != depois else "")
+    check("Decimal inteiro vira int", depois["parcelas"] == 12 and isinstance(depois["parcelas"], int))
+    check("UTF-8 cru, sem \\u", "ação".encode() in s.dumps({"t": "ação"}))
+
+
+def teste_3_app():
+    print("3) RespostaJSON no app e nas listagens")
+    from app import main as app_main
+    from app import respostas
+
+    check("default_response_class do app", app_main.app.router.default_response_class is s.RespostaJSON)
+    resposta = respostas.com_etag([{"a": datetime(2025, 1, 1)}], 'W/"x"')
+    check("com_etag entrega RespostaJSON já renderizada", isinstance(resposta, s.RespostaJSON)
+          and resposta.body == b'[{"a":"2025-01-01T00:00:00"}]'
+          and resposta.headers["content-type"] == "application/json")
+
+
+async def teste_4_ler_json():
+    print("4) ler_json")
+    corpo = _webhook(3)
+    pedido = SimpleNamespace(body=AsyncMock(return_value=corpo))
+    check("mesmo dict do json.loads", await s.ler_json(pedido) == json.loads(corpo))
+    try:
+        await s.ler_json(SimpleNamespace(body=AsyncMock(return_value=b"{quebrado")))
+        check("inválido: ValueError", False)
+    except ValueError as e:
+        check("inválido: ValueError (e JSONDecodeError, como antes)",
+              isinstance(e, json.JSONDecodeError))
+
+
+async def teste_5_relay():
+    print("5) relay do webhook")
+    from app import main as app_main
+
+    corpo = b'{"object":"page","entry":[],"acento":"a\\u00e7\\u00e3o"}'
+    request = SimpleNamespace(body=AsyncMock(return_value=corpo))
+    with patch.object(app_main, "cliente_http") as relay:
+        post = relay.return_value.__aenter__.return_value.post = AsyncMock()
+        resposta = await app_main.receive_webhook(request, SimpleNamespace())
+    chamada = post.await_args
+    check("bytes repassados sem reserializar", chamada.kwargs.get("content") == corpo
+          and "json" not in chamada.kwargs)
+    check("com Content-Type JSON", chamada.kwargs["headers"]["Content-Type"] == "application/json")
+    check("e o webhook segue: objeto desconhecido ignorado", resposta == {"status": "ignored"})
+
+
+def teste_6_bench_contatos():
+    print("6) benchmark list_contacts (5.000 contatos)")
+    contatos = _contatos(5000)
+    check("mesmo conteúdo", json.loads(_antes(contatos)) == json.loads(s.RespostaJSON(contatos).body))
+    antes = _cronometrar(lambda: _antes(contatos), 3)
+    depois = _cronometrar(lambda: s.RespostaJSON(contatos).body, 3)
+    ganho = antes / depois
+    print(f"     antes {antes / 3 * 1000:.1f} ms · depois {depois / 3 * 1000:.1f} ms · {ganho:.1f}x")
+    check("ao menos 3x mais rápido", ganho >= 3, f"{ganho:.1f}x")
+
+    crus = [dict(c, last_message_time=datetime(2025, 1, 31, 14, 5, 9, i)) for i, c in enumerate(contatos)]
+    antes = _cronometrar(lambda: _antes(crus), 3)
+    depois = _cronometrar(lambda: s.dumps(crus), 3)
+    print(f"     com datetime cru: antes {antes / 3 * 1000:.1f} ms · depois {depois / 3 * 1000:.1f} ms "
+          f"· {antes / depois:.1f}x")
+    check("datetime cru: ao menos 3x", antes / depois >= 3, f"{antes / depois:.1f}x")
+
+
+def teste_7_bench_webhook():
+    print("7) benchmark receive_webhook (parse de 50 status)")
+    import orjson
+
+    corpo = _webhook(50)
+    check("mesmo objeto que o json da stdlib", orjson.loads(corpo) == json.loads(corpo))
+    antes = _cronometrar(lambda: json.loads(corpo), 300)
+    depois = _cronometrar(lambda: orjson.loads(corpo), 300)
+    print(f"     antes {antes / 300 * 1e6:.0f} µs · depois {depois / 300 * 1e6:.0f} µs · "
+          f"{antes / depois:.1f}x ({len(corpo)} bytes)")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("JSON RÁPIDO (orjson) — SAÍDA DAS ROTAS E ENTRADA DO WEBHOOK")
+    print("Nada enviado. Nenhuma conexão de banco.")
+    print("=" * 90 + "\n")
+
+    teste_1_datas()
+    teste_2_paridade()
+    teste_3_app()
+    await teste_4_ler_json()
+    await teste_5_relay()
+    teste_6_bench_contatos()
+    teste_7_bench_webhook()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,285 @@
+"""Dublês da Meta, Exact, OpenAI e Twilio (servicos_falsos.py): formato, comportamento e o backend.
+
+Rodar: cd backend && venv/bin/python test_servicos_falsos.py
+
+NADA SAI PARA A REDE. As seções 1-3 falam com o app dos dublês por httpx.ASGITransport (sem
+porta nenhuma). A 4 e a 5 sobem os dublês em 127.0.0.1, numa porta livre, e apontam o backend
+para eles pelas *_BASE_URL — que por isso são definidas ANTES de importar qualquer módulo de
+app/ (as URLs são constantes de módulo). Nenhuma chamada ao serviço de verdade é possível: as
+variáveis cobrem todos eles, e a seção 4 confere que cada módulo leu a sua.
+
+  1. comportamento: balde de fichas, --ajuste, limite e erro no formato de cada serviço
+  2. rotas: Graph, Exact, OpenAI, Twilio e relay respondem o que o backend lê
+  3. /_estado: ok/erro/limite por serviço, pico de simultâneas, DELETE zera
+  4. o backend de verdade contra os dublês: whatsapp.py, exact_spotter.py, ai_engine.py,
+     transcription.py, twilio (SDK), recordings.py
+  5. pressão: teto de vazão devolve 130429 ao envio; o SDK da OpenAI tenta de novo no 429
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+import tempfile
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+PORTA = _porta_livre()
+BASE = f"http://127.0.0.1:{PORTA}"
+
+import servicos_falsos as sf  # noqa: E402
+
+os.environ.update(sf.variaveis(BASE))
+os.environ.setdefault("OPENAI_API_KEY", "sk-falsa")
+os.environ["EXACT_SPOTTER_TOKEN"] = "token-falso"
+
+import httpx  # noqa: E402
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    if condicao:
+        print(f"  ✅ {nome}" + (f" — {detalhe}" if detalhe else ""))
+    else:
+        print(f"  ❌ {nome}" + (f" — {detalhe}" if detalhe else ""))
+        falhas.append(nome)
+
+
+def _cliente(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://falso")
+
+
+GRAPH = {"Authorization": "Bearer x"}
+MENSAGEM = {"messaging_product": "whatsapp", "to": "5511999990000", "type": "text", "text": {"body": "oi"}}
+
+
+async def teste_1_comportamento():
+    print("1) comportamento")
+    balde = sf._Balde(5)
+    check("balde: rajada de 1 s e depois recusa", [balde.tirar() for _ in range(6)] == [True] * 5 + [False])
+    check("balde com 0 = sem teto", all(sf._Balde(0).tirar() for _ in range(1000)))
+
+    args = sf._argumentos(["--latencia-ms", "10", "--ajuste", "openai.latencia_ms=900",
+                           "--ajuste", "graph.limite=0.5"])
+    c = sf.comportamentos(args)
+    check("--ajuste muda só aquele serviço", c["openai"].latencia_ms == 900 and c["exact"].latencia_ms == 10
+          and c["graph"].limite == 0.5 and c["openai"].limite == 0)
+    for ruim in ("graph.latencia=1", "meta.limite=1", "graph.limite"):
+        try:
+            sf.comportamentos(sf._argumentos(["--ajuste", ruim]))
+            check(f"--ajuste {ruim!r} recusado", False)
+        except SystemExit:
+            check(f"--ajuste {ruim!r} recusado", True)
+
+    limite = sf.criar_app({s: sf.Comportamento(limite=1) for s in sf.SERVICOS})
+    async with _cliente(limite) as http:
+        r = await http.post("/graph/v22.0/123/messages", headers=GRAPH, json=MENSAGEM)
+        check("graph: limite = HTTP 400 com error.code 130429",
+              r.status_code == 400 and r.json()["error"]["code"] == 130429, r.text[:80])
+        r = await http.get("/exact/v3/Leads", headers={"token_exact": "x"})
+        check("exact: limite = 429", r.status_code == 429)
+        r = await http.post("/openai/v1/embeddings", headers=GRAPH, json={"input": "a"})
+        check("openai: limite = 429 rate_limit_exceeded com retry-after",
+              r.status_code == 429 and r.json()["error"]["code"] == "rate_limit_exceeded"
+              and r.headers.get("retry-after") == "1")
+        r = await http.get("/twilio/2010-04-01/Accounts/AC1/Calls/CA1.json", auth=("AC1", "t"))
+        check("twilio: limite = 429 code 20429", r.status_code == 429 and r.json()["code"] == 20429)
+
+    erro = sf.criar_app({s: sf.Comportamento(erros=1) for s in sf.SERVICOS})
+    async with _cliente(erro) as http:
+        r = await http.post("/graph/v22.0/123/messages", headers=GRAPH, json=MENSAGEM)
+        check("graph: erro = 500 com error.code", r.status_code == 500 and r.json()["error"]["code"] == 131000)
+        r = await http.post("/openai/v1/chat/completions", headers=GRAPH, json={"messages": []})
+        check("openai: erro = 500 server_error", r.status_code == 500 and r.json()["error"]["type"] == "server_error")
+        r = await http.post("/cs/api/webhook/whatsapp", content=b"{}")
+        check("cs: erro = 502", r.status_code == 502)
+
+    lento = sf.criar_app({"exact": sf.Comportamento(latencia_ms=200)})
+    async with _cliente(lento) as http:
+        inicio = asyncio.get_running_loop().time()
+        await http.get("/exact/v3/Funnels", headers={"token_exact": "x"})
+        meio = asyncio.get_running_loop().time()
+        await http.get("/graph/v22.0/1", headers=GRAPH)
+        fim = asyncio.get_running_loop().time()
+    check("latência só no serviço ajustado", meio - inicio >= 0.2 and fim - meio < 0.1,
+          f"exact {1000 * (meio - inicio):.0f} ms, graph {1000 * (fim - meio):.0f} ms")
+
+
+async def teste_2_rotas():
+    print("2) rotas")
+    app = sf.criar_app(leads=1_200)
+    async with _cliente(app) as http:
+        r = await http.post("/graph/v22.0/123/messages", headers=GRAPH, json=MENSAGEM)
+        check("graph: envio devolve messages[0].id", r.json()["messages"][0]["id"].startswith("wamid.falso."))
+        r = await http.post("/graph/v22.0/123/messages", json=MENSAGEM)
+        check("graph: sem token, 401 code 190", r.status_code == 401 and r.json()["error"]["code"] == 190)
+        r = await http.post("/graph/v22.0/123/messages", headers=GRAPH, json={"type": "text"})
+        check("graph: sem `to`, 400 code 100", r.status_code == 400 and r.json()["error"]["code"] == 100)
+        r = await http.get("/graph/v22.0/55/message_templates", headers=GRAPH, params={"name": "x"})
+        check("graph: template pelo nome, com BODY", r.json()["data"][0]["name"] == "x"
+              and r.json()["data"][0]["components"][0]["type"] == "BODY")
+        r = await http.get("/graph/v22.0/777", headers=GRAPH)
+        midia = await http.get(r.json()["url"].replace("http://falso", ""))
+        check("graph: URL da mídia baixa a mídia", midia.status_code == 200 and len(midia.content) == 2052)
+
+        exact = {"token_exact": "x"}
+        pagina = (await http.get("/exact/v3/Leads", headers=exact, params={"$top": 500, "$skip": 1_000})).json()
+        check("exact: paginação $top/$skip até o total", len(pagina["value"]) == 200)
+        ids = [l["id"] for l in (await http.get("/exact/v3/Leads", headers=exact,
+                                                params={"$top": 10})).json()["value"]]
+        check("exact: Id desc", ids == sorted(ids, reverse=True))
+        um = (await http.get("/exact/v3/Leads", headers=exact, params={"$filter": f"id eq {ids[3]}"})).json()
+        check("exact: $filter id eq", [l["id"] for l in um["value"]] == [ids[3]])
+        check("exact: subSource de pós (is_pos_lead)", um["value"][0]["subSource"]["value"].startswith("pos"))
+        r = await http.post("/exact/v3/timelineAdd", headers=exact, json={"leadId": 1, "text": "x", "userId": 1})
+        check("exact: timelineAdd 201", r.status_code == 201)
+        r = await http.get("/exact/v3/Funnels")
+        check("exact: sem token_exact, 401", r.status_code == 401)
+
+        r = await http.post("/openai/v1/embeddings", headers=GRAPH, json={"input": ["a", "b"], "model": "m"})
+        vetores = [d["embedding"] for d in r.json()["data"]]
+        check("openai: um embedding por entrada, 1536 dimensões",
+              len(vetores) == 2 and {len(v) for v in vetores} == {1536})
+        check("openai: embedding determinístico e unitário", vetores[0] == sf.embedding("a")
+              and abs(sum(x * x for x in vetores[0]) - 1) < 1e-3)
+        r = await http.post("/openai/v1/chat/completions", headers=GRAPH, json={
+            "model": "gpt-4o-mini", "messages": [{"role": "system", "content": "Responda APENAS com JSON"}]})
+        check("openai: quem pede JSON recebe '{}'", r.json()["choices"][0]["message"]["content"] == "{}")
+        r = await http.post("/openai/v1/audio/transcriptions", headers=GRAPH,
+                            files={"file": ("a.mp3", b"x" * 10)}, data={"model": "whisper-1"})
+        check("openai: transcrição com `text`", "10 bytes" in r.json()["text"])
+
+        r = await http.post("/twilio/2010-04-01/Accounts/AC1/Calls.json", auth=("AC1", "t"),
+                            data={"To": "+5511999990000", "From": "+5511900000001", "Url": "http://x"})
+        check("twilio: Calls.json 201 com sid CA...", r.status_code == 201 and r.json()["sid"].startswith("CA"))
+        r = await http.get("/twilio/2010-04-01/Accounts/AC1/Recordings/RE1.mp3", auth=("AC1", "t"))
+        check("twilio: gravação com Content-Length", int(r.headers["content-length"]) == sf.GRAVACAO_KB * 1024)
+        r = await http.get("/twilio/2010-04-01/Accounts/AC1/Calls/CA1.json")
+        check("twilio: sem Basic, 401 code 20003", r.status_code == 401 and r.json()["code"] == 20003)
+
+
+async def teste_3_estado():
+    print("3) /_estado")
+    app = sf.criar_app({"graph": sf.Comportamento(latencia_ms=50, por_segundo=10)})
+    async with _cliente(app) as http:
+        respostas = await asyncio.gather(*(
+            http.post("/graph/v22.0/1/messages", headers=GRAPH, json=MENSAGEM) for _ in range(15)))
+        estado = (await http.get("/_estado")).json()["graph"]
+        check("10 ok e 5 no teto", (estado["ok"], estado["limite"]) == (10, 5), str(estado))
+        check("status batem com o estado", sum(r.status_code == 200 for r in respostas) == 10)
+        check("pico = as 10 simultâneas que passaram", estado["pico"] == 10 and estado["em_voo"] == 0)
+        await asyncio.sleep(0.2)                  # o balde repõe 2 fichas
+        await http.post("/graph/v22.0/1/messages", json=MENSAGEM)
+        check("recusa do handler conta como erro", (await http.get("/_estado")).json()["graph"]["erro"] == 1)
+        zerado = (await http.delete("/_estado")).json()
+        check("DELETE zera", all(not any(v.values()) for v in zerado.values()))
+
+
+async def teste_4_backend():
+    print("4) o backend de verdade contra os dublês")
+    from app import ai_engine, exact_spotter, recordings, transcription, twilio_routes, whatsapp
+    from app import main  # noqa: F401 — CS_RELAY_URL
+    for nome in ("httpx", "twilio.http_client", "openai._base_client"):
+        logging.getLogger(nome).setLevel(logging.WARNING)      # uma linha por request, aqui é ruído
+
+    check("cada módulo leu a sua URL", whatsapp.BASE_URL == f"{BASE}/graph/v22.0"
+          and exact_spotter.BASE_URL == f"{BASE}/exact/v3" and twilio_routes.TWILIO_BASE_URL == f"{BASE}/twilio"
+          and str(ai_engine.client.base_url) == f"{BASE}/openai/v1/"
+          and str(transcription.client.base_url) == f"{BASE}/openai/v1/"
+          and main.CS_RELAY_URL == f"{BASE}/cs/api/webhook/whatsapp")
+
+    app = sf.criar_app(leads=700)
+    async with sf.servir(app, PORTA):
+        r = await whatsapp.send_text_message("5511999990000", "oi", "123", "tok")
+        check("whatsapp.send_text_message", r["messages"][0]["id"].startswith("wamid.falso."))
+        r = await whatsapp.send_template_message("5511999990000", "boas_vindas_pos", "pt_BR", "123", "tok",
+                                                 parameters=["Ana"])
+        check("whatsapp.send_template_message", "messages" in r)
+        media_id = await whatsapp.upload_media(b"x" * 100, "image/jpeg", "a.jpg", "123", "tok")
+        check("whatsapp.upload_media", media_id.isdigit())
+        corpo = await whatsapp.fetch_template_body("55", "tok", "boas_vindas_pos", "pt_BR")
+        check("whatsapp.fetch_template_body", corpo and "{{1}}" in corpo, str(corpo))
+
+        pagina = await exact_spotter.fetch_leads_from_exact(skip=500, top=500)
+        check("exact_spotter.fetch_leads_from_exact pagina", len(pagina["value"]) == 200)
+        check("exact_spotter.is_pos_lead aceita o lead", exact_spotter.is_pos_lead(pagina["value"][0]))
+        check("exact_spotter.add_timeline_comment", await exact_spotter.add_timeline_comment(1, "x") is True)
+
+        vetor = await ai_engine.generate_embedding("pós em saúde mental")
+        check("ai_engine.generate_embedding", vetor == sf.embedding("pós em saúde mental"))
+        texto = await transcription._whisper(b"\xff" * 300, "a.mp3")
+        check("transcription._whisper", "300 bytes" in texto, texto)
+        insights = await transcription.generate_insights("SDR: oi", 60, "SDR")
+        check("transcription.generate_insights", bool(insights))
+
+        from twilio.rest import Client
+        from app.metrics import http_client_twilio
+        cliente = Client("AC1", "t", http_client=http_client_twilio())
+        cliente.api.base_url = twilio_routes.TWILIO_BASE_URL
+        chamada = await asyncio.to_thread(cliente.calls.create, to="+5511999990000", from_="+5511900000001",
+                                          url="http://localhost/voice")
+        check("twilio SDK: calls.create no dublê", chamada.sid.startswith("CA") and chamada.status == "queued")
+
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = os.path.join(pasta, "CA1.mp3")
+            tamanho = await recordings.baixar_gravacao(
+                f"{BASE}/twilio/2010-04-01/Accounts/AC1/Recordings/RE1.mp3", destino, auth=("AC1", "t"))
+            check("recordings.baixar_gravacao", tamanho == sf.GRAVACAO_KB * 1024 == os.path.getsize(destino))
+
+        estado = app.state.estado.resumo()
+        check("nada no teto nem em erro", all(v["limite"] == v["erro"] == 0 for v in estado.values()), str(estado))
+
+
+async def teste_5_pressao():
+    print("5) pressão")
+    from app import ai_engine, whatsapp
+
+    app = sf.criar_app({"graph": sf.Comportamento(latencia_ms=20, por_segundo=20),
+                        "openai": sf.Comportamento(limite=1)})
+    async with sf.servir(app, PORTA):
+        respostas = await asyncio.gather(*(
+            whatsapp.send_text_message("5511999990000", f"m{i}", "123", "tok") for i in range(60)))
+        recusadas = [r for r in respostas if r.get("error", {}).get("code") == 130429]
+        check("acima do teto, o envio recebe 130429 (o corpo que o backend lê)",
+              len(recusadas) == 40 and len(respostas) - len(recusadas) == 20, f"{len(recusadas)} recusadas")
+
+        import openai
+        try:
+            await ai_engine.client.with_options(max_retries=1).embeddings.create(model="m", input="x")
+            check("429 da OpenAI vira RateLimitError", False)
+        except openai.RateLimitError:
+            check("429 da OpenAI vira RateLimitError", True)
+        limite = app.state.estado.resumo()["openai"]["limite"]
+        check("o SDK tentou de novo (retry-after) antes de desistir", limite == 2, f"{limite} tentativas")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("DUBLÊS DA META, EXACT, OPENAI E TWILIO — FORMATO, COMPORTAMENTO E O BACKEND CONTRA ELES")
+    print(f"Nada sai para a rede: dublês em memória e em {BASE}.")
+    print("=" * 90 + "\n")
+
+    await teste_1_comportamento()
+    await teste_2_rotas()
+    await teste_3_estado()
+    await teste_4_backend()
+    await teste_5_pressao()
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,214 @@
+"""Transcrição segmentada em paralelo (audio_split + transcription.transcribe_audio).
+
+Rodar: cd backend && venv/bin/python test_transcricao_segmentada.py
+
+NADA SAI PARA A REDE: o Whisper é substituído por um backend FALSO que entende o MP3
+sintético gerado aqui. Cada quadro carrega no payload o próprio número, e o backend falso
+"transcreve" emitindo uma palavra por segundo de áudio (w0, w1, w2...) — então a costura
+pode ser conferida palavra a palavra: o texto final tem que ser exatamente w0..wN, sem buraco
+e sem duplicata na emenda. O backend dorme proporcional à duração do trecho, que é o que
+torna o benchmark (caso 6) uma medida de verdade do ganho do paralelismo.
+
+  1. cabeçalho MPEG: tamanho e duração de quadro batem com a especificação
+  2. varredura: pula ID3v2, ressincroniza depois de lixo, ignora ID3v1 no fim
+  3. divisão: fatias em fronteira de quadro, ~5 min cada, sobreposição de ~4 s
+  4. costura: remove a duplicata da emenda; sem emenda comum, concatena
+  5. ponta a ponta: 40 min -> 8 trechos -> texto idêntico ao de transcrever tudo de uma vez
+  6. benchmark: 40 min em tempo próximo ao de 5 min (e muito abaixo do sequencial)
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from app import audio_split as au
+from app import transcription as tr
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+# ==========================================================================================
+# MP3 SINTÉTICO
+# ==========================================================================================
+
+# MPEG-1 Layer III, 32 kbps, 32 kHz, sem CRC, mono: quadro de 144 bytes e 36 ms.
+CABECALHO = bytes([0xFF, 0xFB, 0x18, 0xC4])
+TAMANHO_QUADRO = 144
+DURACAO_QUADRO = 1152 / 32000
+
+
+def mp3_sintetico(segundos: float) -> bytes:
+    n = int(segundos / DURACAO_QUADRO)
+    payload_vazio = bytes(TAMANHO_QUADRO - 8)
+    return b"".join(CABECALHO + i.to_bytes(4, "big") + payload_vazio for i in range(n))
+
+
+def _segundos_do_trecho(dados: bytes) -> list[int]:
+    """Segundos (inteiros) de áudio cobertos pelos quadros do trecho, em ordem.
+
+    Passo fixo de TAMANHO_QUADRO em vez de quadros_mp3: o backend falso roda no event loop e
+    não pode gastar CPU que o Whisper de verdade não gastaria aqui.
+    """
+    vistos = []
+    for pos in range(0, len(dados) - 7, TAMANHO_QUADRO):
+        s = int(int.from_bytes(dados[pos + 4:pos + 8], "big") * DURACAO_QUADRO)
+        if not vistos or vistos[-1] != s:
+            vistos.append(s)
+    return vistos
+
+
+CUSTO_POR_SEGUNDO = 0.001   # backend falso: 5 min de áudio = 0,3 s de "Whisper"
+
+
+async def whisper_falso(dados: bytes, nome: str) -> str:
+    segundos = _segundos_do_trecho(dados)
+    await asyncio.sleep(len(segundos) * CUSTO_POR_SEGUNDO)
+    return " ".join(f"w{s}," if s % 7 == 0 else f"w{s}" for s in segundos)
+
+
+def _esperado(segundos: float) -> str:
+    return " ".join(f"w{s}," if s % 7 == 0 else f"w{s}"
+                    for s in sorted({int(i * DURACAO_QUADRO)
+                                     for i in range(int(segundos / DURACAO_QUADRO))}))
+
+
+# ==========================================================================================
+# 1-4: peças
+# ==========================================================================================
+
+def teste_1_cabecalho():
+    print("\n1) cabeçalho MPEG")
+    tamanho, duracao = au.cabecalho_mp3(CABECALHO + bytes(140), 0)
+    check("MPEG-1 L3 32 kbps 32 kHz → 144 bytes, 36 ms",
+          tamanho == 144 and abs(duracao - 0.036) < 1e-9, f"{tamanho}, {duracao}")
+    # MPEG-1 L3 128 kbps 44,1 kHz com padding: 144 * 128000 / 44100 + 1 = 418
+    t, _ = au.cabecalho_mp3(bytes([0xFF, 0xFB, 0x92, 0x64]), 0)
+    check("128 kbps / 44,1 kHz com padding → 418 bytes", t == 418, f"{t}")
+    # MPEG-2.5 L3 8 kbps 8 kHz (o formato de telefonia): 576 amostras, 72 ms
+    t, d = au.cabecalho_mp3(bytes([0xFF, 0xE3, 0x18, 0xC4]), 0)
+    check("MPEG-2.5 L3 8 kbps 8 kHz → 72 bytes, 72 ms", t == 72 and abs(d - 0.072) < 1e-9,
+          f"{t}, {d}")
+    check("bitrate free/reservado recusado",
+          au.cabecalho_mp3(bytes([0xFF, 0xFB, 0x08, 0xC4]), 0) is None)
+
+
+def teste_2_varredura():
+    print("\n2) varredura de quadros")
+    corpo = mp3_sintetico(1.0)
+    id3 = b"ID3\x03\x00\x00\x00\x00\x00\x14" + bytes(20)     # tag de 20 bytes
+    lixo = b"\xff\xfb\x00\x00lixo"                            # parece sync, não é quadro
+    dados = id3 + corpo[:720] + lixo + corpo[720:] + b"TAG" + bytes(125)
+    quadros = au.quadros_mp3(dados)
+    check("todos os quadros achados", len(quadros) == len(corpo) // TAMANHO_QUADRO,
+          f"{len(quadros)} de {len(corpo) // TAMANHO_QUADRO}")
+    check("primeiro quadro logo depois da ID3v2", quadros[0][0] == 30)
+    check("duração somada", abs(au.duracao_mp3(quadros) - len(quadros) * 0.036) < 1e-6)
+
+
+def teste_3_divisao():
+    print("\n3) divisão em trechos")
+    dados = mp3_sintetico(40 * 60)
+    fatias = au.dividir_mp3(dados)
+    check("40 min → 8 trechos de ~5 min", len(fatias) == 8, f"{len(fatias)}")
+    check("toda fatia começa em cabeçalho e é MP3 válido",
+          all(f[:4] == CABECALHO and len(f) % TAMANHO_QUADRO == 0 for f in fatias))
+    durs = [au.duracao_mp3(au.quadros_mp3(f)) for f in fatias]
+    check("cada trecho ≤ segmento + sobreposição",
+          max(durs) <= au.SEGMENTO_SEGUNDOS + au.SOBREPOSICAO_SEGUNDOS + 0.1, f"{max(durs):.1f}s")
+    a, b = _segundos_do_trecho(fatias[0]), _segundos_do_trecho(fatias[1])
+    check("emenda sobrepõe ~4 s", 3 <= a[-1] - b[0] <= 5, f"A até {a[-1]}, B desde {b[0]}")
+    check("áudio curto → uma fatia só", len(au.dividir_mp3(mp3_sintetico(60))) == 1)
+
+
+def teste_4_costura():
+    print("\n4) costura")
+    a = "então o curso começa em março e as aulas são aos sába"
+    b = "aulas são aos sábados pela manhã"
+    check("emenda duplicada removida, palavra cortada descartada",
+          au.costurar([a, b]) == "então o curso começa em março e as aulas são aos sábados pela manhã",
+          au.costurar([a, b]))
+    check("pontuação e caixa diferentes ainda casam",
+          au.costurar(["ok, Então vamos fechar", "então, vamos fechar a matrícula"])
+          == "ok, então, vamos fechar a matrícula")
+    check("sem emenda comum → concatena (nada apagado)",
+          au.costurar(["alô bom dia", "tudo certo sim"]) == "alô bom dia tudo certo sim")
+    check("trecho vazio (silêncio) ignorado", au.costurar(["um dois", "", "três"]) == "um dois três")
+
+
+# ==========================================================================================
+# 5-6: ponta a ponta e benchmark
+# ==========================================================================================
+
+def _arquivo(diretorio, minutos):
+    caminho = os.path.join(diretorio, f"CA_{minutos}min.mp3")
+    with open(caminho, "wb") as f:
+        f.write(mp3_sintetico(minutos * 60))
+    return caminho
+
+
+async def teste_5_e_6(diretorio):
+    print("\n5) ponta a ponta: 40 min")
+    longa = _arquivo(diretorio, 40)
+    texto = await tr.transcribe_audio(longa, transcrever=whisper_falso)
+    esperado = _esperado(40 * 60)
+    check("texto costurado == áudio inteiro, sem buraco nem duplicata", texto == esperado,
+          f"{len(texto.split())} palavras, esperado {len(esperado.split())}")
+
+    print("\n6) benchmark (backend falso, 1 ms por segundo de áudio)")
+    curta = _arquivo(diretorio, 5)
+    inicio = time.perf_counter()
+    await tr.transcribe_audio(curta, transcrever=whisper_falso)
+    t5 = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    await tr.transcribe_audio(longa, transcrever=whisper_falso)
+    t40 = time.perf_counter() - inicio
+
+    with open(longa, "rb") as f:
+        inicio = time.perf_counter()
+        await whisper_falso(f.read(), "inteira.mp3")
+        sequencial = time.perf_counter() - inicio
+
+    print(f"     5 min: {t5:.2f}s   40 min segmentado: {t40:.2f}s   "
+          f"40 min numa requisição só: {sequencial:.2f}s")
+    check("40 min em até 2x o tempo de 5 min", t40 <= 2 * t5, f"{t40 / t5:.2f}x")
+    check("40 min segmentado bem abaixo da requisição única", t40 < sequencial / 3,
+          f"{sequencial / t40:.1f}x mais rápido")
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("TRANSCRIÇÃO SEGMENTADA EM PARALELO")
+    print("Nenhuma chamada de rede. Whisper substituído por backend falso.")
+    print("=" * 90)
+
+    teste_1_cabecalho()
+    teste_2_varredura()
+    teste_3_divisao()
+    teste_4_costura()
+    diretorio = tempfile.mkdtemp(prefix="transcricao_teste_")
+    try:
+        await teste_5_e_6(diretorio)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+"""Fila de transcrição de ligações (transcription_worker) + endpoint que só enfileira.
+
+Rodar: cd backend && venv/bin/python test_transcricao_worker.py
+
+NADA SAI PARA A REDE E NADA É GRAVADO: Whisper e GPT são AsyncMock, a fila é uma lista em
+memória com o comportamento de _reivindicar (uma ligação por chamada, nunca a mesma duas
+vezes — o que o SKIP LOCKED garante no banco) e _gravar só anota o desfecho. As gravações
+são arquivos vazios num diretório temporário.
+
+  1. 5 ligações na fila, concorrência 2 -> todas 'done', nunca mais de 2 ao mesmo tempo
+  2. tempos de cada etapa gravados em transcription_timings
+  3. falha transitória -> volta para 'pending' com run_at empurrado e o motivo gravado
+  4. última tentativa falha -> 'error', sai da fila
+  5. gravação sumida do disco -> 'error' direto, sem gastar tentativa
+  6. _reivindicar usa FOR UPDATE SKIP LOCKED e também pega 'processing' travada
+  7. POST /transcribe só enfileira: nenhum Whisper dentro do request, worker acordado
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from app import transcription as tr
+from app import transcription_worker as tw
+
+falhas = []
+
+
+def check(nome, condicao, detalhe=""):
+    print(f"  {'✅' if condicao else '❌'} {nome}" + (f" — {detalhe}" if detalhe else ""))
+    if not condicao:
+        falhas.append(nome)
+
+
+AGORA = datetime(2026, 10, 19, 14, 0, 0)
+DIR = tempfile.mkdtemp(prefix="gravacoes_teste_")
+
+
+def _gravacao(i):
+    caminho = os.path.join(DIR, f"CA{i}.mp3")
+    open(caminho, "wb").close()
+    return caminho
+
+
+# ==========================================================================================
+# DUBLÊS
+# ==========================================================================================
+
+class SessaoFalsa:
+    def __init__(self, resposta=None):
+        self.statements = []
+        self.commits = 0
+        self._resposta = resposta
+
+    async def execute(self, stmt, *a, **kw):
+        self.statements.append(stmt)
+        r = MagicMock()
+        r.scalar_one_or_none.return_value = self._resposta
+        return r
+
+    async def commit(self):
+        self.commits += 1
+
+
+def fabrica_de_sessao(sessao):
+    class CM:
+        async def __aenter__(self):
+            return sessao
+
+        async def __aexit__(self, *a):
+            return False
+    return lambda: CM()
+
+
+class FilaFalsa:
+    """A fila em memória, com o comportamento de _reivindicar e _gravar."""
+    def __init__(self, trabalhos):
+        self.trabalhos = list(trabalhos)
+        self.gravados = {}
+
+    async def reivindicar(self, db, corte):
+        return self.trabalhos.pop(0) if self.trabalhos else None
+
+    async def gravar(self, call_id, **valores):
+        self.gravados.setdefault(call_id, {}).update(valores)
+
+    def patches(self):
+        return (patch.object(tw, "_reivindicar", new=self.reivindicar),
+                patch.object(tw, "_gravar", new=self.gravar),
+                patch.object(tw, "async_session", new=fabrica_de_sessao(SessaoFalsa())))
+
+
+def _trabalho(i, attempts=1, caminho=None):
+    return {"id": i, "call_sid": f"CA{i}", "duration": 120, "user_name": "SDR",
+            "local_recording_path": caminho or _gravacao(i), "attempts": attempts}
+
+
+async def _rodar(fila, whisper, insights=None, concorrencia=2):
+    insights = insights or AsyncMock(return_value="insights")
+    p1, p2, p3 = fila.patches()
+    with p1, p2, p3, \
+         patch.object(tr, "transcribe_audio", new=whisper), \
+         patch.object(tr, "generate_insights", new=insights):
+        return await tw.processar_fila(agora=AGORA, concorrencia=concorrencia)
+
+
+# ==========================================================================================
+# 1-2: caminho feliz
+# ==========================================================================================
+
+async def teste_1_concorrencia_limitada():
+    print("\n1) 5 ligações, concorrência 2")
+    ativos = {"agora": 0, "pico": 0}
+
+    async def whisper(caminho):
+        ativos["agora"] += 1
+        ativos["pico"] = max(ativos["pico"], ativos["agora"])
+        await asyncio.sleep(0.01)
+        ativos["agora"] -= 1
+        return f"transcrição de {os.path.basename(caminho)}"
+
+    fila = FilaFalsa([_trabalho(i) for i in range(1, 6)])
+    resumo = await _rodar(fila, whisper)
+    check("todas concluídas", resumo == {"done": 5}, f"{resumo}")
+    check("nunca mais de 2 ao mesmo tempo", ativos["pico"] == 2, f"pico={ativos['pico']}")
+    check("transcrição e insights gravados",
+          fila.gravados[3]["transcription"] == "transcrição de CA3.mp3"
+          and fila.gravados[3]["transcription_insights"] == "insights")
+
+    timings = json.loads(fila.gravados[1]["transcription_timings"])
+    print("\n2) tempos gravados")
+    check("whisper_ms, insights_ms e total_ms presentes",
+          {"whisper_ms", "insights_ms", "total_ms"} <= set(timings), f"{timings}")
+    check("finished_at carimbado", fila.gravados[1]["transcription_finished_at"] is not None)
+
+
+# ==========================================================================================
+# 3-5: falhas
+# ==========================================================================================
+
+async def teste_3_retentativa():
+    print("\n3) falha transitória → pending com run_at empurrado")
+    fila = FilaFalsa([_trabalho(1, attempts=1)])
+    resumo = await _rodar(fila, AsyncMock(side_effect=TimeoutError("whisper demorou")))
+    g = fila.gravados[1]
+    check("volta para pending", resumo == {"pending": 1} and g["transcription_status"] == "pending",
+          f"{resumo}")
+    check("run_at = agora + atraso",
+          g["transcription_run_at"] == AGORA + timedelta(seconds=tw.ATRASO_RETENTATIVA_SEGUNDOS))
+    check("motivo gravado", "whisper demorou" in g["transcription_error"])
+
+
+async def teste_4_ultima_tentativa():
+    print("\n4) última tentativa → error")
+    fila = FilaFalsa([_trabalho(1, attempts=tw.MAX_TENTATIVAS)])
+    resumo = await _rodar(fila, AsyncMock(side_effect=RuntimeError("429")))
+    check("vira error", resumo == {"error": 1} and fila.gravados[1]["transcription_status"] == "error")
+
+
+async def teste_5_gravacao_sumida():
+    print("\n5) gravação sumida → error sem retentativa")
+    whisper = AsyncMock(return_value="nunca")
+    fila = FilaFalsa([_trabalho(1, attempts=1, caminho=os.path.join(DIR, "nao_existe.mp3"))])
+    resumo = await _rodar(fila, whisper)
+    check("error já na 1ª tentativa", resumo == {"error": 1}, f"{resumo}")
+    check("Whisper nem chamado", whisper.await_count == 0)
+
+
+# ==========================================================================================
+# 6: reivindicação
+# ==========================================================================================
+
+async def teste_6_reivindicar():
+    print("\n6) _reivindicar")
+    call_log = SimpleNamespace(id=7, call_sid="CA7", local_recording_path="/x.mp3", duration=30,
+                               user_name=None, transcription_attempts=1)
+    db = SessaoFalsa(resposta=call_log)
+    trabalho = await tw._reivindicar(db, AGORA)
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    check("SELECT usa FOR UPDATE SKIP LOCKED", "FOR UPDATE SKIP LOCKED" in sql)
+    check("pega 'processing' travada além de 'pending'",
+          "transcription_started_at <" in sql and "transcription_run_at IS NULL" in sql)
+    check("tentativa contada na reivindicação", trabalho["attempts"] == 2, f"{trabalho}")
+    upd = db.statements[1].compile(dialect=postgresql.dialect())
+    check("marca processing", upd.params.get("transcription_status") == "processing",
+          f"{upd.params}")
+    check("não commita (quem chama é dono da transação)", db.commits == 0)
+
+
+# ==========================================================================================
+# 7: endpoint
+# ==========================================================================================
+
+async def teste_7_endpoint_so_enfileira():
+    print("\n7) POST /transcribe só enfileira")
+    from app import database
+    from app import twilio_routes
+    call_log = SimpleNamespace(id=9, local_recording_path="/x.mp3", transcription_status="error",
+                               transcription_attempts=3, transcription_run_at=AGORA,
+                               transcription_error="429")
+    db = SessaoFalsa(resposta=call_log)
+    whisper = AsyncMock()
+    tw._acordar.clear()
+    with patch.object(database, "async_session", new=fabrica_de_sessao(db)), \
+         patch.object(tr, "transcribe_audio", new=whisper):
+        r = await twilio_routes.transcribe_call(9, current_user=None)
+    check("devolve pending", r["transcription_status"] == "pending", f"{r}")
+    check("tentativas zeradas e erro limpo",
+          call_log.transcription_attempts == 0 and call_log.transcription_error is None)
+    check("commit feito", db.commits == 1)
+    check("nenhum Whisper dentro do request", whisper.await_count == 0)
+    check("worker acordado", tw._acordar.is_set())
+
+    call_log.transcription_status = "processing"
+    db.commits = 0
+    with patch.object(database, "async_session", new=fabrica_de_sessao(db)):
+        r = await twilio_routes.transcribe_call(9, current_user=None)
+    check("já em processamento: não mexe", r["transcription_status"] == "processing"
+          and db.commits == 0)
+
+
+async def main():
+    print("\n" + "=" * 90)
+    print("FILA DE TRANSCRIÇÃO DE LIGAÇÕES")
+    print("Nada enviado. Nada gravado. Nenhuma conexão de banco. Nenhuma chamada de rede.")
+    print("=" * 90)
+
+    await teste_1_concorrencia_limitada()
+    await teste_3_retentativa()
+    await teste_4_ultima_tentativa()
+    await teste_5_gravacao_sumida()
+    await teste_6_reivindicar()
+    await teste_7_endpoint_so_enfileira()
+    shutil.rmtree(DIR, ignore_errors=True)
+
+    print("\n" + "=" * 90)
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam:")
+        for f in falhas:
+            print(f"   - {f}")
+        sys.exit(1)
+    print("✅ TODOS OS TESTES PASSARAM — nada enviado, nada gravado.")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -36,23 +36,36 @@ export default function CallsPage() {
   const [transcribing, setTranscribing] = useState<number | null>(null);
 
 
-  const fetchCalls = async () => {
+  const fetchCalls = async (silencioso = false) => {
     try {
-      setLoading(true);
+      if (!silencioso) setLoading(true);
       const token = localStorage.getItem('token');
       const res = await api.get('/twilio/call-logs', {
         headers: { Authorization: `Bearer ${token}` },
       });
       setCalls(res.data);
+      setSelectedCall(prev => prev ? (res.data.find((c: CallLog) => c.id === prev.id) ?? prev) : null);
     } catch (err) {
       console.error('Erro ao buscar ligações:', err);
     } finally {
-      setLoading(false);
+      if (!silencioso) setLoading(false);
     }
   };
 
   useEffect(() => { fetchCalls(); }, []);
 
+  // A transcrição roda no worker do backend: o POST só enfileira. Enquanto houver ligação na
+  // fila ou em processamento, a lista é relida até ela chegar a 'done' ou 'error'.
+  const emTranscricao = (call: CallLog) =>
+    call.transcription_status === 'pending' || call.transcription_status === 'processing';
+  const algumaEmTranscricao = calls.some(emTranscricao);
+
+  useEffect(() => {
+    if (!algumaEmTranscricao) return;
+    const interval = setInterval(() => fetchCalls(true), 4000);
+    return () => clearInterval(interval);
+  }, [algumaEmTranscricao]);
+
   const deleteRecording = async (callSid: string, e: React.MouseEvent) => {
     e.stopPropagation();
     if (!confirm('Apagar gravação permanentemente?')) return;
@@ -74,10 +87,10 @@ export default function CallsPage() {
       const token = localStorage.getItem('token');
       const res = await api.post(`/twilio/transcribe/${call.id}`, {}, {
         headers: { Authorization: `Bearer ${token}` },
-        timeout: 120000,
       });
-      await fetchCalls();
-      setSelectedCall(prev => prev ? { ...prev, ...res.data } : null);
+      const { transcription_status } = res.data;
+      setCalls(prev => prev.map(c => c.id === call.id ? { ...c, transcription_status } : c));
+      setSelectedCall(prev => prev && prev.id === call.id ? { ...prev, transcription_status } : prev);
     } catch (err) {
       console.error('Erro ao transcrever:', err);
     } finally {
@@ -303,11 +316,11 @@ export default function CallsPage() {
                           {hasRec && call.transcription_status !== 'done' && (
                             <button
                               onClick={(e) => transcribeCall(call, e)}
-                              disabled={transcribing === call.id}
+                              disabled={transcribing === call.id || emTranscricao(call)}
                               className="flex items-center gap-1.5 px-3 py-1.5 bg-violet-50 hover:bg-violet-100 text-violet-600 rounded-lg text-xs font-medium transition-all disabled:opacity-60"
                               title="Transcrever com IA"
                             >
-                              {transcribing === call.id
+                              {transcribing === call.id || emTranscricao(call)
                                 ? <Loader2 className="w-3 h-3 animate-spin" />
                                 : <Sparkles className="w-3 h-3" />}
                             </button>
@@ -425,10 +438,10 @@ export default function CallsPage() {
                 <div>
                   <button
                     onClick={() => transcribeCall(selectedCall!)}
-                    disabled={transcribing === selectedCall!.id}
+                    disabled={transcribing === selectedCall!.id || emTranscricao(selectedCall!)}
                     className="w-full flex items-center justify-center gap-2 py-3 bg-gradient-to-r from-violet-500 to-purple-600 text-white hover:from-violet-600 hover:to-purple-700 rounded-2xl text-sm font-semibold transition-all shadow-sm hover:shadow-md disabled:opacity-60"
                   >
-                    {transcribing === selectedCall!.id
+                    {transcribing === selectedCall!.id || emTranscricao(selectedCall!)
                       ? <><Loader2 className="w-4 h-4 animate-spin" /> Processando transcrição...</>
                       : <><Sparkles className="w-4 h-4" /> Gerar Transcrição com IA</>}
                   </button>
@@ -476,10 +489,10 @@ export default function CallsPage() {
               {hasRecording && !hasTranscription && (
                 <button
                   onClick={() => transcribeCall(selectedCall!)}
-                  disabled={transcribing === selectedCall!.id}
+                  disabled={transcribing === selectedCall!.id || emTranscricao(selectedCall!)}
                   className="ml-auto flex items-center gap-1.5 px-4 py-2 bg-violet-600 text-white text-xs font-semibold rounded-xl hover:bg-violet-700 transition-all disabled:opacity-60"
                 >
-                  {transcribing === selectedCall!.id
+                  {transcribing === selectedCall!.id || emTranscricao(selectedCall!)
                     ? <><Loader2 className="w-3.5 h-3.5 animate-spin" /> Processando...</>
                     : <><Sparkles className="w-3.5 h-3.5" /> Transcrever</>}
                 </button>
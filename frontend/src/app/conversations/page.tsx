@@ -33,6 +33,7 @@ import {
 } from 'lucide-react';
 import AppLayout from '@/components/AppLayout';
 import api from '@/lib/api';
+import { useEventos } from '@/lib/eventos';
 
 interface ChannelInfo {
   id: number;
@@ -97,6 +98,10 @@ interface Message {
   sent_by_ai: boolean;
 }
 
+// A conversa abre com as últimas PAGINA_MENSAGENS e sobe por cursor (timestamp + id da mais
+// antiga na tela) sob demanda — a mesma paginação que continua no arquivo frio do backend.
+const PAGINA_MENSAGENS = 50;
+
 const leadStatuses = [
   { value: 'novo', label: 'Novo', color: 'bg-blue-500', bg: 'bg-blue-50', text: 'text-blue-700', border: 'border-blue-200' },
   { value: 'em_contato', label: 'Em contato', color: 'bg-amber-500', bg: 'bg-amber-50', text: 'text-amber-700', border: 'border-amber-200' },
@@ -162,6 +167,8 @@ export default function ConversationsPage() {
   const [sdrFilter, setSdrFilter] = useState<number | null>(null);
   const [users, setUsers] = useState<{id: number; name: string}[]>([]);
   const [loadingMessages, setLoadingMessages] = useState(false);
+  const [temAntigas, setTemAntigas] = useState(false);
+  const [carregandoAntigas, setCarregandoAntigas] = useState(false);
   const [showScrollDown, setShowScrollDown] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
   const [showAttachMenu, setShowAttachMenu] = useState(false);
@@ -170,7 +177,10 @@ export default function ConversationsPage() {
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const chatContainerRef = useRef<HTMLDivElement>(null);
-  const prevMsgCountRef = useRef<number>(0);
+  const ultimoIdRef = useRef<number>(0);
+  const conversaRef = useRef<string | null>(null);
+  const alturaAntesRef = useRef<number | null>(null);
+  const mensagensRef = useRef<Message[]>([]);
   const isTabFocusedRef = useRef<boolean>(true);
   const notifAudioRef = useRef<HTMLAudioElement | null>(null);
   const attachMenuRef = useRef<HTMLDivElement>(null);
@@ -209,15 +219,47 @@ export default function ConversationsPage() {
     loadTags();
   }, []);
 
+  // Tempo real: o backend avisa o que mudou (lib/eventos.ts) e a tela recarrega só aquilo.
+  // A lista é recarregada com um respiro de 500ms, para um disparo em massa (centenas de
+  // status em segundos) virar uma recarga, e não centenas.
+  const recargaContatosRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const agendarRecargaContatos = () => {
+    if (recargaContatosRef.current) return;
+    recargaContatosRef.current = setTimeout(() => {
+      recargaContatosRef.current = null;
+      loadContacts();
+    }, 500);
+  };
+
+  const tempoReal = useEventos(evento => {
+    if (!activeChannel) return;
+    if (evento.tipo === 'resync') {
+      agendarRecargaContatos();
+      if (selectedContact) loadMessages(selectedContact.wa_id);
+      return;
+    }
+    if (evento.tipo !== 'mensagem' && evento.tipo !== 'status' && evento.tipo !== 'atribuicao') return;
+    if (evento.canal != null && evento.canal !== activeChannel.id) return;
+    agendarRecargaContatos();
+    if (evento.tipo !== 'atribuicao' && evento.wa_id && evento.wa_id === selectedContact?.wa_id) {
+      loadMessages(evento.wa_id);
+    }
+  });
+
   useEffect(() => {
     if (activeChannel) {
       loadContacts();
       loadUsers();
-      const interval = setInterval(loadContacts, 5000);
-      return () => clearInterval(interval);
     }
   }, [activeChannel]);
 
+  // Polling só enquanto o tempo real está fora (conexão caindo, backend reiniciando).
+  useEffect(() => {
+    if (!activeChannel || tempoReal) return;
+    const interval = setInterval(loadContacts, 5000);
+    return () => clearInterval(interval);
+  }, [activeChannel, tempoReal]);
+
   useEffect(() => {
     if (deepLinkDoneRef.current || contacts.length === 0) return;
     const wa = new URLSearchParams(window.location.search).get('wa');
@@ -230,20 +272,27 @@ export default function ConversationsPage() {
 
   useEffect(() => {
     if (selectedWaId) {
-      prevMsgCountRef.current = 0;
+      ultimoIdRef.current = 0;
+      conversaRef.current = selectedWaId;
       setLoadingMessages(true);
+      setTemAntigas(false);
       setMessages([]);
       loadMessages(selectedWaId);
       loadNatEstado(selectedWaId);
       setNotesValue(selectedContact?.notes || '');
       // Marcar como lido sem forçar reload da lista
       api.post(`/contacts/${selectedWaId}/read`).catch(() => {});
-      const interval = setInterval(() => loadMessages(selectedWaId), 3000);
-      return () => clearInterval(interval);
+      return;
     }
     setNatEstado(null);
   }, [selectedWaId]);
 
+  useEffect(() => {
+    if (!selectedWaId || tempoReal) return;
+    const interval = setInterval(() => loadMessages(selectedWaId), 3000);
+    return () => clearInterval(interval);
+  }, [selectedWaId, tempoReal]);
+
   // O estado da NAT muda por fora desta tela: o lead responde e o fluxo avança, ou o outro
   // SDR assume. 15s é o passo do NotificationBell — mesma ordem de frescor, e bem mais
   // barato que os 3s das mensagens para um dado que muda a cada minutos.
@@ -253,8 +302,19 @@ export default function ConversationsPage() {
     return () => clearInterval(interval);
   }, [selectedWaId]);
 
-  // Scroll simples: sempre vai pro final quando mensagens mudam
   useEffect(() => {
+    mensagensRef.current = messages;
+  }, [messages]);
+
+  // Scroll: vai pro final quando mensagens mudam — menos quando a mudança foi a página de
+  // antigas entrando em cima, que mantém o que estava na tela no mesmo lugar.
+  useEffect(() => {
+    const container = chatContainerRef.current;
+    if (alturaAntesRef.current !== null && container) {
+      container.scrollTop += container.scrollHeight - alturaAntesRef.current;
+      alturaAntesRef.current = null;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
@@ -305,21 +365,28 @@ export default function ConversationsPage() {
 
   const loadMessages = async (waId: string) => {
     try {
-      const res = await api.get(`/contacts/${waId}/messages`);
+      const res = await api.get(`/contacts/${waId}/messages`, { params: { limit: PAGINA_MENSAGENS } });
+      if (conversaRef.current !== waId) return;  // trocou de conversa no meio
       const newMsgs: Message[] = res.data;
 
       // Detectar novas mensagens inbound para notificação
-      if (prevMsgCountRef.current > 0 && newMsgs.length > prevMsgCountRef.current) {
-        const newOnes = newMsgs.slice(prevMsgCountRef.current);
-        const hasInbound = newOnes.some(m => m.direction === 'inbound');
-        if (hasInbound && !isTabFocusedRef.current) {
-          setUnreadCount(prev => prev + newOnes.filter(m => m.direction === 'inbound').length);
+      if (ultimoIdRef.current > 0) {
+        const newOnes = newMsgs.filter(m => m.id > ultimoIdRef.current && m.direction === 'inbound');
+        if (newOnes.length > 0 && !isTabFocusedRef.current) {
+          setUnreadCount(prev => prev + newOnes.length);
           try { notifAudioRef.current?.play(); } catch {}
         }
       }
-      prevMsgCountRef.current = newMsgs.length;
-
-      setMessages(newMsgs);
+      if (newMsgs.length > 0) ultimoIdRef.current = Math.max(ultimoIdRef.current, newMsgs[newMsgs.length - 1].id);
+
+      // A recarga traz só a página mais nova; as antigas que o usuário já abriu ficam — se a
+      // página nova encosta nelas. Chegou mais de uma página desde a última recarga: haveria
+      // um buraco no meio, então a conversa recomeça da página nova.
+      const atuais = mensagensRef.current;
+      const encaixe = newMsgs.length > 0 ? atuais.findIndex(m => m.id === newMsgs[0].id) : -1;
+      const antigas = encaixe > 0 ? atuais.slice(0, encaixe) : [];
+      if (antigas.length === 0) setTemAntigas(newMsgs.length === PAGINA_MENSAGENS);
+      setMessages([...antigas, ...newMsgs]);
       setLoadingMessages(false);
     } catch (err) {
       console.error('Erro:', err);
@@ -327,6 +394,29 @@ export default function ConversationsPage() {
     }
   };
 
+  const carregarAntigas = async () => {
+    const waId = selectedContact?.wa_id;
+    const maisAntiga = messages[0];
+    if (!waId || !maisAntiga || carregandoAntigas) return;
+    setCarregandoAntigas(true);
+    try {
+      const res = await api.get(`/contacts/${waId}/messages`, {
+        params: { before: maisAntiga.timestamp, before_id: maisAntiga.id, limit: PAGINA_MENSAGENS },
+      });
+      if (conversaRef.current !== waId) return;
+      const antigas: Message[] = res.data;
+      setTemAntigas(antigas.length === PAGINA_MENSAGENS);
+      if (antigas.length > 0) {
+        alturaAntesRef.current = chatContainerRef.current?.scrollHeight ?? null;
+        setMessages(prev => [...antigas, ...prev]);
+      }
+    } catch (err) {
+      console.error('Erro:', err);
+    } finally {
+      setCarregandoAntigas(false);
+    }
+  };
+
   const loadNatEstado = async (waId: string) => {
     try {
       const res = await api.get(`/nat/${waId}/estado`);
@@ -1209,6 +1299,7 @@ export default function ConversationsPage() {
                 {/* Messages */}
                 <div className="flex-1 flex flex-col min-w-0">
                   <div
+                    ref={chatContainerRef}
                     className="flex-1 overflow-y-auto px-4 py-4 space-y-1 bg-[#eef0f3] relative"
                   >
                     {loadingMessages ? (
@@ -1231,6 +1322,18 @@ export default function ConversationsPage() {
                       </div>
                     ) : (
                     <>
+                    {temAntigas && (
+                      <div className="flex justify-center my-2">
+                        <button
+                          onClick={carregarAntigas}
+                          disabled={carregandoAntigas}
+                          className="flex items-center gap-1.5 px-3 py-1 bg-white rounded-lg text-[11px] text-gray-500 shadow-sm font-medium hover:text-[#2A658F] transition-colors disabled:opacity-60"
+                        >
+                          {carregandoAntigas && <Loader2 className="w-3 h-3 animate-spin" />}
+                          Carregar mensagens anteriores
+                        </button>
+                      </div>
+                    )}
                     {groupedMessages.map((group) => (
                       <div key={group.date}>
                         <div className="flex justify-center my-3">
@@ -4,6 +4,7 @@ import { useState, useEffect, useRef } from 'react';
 import { useRouter } from 'next/navigation';
 import { Bell, X } from 'lucide-react';
 import api from '@/lib/api';
+import { useEventos } from '@/lib/eventos';
 
 interface Notif {
   id: number;
@@ -104,12 +105,22 @@ export default function NotificationBell({ collapsed = false }: { collapsed?: bo
     } catch {}
   };
 
+  // Notificação nova chega pelo tempo real (lib/eventos.ts); o polling fica só de reserva.
+  const tempoReal = useEventos(evento => {
+    if (evento.tipo === 'notificacao' || evento.tipo === 'resync') load();
+  });
+
   useEffect(() => {
     if (typeof window !== 'undefined' && !localStorage.getItem('token')) return;
     load();
+  }, []);
+
+  useEffect(() => {
+    if (tempoReal) return;
+    if (typeof window !== 'undefined' && !localStorage.getItem('token')) return;
     const interval = setInterval(load, 15000);
     return () => clearInterval(interval);
-  }, []);
+  }, [tempoReal]);
 
   const askPermission = () => {
     unlockAudio();
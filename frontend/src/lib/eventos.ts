@@ -0,0 +1,129 @@
+'use client';
+
+import { useEffect, useRef, useState } from 'react';
+import api from '@/lib/api';
+
+// Eventos em tempo real do backend (GET /api/eventos/stream, ver backend/app/eventos.py).
+// Um EventSource só por aba, compartilhado por todas as telas que chamam useEventos.
+// O evento é um DELTA ("mensagem nova no wa_id X"): a tela decide o que recarregar.
+// O EventSource não manda header, então a credencial vai na URL — e por isso é um ticket de
+// 60s e uso único (POST /api/eventos/ticket), nunca o token da sessão.
+
+export interface Evento {
+  tipo: 'estado' | 'resync' | 'mensagem' | 'status' | 'notificacao' | 'atribuicao';
+  wa_id?: string | null;
+  id?: number;
+  canal?: number | null;
+  tempo_real?: boolean;
+  [campo: string]: unknown;
+}
+
+type Ouvinte = (evento: Evento) => void;
+
+const TIPOS: Evento['tipo'][] = ['estado', 'resync', 'mensagem', 'status', 'notificacao', 'atribuicao'];
+
+const REABRIR_MS = 5000;
+
+let fonte: EventSource | null = null;
+let abrindo = false;
+let reabrir: ReturnType<typeof setTimeout> | null = null;
+let tempoReal = false;
+const ouvintes = new Set<Ouvinte>();
+const ouvintesEstado = new Set<(ativo: boolean) => void>();
+
+function emitir(evento: Evento) {
+  ouvintes.forEach(ouvinte => ouvinte(evento));
+}
+
+function mudarEstado(ativo: boolean) {
+  if (ativo === tempoReal) return;
+  tempoReal = ativo;
+  ouvintesEstado.forEach(f => f(ativo));
+  // Voltou (reconexão do navegador ou LISTEN do backend): o que passou no buraco não veio.
+  if (ativo) emitir({ tipo: 'resync' });
+}
+
+function agendarReabertura() {
+  if (reabrir || ouvintes.size === 0) return;
+  reabrir = setTimeout(() => {
+    reabrir = null;
+    abrir();
+  }, REABRIR_MS);
+}
+
+async function abrir() {
+  const token = localStorage.getItem('token');
+  if (fonte || abrindo || !token) return;
+  abrindo = true;
+  let ticket: string;
+  try {
+    const res = await api.post('/eventos/ticket', null, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    ticket = res.data.ticket;
+  } catch {
+    // Sem ticket, as telas seguem no polling; tenta de novo daqui a pouco.
+    abrindo = false;
+    agendarReabertura();
+    return;
+  }
+  abrindo = false;
+  // A tela pode ter saído enquanto o ticket vinha.
+  if (fonte || ouvintes.size === 0) return;
+  fonte = new EventSource(`${api.defaults.baseURL}/eventos/stream?ticket=${encodeURIComponent(ticket)}`);
+  TIPOS.forEach(tipo => {
+    fonte!.addEventListener(tipo, msg => {
+      const evento = JSON.parse((msg as MessageEvent).data) as Evento;
+      if (evento.tipo === 'estado') mudarEstado(Boolean(evento.tempo_real));
+      else emitir(evento);
+    });
+  });
+  // A reconexão nativa do navegador reusaria o ticket, que já foi gasto: fecha e reabre com
+  // um novo. Enquanto isso, as telas fazem polling.
+  fonte.onerror = () => {
+    fonte?.close();
+    fonte = null;
+    mudarEstado(false);
+    agendarReabertura();
+  };
+}
+
+function fecharSeOcioso() {
+  if (ouvintes.size > 0) return;
+  if (reabrir) {
+    clearTimeout(reabrir);
+    reabrir = null;
+  }
+  if (!fonte) return;
+  fonte.close();
+  fonte = null;
+  mudarEstado(false);
+}
+
+/**
+ * Assina os eventos em tempo real. Devolve se o tempo real está de pé: com `false`, a tela
+ * mantém o polling antigo como rede de segurança.
+ */
+export function useEventos(onEvento: Ouvinte): boolean {
+  const ref = useRef(onEvento);
+  const [ativo, setAtivo] = useState(tempoReal);
+
+  useEffect(() => {
+    ref.current = onEvento;
+  });
+
+  useEffect(() => {
+    const ouvinte: Ouvinte = evento => ref.current(evento);
+    ouvintes.add(ouvinte);
+    ouvintesEstado.add(setAtivo);
+    abrir();
+    setAtivo(tempoReal);
+    return () => {
+      ouvintes.delete(ouvinte);
+      ouvintesEstado.delete(setAtivo);
+      fecharSeOcioso();
+    };
+  }, []);
+
+  return ativo;
+}